@@ -0,0 +1,101 @@
+"""
+asyncio front-end for the exchange API clients
+"""
+
+import asyncio
+from collections.abc import Callable, Iterable
+from typing import Any, TypeVar
+
+from .ExchangeApi import ExchangeApi
+from .OrderBook import OrderBook
+
+
+T = TypeVar("T")
+
+
+class AsyncExchangeApi:
+    """
+    Awaitable version of an ExchangeApi with the same Poloniex-shaped return values.
+
+    Every call runs the synchronous client on a worker thread. The clients already
+    share a keep-alive connection pool, let public requests run concurrently and keep
+    signed requests in nonce order, so awaiting several calls at once overlaps their
+    network time while still respecting the rate-limit buckets.
+    """
+
+    def __init__(self, api: ExchangeApi) -> None:
+        self.api = api
+
+    async def _call(self, func: Callable[..., T], *args: Any) -> T:
+        return await asyncio.to_thread(func, *args)
+
+    async def return_ticker(self) -> dict[str, dict[str, str]]:
+        return await self._call(self.api.return_ticker)
+
+    async def return_available_account_balances(self, account: str) -> dict[str, dict[str, str]]:
+        return await self._call(self.api.return_available_account_balances, account)
+
+    async def return_loan_orders(
+        self, currency: str, limit: int = 0
+    ) -> dict[str, list[dict[str, Any]]]:
+        return await self._call(self.api.return_loan_orders, currency, limit)
+
+    async def return_loan_book(self, currency: str, limit: int = 0) -> OrderBook:
+        return await self._call(self.api.return_loan_book, currency, limit)
+
+    async def return_open_loan_offers(self) -> dict[str, list[dict[str, Any]]]:
+        return await self._call(self.api.return_open_loan_offers)
+
+    async def return_active_loans(self) -> dict[str, list[dict[str, Any]]]:
+        return await self._call(self.api.return_active_loans)
+
+    async def get_frr(self, currency: str) -> float:
+        return await self._call(self.api.get_frr, currency)
+
+    async def create_loan_offer(
+        self, currency: str, amount: float, duration: int, auto_renew: int, lending_rate: float
+    ) -> dict[str, Any]:
+        return await self._call(
+            self.api.create_loan_offer, currency, amount, duration, auto_renew, lending_rate
+        )
+
+    async def cancel_loan_offer(self, currency: str, order_number: int) -> dict[str, Any]:
+        return await self._call(self.api.cancel_loan_offer, currency, order_number)
+
+    async def fetch_loan_orders(
+        self, limits: dict[str, int]
+    ) -> dict[str, dict[str, list[dict[str, Any]]] | BaseException]:
+        """
+        Fetches the loan order books of several currencies concurrently.
+        `limits` maps each currency to the number of levels to request. A failed
+        currency maps to its exception instead of aborting the others.
+        """
+        currencies = list(limits)
+        results = await asyncio.gather(
+            *(self.return_loan_orders(cur, limits[cur]) for cur in currencies),
+            return_exceptions=True,
+        )
+        return dict(zip(currencies, results, strict=True))
+
+    async def fetch_loan_books(
+        self, limits: dict[str, int]
+    ) -> dict[str, OrderBook | BaseException]:
+        """
+        Same as fetch_loan_orders, with the books as OrderBook arrays
+        """
+        currencies = list(limits)
+        results = await asyncio.gather(
+            *(self.return_loan_book(cur, limits[cur]) for cur in currencies),
+            return_exceptions=True,
+        )
+        return dict(zip(currencies, results, strict=True))
+
+    async def fetch_frrs(self, currencies: Iterable[str]) -> dict[str, float | BaseException]:
+        """
+        Fetches the flash return rate of several currencies concurrently.
+        """
+        currencies = list(currencies)
+        results = await asyncio.gather(
+            *(self.get_frr(cur) for cur in currencies), return_exceptions=True
+        )
+        return dict(zip(currencies, results, strict=True))
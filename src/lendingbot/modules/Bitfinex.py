@@ -2,30 +2,44 @@ import base64
 import hashlib
 import hmac
 import json
-import threading
 import time
-from collections import deque
+from collections.abc import Sequence
 from typing import Any
 
-import requests
+import numpy as np
 
 from . import Configuration
 from .Bitfinex2Poloniex import Bitfinex2Poloniex
+from .BitfinexWebSocket import BitfinexWebSocketFeed
 from .ExchangeApi import ApiError, ExchangeApi
+from .FrrCache import FrrCache
+from .HistorySync import HistoryPage
+from .HttpClient import HttpClient
+from .JsonDecoder import BALANCES, CREDITS, LENDBOOK, OFFERS
+from .OrderBook import OrderBook
+from .RateLimiter import AUTH_READ, AUTH_WRITE, PUBLIC, BucketLimit, parse_retry_after
 from .Utils import format_amount_currency, format_rate_pct
 
 
+# Bitfinex throttles public, authenticated read and authenticated write endpoints
+# separately, so each group gets its own budget.
+DEFAULT_RATE_LIMITS = {
+    PUBLIC: BucketLimit(requests=5, period_ms=10000),
+    AUTH_READ: BucketLimit(requests=1, period_ms=2000),
+    AUTH_WRITE: BucketLimit(requests=1, period_ms=1000),
+}
+WRITE_COMMANDS = frozenset({"offer/new", "offer/cancel", "transfer"})
+DEFAULT_URL = "https://api.bitfinex.com"
+
+
 class Bitfinex(ExchangeApi):
     def __init__(self, cfg: Configuration.RootConfig, log: Any) -> None:
         super().__init__(cfg, log)
         self.cfg = cfg
         self.log = log
-        self.lock = threading.RLock()
-        self.req_per_period = 1
-        self.default_req_period = 5000.0  # milliseconds, 1000 = 60/min
-        self.req_period = self.default_req_period
-        self.req_time_log: deque[float] = deque(maxlen=self.req_per_period)
-        self.url = "https://api.bitfinex.com"
+        self.init_rate_limiter(cfg, DEFAULT_RATE_LIMITS)
+        self.url = (self.cfg.api.base_url or DEFAULT_URL).rstrip("/")
+        self.http = HttpClient(cfg)
 
         self.key = self.cfg.api.apikey.get_secret_value() if self.cfg.api.apikey else None
         self.secret = self.cfg.api.secret.get_secret_value() if self.cfg.api.secret else None
@@ -33,10 +47,21 @@ class Bitfinex(ExchangeApi):
         self.apiVersion = "v1"
         self.symbols: list[str] = []
         self.ticker: dict[str, dict[str, Any]] = {}
+        # Funding tickers of the lent currencies, refreshed together with the ticker
+        self.funding_ticker: dict[str, dict[str, str]] = {}
         self.tickerTime = 0
         self.baseCurrencies = ["USD", "BTC", "ETH"]
 
         self.all_currencies = self.cfg.api.all_currencies
+        self.frr_cache: FrrCache = FrrCache(
+            self._fetch_frrs, self.cfg.api.frr_cache_ttl, currencies=self.all_currencies
+        )
+
+        # Serves order books and FRRs from local state while it is in sync
+        self.ws_feed: BitfinexWebSocketFeed | None = None
+        if self.cfg.api.websocket.enabled:
+            self.ws_feed = BitfinexWebSocketFeed(self.cfg.api.websocket, self.all_currencies, log)
+            self.ws_feed.start()
 
         self.usedCurrencies: list[str] = []
         self.timeout = int(self.cfg.bot.request_timeout)
@@ -50,19 +75,30 @@ class Bitfinex(ExchangeApi):
         Returns a nonce
         Used in authentication
         """
-        return str(int(time.time() * 100000))
+        return str(self.next_nonce(int(time.time() * 100000)))
+
+    def close(self) -> None:
+        if self.ws_feed is not None:
+            self.ws_feed.stop()
+        self.http.close()
+        super().close()
 
-    def limit_request_rate(self) -> None:
-        super().limit_request_rate()
+    def limit_request_rate(self, bucket: str = PUBLIC) -> float:
+        waited = super().limit_request_rate(bucket)
+        if waited > 0:
+            self.debug_log(f"Waited {waited:.3f}s for {bucket} rate limit")
+        return waited
 
-    def increase_request_timer(self) -> None:
-        super().increase_request_timer()
+    def increase_request_timer(
+        self, bucket: str = PUBLIC, retry_after: float | None = None
+    ) -> None:
+        super().increase_request_timer(bucket, retry_after)
 
-    def decrease_request_timer(self) -> None:
-        super().decrease_request_timer()
+    def decrease_request_timer(self, bucket: str = PUBLIC, latency: float | None = None) -> None:
+        super().decrease_request_timer(bucket, latency)
 
-    def reset_request_timer(self) -> None:
-        super().reset_request_timer()
+    def reset_request_timer(self, bucket: str = PUBLIC) -> None:
+        super().reset_request_timer(bucket)
 
     def _sign_payload(self, payload: dict[str, Any]) -> dict[str, str]:
         j = json.dumps(payload)
@@ -80,7 +116,22 @@ class Bitfinex(ExchangeApi):
             "X-BFX-APIKEY": self.key,
             "X-BFX-SIGNATURE": signature,
             "X-BFX-PAYLOAD": data.decode("utf-8"),
-            "Connection": "close",
+        }
+
+    def _sign_payload_v2(self, path: str, body: str) -> dict[str, str]:
+        if self.secret is None:
+            raise ApiError("API Secret is not set")
+        if self.key is None:
+            raise ApiError("API Key is not set")
+
+        nonce = self._nonce
+        message = f"/api/{path}{nonce}{body}"
+        signature = hmac.new(self.secret.encode("utf8"), message.encode("utf8"), hashlib.sha384)
+        return {
+            "bfx-nonce": nonce,
+            "bfx-apikey": self.key,
+            "bfx-signature": signature.hexdigest(),
+            "Content-Type": "application/json",
         }
 
     def debug_log(self, msg: str) -> None:
@@ -93,14 +144,18 @@ class Bitfinex(ExchangeApi):
         request_path: str,
         payload: dict[str, str] | None = None,
         verify: bool = True,
+        bucket: str = PUBLIC,
+        data: str | None = None,
+        payload_type: str | None = None,
     ) -> Any:
         try:
             url = f"{self.url}{request_path}"
+            start = time.monotonic()
             if method == "get":
-                r = requests.get(url, timeout=self.timeout, headers={"Connection": "close"})
+                r = self.http.get(url)
                 self.debug_log(f"GET: {url}")
             else:
-                r = requests.post(url, headers=payload, verify=verify, timeout=self.timeout)
+                r = self.http.post(url, headers=payload, data=data, verify=verify)
                 self.debug_log(f"POST: {url} headers={payload}")
 
             if r.status_code != 200:
@@ -109,41 +164,81 @@ class Bitfinex(ExchangeApi):
                         f"API Error {r.status_code}: The web server reported a bad gateway or gateway timeout error."
                     )
                 elif r.status_code == 429:
-                    self.increase_request_timer()
+                    retry_after = parse_retry_after(r.headers.get("Retry-After"))
+                    self.increase_request_timer(bucket, retry_after)
                 raise ApiError(f"API Error {r.status_code}: {r.text}")
 
-            # Check in case something has gone wrong and the timer is too big
-            self.reset_request_timer()
-            self.debug_log(f"Response: {r.text}")
-            return r.json()
+            self.decrease_request_timer(bucket, time.monotonic() - start)
+            if self.api_debug_log:
+                self.log.log(f"Response: {r.text}")
+            return self.json_decoder.decode_response(r, payload_type)
 
         except Exception as ex:
             msg = str(ex)
             ex_msg = f"{msg} Requesting {self.url + request_path}"
             raise ApiError(ex_msg) from ex
 
-    @ExchangeApi.synchronized
     def _post(
-        self, command: str, payload: dict[str, Any] | None = None, verify: bool = True
+        self,
+        command: str,
+        payload: dict[str, Any] | None = None,
+        verify: bool = True,
+        payload_type: str | None = None,
     ) -> Any:
         # keep the request per minute limit
-        self.limit_request_rate()
+        bucket = AUTH_WRITE if command in WRITE_COMMANDS else AUTH_READ
+        self.limit_request_rate(bucket)
+        return self._signed_post(command, payload or {}, verify, bucket, payload_type)
 
-        payload = payload or {}
+    @ExchangeApi.signed
+    def _signed_post(
+        self,
+        command: str,
+        payload: dict[str, Any],
+        verify: bool,
+        bucket: str,
+        payload_type: str | None = None,
+    ) -> Any:
         payload["request"] = f"/{self.apiVersion}/{command}"
         payload["nonce"] = self._nonce
         signed_payload = self._sign_payload(payload)
-        return self._request("post", str(payload["request"]), signed_payload, verify)
+        return self._request(
+            "post",
+            str(payload["request"]),
+            signed_payload,
+            verify,
+            bucket,
+            payload_type=payload_type,
+        )
+
+    def _post_v2(self, path: str, payload: dict[str, Any]) -> Any:
+        """
+        Sends an authenticated v2 write request. path is like "v2/auth/w/..."
+        """
+        self.limit_request_rate(AUTH_WRITE)
+        return self._signed_post_v2(path, payload)
 
-    @ExchangeApi.synchronized
-    def _get(self, command: str, api_version: str | None = None) -> Any:
-        # keep the request per minute limit
-        self.limit_request_rate()
+    @ExchangeApi.signed
+    def _signed_post_v2(self, path: str, payload: dict[str, Any]) -> Any:
+        body = json.dumps(payload)
+        headers = self._sign_payload_v2(path, body)
+        return self._request("post", f"/{path}", headers, bucket=AUTH_WRITE, data=body)
 
+    def _get(
+        self, command: str, api_version: str | None = None, payload_type: str | None = None
+    ) -> Any:
         if api_version is None:
             api_version = self.apiVersion
         request_path = f"/{api_version}/{command}"
-        return self._request("get", request_path)
+        return self.public_requests.do(
+            request_path, lambda: self._send_get(request_path, payload_type)
+        )
+
+    def _send_get(self, request_path: str, payload_type: str | None = None) -> Any:
+        # keep the request per minute limit
+        self.limit_request_rate(PUBLIC)
+        with self.public_slots:
+            return self._request("get", request_path, payload_type=payload_type)
 
     def _get_symbols(self) -> list[str]:
         """
@@ -165,73 +260,129 @@ class Bitfinex(ExchangeApi):
         Returns active loan offers
         https://bitfinex.readme.io/v1/reference#rest-auth-offers
         """
-        bfx_resp = self._post("offers")
+        bfx_resp = self._post("offers", payload_type=OFFERS)
         resp = Bitfinex2Poloniex.convertOpenLoanOffers(bfx_resp)
 
         return resp
 
     def return_loan_orders(self, currency: str, limit: int = 0) -> dict[str, list[dict[str, Any]]]:
-        command = f"lendbook/{currency}?limit_asks={limit}&limit_bids={limit}"
-        bfx_resp = self._get(command)
-        resp = Bitfinex2Poloniex.convertLoanOrders(bfx_resp)
+        return self.return_loan_book(currency, limit).to_poloniex()
 
-        return resp
+    def return_loan_book(self, currency: str, limit: int = 0) -> OrderBook:
+        """
+        Returns the funding book from the WebSocket feed while it is in sync, or else
+        from a lendbook request
+        https://bitfinex.readme.io/v1/reference#rest-public-fundingbook
+        """
+        if self.ws_feed is not None:
+            book = self.ws_feed.order_book(currency, limit)
+            if book is not None:
+                return book
+        command = f"lendbook/{currency}?limit_asks={limit}&limit_bids={limit}"
+        bfx_resp = self._get(command, payload_type=LENDBOOK)
+        return OrderBook.from_bitfinex(bfx_resp)
 
     def return_active_loans(self) -> dict[str, list[dict[str, Any]]]:
         """
         Returns own active loan offers
         https://bitfinex.readme.io/v1/reference#rest-auth-offers
         """
-        bfx_resp = self._post("credits")
+        bfx_resp = self._post("credits", payload_type=CREDITS)
         resp = Bitfinex2Poloniex.convertActiveLoans(bfx_resp)
 
         return resp
 
+    def _ticker_symbols(self) -> dict[str, str]:
+        """
+        Maps the v1 symbol of every pair the ticker needs to its v2 trading symbol
+        """
+        symbols = {}
+        for symbol in self._get_symbols():
+            base = symbol[3:].upper()
+            curr = symbol[:3].upper()
+            if (base in self.baseCurrencies) and (curr == "BTC" or curr in self.usedCurrencies):
+                symbols[symbol] = f"t{symbol.upper()}"
+        return symbols
+
     def return_ticker(self) -> dict[str, dict[str, str]]:
         """
-        The ticker is a high level overview of the state of the market
-        https://bitfinex.readme.io/v1/reference#rest-public-ticker
+        The ticker is a high level overview of the state of the market. Every needed
+        pair and the funding ticker of every lent currency come from one request.
+        https://docs.bitfinex.com/reference/rest-public-tickers
         """
         t = int(time.time())
         if t - self.tickerTime < 60:
             return self.ticker
 
+        symbols = self._ticker_symbols()
+        funding_symbols = [f"f{cur}" for cur in self.all_currencies]
+        try:
+            bfx_resp = self._get(
+                "tickers?symbols=" + ",".join([*symbols.values(), *funding_symbols]), "v2"
+            )
+            if isinstance(bfx_resp, dict) and "message" in bfx_resp:
+                raise ApiError(f"Error: {bfx_resp['message']}")
+            # v2 reports errors as ["error", code, message]
+            if not isinstance(bfx_resp, list) or bfx_resp[:1] == ["error"]:
+                raise ApiError(f"Error: {bfx_resp}")
+        except Exception as ex:
+            self.log.log_error(f"Error retrieving ticker: {ex}. Keeping the previous ticker.")
+            return self.ticker
+
+        tickers = {entry[0]: entry for entry in bfx_resp}
         set_ticker_time = True
 
-        for symbol in self._get_symbols():
+        for symbol, v2_symbol in symbols.items():
             base = symbol[3:].upper()
             curr = symbol[:3].upper()
-            if (base in self.baseCurrencies) and (curr == "BTC" or curr in self.usedCurrencies):
-                couple = f"{base}_{curr}"
-                couple_reverse = f"{curr}_{base}"
-
-                try:
-                    ticker = self._get(f"pubticker/{symbol}")
-
-                    if isinstance(ticker, dict) and "message" in ticker:
-                        raise ApiError(f"Error: {ticker['message']} ({symbol})")
-
-                    self.ticker[couple] = {
-                        "last": ticker["last_price"],
-                        "lowestAsk": ticker["ask"],
-                        "highestBid": ticker["bid"],
-                        "percentChange": "",
-                        "baseVolume": str(float(ticker["volume"]) * float(ticker["mid"])),
-                        "quoteVolume": ticker["volume"],
-                    }
-                    self.ticker[couple_reverse] = {
-                        "last": str(1 / float(self.ticker[couple]["last"])),
-                        "lowestAsk": str(1 / float(self.ticker[couple]["lowestAsk"])),
-                        "highestBid": str(1 / float(self.ticker[couple]["highestBid"])),
-                    }
-
-                except Exception as ex:
-                    msg = str(ex)
-                    self.log.log_error(
-                        f"Error retrieving ticker for {symbol}: {msg}. Continue with next currency."
-                    )
-                    set_ticker_time = False
-                    continue
+            couple = f"{base}_{curr}"
+            couple_reverse = f"{curr}_{base}"
+
+            try:
+                if v2_symbol not in tickers:
+                    raise ApiError(f"Error: no ticker returned ({symbol})")
+                # [SYMBOL, BID, BID_SIZE, ASK, ASK_SIZE, DAILY_CHANGE,
+                #  DAILY_CHANGE_RELATIVE, LAST_PRICE, VOLUME, HIGH, LOW]
+                _, bid, _, ask, _, _, change_rel, last, volume = tickers[v2_symbol][:9]
+                mid = (float(bid) + float(ask)) / 2
+
+                self.ticker[couple] = {
+                    "last": str(last),
+                    "lowestAsk": str(ask),
+                    "highestBid": str(bid),
+                    "percentChange": str(change_rel),
+                    "baseVolume": str(float(volume) * mid),
+                    "quoteVolume": str(volume),
+                }
+                self.ticker[couple_reverse] = {
+                    "last": str(1 / float(last)),
+                    "lowestAsk": str(1 / float(ask)),
+                    "highestBid": str(1 / float(bid)),
+                }
+
+            except Exception as ex:
+                msg = str(ex)
+                self.log.log_error(
+                    f"Error retrieving ticker for {symbol}: {msg}. Continue with next currency."
+                )
+                set_ticker_time = False
+                continue
+
+        frrs = {}
+        for cur in self.all_currencies:
+            entry = tickers.get(f"f{cur}")
+            # [SYMBOL, FRR, BID, BID_PERIOD, BID_SIZE, ASK, ASK_PERIOD, ASK_SIZE,
+            #  DAILY_CHANGE, DAILY_CHANGE_RELATIVE, LAST_PRICE, VOLUME, ...]
+            if entry is not None and len(entry) > 11:
+                self.funding_ticker[cur] = {
+                    "frr": str(entry[1]),
+                    "highestBid": str(entry[2]),
+                    "lowestAsk": str(entry[5]),
+                    "last": str(entry[10]),
+                    "volume": str(entry[11]),
+                }
+                frrs[cur] = float(entry[1])
+        self.frr_cache.update(frrs)
 
         if set_ticker_time and len(self.ticker) > 2:  # USD_BTC and BTC_USD are always in
             self.tickerTime = t
@@ -243,7 +394,7 @@ class Bitfinex(ExchangeApi):
         Returns own balances sorted by account
         https://bitfinex.readme.io/v1/reference#rest-auth-wallet-balances
         """
-        bfx_resp = self._post("balances")
+        bfx_resp = self._post("balances", payload_type=BALANCES)
         balances = Bitfinex2Poloniex.convertAccountBalances(bfx_resp, account)
 
         if "lending" in balances:
@@ -276,6 +427,31 @@ class Bitfinex(ExchangeApi):
 
         return {"success": success, "message": message}
 
+    def cancel_loan_offers(
+        self, currency: str, order_numbers: Sequence[int], all_open: bool = False
+    ) -> list[dict[str, Any] | Exception]:
+        """
+        Cancels several offers. All open offers of a currency are canceled with one v2
+        request; funding offers have no multi-cancel by id, so any other set is
+        canceled one by one.
+        https://docs.bitfinex.com/reference/rest-auth-cancel-all-funding-offers
+        """
+        if all_open and len(order_numbers) > 1:
+            try:
+                bfx_resp = self._post_v2(
+                    "v2/auth/w/funding/offer/cancel/all", {"currency": currency}
+                )
+                # [MTS, TYPE, MESSAGE_ID, null, NOTIFY_INFO, CODE, STATUS, TEXT]
+                if not isinstance(bfx_resp, list) or bfx_resp[6] != "SUCCESS":
+                    raise ApiError(f"Unexpected response {bfx_resp}")
+                message = f"Loan offer canceled (all {len(order_numbers)} open {currency} offers)."
+                return [{"success": 1, "message": message} for _ in order_numbers]
+            except Exception as ex:
+                self.log.log_error(
+                    f"Error canceling all {currency} offers at once, canceling one by one: {ex}"
+                )
+        return super().cancel_loan_offers(currency, order_numbers)
+
     def create_loan_offer(
         self,
         currency: str,
@@ -371,41 +547,91 @@ class Bitfinex(ExchangeApi):
         https://bitfinex.readme.io/v1/reference#rest-auth-balance-history
         """
         history = []
-        all_currencies = self.cfg.api.all_currencies
-        for curr in all_currencies:
-            payload = {
-                "currency": curr,
-                "since": str(start),
-                "until": str(stop),
-                "limit": limit,
-                "wallet": "deposit",
-            }
-            bfx_resp = self._post("history", payload)
-            for entry in bfx_resp:
-                if "Margin Funding Payment" in entry["description"]:
-                    amount = float(entry["amount"])
-                    history.append(
-                        {
-                            "id": int(float(entry["timestamp"])),
-                            "currency": curr,
-                            "rate": "0.0",
-                            "amount": "0.0",
-                            "duration": "0.0",
-                            "interest": str(amount / 0.85),
-                            "fee": str(amount - amount / 0.85),
-                            "earned": str(amount),
-                            "open": Bitfinex2Poloniex.convertTimestamp(entry["timestamp"]),
-                            "close": Bitfinex2Poloniex.convertTimestamp(entry["timestamp"]),
-                        }
-                    )
+        for curr in self.history_streams():
+            history.extend(self.return_lending_history_page(curr, start, stop, limit).rows)
 
         return history
 
-    def get_frr(self, currency: str) -> float:
+    def history_streams(self) -> list[str]:
+        """The ledger is requested per currency"""
+        return list(self.cfg.api.all_currencies)
+
+    def return_lending_history_page(
+        self, stream: str, start: int, stop: int, limit: int
+    ) -> HistoryPage:
+        """
+        Retrieves the newest `limit` deposit wallet ledger entries of one currency and
+        returns the funding payments among them
+        https://bitfinex.readme.io/v1/reference#rest-auth-balance-history
         """
-        Retrieves the flash return rate for the given currency
-        https://bitfinex.readme.io/v2/reference#rest-public-platform-status
+        payload = {
+            "currency": stream,
+            "since": str(start),
+            "until": str(stop),
+            "limit": limit,
+            "wallet": "deposit",
+        }
+        bfx_resp = self._post("history", payload)
+        timestamps = np.asarray([entry["timestamp"] for entry in bfx_resp], dtype=np.float64)
+        payments = [
+            i
+            for i, entry in enumerate(bfx_resp)
+            if "Margin Funding Payment" in entry["description"]
+        ]
+        earned = np.asarray([bfx_resp[i]["amount"] for i in payments], dtype=np.float64)
+        interest = earned / 0.85
+        dates = Bitfinex2Poloniex.convertTimestamps(timestamps[payments])
+        history = [
+            {
+                "id": int(timestamp),
+                "currency": stream,
+                "rate": "0.0",
+                "amount": "0.0",
+                "duration": "0.0",
+                "interest": str(gross),
+                "fee": str(fee),
+                "earned": str(amount),
+                "open": date,
+                "close": date,
+            }
+            for timestamp, amount, gross, fee, date in zip(
+                timestamps[payments].tolist(),
+                earned.tolist(),
+                interest.tolist(),
+                (earned - interest).tolist(),
+                dates,
+                strict=True,
+            )
+        ]
+
+        return HistoryPage(
+            rows=history,
+            oldest=int(timestamps.min()) if len(timestamps) else None,
+            complete=len(bfx_resp) < limit,
+        )
+
+    def _fetch_frrs(self, currencies: list[str]) -> dict[str, float]:
         """
-        command = f"tickers?symbols=f{currency}"
+        Retrieves the flash return rates of several currencies with one request
+        https://docs.bitfinex.com/reference/rest-public-tickers
+        """
+        command = "tickers?symbols=" + ",".join(f"f{cur}" for cur in currencies)
         resp = self._get(command, "v2")
-        return float(resp[0][1])
+        if not isinstance(resp, list) or resp[:1] == ["error"]:
+            raise ApiError(f"Error retrieving FRR: {resp}")
+        return {
+            entry[0][1:]: float(entry[1])
+            for entry in resp
+            if isinstance(entry, list) and str(entry[0]).startswith("f")
+        }
+
+    def get_frr(self, currency: str) -> float:
+        """
+        Retrieves the flash return rate for the given currency from the WebSocket feed,
+        or else the FRR cache
+        """
+        if self.ws_feed is not None:
+            frr = self.ws_feed.frr(currency)
+            if frr is not None:
+                return frr
+        return self.frr_cache.get(currency)
@@ -3,8 +3,13 @@ Converts Bitfinex to Poloniex Api returns
 """
 
 import datetime
+from collections.abc import Sequence
 from typing import Any
 
+import numpy as np
+
+from .OrderBook import BITFINEX_RATE_DIVISOR, OrderBook
+
 
 class Bitfinex2Poloniex:
     @staticmethod
@@ -15,27 +20,46 @@ class Bitfinex2Poloniex:
         dt = datetime.datetime.fromtimestamp(float(timestamp), datetime.UTC)
         return dt.strftime("%Y-%m-%d %H:%M:%S")
 
+    @staticmethod
+    def convertTimestamps(timestamps: Sequence[str | float] | np.ndarray) -> list[str]:
+        """
+        Converts unix timestamps like convertTimestamp, all at once
+        """
+        seconds = np.floor(np.asarray(timestamps, dtype=np.float64)).astype(np.int64)
+        dates = np.datetime_as_string(seconds.astype("datetime64[s]"), unit="s")
+        return [date.replace("T", " ") for date in dates.tolist()]
+
+    @staticmethod
+    def convertRates(rates: Sequence[str | float] | np.ndarray) -> list[str]:
+        """
+        Converts yearly percent rates to daily rates, all at once
+        """
+        daily = np.asarray(rates, dtype=np.float64) / BITFINEX_RATE_DIVISOR
+        return [str(rate) for rate in daily.tolist()]
+
     @staticmethod
     def convertOpenLoanOffers(bfxOffers: list[dict[str, Any]]) -> dict[str, list[dict[str, Any]]]:
         """
         Convert from "offers" to "returnOpenLoanOffers"
         """
-        plxOffers: dict[str, list[dict[str, Any]]] = {}
-        for offer in bfxOffers:
-            if offer["currency"] not in plxOffers:
-                plxOffers[offer["currency"]] = []
-
-            if offer["direction"] == "lend" and float(offer["remaining_amount"]) > 0:
-                plxOffers[offer["currency"]].append(
-                    {
-                        "id": offer["id"],
-                        "rate": str(float(offer["rate"]) / 36500),
-                        "amount": offer["remaining_amount"],
-                        "duration": offer["period"],
-                        "autoRenew": 0,
-                        "date": Bitfinex2Poloniex.convertTimestamp(offer["timestamp"]),
-                    }
-                )
+        plxOffers: dict[str, list[dict[str, Any]]] = {offer["currency"]: [] for offer in bfxOffers}
+        lends = [offer for offer in bfxOffers if offer["direction"] == "lend"]
+        remaining = np.asarray([offer["remaining_amount"] for offer in lends], dtype=np.float64)
+        lends = [offer for offer, keep in zip(lends, (remaining > 0).tolist(), strict=True) if keep]
+
+        rates = Bitfinex2Poloniex.convertRates([offer["rate"] for offer in lends])
+        dates = Bitfinex2Poloniex.convertTimestamps([offer["timestamp"] for offer in lends])
+        for offer, rate, date in zip(lends, rates, dates, strict=True):
+            plxOffers[offer["currency"]].append(
+                {
+                    "id": offer["id"],
+                    "rate": rate,
+                    "amount": offer["remaining_amount"],
+                    "duration": offer["period"],
+                    "autoRenew": 0,
+                    "date": date,
+                }
+            )
 
         return plxOffers
 
@@ -44,22 +68,23 @@ class Bitfinex2Poloniex:
         """
         Convert from "credits" to "returnActiveLoans"
         """
+        rates = Bitfinex2Poloniex.convertRates([offer["rate"] for offer in bfxOffers])
+        dates = Bitfinex2Poloniex.convertTimestamps([offer["timestamp"] for offer in bfxOffers])
 
         plxOffers: dict[str, list[dict[str, Any]]] = {}
-        plxOffers["provided"] = []
+        plxOffers["provided"] = [
+            {
+                "id": offer["id"],
+                "currency": offer["currency"],
+                "rate": rate,
+                "amount": offer["amount"],
+                "duration": offer["period"],
+                "autoRenew": 0,
+                "date": date,
+            }
+            for offer, rate, date in zip(bfxOffers, rates, dates, strict=True)
+        ]
         plxOffers["used"] = []
-        for offer in bfxOffers:
-            plxOffers["provided"].append(
-                {
-                    "id": offer["id"],
-                    "currency": offer["currency"],
-                    "rate": str(float(offer["rate"]) / 36500),
-                    "amount": offer["amount"],
-                    "duration": offer["period"],
-                    "autoRenew": 0,
-                    "date": Bitfinex2Poloniex.convertTimestamp(offer["timestamp"]),
-                }
-            )
 
         return plxOffers
 
@@ -70,32 +95,7 @@ class Bitfinex2Poloniex:
         """
         Converts from 'lendbook' to 'returnLoanOrders'
         """
-
-        plxOrders: dict[str, list[dict[str, Any]]] = {}
-        plxOrders["offers"] = []
-        plxOrders["demands"] = []
-
-        for bid in bfxLendbook["bids"]:
-            plxOrders["demands"].append(
-                {
-                    "rate": f"{float(bid['rate']) / 36500:0.8f}",
-                    "amount": bid["amount"],
-                    "rangeMin": "2",
-                    "rangeMax": bid["period"],
-                }
-            )
-
-        for ask in bfxLendbook["asks"]:
-            plxOrders["offers"].append(
-                {
-                    "rate": f"{float(ask['rate']) / 36500:0.8f}",
-                    "amount": ask["amount"],
-                    "rangeMin": "2",
-                    "rangeMax": ask["period"],
-                }
-            )
-
-        return plxOrders
+        return OrderBook.from_bitfinex(bfxLendbook).to_poloniex()
 
     @staticmethod
     def convertAccountBalances(
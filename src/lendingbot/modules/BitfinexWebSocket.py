@@ -0,0 +1,301 @@
+"""
+Bitfinex v2 WebSocket feed of the funding books and funding tickers
+"""
+
+import json
+import threading
+import time
+import zlib
+from typing import TYPE_CHECKING, Any
+
+from .OrderBook import BookSide, OrderBook
+from .WebSocket import WebSocketConnection, WebSocketError
+
+
+if TYPE_CHECKING:
+    from .Configuration import WebSocketConfig
+
+
+# conf flags: a checksum message after every book update and a sequence number on
+# every channel message
+FLAG_SEQ_ALL = 65536
+FLAG_OB_CHECKSUM = 131072
+CHECKSUM_LEVELS = 25
+# Bitfinex sends this info code before restarting its servers
+INFO_RECONNECT = 20051
+
+
+class ResyncNeeded(WebSocketError):
+    """The local state can no longer be trusted and must be fetched again"""
+
+
+def _js_number(value: float) -> str:
+    """
+    The number as JavaScript prints it, which is what the exchange's checksums are
+    computed from
+    """
+    if value == int(value) and abs(value) < 1e21:
+        return str(int(value))
+    text = repr(value)
+    if "e" in text and abs(value) >= 1e-6:
+        text = f"{value:.20f}".rstrip("0")
+    return text
+
+
+class FundingBook:
+    """
+    The aggregated (P0) funding book of one currency. Levels are keyed by
+    (rate, period); a positive amount is an offer to lend (ask), a negative one a
+    demand (bid).
+    """
+
+    def __init__(self, currency: str) -> None:
+        self.currency = currency
+        self.asks: dict[tuple[float, int], tuple[int, float]] = {}
+        self.bids: dict[tuple[float, int], tuple[int, float]] = {}
+
+    def apply_snapshot(self, levels: list[list[Any]]) -> None:
+        self.asks.clear()
+        self.bids.clear()
+        for level in levels:
+            self.apply_update(level)
+
+    def apply_update(self, level: list[Any]) -> None:
+        """Applies a [RATE, PERIOD, COUNT, AMOUNT] entry. COUNT 0 removes the level"""
+        rate, period, count, amount = level[:4]
+        side = self.asks if amount > 0 else self.bids
+        key = (float(rate), int(period))
+        if count > 0:
+            side[key] = (int(count), float(amount))
+        else:
+            side.pop(key, None)
+
+    def sorted_asks(self) -> list[tuple[float, int, float]]:
+        """(rate, period, amount), best (lowest) rate first"""
+        return [(k[0], k[1], v[1]) for k, v in sorted(self.asks.items())]
+
+    def sorted_bids(self) -> list[tuple[float, int, float]]:
+        """(rate, period, amount), best (highest) rate first"""
+        items = sorted(self.bids.items(), key=lambda item: (-item[0][0], item[0][1]))
+        return [(k[0], k[1], v[1]) for k, v in items]
+
+    def checksum(self) -> int:
+        """
+        Signed CRC32 of the top levels, bid and ask interleaved as "rate:amount",
+        as Bitfinex computes it for its book checksum messages
+        """
+        bids = self.sorted_bids()[:CHECKSUM_LEVELS]
+        asks = self.sorted_asks()[:CHECKSUM_LEVELS]
+        parts = []
+        for i in range(CHECKSUM_LEVELS):
+            for side in (bids, asks):
+                if i < len(side):
+                    parts += [_js_number(side[i][0]), _js_number(side[i][2])]
+        crc = zlib.crc32(":".join(parts).encode("utf-8"))
+        return crc - (1 << 32) if crc >= 1 << 31 else crc
+
+    def to_order_book(self, limit: int) -> OrderBook:
+        """The best `limit` levels of each side"""
+        return OrderBook(
+            BookSide.from_levels(self.sorted_asks()[:limit]),
+            BookSide.from_levels(self.sorted_bids()[:limit]),
+        )
+
+    def to_loan_orders(self, limit: int) -> dict[str, list[dict[str, Any]]]:
+        """The book in the format of ExchangeApi.return_loan_orders"""
+        return self.to_order_book(limit).to_poloniex()
+
+
+class BitfinexWebSocketFeed:
+    """
+    Keeps the funding book and funding ticker of every currency up to date from the
+    Bitfinex v2 WebSocket API, on a daemon thread.
+
+    Every channel message carries a connection-wide sequence number and every book
+    update is followed by a checksum of the top of the book. A sequence gap, a
+    checksum mismatch, a silent connection or a disconnect drops the local state and
+    reconnects, which resubscribes and starts again from fresh snapshots. Until a
+    currency is synced again, its readers get None and fall back to REST.
+    """
+
+    def __init__(self, cfg: "WebSocketConfig", currencies: list[str], log: Any) -> None:
+        self.url = cfg.url
+        self.book_length = int(cfg.book_length)
+        self.stale_after = float(cfg.stale_after)
+        self.reconnect_delay = float(cfg.reconnect_delay)
+        self.max_reconnect_delay = float(cfg.max_reconnect_delay)
+        self.currencies = list(currencies)
+        self.log = log
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread: threading.Thread | None = None
+        self.connection: WebSocketConnection | None = None
+        self.books: dict[str, FundingBook] = {}
+        self.frrs: dict[str, float] = {}
+        self.updated: dict[str, float] = {}  # currency -> time.time() of its last message
+        self.channels: dict[int, tuple[str, str]] = {}  # chanId -> (channel, currency)
+        self.last_seq: int | None = None
+        self.synced = False  # a book snapshot arrived on the current connection
+        self.connects = 0
+        self.resyncs = 0
+
+    def start(self) -> None:
+        self.thread = threading.Thread(target=self.run, name="BitfinexWebSocket", daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stop_event.set()
+        connection = self.connection
+        if connection is not None:
+            connection.close()
+        if self.thread is not None:
+            self.thread.join(timeout=5)
+
+    def run(self) -> None:
+        delay = self.reconnect_delay
+        while not self.stop_event.is_set():
+            self.synced = False
+            try:
+                self._session()
+            except (OSError, ValueError, WebSocketError) as ex:
+                if not self.stop_event.is_set():
+                    self.log.log_error(f"Bitfinex WebSocket: {ex}. Reconnecting.")
+            self._drop_state()
+            # A connection that delivered a snapshot was healthy, start the back-off over
+            if self.synced:
+                delay = self.reconnect_delay
+            if self.stop_event.wait(delay):
+                break
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    def _session(self) -> None:
+        """Runs one connection until it fails"""
+        connection = WebSocketConnection.connect(self.url, timeout=self.stale_after)
+        self.connection = connection
+        self.connects += 1
+        try:
+            connection.send(json.dumps({"event": "conf", "flags": FLAG_SEQ_ALL | FLAG_OB_CHECKSUM}))
+            for cur in self.currencies:
+                connection.send(
+                    json.dumps(
+                        {
+                            "event": "subscribe",
+                            "channel": "book",
+                            "symbol": f"f{cur}",
+                            "prec": "P0",
+                            "len": str(self.book_length),
+                        }
+                    )
+                )
+                connection.send(
+                    json.dumps({"event": "subscribe", "channel": "ticker", "symbol": f"f{cur}"})
+                )
+            while not self.stop_event.is_set():
+                # Channels send a heartbeat every 15 seconds, silence means a dead link
+                self.handle_message(json.loads(connection.recv()))
+        except ResyncNeeded:
+            self.resyncs += 1
+            raise
+        finally:
+            connection.close()
+            self.connection = None
+
+    def _drop_state(self) -> None:
+        with self.lock:
+            self.books.clear()
+            self.frrs.clear()
+            self.updated.clear()
+            self.channels.clear()
+            self.last_seq = None
+
+    def handle_message(self, msg: Any) -> None:
+        """Applies one decoded message"""
+        if isinstance(msg, dict):
+            self._handle_event(msg)
+            return
+        seq = msg[-1]
+        if self.last_seq is not None and seq != self.last_seq + 1:
+            raise ResyncNeeded(f"Sequence gap: expected {self.last_seq + 1}, got {seq}")
+        self.last_seq = seq
+        channel = self.channels.get(msg[0])
+        if channel is None:
+            return
+        kind, cur = channel
+        body = msg[1]
+        with self.lock:
+            self.updated[cur] = time.time()
+            if body == "hb":
+                return
+            if kind == "ticker":
+                # [FRR, BID, BID_PERIOD, BID_SIZE, ASK, ASK_PERIOD, ASK_SIZE, ...]
+                self.frrs[cur] = float(body[0])
+                return
+            if body == "cs":
+                book = self.books.get(cur)
+                if book is not None and book.checksum() != msg[2]:
+                    raise ResyncNeeded(f"Checksum mismatch on the {cur} funding book")
+                return
+            if not body or isinstance(body[0], list):
+                book = FundingBook(cur)
+                book.apply_snapshot(body)
+                self.books[cur] = book
+                self.synced = True
+                return
+            if cur in self.books:
+                self.books[cur].apply_update(body)
+
+    def _handle_event(self, msg: dict[str, Any]) -> None:
+        event = msg.get("event")
+        if event == "subscribed":
+            cur = str(msg["symbol"])[1:]
+            with self.lock:
+                self.channels[int(msg["chanId"])] = (str(msg["channel"]), cur)
+        elif event == "info" and msg.get("code") == INFO_RECONNECT:
+            raise ResyncNeeded("Server restarting")
+        elif event == "error":
+            self.log.log_error(f"Bitfinex WebSocket error: {msg.get('msg')} ({msg.get('code')})")
+
+    def _is_fresh(self, currency: str) -> bool:
+        updated = self.updated.get(currency)
+        return updated is not None and time.time() - updated < self.stale_after
+
+    def order_book(self, currency: str, limit: int) -> OrderBook | None:
+        """
+        The synced book of the currency, or None if it is not synced or cannot hold
+        `limit` levels
+        """
+        if limit <= 0 or limit > self.book_length:
+            return None
+        with self.lock:
+            book = self.books.get(currency)
+            if book is None or not self._is_fresh(currency):
+                return None
+            return book.to_order_book(limit)
+
+    def loan_orders(self, currency: str, limit: int) -> dict[str, list[dict[str, Any]]] | None:
+        """The synced book of the currency in the format of return_loan_orders, or None"""
+        book = self.order_book(currency, limit)
+        return None if book is None else book.to_poloniex()
+
+    def frr(self, currency: str) -> float | None:
+        with self.lock:
+            if currency not in self.frrs or not self._is_fresh(currency):
+                return None
+            return self.frrs[currency]
+
+    def stats(self) -> dict[str, Any]:
+        now = time.time()
+        with self.lock:
+            return {
+                "connected": self.connection is not None,
+                "connects": self.connects,
+                "resyncs": self.resyncs,
+                "books": {
+                    cur: {
+                        "asks": len(book.asks),
+                        "bids": len(book.bids),
+                        "age": round(now - self.updated.get(cur, now), 1),
+                    }
+                    for cur, book in self.books.items()
+                },
+            }
@@ -0,0 +1,77 @@
+"""
+How many order book levels to request for each currency
+"""
+
+import math
+
+
+# Levels per side requested before a currency's gaps are known
+DEFAULT_DEPTH = 5
+# The deepest book requested; a gap beyond it is treated as beyond the whole book
+MAX_DEPTH = 500
+# Levels requested per level the gaps were last filled at
+HEADROOM = 1.5
+
+
+class BookExhausted(Exception):
+    """
+    A gap target of a currency lies beyond the levels of its order book that were
+    requested, which were all received, so the book may go deeper
+    """
+
+    def __init__(self, currency: str, target: float, volume: float) -> None:
+        super().__init__(
+            f"{currency}: gap target {target:g} beyond the {volume:g} offered in the book"
+        )
+        self.currency = currency
+        self.target = target
+        self.volume = volume
+
+
+class BookDepth:
+    """
+    The number of levels to request of every currency's order book. A currency starts
+    at the default depth. When its gap targets lie beyond the levels received, the
+    depth grows to the levels the missing volume is expected to take, so only that
+    currency's book is fetched again. When the gaps were filled well within the book,
+    the depth shrinks back towards the levels the gaps took, half the way per cycle,
+    so a currency whose book thinned out once does not keep fetching a deep book.
+    """
+
+    def __init__(self, default: int = DEFAULT_DEPTH, maximum: int = MAX_DEPTH) -> None:
+        self.default = default
+        self.maximum = max(default, maximum)
+        self.limits: dict[str, int] = {}
+
+    def limit(self, currency: str) -> int:
+        """The number of levels to request of the currency's book"""
+        return self.limits.setdefault(currency, self.default)
+
+    def at_maximum(self, currency: str) -> bool:
+        return self.limit(currency) >= self.maximum
+
+    def grow(self, currency: str, target: float, volume: float) -> int | None:
+        """
+        Deepens the currency's book after `volume` on the levels received fell short
+        of the gap `target`. Returns the new depth, or None if it is at the maximum.
+        """
+        limit = self.limit(currency)
+        if limit >= self.maximum:
+            return None
+        # Assumes the missing volume is spread over the levels like the volume received
+        wanted = math.ceil(limit * target / volume * HEADROOM) if volume > 0 else 0
+        self.limits[currency] = min(self.maximum, max(wanted, 2 * limit))
+        return self.limits[currency]
+
+    def record(self, currency: str, levels_used: int) -> int:
+        """
+        Adjusts the currency's depth to the number of levels its gaps were filled
+        within. Returns the depth for the next request.
+        """
+        limit = self.limit(currency)
+        wanted = min(self.maximum, max(self.default, math.ceil(levels_used * HEADROOM)))
+        if wanted > limit:
+            self.limits[currency] = wanted
+        elif wanted < limit:
+            self.limits[currency] = limit - (limit - wanted) // 2
+        return self.limits[currency]
@@ -7,6 +7,9 @@ from typing import TYPE_CHECKING, Any
 
 from pydantic import BaseModel, Field, SecretStr, field_validator, model_validator
 
+from .JsonDecoder import DECODER_NAMES
+from .RateLimiter import BUCKET_NAMES
+
 
 if TYPE_CHECKING:
     from pathlib import Path
@@ -39,11 +42,119 @@ class AnalysisMethod(str, Enum):
 # --- Sub-Models ---
 
 
+class HttpConfig(BaseModel):
+    # Max keep-alive connections kept open per exchange host
+    pool_size: int = Field(10, ge=1, le=100)
+    # Seconds to wait for the TCP/TLS connection; the read timeout is bot.request_timeout
+    connect_timeout: float = Field(5.0, gt=0, le=60)
+    # Pooled connections idle for longer than this (seconds) are closed. 0 = never
+    idle_timeout: float = Field(30.0, ge=0, le=3600)
+    # Unauthenticated requests allowed in flight at the same time
+    public_concurrency: int = Field(4, ge=1, le=64)
+    # Seconds a public response (order book, ticker) is reused by identical requests.
+    # 0 = only share responses between requests that are in flight at the same time
+    public_cache_ttl: float = Field(0.0, ge=0, le=60)
+    # Library that decodes the responses: auto (msgspec, else orjson, else the
+    # standard library), msgspec, orjson or json
+    json_decoder: str = "auto"
+
+    @field_validator("json_decoder")
+    @classmethod
+    def check_json_decoder(cls, v: str) -> str:
+        if v not in DECODER_NAMES:
+            raise ValueError(f"json_decoder must be one of {DECODER_NAMES}")
+        return v
+
+
+class RateLimitConfig(BaseModel):
+    # At most `requests` calls within any window of `period_ms` milliseconds
+    requests: int = Field(ge=1, le=1000)
+    period_ms: float = Field(gt=0, le=600000)
+
+
+class AdaptiveRateConfig(BaseModel):
+    # Request rate is multiplied by this after a rate limit (429) error
+    backoff_factor: float = Field(0.5, gt=0, lt=1)
+    # Fraction of the configured rate added back after every successful request
+    probe_step: float = Field(0.05, gt=0, le=1)
+    # The rate never drops below the configured rate divided by this
+    max_backoff: float = Field(10.0, ge=1, le=100)
+    # Probing may raise the rate up to the configured rate times this. 1 = never above it
+    max_speedup: float = Field(1.0, ge=1, le=10)
+    # Successful requests slower than this (seconds) do not raise the rate. 0 = off
+    slow_response: float = Field(0.0, ge=0, le=180)
+    # File the learned rates are kept in across restarts. Empty = do not keep them
+    state_file: str = "market_data/rate_limits.json"
+
+
+class WebSocketConfig(BaseModel):
+    # Serve order books and FRRs from a WebSocket feed instead of polling (Bitfinex)
+    enabled: bool = False
+    url: str = "wss://api-pub.bitfinex.com/ws/2"
+    # Levels per side kept in the local book: 1, 25, 100 or 250
+    book_length: int = 25
+    # Seconds without any message after which the feed's data is not used and the
+    # connection is replaced
+    stale_after: float = Field(30.0, ge=5, le=600)
+    # Seconds before reconnecting, doubled after every failed attempt up to the max
+    reconnect_delay: float = Field(1.0, gt=0, le=600)
+    max_reconnect_delay: float = Field(60.0, gt=0, le=3600)
+
+    @field_validator("book_length")
+    @classmethod
+    def check_book_length(cls, v: int) -> int:
+        if v not in (1, 25, 100, 250):
+            raise ValueError("book_length must be 1, 25, 100 or 250")
+        return v
+
+
+class JournalConfig(BaseModel):
+    # Append every exchange request and response to this file. Empty = do not record
+    record: str = ""
+    # Answer every exchange request from this recorded file instead of the exchange,
+    # without rate limits. Empty = talk to the exchange
+    replay: str = ""
+
+    @model_validator(mode="after")
+    def check_single_mode(self) -> JournalConfig:
+        if self.record and self.replay:
+            raise ValueError("journal record and replay cannot be used together")
+        return self
+
+
+class CoordinatorConfig(BaseModel):
+    # File shared by every bot process that uses this API key: signed requests take
+    # their nonces from it and the processes share the request budgets. Empty = the
+    # key is used by this process alone
+    state_file: str = ""
+
+
 class ApiConfig(BaseModel):
     exchange: Exchange = Exchange.BITFINEX
     apikey: SecretStr | None = None
     secret: SecretStr | None = None
+    # Replaces the exchange's REST endpoint, e.g. with a local ExchangeSimulator
+    base_url: str | None = None
     all_currencies: list[str] = Field(default_factory=list)
+    http: HttpConfig = Field(default_factory=lambda: HttpConfig())
+    # Overrides of the exchange's default request budgets, by endpoint group
+    rate_limits: dict[str, RateLimitConfig] = Field(default_factory=dict)
+    adaptive_rate: AdaptiveRateConfig = Field(default_factory=lambda: AdaptiveRateConfig())
+    websocket: WebSocketConfig = Field(default_factory=lambda: WebSocketConfig())
+    journal: JournalConfig = Field(default_factory=lambda: JournalConfig())
+    coordinator: CoordinatorConfig = Field(default_factory=lambda: CoordinatorConfig())
+    # Seconds a fetched flash return rate is reused (Bitfinex). 0 = fetch on every lookup
+    frr_cache_ttl: float = Field(60.0, ge=0, le=3600)
+
+    @field_validator("rate_limits")
+    @classmethod
+    def check_rate_limit_names(cls, v: dict[str, RateLimitConfig]) -> dict[str, RateLimitConfig]:
+        unknown = set(v) - set(BUCKET_NAMES)
+        if unknown:
+            raise ValueError(
+                f"Unknown rate limit bucket(s) {sorted(unknown)}, expected {BUCKET_NAMES}"
+            )
+        return v
 
 
 class WebServerConfig(BaseModel):
@@ -53,6 +164,14 @@ class WebServerConfig(BaseModel):
     template: str = "www"
 
 
+class ReconcileConfig(BaseModel):
+    # Keep matching open offers instead of canceling and recreating every offer each cycle
+    enabled: bool = False
+    # Max difference, in percent of the desired value, for an open offer to be kept
+    rate_tolerance: float = Field(0.5, ge=0, le=100)
+    amount_tolerance: float = Field(1.0, ge=0, le=100)
+
+
 class BotConfig(BaseModel):
     label: str = "Lending Bot"
     period_active: float = Field(60.0, ge=1, le=3600)
@@ -64,10 +183,15 @@ class BotConfig(BaseModel):
     output_currency: str = "BTC"
     keep_stuck_orders: bool = True
     hide_coins: bool = True
+    # Fetch all currencies' order books and FRRs concurrently before lending
+    concurrent_fetch: bool = False
+    # Currencies lent at the same time, each on its own thread; 1 lends them in turn
+    lend_workers: int = Field(1, ge=1, le=16)
     end_date: str | None = None
     plugins: list[str] = Field(default_factory=list)
     transferable_currencies: list[str] = Field(default_factory=list)
     web: WebServerConfig = Field(default_factory=lambda: WebServerConfig())
+    reconcile: ReconcileConfig = Field(default_factory=lambda: ReconcileConfig())
 
     @field_validator("exchange", mode="before", check_fields=False)
     @classmethod
@@ -0,0 +1,99 @@
+"""
+Exchange state fetched once per bot cycle
+"""
+
+import dataclasses
+import time
+from collections.abc import Mapping
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Any, cast
+
+
+ACTIVE_LOANS = "active_loans"
+OPEN_LOAN_OFFERS = "open_loan_offers"
+LENDING_BALANCES = "lending_balances"
+TICKER = "ticker"
+RESOURCES = (ACTIVE_LOANS, OPEN_LOAN_OFFERS, LENDING_BALANCES, TICKER)
+
+
+def _fetch_resource(api: Any, resource: str) -> Any:
+    if resource == ACTIVE_LOANS:
+        return api.return_active_loans()
+    if resource == OPEN_LOAN_OFFERS:
+        return api.return_open_loan_offers()
+    if resource == LENDING_BALANCES:
+        return api.return_available_account_balances("lending").get("lending", {})
+    if resource == TICKER:
+        return api.return_ticker()
+    raise ValueError(f"Unknown snapshot resource {resource}, expected {RESOURCES}")
+
+
+@dataclass(frozen=True)
+class CycleSnapshot:
+    """
+    The exchange state one bot cycle works with: active loans, open loan offers,
+    lending balances and the ticker, each fetched once. Consumers read the snapshot
+    instead of calling the API, so one step no longer requests the same resource
+    several times.
+
+    Snapshots are never modified. A cycle step that changes the account (a transfer,
+    canceled offers) takes a `refreshed` copy with the affected resources refetched.
+    """
+
+    resources: Mapping[str, Any] = field(default_factory=lambda: MappingProxyType({}))
+    # Seconds each resource took to fetch
+    fetch_times: Mapping[str, float] = field(default_factory=lambda: MappingProxyType({}))
+    created: float = field(default_factory=time.time)
+
+    @classmethod
+    def fetch(cls, api: Any, *resources: str) -> "CycleSnapshot":
+        """Fetches the given resources, in order, into a new snapshot"""
+        return cls().refreshed(api, *resources)
+
+    def refreshed(self, api: Any, *resources: str) -> "CycleSnapshot":
+        """
+        Returns a copy of this snapshot with the given resources fetched again.
+        Resources not listed are carried over unchanged.
+        """
+        data = dict(self.resources)
+        fetch_times = dict(self.fetch_times)
+        for resource in resources:
+            start = time.perf_counter()
+            data[resource] = _fetch_resource(api, resource)
+            fetch_times[resource] = time.perf_counter() - start
+        return dataclasses.replace(
+            self, resources=MappingProxyType(data), fetch_times=MappingProxyType(fetch_times)
+        )
+
+    def has(self, resource: str) -> bool:
+        return resource in self.resources
+
+    def _get(self, resource: str) -> Any:
+        try:
+            return self.resources[resource]
+        except KeyError:
+            raise KeyError(f"{resource} was not fetched into this snapshot") from None
+
+    @property
+    def active_loans(self) -> dict[str, list[dict[str, Any]]]:
+        """Same shape as ExchangeApi.return_active_loans"""
+        return cast("dict[str, list[dict[str, Any]]]", self._get(ACTIVE_LOANS))
+
+    @property
+    def open_loan_offers(self) -> dict[str, list[dict[str, Any]]]:
+        """Same shape as ExchangeApi.return_open_loan_offers"""
+        return cast("dict[str, list[dict[str, Any]]]", self._get(OPEN_LOAN_OFFERS))
+
+    @property
+    def lending_balances(self) -> dict[str, str]:
+        """The "lending" account of ExchangeApi.return_available_account_balances"""
+        return cast("dict[str, str]", self._get(LENDING_BALANCES))
+
+    @property
+    def ticker(self) -> dict[str, dict[str, str]]:
+        """Same shape as ExchangeApi.return_ticker"""
+        return cast("dict[str, dict[str, str]]", self._get(TICKER))
+
+    def describe_fetch_times(self) -> str:
+        return ", ".join(f"{name} {secs * 1000:.0f}ms" for name, secs in self.fetch_times.items())
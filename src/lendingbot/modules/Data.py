@@ -7,6 +7,7 @@ from typing import Any
 
 import requests
 
+from .CycleSnapshot import TICKER, CycleSnapshot
 from .Logger import Logger
 from .Utils import format_amount_currency, format_rate_pct
 
@@ -47,8 +48,10 @@ def init(api1: Any, log1: Logger) -> None:
     log = log1
 
 
-def get_on_order_balances() -> dict[str, Decimal]:
-    loan_offers = api.return_open_loan_offers()
+def get_on_order_balances(snapshot: CycleSnapshot | None = None) -> dict[str, Decimal]:
+    loan_offers = (
+        snapshot.open_loan_offers if snapshot is not None else api.return_open_loan_offers()
+    )
     on_order_balances: dict[str, Decimal] = {}
     for cur in loan_offers:
         for offer in loan_offers[cur]:
@@ -77,14 +80,17 @@ def get_max_duration(end_date: str, context: str) -> int | str:
         exit(1)
 
 
-def get_total_lent() -> LentData:
+def get_total_lent(snapshot: CycleSnapshot | None = None) -> LentData:
     """
     Retrieves the total amount lent for each currency.
 
+    Args:
+        snapshot: Cycle snapshot to read the active loans from instead of the API.
+
     Returns:
         LentData: Object containing total amount lent and total weighted rate per currency.
     """
-    crypto_lent = api.return_active_loans()
+    crypto_lent = snapshot.active_loans if snapshot is not None else api.return_active_loans()
     total_lent: dict[str, Decimal] = {}
     rate_lent: dict[str, Decimal] = {}
     for item in crypto_lent["provided"]:
@@ -130,10 +136,15 @@ def stringify_total_lent(lent_data: LentData) -> str:
     return result
 
 
-def update_conversion_rates(output_currency: str, json_output_enabled: bool) -> None:
+def update_conversion_rates(
+    output_currency: str, json_output_enabled: bool, snapshot: CycleSnapshot | None = None
+) -> None:
     if json_output_enabled and log:
-        total_lent = get_total_lent().total_lent
-        ticker_response = api.return_ticker()
+        total_lent = get_total_lent(snapshot).total_lent
+        if snapshot is not None and snapshot.has(TICKER):
+            ticker_response = snapshot.ticker
+        else:
+            ticker_response = api.return_ticker()
         output_currency_found = False
         # Set this up now in case we get an exception later and don't have a currency to use
         log.updateOutputCurrency("highestBid", "1")
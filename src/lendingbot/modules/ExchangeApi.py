@@ -4,9 +4,25 @@ Exchange API Base class
 
 import abc
 import calendar
+import threading
 import time
-from collections.abc import Callable
-from typing import Any, TypeVar
+from collections.abc import Callable, Sequence
+from contextlib import AbstractContextManager, nullcontext
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, TypeVar
+
+from .HistorySync import ALL_CURRENCIES, HistoryPage
+from .JsonDecoder import create_decoder
+from .OrderBook import OrderBook
+from .RateLimiter import PUBLIC, AdaptiveRate, BucketLimit, RateLimiter
+from .RequestScheduler import RequestScheduler
+from .SigningCoordinator import SigningCoordinator
+from .SingleFlight import SingleFlight
+
+
+if TYPE_CHECKING:
+    from .FrrCache import FrrCache
+    from .Reconciliation import LendOffer
 
 
 F = TypeVar("F", bound=Callable[..., Any])
@@ -33,44 +49,136 @@ class ExchangeApi(abc.ABC):
 
         return new_method  # type: ignore[return-value]
 
+    @staticmethod
+    def signed(method: F) -> F:
+        """
+        Work with instance method only !!!
+        Serializes signed requests so nonces reach the exchange in increasing order.
+        """
+
+        def new_method(self: Any, *arg: Any, **kws: Any) -> Any:
+            with self.nonce_lock, self.signing():
+                return method(self, *arg, **kws)
+
+        return new_method  # type: ignore[return-value]
+
     @abc.abstractmethod
     def __init__(self, cfg: Any, log: Any) -> None:
         """
         Constructor
         """
-        self.req_time_log: Any = []
-        self.req_per_period: int = 0
-        self.req_period: float = 0
-        self.default_req_period: float = 0
+        self.rate_limiter = RateLimiter()
+        # Orders the requests waiting for a rate limit bucket by priority class
+        self.scheduler = RequestScheduler()
+        # Only signed calls need strict ordering (nonce). Unauthenticated calls run
+        # concurrently, up to public_concurrency at a time.
+        self.nonce_lock = threading.RLock()
+        self.lock = self.nonce_lock
+        self.public_slots = threading.BoundedSemaphore(int(cfg.api.http.public_concurrency))
+        # Identical public requests in flight at the same time share one network call
+        self.public_requests = SingleFlight(float(cfg.api.http.public_cache_ttl))
+        # Set by exchanges that support the flash return rate
+        self.frr_cache: FrrCache | None = None
+        self.rate_state_file: Path | None = None
+        self.saved_rate_state: dict[str, dict[str, float]] = {}
+        # Answering from a recorded journal: nothing to throttle
+        self.replaying = bool(cfg.api.journal.replay)
+        self.json_decoder = create_decoder(cfg.api.http.json_decoder)
+        # Shares nonces and request budgets with other processes using the same key
+        self.coordinator: SigningCoordinator | None = None
+        if cfg.api.coordinator.state_file and not self.replaying:
+            self.coordinator = SigningCoordinator(cfg.api.coordinator.state_file)
+
+    def init_rate_limiter(self, cfg: Any, defaults: dict[str, BucketLimit]) -> None:
+        """
+        Creates the request buckets from the exchange defaults and [api.rate_limits],
+        resuming from the rates learned before the last restart
+        """
+        adaptive_cfg = cfg.api.adaptive_rate
+        adaptive = AdaptiveRate(
+            backoff_factor=adaptive_cfg.backoff_factor,
+            probe_step=adaptive_cfg.probe_step,
+            max_backoff=adaptive_cfg.max_backoff,
+            max_speedup=adaptive_cfg.max_speedup,
+            slow_response=adaptive_cfg.slow_response,
+        )
+        self.rate_limiter = RateLimiter.from_config(defaults, cfg.api.rate_limits, adaptive)
+        if adaptive_cfg.state_file and not self.replaying:
+            self.rate_state_file = Path(adaptive_cfg.state_file)
+            self.rate_limiter.load_state(self.rate_state_file, str(self))
+            self.saved_rate_state = self.rate_limiter.state()
+
+    def save_rate_state(self) -> bool:
+        """
+        Writes the learned request rates to the state file if they changed since the
+        last save. Returns True if the file was written.
+        """
+        if self.rate_state_file is None:
+            return False
+        state = self.rate_limiter.state()
+        if state == self.saved_rate_state:
+            return False
+        self.rate_limiter.save_state(self.rate_state_file, str(self))
+        self.saved_rate_state = state
+        return True
+
+    def close(self) -> None:
+        """Releases the connections and files of the client when the bot stops"""
+        if self.coordinator is not None:
+            self.coordinator.close()
 
     @abc.abstractmethod
-    def limit_request_rate(self) -> None:
-        now = time.time() * 1000  # milliseconds
-        # Start throttling only when the queue is full
-        if len(self.req_time_log) == self.req_per_period:
-            time_since_oldest_req = now - self.req_time_log[0]
-            if time_since_oldest_req < self.req_period:
-                sleep_time = (self.req_period - time_since_oldest_req) / 1000
-                self.req_time_log.append(now + self.req_period - time_since_oldest_req)
-                time.sleep(sleep_time)
-                return
+    def limit_request_rate(self, bucket: str = PUBLIC) -> float:
+        """
+        Blocks until the given bucket allows another request. Waiting requests are
+        served in the order of their RequestScheduler class.
+        Returns the number of seconds spent waiting.
+        """
+        if self.replaying:
+            return 0.0
+        wait = self.scheduler.acquire(self.rate_limiter, bucket)
+        if self.coordinator is not None:
+            wait += self.coordinator.acquire(self.rate_limiter.bucket(bucket))
+        return wait
+
+    def signing(self) -> AbstractContextManager[None]:
+        """
+        Held from taking a nonce until the signed request is sent. With a coordinator it
+        also keeps the other processes sharing the key from signing meanwhile.
+        """
+        if self.coordinator is None:
+            return nullcontext()
+        return self.coordinator.signing()
 
-        self.req_time_log.append(now)
+    def next_nonce(self, floor: int) -> int:
+        """
+        The nonce of a signed request, `floor` being the exchange's time based value.
+        With a coordinator it is also greater than every nonce of the other processes.
+        """
+        if self.coordinator is None:
+            return floor
+        return self.coordinator.next_nonce(floor)
 
     @abc.abstractmethod
-    def increase_request_timer(self) -> None:
-        if self.req_period <= self.default_req_period * 3.0:
-            self.req_period += 500
+    def increase_request_timer(
+        self, bucket: str = PUBLIC, retry_after: float | None = None
+    ) -> None:
+        """
+        Backs off after the exchange rejected a request for exceeding its rate limit.
+        `retry_after` is the wait in seconds the exchange asked for, if any.
+        """
+        self.rate_limiter.bucket(bucket).slow_down(retry_after)
 
     @abc.abstractmethod
-    def decrease_request_timer(self) -> None:
-        if self.req_period > self.default_req_period:
-            self.req_period -= 1
+    def decrease_request_timer(self, bucket: str = PUBLIC, latency: float | None = None) -> None:
+        """
+        Probes a higher rate after a successful request that took `latency` seconds
+        """
+        self.rate_limiter.bucket(bucket).speed_up(latency)
 
     @abc.abstractmethod
-    def reset_request_timer(self) -> None:
-        if self.req_period >= self.default_req_period * 1.5:
-            self.req_period = self.default_req_period
+    def reset_request_timer(self, bucket: str = PUBLIC) -> None:
+        self.rate_limiter.bucket(bucket).reset()
 
     @abc.abstractmethod
     def return_ticker(self) -> dict[str, dict[str, str]]:
@@ -116,6 +224,31 @@ class ExchangeApi(abc.ABC):
          "close": "2016-09-28 18:13:03" }]
         """
 
+    def history_streams(self) -> list[str]:
+        """
+        The parts of the lending history return_lending_history_page can download
+        independently. This default downloads all currencies together.
+        """
+        return [ALL_CURRENCIES]
+
+    def return_lending_history_page(
+        self,
+        stream: str,  # noqa: ARG002
+        start: int,
+        stop: int,
+        limit: int,
+    ) -> HistoryPage:
+        """
+        Returns the newest `limit` entries of one history stream between the "start"
+        and "stop" UNIX timestamps. This default pages return_lending_history.
+        """
+        rows = self.return_lending_history(start, stop, limit)
+        return HistoryPage(
+            rows=rows,
+            oldest=min((self.create_time_stamp(row["close"]) for row in rows), default=None),
+            complete=len(rows) < limit,
+        )
+
     @abc.abstractmethod
     def return_loan_orders(self, currency: str, limit: int = 0) -> dict[str, list[dict[str, Any]]]:
         """
@@ -126,6 +259,13 @@ class ExchangeApi(abc.ABC):
          "demands":[{"rate":"0.00170000","amount":"26.54848841","rangeMin":2,"rangeMax":2}, ... ]}
         """
 
+    def return_loan_book(self, currency: str, limit: int = 0) -> OrderBook:
+        """
+        Returns the loan offers and demands of a currency as arrays. This default
+        converts return_loan_orders.
+        """
+        return OrderBook.from_poloniex(self.return_loan_orders(currency, limit))
+
     @abc.abstractmethod
     def return_open_loan_offers(self) -> dict[str, list[dict[str, Any]]]:
         """
@@ -159,6 +299,43 @@ class ExchangeApi(abc.ABC):
         Creates a loan offer for a given currency.
         """
 
+    def cancel_loan_offers(
+        self,
+        currency: str,
+        order_numbers: Sequence[int],
+        all_open: bool = False,  # noqa: ARG002
+    ) -> list[dict[str, Any] | Exception]:
+        """
+        Cancels several loan offers of one currency. `all_open` tells that these are all
+        of its open offers, which lets an exchange cancel them with a single request.
+        Returns the reply for each offer, or the exception its cancel raised.
+        This default cancels them one by one.
+        """
+        results: list[dict[str, Any] | Exception] = []
+        for order_number in order_numbers:
+            try:
+                results.append(self.cancel_loan_offer(currency, order_number))
+            except Exception as ex:
+                results.append(ex)
+        return results
+
+    def create_loan_offers(self, offers: Sequence["LendOffer"]) -> list[dict[str, Any] | Exception]:
+        """
+        Creates several loan offers. Returns the reply for each offer, or the exception
+        its creation raised. This default creates them one by one.
+        """
+        results: list[dict[str, Any] | Exception] = []
+        for offer in offers:
+            try:
+                results.append(
+                    self.create_loan_offer(
+                        offer.currency, float(offer.amount), offer.days, 0, offer.rate
+                    )
+                )
+            except Exception as ex:
+                results.append(ex)
+        return results
+
     @abc.abstractmethod
     def transfer_balance(
         self, currency: str, amount: float, from_account: str, to_account: str
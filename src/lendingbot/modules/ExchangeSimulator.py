@@ -0,0 +1,982 @@
+"""
+Local HTTP simulator of the Bitfinex and Poloniex lending endpoints the bot uses
+
+Run it with ``python -m lendingbot.modules.ExchangeSimulator`` and point ``api.base_url``
+at it to run the bot end to end without an exchange.
+"""
+
+import argparse
+import base64
+import csv
+import datetime
+import hashlib
+import hmac
+import itertools
+import json
+import random
+import threading
+import time
+import urllib.parse
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any
+
+
+DAY = 86400.0
+# Bitfinex v1 quotes funding rates as yearly percentages
+YEARLY_PCT = 36500
+# Share of the interest the lender keeps after the exchange's fee
+LENDER_SHARE = 0.85
+# Smallest offer the exchange accepts, in USD
+MIN_OFFER_USD = 50.0
+# Synthetic book: levels per side, spaced this fraction of the base rate apart
+BOOK_LEVELS = 20
+LEVEL_STEP = 0.02
+PERIODS = (2, 3, 5, 7, 10, 14, 20, 30)
+WALLETS = ("deposit", "exchange", "trading")
+# Poloniex account names of the Bitfinex wallets
+POLONIEX_ACCOUNTS = {"lending": "deposit", "exchange": "exchange", "margin": "trading"}
+
+
+class SimulatorError(Exception):
+    """A request the simulated exchange rejects. Answered with HTTP 400"""
+
+
+@dataclass(frozen=True)
+class CurrencySettings:
+    # Daily rate around which the synthetic book is built, also the FRR
+    rate: float = 0.0002
+    # Amount on each side of the synthetic book
+    depth: float = 100000.0
+    # Value of one unit in USD, for tickers and minimum offer sizes
+    price_usd: float = 1.0
+    # Initial lending (deposit) wallet of the simulated account
+    balance: float = 0.0
+
+
+DEFAULT_CURRENCIES = {
+    "USD": CurrencySettings(rate=0.0002, depth=5000000.0, price_usd=1.0, balance=10000.0),
+    "BTC": CurrencySettings(rate=0.00005, depth=100.0, price_usd=60000.0, balance=0.5),
+    "ETH": CurrencySettings(rate=0.0001, depth=2000.0, price_usd=3000.0, balance=5.0),
+}
+
+
+@dataclass(frozen=True)
+class SimulatorSettings:
+    # Seconds added to every response, plus a uniform random extra of up to latency_jitter
+    latency: float = 0.0
+    latency_jitter: float = 0.0
+    # Fraction of requests answered with a rate limit error (429), and its Retry-After
+    rate_limit_rate: float = 0.0
+    retry_after: float = 1.0
+    # Fraction of requests answered with `error_status`
+    error_rate: float = 0.0
+    error_status: int = 500
+    # Simulated seconds per real second; loans expire and demand arrives that much faster
+    time_scale: float = 1.0
+    # Seconds between synthetic borrower demands per currency, and their mean size as a
+    # fraction of the currency's book depth
+    demand_interval: float = 5.0
+    demand_fraction: float = 0.02
+    # How far above the base rate a synthetic borrower accepts to pay, as a fraction
+    demand_spread: float = 0.1
+    # Credentials the signed requests must carry. None accepts any key and signature
+    api_key: str | None = None
+    api_secret: str | None = None
+    seed: int | None = None
+
+
+@dataclass(frozen=True)
+class DemandEvent:
+    """A borrower taking `amount` at daily rates up to `rate`, `at` seconds after start"""
+
+    at: float
+    currency: str
+    amount: float
+    rate: float
+
+
+def load_demand(path: str | Path) -> list[DemandEvent]:
+    """Reads replayed demand from a CSV file with the columns at, currency, amount, rate"""
+    with Path(path).open(newline="") as f:
+        events = [
+            DemandEvent(
+                float(row["at"]), row["currency"].upper(), float(row["amount"]), float(row["rate"])
+            )
+            for row in csv.DictReader(f)
+        ]
+    return sorted(events, key=lambda event: event.at)
+
+
+@dataclass
+class SimOffer:
+    id: int
+    currency: str
+    rate: float  # daily
+    period: int
+    amount: float
+    remaining: float
+    timestamp: float
+
+
+@dataclass
+class SimCredit:
+    id: int
+    currency: str
+    rate: float  # daily
+    period: int
+    amount: float
+    opened: float
+    expires: float
+
+
+@dataclass
+class SimMarket:
+    currency: str
+    settings: CurrencySettings
+    next_demand: float
+    offers: dict[int, SimOffer] = field(default_factory=dict)
+    credits: dict[int, SimCredit] = field(default_factory=dict)
+    filled: float = 0.0
+    volume: float = 0.0
+
+    def synthetic_asks(self) -> list[tuple[float, int, float]]:
+        """(rate, period, amount) of the other lenders, lowest rate first"""
+        base = self.settings.rate
+        amount = self.settings.depth / BOOK_LEVELS
+        return [
+            (base * (1 + LEVEL_STEP * i), PERIODS[i % len(PERIODS)], amount)
+            for i in range(BOOK_LEVELS)
+        ]
+
+    def synthetic_bids(self) -> list[tuple[float, int, float]]:
+        """(rate, period, amount) of the borrowers, highest rate first"""
+        base = self.settings.rate
+        amount = self.settings.depth / BOOK_LEVELS
+        return [
+            (base * (1 - LEVEL_STEP * (i + 1)), PERIODS[i % len(PERIODS)], amount)
+            for i in range(BOOK_LEVELS)
+        ]
+
+
+class SimulatedExchange:
+    """
+    The state and matching engine behind the simulator: one funding market per
+    currency, the wallets, open offers, active loans and ledger of one account.
+
+    The other lenders are a synthetic book that stays the same; borrower demand walks
+    it together with the account's offers from the lowest rate up, so an offer is only
+    filled when it is cheaper than what is left of the demand's rate. Filled offers
+    become loans that return their amount and pay interest when their period ends.
+    Demand is synthetic, or replayed from a list of events. The market moves forward
+    lazily to the current simulated time on every call.
+    """
+
+    def __init__(
+        self,
+        currencies: dict[str, CurrencySettings] | None = None,
+        settings: SimulatorSettings | None = None,
+        demand: list[DemandEvent] | None = None,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.settings = settings or SimulatorSettings()
+        self.clock = clock
+        self.rng = random.Random(self.settings.seed)
+        self.lock = threading.RLock()
+        self.started = clock()
+        self.ids = itertools.count(1000)
+        self.replay = list(demand) if demand is not None else None
+        self.replay_index = 0
+        self.markets = {
+            cur: SimMarket(cur, cfg, self.started + self.settings.demand_interval)
+            for cur, cfg in (currencies or DEFAULT_CURRENCIES).items()
+        }
+        self.wallets: dict[tuple[str, str], float] = {}
+        for cur, market in self.markets.items():
+            self.wallets[("deposit", cur)] = market.settings.balance
+        self.ledger: list[dict[str, Any]] = []
+        self.nonces: dict[str, int] = {}
+
+    def now(self) -> float:
+        """The simulated time"""
+        return self.started + (self.clock() - self.started) * self.settings.time_scale
+
+    def market(self, currency: str) -> SimMarket:
+        market = self.markets.get(currency.upper())
+        if market is None:
+            raise SimulatorError(f"Unknown currency {currency}")
+        return market
+
+    # --- matching ---
+
+    def advance(self) -> None:
+        """Applies the demand and loan expiries due by now"""
+        with self.lock:
+            now = self.now()
+            if self.replay is None:
+                self._synthetic_demand(now)
+            else:
+                self._replayed_demand(now)
+            self._expire_credits(now)
+
+    def _synthetic_demand(self, now: float) -> None:
+        interval = self.settings.demand_interval
+        if interval <= 0:
+            return
+        for market in self.markets.values():
+            while market.next_demand <= now:
+                cfg = market.settings
+                amount = self.rng.expovariate(1 / (cfg.depth * self.settings.demand_fraction))
+                rate = cfg.rate * (1 + self.rng.uniform(0, self.settings.demand_spread))
+                self.fill(market.currency, amount, rate, market.next_demand)
+                market.next_demand += interval
+
+    def _replayed_demand(self, now: float) -> None:
+        assert self.replay is not None
+        while self.replay_index < len(self.replay):
+            event = self.replay[self.replay_index]
+            at = self.started + event.at
+            if at > now:
+                break
+            self.replay_index += 1
+            if event.currency in self.markets:
+                self.fill(event.currency, event.amount, event.rate, at)
+
+    def fill(self, currency: str, amount: float, max_rate: float, at: float) -> float:
+        """
+        Matches a borrower taking `amount` at rates up to `max_rate` against the book.
+        At the same rate the other lenders' offers were there first. Returns the amount
+        of the account's offers that was filled.
+        """
+        with self.lock:
+            market = self.market(currency)
+            ladder: list[tuple[float, int, SimOffer | None, float]] = [
+                (rate, 0, None, level) for rate, _period, level in market.synthetic_asks()
+            ]
+            ladder += [(offer.rate, 1, offer, offer.remaining) for offer in market.offers.values()]
+            ladder.sort(key=lambda entry: (entry[0], entry[1], entry[2].id if entry[2] else 0))
+            filled = 0.0
+            for rate, _, offer, available in ladder:
+                if amount <= 0 or rate > max_rate:
+                    break
+                take = min(amount, available)
+                amount -= take
+                market.volume += take
+                if offer is None:
+                    continue
+                offer.remaining -= take
+                filled += take
+                credit = SimCredit(
+                    next(self.ids), currency, offer.rate, offer.period, take, at, 0.0
+                )
+                credit.expires = at + offer.period * DAY
+                market.credits[credit.id] = credit
+                if offer.remaining <= 1e-12:
+                    del market.offers[offer.id]
+            market.filled += filled
+            return filled
+
+    def _expire_credits(self, now: float) -> None:
+        for market in self.markets.values():
+            for credit in [c for c in market.credits.values() if c.expires <= now]:
+                del market.credits[credit.id]
+                interest = credit.amount * credit.rate * credit.period
+                earned = interest * LENDER_SHARE
+                key = ("deposit", credit.currency)
+                self.wallets[key] = self.wallets.get(key, 0.0) + earned
+                self.ledger.append(
+                    {
+                        "currency": credit.currency,
+                        "amount": earned,
+                        "balance": self.wallets[key],
+                        "description": "Margin Funding Payment on wallet deposit",
+                        "timestamp": credit.expires,
+                        "wallet": "deposit",
+                        "credit": credit,
+                    }
+                )
+
+    # --- account ---
+
+    def available(self, wallet: str, currency: str) -> float:
+        total = self.wallets.get((wallet, currency), 0.0)
+        if wallet != "deposit" or currency not in self.markets:
+            return total
+        market = self.markets[currency]
+        locked = sum(o.remaining for o in market.offers.values())
+        locked += sum(c.amount for c in market.credits.values())
+        return total - locked
+
+    def balances(self) -> list[tuple[str, str, float, float]]:
+        """(wallet, currency, amount, available) of every wallet holding anything"""
+        with self.lock:
+            self.advance()
+            return [
+                (wallet, cur, amount, self.available(wallet, cur))
+                for (wallet, cur), amount in sorted(self.wallets.items())
+                if amount > 0
+            ]
+
+    def place_offer(self, currency: str, amount: float, rate: float, period: int) -> SimOffer:
+        with self.lock:
+            self.advance()
+            market = self.market(currency)
+            if market.settings.price_usd * amount < MIN_OFFER_USD:
+                raise SimulatorError(
+                    f"Invalid offer: incorrect amount, minimum is {MIN_OFFER_USD:g}"
+                )
+            if not 2 <= period <= 120:
+                raise SimulatorError("Invalid offer: period must be between 2 and 120 days")
+            if rate <= 0:
+                raise SimulatorError("Invalid offer: rate must be positive")
+            if amount > self.available("deposit", market.currency) + 1e-9:
+                raise SimulatorError("Invalid offer: not enough balance")
+            offer = SimOffer(
+                next(self.ids), market.currency, rate, period, amount, amount, self.now()
+            )
+            market.offers[offer.id] = offer
+            return offer
+
+    def cancel_offer(self, offer_id: int) -> SimOffer:
+        with self.lock:
+            self.advance()
+            for market in self.markets.values():
+                offer = market.offers.pop(offer_id, None)
+                if offer is not None:
+                    return offer
+            raise SimulatorError("Offer could not be cancelled.")
+
+    def cancel_all(self, currency: str) -> int:
+        with self.lock:
+            self.advance()
+            market = self.market(currency)
+            count = len(market.offers)
+            market.offers.clear()
+            return count
+
+    def open_offers(self) -> list[SimOffer]:
+        with self.lock:
+            self.advance()
+            return [o for m in self.markets.values() for o in m.offers.values()]
+
+    def active_credits(self) -> list[SimCredit]:
+        with self.lock:
+            self.advance()
+            return [c for m in self.markets.values() for c in m.credits.values()]
+
+    def transfer(self, currency: str, amount: float, source: str, target: str) -> None:
+        with self.lock:
+            self.advance()
+            currency = currency.upper()
+            if source not in WALLETS or target not in WALLETS:
+                raise SimulatorError("Invalid wallet")
+            if amount <= 0 or amount > self.available(source, currency) + 1e-9:
+                raise SimulatorError("Insufficient balance")
+            self.wallets[(source, currency)] = self.wallets.get((source, currency), 0.0) - amount
+            self.wallets[(target, currency)] = self.wallets.get((target, currency), 0.0) + amount
+
+    def history(
+        self, currency: str, since: float, until: float, limit: int
+    ) -> list[dict[str, Any]]:
+        """Ledger entries of the currency between since and until, newest first"""
+        with self.lock:
+            self.advance()
+            entries = [
+                e
+                for e in self.ledger
+                if e["currency"] == currency.upper() and since <= e["timestamp"] <= until
+            ]
+            return sorted(entries, key=lambda e: -e["timestamp"])[:limit]
+
+    # --- market data ---
+
+    def order_book(
+        self, currency: str, limit: int
+    ) -> tuple[list[tuple[float, int, float]], list[tuple[float, int, float]]]:
+        """(asks, bids) as (daily rate, period, amount), including the account's offers"""
+        with self.lock:
+            self.advance()
+            market = self.market(currency)
+            asks = market.synthetic_asks()
+            asks += [(o.rate, o.period, o.remaining) for o in market.offers.values()]
+            asks.sort(key=lambda level: level[0])
+            bids = market.synthetic_bids()
+            if limit > 0:
+                return asks[:limit], bids[:limit]
+            return asks, bids
+
+    def price(self, currency: str, quote: str) -> float:
+        return self.market(currency).settings.price_usd / self.market(quote).settings.price_usd
+
+    def check_nonce(self, key: str, nonce: int) -> None:
+        with self.lock:
+            last = self.nonces.get(key, 0)
+            if nonce <= last:
+                raise SimulatorError(f"Nonce must be greater than {last}. You provided {nonce}.")
+            self.nonces[key] = nonce
+
+    def stats(self) -> dict[str, Any]:
+        with self.lock:
+            return {
+                cur: {
+                    "offers": len(m.offers),
+                    "credits": len(m.credits),
+                    "filled": m.filled,
+                    "volume": m.volume,
+                }
+                for cur, m in self.markets.items()
+            }
+
+
+def _amount(value: float) -> str:
+    return f"{value:.8f}"
+
+
+def _date(timestamp: float) -> str:
+    return datetime.datetime.fromtimestamp(timestamp, datetime.UTC).strftime("%Y-%m-%d %H:%M:%S")
+
+
+class BitfinexRoutes:
+    """The Bitfinex v1 and v2 endpoints, in the exchange's own formats"""
+
+    def __init__(self, exchange: SimulatedExchange) -> None:
+        self.exchange = exchange
+
+    def get(self, path: str, query: dict[str, str]) -> Any:
+        ex = self.exchange
+        if path == "/v1/symbols":
+            return [
+                f"{cur.lower()}{quote.lower()}"
+                for cur in ex.markets
+                for quote in ("USD", "BTC")
+                if cur not in ("USD", quote) and quote in ex.markets
+            ]
+        if path.startswith("/v1/lendbook/"):
+            currency = path.rsplit("/", 1)[1]
+            asks, bids = ex.order_book(currency, int(query.get("limit_asks", 50) or 0))
+            now = str(ex.now())
+
+            def levels(side: list[tuple[float, int, float]]) -> list[dict[str, Any]]:
+                return [
+                    {
+                        "rate": str(round(rate * YEARLY_PCT, 10)),
+                        "amount": _amount(amount),
+                        "period": period,
+                        "timestamp": now,
+                        "frr": "No",
+                    }
+                    for rate, period, amount in side
+                ]
+
+            return {"asks": levels(asks), "bids": levels(bids)}
+        if path == "/v2/tickers":
+            return [t for t in (self._ticker(s) for s in query.get("symbols", "").split(",")) if t]
+        raise SimulatorError(f"Unknown endpoint {path}")
+
+    def _ticker(self, symbol: str) -> list[Any] | None:
+        ex = self.exchange
+        if symbol.startswith("f") and symbol[1:] in ex.markets:
+            market = ex.markets[symbol[1:]]
+            asks, bids = ex.order_book(market.currency, 1)
+            bid, ask, frr = bids[0], asks[0], market.settings.rate
+            # [SYMBOL, FRR, BID, BID_PERIOD, BID_SIZE, ASK, ASK_PERIOD, ASK_SIZE,
+            #  DAILY_CHANGE, DAILY_CHANGE_RELATIVE, LAST_PRICE, VOLUME, HIGH, LOW,
+            #  _, _, FRR_AMOUNT_AVAILABLE]
+            return [
+                symbol,
+                frr,
+                bid[0],
+                bid[1],
+                bid[2],
+                ask[0],
+                ask[1],
+                ask[2],
+                0,
+                0,
+                frr,
+                market.volume,
+                ask[0],
+                bid[0],
+                None,
+                None,
+                0,
+            ]
+        if symbol.startswith("t") and len(symbol) == 7:
+            cur, quote = symbol[1:4], symbol[4:]
+            if cur not in ex.markets or quote not in ex.markets:
+                return None
+            price = ex.price(cur, quote)
+            # [SYMBOL, BID, BID_SIZE, ASK, ASK_SIZE, DAILY_CHANGE,
+            #  DAILY_CHANGE_RELATIVE, LAST_PRICE, VOLUME, HIGH, LOW]
+            return [symbol, price * 0.9995, 10, price * 1.0005, 10, 0, 0, price, 1000, price, price]
+        return None
+
+    def post(self, path: str, headers: dict[str, str], body: bytes) -> Any:
+        if path.startswith("/v2/"):
+            payload = self._authenticate_v2(path, headers, body)
+            if path == "/v2/auth/w/funding/offer/cancel/all":
+                count = self.exchange.cancel_all(str(payload["currency"]))
+                # [MTS, TYPE, MESSAGE_ID, null, NOTIFY_INFO, CODE, STATUS, TEXT]
+                return [
+                    int(self.exchange.now() * 1000),
+                    "foc-all-req",
+                    None,
+                    None,
+                    None,
+                    None,
+                    "SUCCESS",
+                    f"{count} offers canceled",
+                ]
+            raise SimulatorError(f"Unknown endpoint {path}")
+
+        payload = self._authenticate_v1(path, headers)
+        ex = self.exchange
+        if path == "/v1/balances":
+            return [
+                {
+                    "type": wallet,
+                    "currency": cur.lower(),
+                    "amount": _amount(amount),
+                    "available": _amount(available),
+                }
+                for wallet, cur, amount, available in ex.balances()
+            ]
+        if path == "/v1/offers":
+            return [self._offer(o) for o in ex.open_offers()]
+        if path == "/v1/credits":
+            return [
+                {
+                    "id": c.id,
+                    "currency": c.currency,
+                    "status": "ACTIVE",
+                    "rate": str(round(c.rate * YEARLY_PCT, 10)),
+                    "period": c.period,
+                    "amount": _amount(c.amount),
+                    "timestamp": str(c.opened),
+                }
+                for c in ex.active_credits()
+            ]
+        if path == "/v1/offer/new":
+            if payload.get("direction") != "lend":
+                raise SimulatorError("Invalid offer: only lend offers are simulated")
+            offer = ex.place_offer(
+                str(payload["currency"]),
+                float(payload["amount"]),
+                float(payload["rate"]) / YEARLY_PCT,
+                int(payload["period"]),
+            )
+            return self._offer(offer)
+        if path == "/v1/offer/cancel":
+            offer = ex.cancel_offer(int(payload["offer_id"]))
+            return {**self._offer(offer), "is_live": False, "is_cancelled": True}
+        if path == "/v1/transfer":
+            currency, amount = str(payload["currency"]), float(payload["amount"])
+            try:
+                ex.transfer(currency, amount, str(payload["walletfrom"]), str(payload["walletto"]))
+            except SimulatorError as err:
+                return [{"status": "error", "message": str(err)}]
+            return [
+                {
+                    "status": "success",
+                    "message": f"{amount} {currency} transfered from {payload['walletfrom']} to {payload['walletto']}",
+                }
+            ]
+        if path == "/v1/history":
+            entries = ex.history(
+                str(payload["currency"]),
+                float(payload.get("since", 0)),
+                float(payload.get("until", ex.now())),
+                int(payload.get("limit", 500)),
+            )
+            return [
+                {
+                    "currency": e["currency"],
+                    "amount": _amount(e["amount"]),
+                    "balance": _amount(e["balance"]),
+                    "description": e["description"],
+                    "timestamp": str(e["timestamp"]),
+                }
+                for e in entries
+            ]
+        raise SimulatorError(f"Unknown endpoint {path}")
+
+    @staticmethod
+    def _offer(offer: SimOffer) -> dict[str, Any]:
+        return {
+            "id": offer.id,
+            "currency": offer.currency,
+            "rate": str(round(offer.rate * YEARLY_PCT, 10)),
+            "period": offer.period,
+            "direction": "lend",
+            "timestamp": str(offer.timestamp),
+            "is_live": True,
+            "is_cancelled": False,
+            "original_amount": _amount(offer.amount),
+            "remaining_amount": _amount(offer.remaining),
+            "executed_amount": _amount(offer.amount - offer.remaining),
+        }
+
+    def _check_key(self, key: str | None, data: bytes, signature: str | None) -> None:
+        settings = self.exchange.settings
+        if key is None or signature is None:
+            raise SimulatorError("Missing API key or signature")
+        if settings.api_key is not None and key != settings.api_key:
+            raise SimulatorError("Could not find a key matching the given X-BFX-APIKEY.")
+        if settings.api_secret is not None:
+            expected = hmac.new(settings.api_secret.encode(), data, hashlib.sha384).hexdigest()
+            if not hmac.compare_digest(expected, signature):
+                raise SimulatorError("Invalid X-BFX-SIGNATURE")
+
+    def _authenticate_v1(self, path: str, headers: dict[str, str]) -> dict[str, Any]:
+        data = headers.get("x-bfx-payload", "")
+        self._check_key(headers.get("x-bfx-apikey"), data.encode(), headers.get("x-bfx-signature"))
+        payload: dict[str, Any] = json.loads(base64.b64decode(data))
+        if payload.get("request") != path:
+            raise SimulatorError("Payload request does not match the path")
+        self.exchange.check_nonce(headers["x-bfx-apikey"], int(payload["nonce"]))
+        return payload
+
+    def _authenticate_v2(self, path: str, headers: dict[str, str], body: bytes) -> dict[str, Any]:
+        nonce = headers.get("bfx-nonce", "")
+        message = f"/api{path}{nonce}{body.decode()}".encode()
+        self._check_key(headers.get("bfx-apikey"), message, headers.get("bfx-signature"))
+        self.exchange.check_nonce(headers["bfx-apikey"], int(nonce))
+        payload: dict[str, Any] = json.loads(body or b"{}")
+        return payload
+
+
+class PoloniexRoutes:
+    """The Poloniex public and trading API commands, in the exchange's own formats"""
+
+    def __init__(self, exchange: SimulatedExchange) -> None:
+        self.exchange = exchange
+
+    def public(self, query: dict[str, str]) -> Any:
+        ex = self.exchange
+        command = query.get("command")
+        if command == "returnLoanOrders":
+            asks, bids = ex.order_book(query["currency"], int(query.get("limit", 0)))
+
+            def levels(side: list[tuple[float, int, float]]) -> list[dict[str, Any]]:
+                return [
+                    {
+                        "rate": f"{rate:.8f}",
+                        "amount": _amount(amount),
+                        "rangeMin": 2,
+                        "rangeMax": period,
+                    }
+                    for rate, period, amount in side
+                ]
+
+            return {"offers": levels(asks), "demands": levels(bids)}
+        if command == "returnTicker":
+            ticker = {}
+            for cur in ex.markets:
+                if cur == "BTC" or "BTC" not in ex.markets:
+                    continue
+                price = ex.price(cur, "BTC")
+                ticker[f"BTC_{cur}"] = {
+                    "last": f"{price:.8f}",
+                    "lowestAsk": f"{price * 1.0005:.8f}",
+                    "highestBid": f"{price * 0.9995:.8f}",
+                    "percentChange": "0",
+                    "baseVolume": "1000",
+                    "quoteVolume": f"{1000 / price:.8f}",
+                }
+            return ticker
+        if command == "return24hVolume":
+            return {
+                f"BTC_{cur}": {"BTC": "1000", cur: "1000"} for cur in ex.markets if cur != "BTC"
+            }
+        raise SimulatorError("Invalid command.")
+
+    def trading(self, headers: dict[str, str], body: bytes) -> Any:
+        ex = self.exchange
+        settings = ex.settings
+        key, sign = headers.get("key"), headers.get("sign")
+        if not key or not sign:
+            raise SimulatorError("Invalid API key/secret pair.")
+        if settings.api_key is not None and key != settings.api_key:
+            raise SimulatorError("Invalid API key/secret pair.")
+        if settings.api_secret is not None:
+            expected = hmac.new(settings.api_secret.encode(), body, hashlib.sha512).hexdigest()
+            if not hmac.compare_digest(expected, sign):
+                raise SimulatorError("Invalid API key/secret pair.")
+        req = dict(urllib.parse.parse_qsl(body.decode()))
+        ex.check_nonce(key, int(req.get("nonce", 0)))
+        command = req.get("command")
+
+        if command in ("returnAvailableAccountBalances", "returnBalances"):
+            balances: dict[str, dict[str, str]] = {}
+            accounts = {wallet: name for name, wallet in POLONIEX_ACCOUNTS.items()}
+            for wallet, cur, _total, available in ex.balances():
+                if available > 0:
+                    balances.setdefault(accounts[wallet], {})[cur] = _amount(available)
+            if command == "returnBalances":
+                return {cur: _amount(ex.available("exchange", cur)) for cur in ex.markets}
+            if req.get("account"):
+                account = req["account"]
+                return {account: balances[account]} if account in balances else []
+            return balances or []
+        if command == "returnOpenLoanOffers":
+            offers: dict[str, list[dict[str, Any]]] = {}
+            for o in ex.open_offers():
+                offers.setdefault(o.currency, []).append(
+                    {
+                        "id": o.id,
+                        "rate": f"{o.rate:.8f}",
+                        "amount": _amount(o.remaining),
+                        "duration": o.period,
+                        "autoRenew": 0,
+                        "date": _date(o.timestamp),
+                    }
+                )
+            return offers or []
+        if command == "returnActiveLoans":
+            return {
+                "provided": [
+                    {
+                        "id": c.id,
+                        "currency": c.currency,
+                        "rate": f"{c.rate:.8f}",
+                        "amount": _amount(c.amount),
+                        "range": c.period,
+                        "duration": c.period,
+                        "autoRenew": 0,
+                        "date": _date(c.opened),
+                        "fees": "0.00000000",
+                    }
+                    for c in ex.active_credits()
+                ],
+                "used": [],
+            }
+        if command == "createLoanOffer":
+            offer = ex.place_offer(
+                req["currency"],
+                float(req["amount"]),
+                float(req["lendingRate"]),
+                int(req["duration"]),
+            )
+            return {"success": 1, "message": "Loan order placed.", "orderID": offer.id}
+        if command == "cancelLoanOffer":
+            ex.cancel_offer(int(req["orderNumber"]))
+            return {"success": 1, "message": "Loan offer canceled."}
+        if command == "transferBalance":
+            source = POLONIEX_ACCOUNTS.get(req["fromAccount"], req["fromAccount"])
+            target = POLONIEX_ACCOUNTS.get(req["toAccount"], req["toAccount"])
+            ex.transfer(req["currency"], float(req["amount"]), source, target)
+            return {
+                "success": 1,
+                "message": f"Transferred {req['amount']} {req['currency']} from {req['fromAccount']} to {req['toAccount']} account.",
+            }
+        if command == "returnLendingHistory":
+            history: list[dict[str, Any]] = []
+            for cur in ex.markets:
+                entries = ex.history(
+                    cur, float(req.get("start", 0)), float(req.get("end", ex.now())), 10**9
+                )
+                for e in entries:
+                    credit: SimCredit = e["credit"]
+                    interest = e["amount"] / LENDER_SHARE
+                    history.append(
+                        {
+                            "id": credit.id,
+                            "currency": cur,
+                            "rate": f"{credit.rate:.8f}",
+                            "amount": _amount(credit.amount),
+                            "duration": f"{credit.period:.8f}",
+                            "interest": _amount(interest),
+                            "fee": _amount(e["amount"] - interest),
+                            "earned": _amount(e["amount"]),
+                            "open": _date(credit.opened),
+                            "close": _date(credit.expires),
+                        }
+                    )
+            history.sort(key=lambda h: h["close"], reverse=True)
+            return history[: int(req.get("limit", 500))]
+        if command == "toggleAutoRenew":
+            return {"success": 1, "message": 0}
+        raise SimulatorError("Invalid command.")
+
+
+class ExchangeSimulator:
+    """
+    Serves a SimulatedExchange over HTTP: Bitfinex under /v1 and /v2, Poloniex under
+    /public and /tradingApi. Every response can be delayed, and answered with a rate
+    limit error or a server error instead, as set in SimulatorSettings.
+    """
+
+    def __init__(
+        self,
+        exchange: SimulatedExchange | None = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ) -> None:
+        self.exchange = exchange or SimulatedExchange()
+        self.settings = self.exchange.settings
+        self.bitfinex = BitfinexRoutes(self.exchange)
+        self.poloniex = PoloniexRoutes(self.exchange)
+        self.fault_rng = random.Random(self.settings.seed)
+        self.fault_lock = threading.Lock()
+        self.requests = 0
+        self.rate_limited = 0
+        self.errors = 0
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self.thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host!s}:{port}"
+
+    def start(self) -> None:
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, name="ExchangeSimulator", daemon=True
+        )
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        if self.thread is not None:
+            self.thread.join(timeout=5)
+
+    def _fault(self) -> int | None:
+        """Waits the simulated latency. Returns the status to fail the request with, if any"""
+        settings = self.settings
+        with self.fault_lock:
+            self.requests += 1
+            delay = settings.latency + self.fault_rng.uniform(0, settings.latency_jitter)
+            roll = self.fault_rng.random()
+            status = None
+            if roll < settings.rate_limit_rate:
+                self.rate_limited += 1
+                status = 429
+            elif roll < settings.rate_limit_rate + settings.error_rate:
+                self.errors += 1
+                status = settings.error_status
+        if delay > 0:
+            time.sleep(delay)
+        return status
+
+    def handle(
+        self, method: str, target: str, headers: dict[str, str], body: bytes
+    ) -> tuple[int, dict[str, str], Any]:
+        """Answers one request. Returns (status, extra headers, JSON body)"""
+        status = self._fault()
+        if status == 429:
+            return (
+                429,
+                {"Retry-After": f"{self.settings.retry_after:g}"},
+                {"error": "ERR_RATE_LIMIT"},
+            )
+        if status is not None:
+            return status, {}, {"error": "Simulated server error"}
+
+        parts = urllib.parse.urlsplit(target)
+        query = dict(urllib.parse.parse_qsl(parts.query))
+        path = parts.path
+        try:
+            if path.startswith(("/v1/", "/v2/")):
+                if method == "GET":
+                    return 200, {}, self.bitfinex.get(path, query)
+                return 200, {}, self.bitfinex.post(path, headers, body)
+            if path == "/public" and method == "GET":
+                return 200, {}, self.poloniex.public(query)
+            if path == "/tradingApi" and method == "POST":
+                return 200, {}, self.poloniex.trading(headers, body)
+            return 404, {}, {"error": f"Unknown endpoint {path}"}
+        except (SimulatorError, KeyError, ValueError) as ex:
+            message = str(ex) if isinstance(ex, SimulatorError) else f"Invalid request: {ex!r}"
+            if path.startswith("/v1/"):
+                return 400, {}, {"message": message}
+            if path.startswith("/v2/"):
+                return 500, {}, ["error", 10020, message]
+            return 200, {}, {"error": message}
+
+    def _handler_class(self) -> type[BaseHTTPRequestHandler]:
+        simulator = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _respond(self, method: str) -> None:
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                headers = {name.lower(): value for name, value in self.headers.items()}
+                status, extra, data = simulator.handle(method, self.path, headers, body)
+                payload = json.dumps(data).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for name, value in extra.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self) -> None:
+                self._respond("GET")
+
+            def do_POST(self) -> None:
+                self._respond("POST")
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+        return Handler
+
+    def stats(self) -> dict[str, Any]:
+        with self.fault_lock:
+            counters = {
+                "requests": self.requests,
+                "rate_limited": self.rate_limited,
+                "errors": self.errors,
+            }
+        return {**counters, "markets": self.exchange.stats()}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local simulator of the exchange lending APIs")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="Seconds added to every response"
+    )
+    parser.add_argument("--latency-jitter", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction answered 429")
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction answered 500")
+    parser.add_argument("--time-scale", type=float, default=1.0)
+    parser.add_argument("--demand", help="CSV of replayed demand: at,currency,amount,rate")
+    parser.add_argument("--api-key")
+    parser.add_argument("--api-secret")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    settings = SimulatorSettings(
+        latency=args.latency,
+        latency_jitter=args.latency_jitter,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after,
+        error_rate=args.error_rate,
+        time_scale=args.time_scale,
+        api_key=args.api_key,
+        api_secret=args.api_secret,
+        seed=args.seed,
+    )
+    demand = load_demand(args.demand) if args.demand else None
+    simulator = ExchangeSimulator(
+        SimulatedExchange(settings=settings, demand=demand), args.host, args.port
+    )
+    print(f"Exchange simulator listening on {simulator.url}")
+    try:
+        simulator.server.serve_forever()
+    except KeyboardInterrupt:
+        simulator.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
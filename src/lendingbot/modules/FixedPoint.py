@@ -0,0 +1,71 @@
+"""
+Integer fixed-point amounts and rates for the lending calculations
+"""
+
+from decimal import ROUND_CEILING, ROUND_FLOOR, ROUND_HALF_EVEN, Decimal
+
+
+# Amounts are counted in satoshis (1e-8), daily rates in units of 1e-10
+AMOUNT_DIGITS = 8
+RATE_DIGITS = 10
+AMOUNT_SCALE = 10**AMOUNT_DIGITS
+RATE_SCALE = 10**RATE_DIGITS
+
+Amount = Decimal | str | float | int
+
+
+def _units(value: Amount, digits: int, rounding: str) -> int:
+    """`value` in units of 10**-digits"""
+    scale: int = 10**digits
+    if isinstance(value, int):
+        return value * scale
+    if isinstance(value, str):
+        whole, _, fraction = value.partition(".")
+        # Plain non-negative decimals, as the exchanges send them, skip Decimal
+        if (
+            whole.isdigit()
+            and (not fraction or fraction.isdigit())
+            and (len(fraction) <= digits or rounding == ROUND_FLOOR)
+        ):
+            return int(whole) * scale + int(fraction[:digits].ljust(digits, "0"))
+        number = Decimal(value)
+    elif isinstance(value, Decimal):
+        number = value
+    else:
+        number = Decimal(str(value))
+    return int(number.scaleb(digits).to_integral_value(rounding))
+
+
+def amount_units(value: Amount) -> int:
+    """
+    An amount (Decimal, str, float or whole coins) in satoshis. Anything below a
+    satoshi is cut off, so an amount never grows by the conversion.
+    """
+    return _units(value, AMOUNT_DIGITS, ROUND_FLOOR)
+
+
+def rate_units(value: Amount) -> int:
+    """A daily rate in units of 1e-10, rounded half to even"""
+    return _units(value, RATE_DIGITS, ROUND_HALF_EVEN)
+
+
+def ceil_amount_units(value: Decimal) -> int:
+    """The smallest number of satoshis that is at least `value`"""
+    return int(value.scaleb(AMOUNT_DIGITS).to_integral_value(ROUND_CEILING))
+
+
+def amount_decimal(units: int) -> Decimal:
+    return Decimal(units).scaleb(-AMOUNT_DIGITS)
+
+
+def rate_decimal(units: int) -> Decimal:
+    return Decimal(units).scaleb(-RATE_DIGITS)
+
+
+def split_units(total: int, parts: int) -> list[int]:
+    """
+    `total` split into `parts` equal shares; the units that do not divide evenly go
+    to the first share
+    """
+    share, remainder = divmod(total, parts)
+    return [share + remainder] + [share] * (parts - 1)
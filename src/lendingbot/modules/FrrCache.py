@@ -0,0 +1,83 @@
+"""
+Shared cache of the flash return rates of the lent currencies
+"""
+
+import threading
+import time
+from collections.abc import Callable, Iterable
+from typing import Any
+
+
+class FrrCache:
+    """
+    Keeps the flash return rate of every currency for `ttl` seconds.
+
+    A lookup of a missing or expired currency refreshes every known currency with one
+    call to `fetch`, which takes a list of currencies and returns their FRRs. A ttl of
+    0 disables caching. The cache is thread-safe, so the lending engine, the async
+    prefetch and the web server can all read it.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[list[str]], dict[str, float]],
+        ttl: float,
+        currencies: Iterable[str] = (),
+    ) -> None:
+        self.fetch = fetch
+        self.ttl = float(ttl)
+        self.currencies: list[str] = list(currencies)
+        self.lock = threading.Lock()
+        self.rates: dict[str, float] = {}
+        self.updated: dict[str, float] = {}  # currency -> time.time() of the last update
+        self.hits = 0
+        self.misses = 0
+        self.fetches = 0
+
+    def _is_fresh(self, currency: str, now: float) -> bool:
+        updated = self.updated.get(currency)
+        return updated is not None and now - updated < self.ttl
+
+    def update(self, rates: dict[str, float]) -> None:
+        """Stores rates that were fetched elsewhere, e.g. with the ticker"""
+        now = time.time()
+        with self.lock:
+            for currency, rate in rates.items():
+                self.rates[currency] = rate
+                self.updated[currency] = now
+
+    def get(self, currency: str) -> float:
+        """
+        Returns the FRR of the currency, fetching all currencies if it is not cached
+        """
+        with self.lock:
+            if self._is_fresh(currency, time.time()):
+                self.hits += 1
+                return self.rates[currency]
+            self.misses += 1
+            # Held during the fetch so concurrent lookups wait for one request
+            currencies = list(dict.fromkeys([*self.currencies, currency]))
+            rates = self.fetch(currencies)
+            self.fetches += 1
+            now = time.time()
+            for cur, rate in rates.items():
+                self.rates[cur] = rate
+                self.updated[cur] = now
+            if currency not in rates:
+                raise KeyError(f"No FRR returned for {currency}")
+            return rates[currency]
+
+    def snapshot(self) -> dict[str, Any]:
+        """Cached rates with their age in seconds, plus the cache counters"""
+        now = time.time()
+        with self.lock:
+            return {
+                "ttl": self.ttl,
+                "rates": {
+                    cur: {"frr": rate, "age": round(now - self.updated[cur], 1)}
+                    for cur, rate in self.rates.items()
+                },
+                "hits": self.hits,
+                "misses": self.misses,
+                "fetches": self.fetches,
+            }
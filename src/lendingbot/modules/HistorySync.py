@@ -0,0 +1,240 @@
+"""
+Resumable download of the lending history into SQLite
+"""
+
+import sqlite3
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any
+
+from .RequestScheduler import BACKFILL, request_class
+
+
+if TYPE_CHECKING:
+    from .ExchangeApi import ExchangeApi
+
+
+# The stream of an exchange that returns the history of all currencies at once
+ALL_CURRENCIES = "*"
+
+CURSOR_CREATE = (
+    "CREATE TABLE IF NOT EXISTS history_sync("
+    "stream TEXT PRIMARY KEY, synced_from INTEGER, synced_until INTEGER NOT NULL)"
+)
+CURSOR_GET = "SELECT synced_from, synced_until FROM history_sync WHERE stream = ?"
+CURSOR_SET = (
+    "INSERT OR REPLACE INTO history_sync(stream, synced_from, synced_until) VALUES (?, ?, ?)"
+)
+
+
+@dataclass
+class HistoryPage:
+    """One response of ExchangeApi.return_lending_history_page"""
+
+    rows: list[dict[str, Any]] = field(default_factory=list)
+    # Timestamp of the oldest entry the exchange returned, including the entries that
+    # are not lending payments. None if it returned nothing
+    oldest: int | None = None
+    # True if the exchange returned fewer entries than the limit, so nothing older
+    # is left in the requested range
+    complete: bool = True
+
+
+@dataclass(frozen=True)
+class HistoryWindow:
+    """The part of a stream's history between start and stop (exclusive)"""
+
+    stream: str
+    start: int
+    stop: int
+
+
+class HistorySync:
+    """
+    Downloads the lending history and writes every page to SQLite as soon as it
+    arrives.
+
+    The history of each stream (a currency, or ALL_CURRENCIES) is paged backwards
+    from now, so a short history takes a single request. Only below a page that
+    comes back full, with `page_limit` entries, is the older history split into
+    windows expected to hold about a page each, at most `window` seconds long, which
+    up to `concurrency` workers fetch at the same time. One sync uses at most
+    `windows_per_sync` requests and windows for the older history, and the next
+    sync continues where it stopped, so a long history does not hold up the caller.
+    The requests queue as BACKFILL, so they only use the rate limit budget the bot
+    leaves over.
+
+    Each stream's cursor, the time range stored without a gap, is kept in the
+    history_sync table. A sync resumes from the cursor, so an interrupted download
+    does not start over.
+    """
+
+    def __init__(
+        self,
+        api: "ExchangeApi",
+        db: sqlite3.Connection,
+        log: Any,
+        store: Callable[[list[dict[str, Any]]], None],
+        window: int = 90 * 86400,
+        concurrency: int = 4,
+        page_limit: int = 1000,
+        windows_per_sync: int = 8,
+    ) -> None:
+        self.api = api
+        self.db = db
+        self.log = log
+        # Writes rows to the database without committing
+        self.store = store
+        self.window = int(window)
+        self.concurrency = int(concurrency)
+        self.page_limit = int(page_limit)
+        self.windows_per_sync = int(windows_per_sync)
+        self.db_lock = threading.Lock()
+        with self.db_lock:
+            self.db.execute(CURSOR_CREATE)
+            self.db.commit()
+
+    def load_cursor(self, stream: str) -> tuple[int | None, int] | None:
+        """
+        The stored range of the stream as (synced_from, synced_until): every entry
+        from synced_from up to synced_until (exclusive) is stored, and synced_from is
+        None once everything older is too. None if nothing was synced yet.
+        """
+        with self.db_lock:
+            row = self.db.execute(CURSOR_GET, (stream,)).fetchone()
+        if row is None:
+            return None
+        return (None if row[0] is None else int(row[0])), int(row[1])
+
+    def save_cursor(self, stream: str, synced_from: int | None, synced_until: int) -> None:
+        with self.db_lock:
+            self.db.execute(CURSOR_SET, (stream, synced_from, synced_until))
+            self.db.commit()
+
+    def cursor(self, stream: str) -> int | None:
+        """The time up to which the stream's newest entries are stored"""
+        cursor = self.load_cursor(stream)
+        return None if cursor is None else cursor[1]
+
+    def sync(self, start: int, stop: int | None = None) -> tuple[int, bool]:
+        """
+        Downloads the history of every stream from its cursor up to `stop` (default
+        now), then older entries down to `start` as far as windows_per_sync allows.
+        Returns the number of rows stored and whether every stream is stored from
+        `start` to `stop`.
+        """
+        start = int(start)
+        stop = int(time.time()) if stop is None else int(stop)
+        streams = list(self.api.history_streams())
+        failed: set[str] = set()
+        count = 0
+        with ThreadPoolExecutor(
+            max_workers=self.concurrency, thread_name_prefix="HistorySync"
+        ) as pool:
+            # Entries newer than the cursors, usually a single page per stream
+            newer: dict[Future[int], str] = {}
+            for stream in streams:
+                cursor = self.load_cursor(stream)
+                if cursor is None:
+                    # Nothing stored yet, the whole history is paged backwards from now
+                    self.save_cursor(stream, stop, stop)
+                elif cursor[1] < stop:
+                    window = HistoryWindow(stream, cursor[1], stop)
+                    newer[pool.submit(self.fetch_window, window)] = stream
+            for future in as_completed(newer):
+                stream = newer[future]
+                try:
+                    count += future.result()
+                except Exception as ex:
+                    failed.add(stream)
+                    self.log.log_error(f"Error downloading new {stream} lending history: {ex}")
+                    continue
+                synced_from, _ = self.load_cursor(stream) or (None, stop)
+                self.save_cursor(stream, synced_from, stop)
+
+            budget = self.windows_per_sync
+            for stream in streams:
+                try:
+                    stored, budget = self.backfill(pool, stream, start, budget)
+                    count += stored
+                except Exception as ex:
+                    failed.add(stream)
+                    self.log.log_error(f"Error downloading older {stream} lending history: {ex}")
+
+        complete = not failed and all(
+            self.load_cursor(stream) == (None, stop) for stream in streams
+        )
+        return count, complete
+
+    def backfill(
+        self, pool: ThreadPoolExecutor, stream: str, start: int, budget: int
+    ) -> tuple[int, int]:
+        """
+        Downloads the stream's entries older than its cursor down to `start`, newest
+        first, with at most `budget` requests and windows.
+        Returns the rows stored and the budget left.
+        """
+        cursor = self.load_cursor(stream)
+        if cursor is None:
+            return 0, budget
+        synced_from, synced_until = cursor
+        count = 0
+        while synced_from is not None and synced_from > start and budget > 0:
+            # The newest page of what is left. Unless it is full, nothing older is left
+            page = self.fetch_page(stream, start, synced_from - 1)
+            budget -= 1
+            count += len(page.rows)
+            if page.complete or page.oldest is None or page.oldest <= start:
+                synced_from = None
+                break
+            span = synced_from - page.oldest
+            # The oldest second may have more entries than fit the page, fetch it again
+            synced_from = page.oldest + 1 if page.oldest + 1 < synced_from else synced_from - 1
+            self.save_cursor(stream, synced_from, synced_until)
+
+            # Windows below the page, as long as the page took to fill, newest first
+            width = max(1, min(span, self.window))
+            tops = range(synced_from, start, -width)[: min(budget, self.concurrency)]
+            windows = [HistoryWindow(stream, max(start, top - width), top) for top in tops]
+            budget -= len(windows)
+            futures = [pool.submit(self.fetch_window, window) for window in windows]
+            error: Exception | None = None
+            for window, future in zip(windows, futures, strict=True):
+                try:
+                    count += future.result()
+                except Exception as ex:
+                    error = error or ex
+                if error is None:
+                    synced_from = window.start
+            if error is not None:
+                self.save_cursor(stream, synced_from, synced_until)
+                raise error
+        if synced_from is not None and synced_from <= start:
+            synced_from = None
+        self.save_cursor(stream, synced_from, synced_until)
+        return count, budget
+
+    def fetch_page(self, stream: str, start: int, until: int) -> HistoryPage:
+        """Stores the newest page of the stream between start and until (inclusive)"""
+        with request_class(BACKFILL):
+            page = self.api.return_lending_history_page(stream, start, until, self.page_limit)
+        if page.rows:
+            with self.db_lock:
+                self.store(page.rows)
+                self.db.commit()
+        return page
+
+    def fetch_window(self, window: HistoryWindow) -> int:
+        """Stores every row of the window, newest page first. Returns the row count"""
+        count = 0
+        until = window.stop - 1
+        while True:
+            page = self.fetch_page(window.stream, window.start, until)
+            count += len(page.rows)
+            if page.complete or page.oldest is None or page.oldest <= window.start:
+                return count
+            # The oldest second may have more entries than fit the page, fetch it again
+            until = page.oldest if page.oldest < until else until - 1
@@ -0,0 +1,107 @@
+"""
+Pooled keep-alive HTTP transport shared by the exchange API clients
+"""
+
+import threading
+import time
+from typing import Any, cast
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from . import Configuration
+from .Journal import JournalRecorder, JournalReplayer
+
+
+class HttpClient:
+    """
+    Thin wrapper around a ``requests.Session`` that keeps connections alive between
+    calls, bounds the connection pool and drops connections that sat idle for too long.
+
+    ``requests.Session`` shares its urllib3 pool safely between threads; the lock here
+    only guards replacing the session when idle connections are reaped.
+
+    With [api.journal] set, every request and response is appended to a journal, or
+    every request is answered from one instead of the network.
+    """
+
+    def __init__(self, cfg: Configuration.RootConfig) -> None:
+        http_cfg = cfg.api.http
+        self.pool_size = int(http_cfg.pool_size)
+        self.connect_timeout = float(http_cfg.connect_timeout)
+        self.read_timeout = float(cfg.bot.request_timeout)
+        self.idle_timeout = float(http_cfg.idle_timeout)
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+        self.session = self._create_session()
+
+        journal_cfg = cfg.api.journal
+        self.recorder: JournalRecorder | None = None
+        self.replayer: JournalReplayer | None = None
+        if journal_cfg.replay:
+            self.replayer = JournalReplayer(journal_cfg.replay)
+        elif journal_cfg.record:
+            secrets = [s.get_secret_value() for s in (cfg.api.apikey, cfg.api.secret) if s]
+            self.recorder = JournalRecorder(journal_cfg.record, secrets)
+
+    @property
+    def timeout(self) -> tuple[float, float]:
+        """(connect, read) timeout tuple as accepted by requests"""
+        return self.connect_timeout, self.read_timeout
+
+    def _create_session(self) -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_size, pool_maxsize=self.pool_size, pool_block=True
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def reap_idle(self) -> bool:
+        """
+        Closes every pooled connection if the pool has not been used for longer than
+        idle_timeout. Servers silently drop idle keep-alive sockets, and reusing one of
+        those fails the next request. Returns True if the pool was reaped.
+        """
+        with self.lock:
+            now = time.monotonic()
+            idle = now - self.last_used
+            self.last_used = now
+            if self.idle_timeout <= 0 or idle <= self.idle_timeout:
+                return False
+            self.session.close()
+            self.session = self._create_session()
+            return True
+
+    def get(self, url: str, headers: dict[str, str] | None = None) -> requests.Response:
+        if self.replayer is not None:
+            return cast("requests.Response", self.replayer.respond("GET", url, headers))
+        self.reap_idle()
+        start = time.monotonic()
+        r = self.session.get(url, headers=headers, timeout=self.timeout)
+        if self.recorder is not None:
+            self.recorder.record("GET", url, headers, None, r, time.monotonic() - start)
+        return r
+
+    def post(
+        self,
+        url: str,
+        headers: dict[str, str] | None = None,
+        data: Any = None,
+        verify: bool = True,
+    ) -> requests.Response:
+        if self.replayer is not None:
+            return cast("requests.Response", self.replayer.respond("POST", url, headers, data))
+        self.reap_idle()
+        start = time.monotonic()
+        r = self.session.post(url, headers=headers, data=data, verify=verify, timeout=self.timeout)
+        if self.recorder is not None:
+            self.recorder.record("POST", url, headers, data, r, time.monotonic() - start)
+        return r
+
+    def close(self) -> None:
+        with self.lock:
+            self.session.close()
+        if self.recorder is not None:
+            self.recorder.close()
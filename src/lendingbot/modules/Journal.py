@@ -0,0 +1,180 @@
+"""
+Record and replay of exchange API traffic
+"""
+
+import base64
+import json
+import threading
+import time
+import urllib.parse
+from collections import deque
+from pathlib import Path
+from typing import Any
+
+
+# Request fields that change on every call and take no part in matching a replay
+VOLATILE_FIELDS = frozenset({"nonce"})
+# Response headers kept in the journal
+KEPT_RESPONSE_HEADERS = ("Retry-After",)
+REDACTED = "***"
+
+
+class JournalMiss(Exception):
+    """A replayed request that the journal has no response for"""
+
+
+def request_key(
+    method: str, url: str, headers: dict[str, str] | None = None, data: Any = None
+) -> tuple[str, str, str]:
+    """
+    (method, path and query, canonical body) of a request, the same for a request
+    and its replay: the host, signatures and nonces are left out. Bitfinex v1 sends
+    its body in the X-BFX-PAYLOAD header, which is read as the body.
+    """
+    parts = urllib.parse.urlsplit(url)
+    target = parts.path + (f"?{parts.query}" if parts.query else "")
+    body: Any = data
+    payload = {name.lower(): value for name, value in (headers or {}).items()}.get("x-bfx-payload")
+    if payload is not None:
+        body = json.loads(base64.b64decode(payload))
+    elif isinstance(data, (str, bytes)) and data:
+        try:
+            body = json.loads(data)
+        except ValueError:
+            body = dict(urllib.parse.parse_qsl(data if isinstance(data, str) else data.decode()))
+    if isinstance(body, dict):
+        body = {k: v for k, v in body.items() if k not in VOLATILE_FIELDS}
+    canonical = "" if body is None else json.dumps(body, sort_keys=True, separators=(",", ":"))
+    return method.upper(), target, canonical
+
+
+class JournalRecorder:
+    """
+    Appends every request and response pair to a JSON lines file, one compact object
+    per line: wall time "t", duration in ms "ms", method "m", path and query "u", body
+    "b", status "s", response text "r" and kept response headers "h". Request headers,
+    which carry the key and signatures, and nonces are not written, and the key and
+    secret are masked wherever else they appear.
+    """
+
+    def __init__(self, path: str | Path, secrets: list[str] | None = None) -> None:
+        self.path = Path(path)
+        self.secrets = [s for s in (secrets or []) if s]
+        self.lock = threading.Lock()
+        self.file = self.path.open("a", encoding="utf-8")
+        self.records = 0
+
+    def _redact(self, text: str) -> str:
+        for secret in self.secrets:
+            text = text.replace(secret, REDACTED)
+        return text
+
+    def record(
+        self,
+        method: str,
+        url: str,
+        headers: dict[str, str] | None,
+        data: Any,
+        response: Any,
+        elapsed: float,
+    ) -> None:
+        method, target, body = request_key(method, url, headers, data)
+        entry: dict[str, Any] = {
+            "t": round(time.time(), 3),
+            "ms": round(elapsed * 1000, 1),
+            "m": method,
+            "u": self._redact(target),
+            "b": self._redact(body),
+            "s": response.status_code,
+            "r": self._redact(response.text),
+        }
+        kept = {
+            name: response.headers[name]
+            for name in KEPT_RESPONSE_HEADERS
+            if name in response.headers
+        }
+        if kept:
+            entry["h"] = kept
+        line = json.dumps(entry, separators=(",", ":"), ensure_ascii=False)
+        with self.lock:
+            self.file.write(line + "\n")
+            self.file.flush()
+            self.records += 1
+
+    def close(self) -> None:
+        with self.lock:
+            self.file.close()
+
+
+class RecordedResponse:
+    """The parts of a requests.Response the exchange clients read"""
+
+    def __init__(self, status_code: int, text: str, headers: dict[str, str] | None = None) -> None:
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers or {}
+
+    @property
+    def content(self) -> bytes:
+        return self.text.encode("utf-8")
+
+    def json(self) -> Any:
+        return json.loads(self.text)
+
+
+def load_journal(path: str | Path) -> list[dict[str, Any]]:
+    """The entries of a journal file. A line cut short by a crash is skipped"""
+    entries = []
+    with Path(path).open(encoding="utf-8") as f:
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+    return entries
+
+
+class JournalReplayer:
+    """
+    Answers requests from a journal. Requests are matched on method, path and query
+    and body; the responses recorded for one request are served in recorded order, and
+    the last one again once they run out. Nothing waits for the recorded latencies.
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        self.lock = threading.Lock()
+        self.responses: dict[tuple[str, str, str], deque[dict[str, Any]]] = {}
+        self.last: dict[tuple[str, str, str], dict[str, Any]] = {}
+        self.served = 0
+        self.misses = 0
+        self.recorded_ms = 0.0
+        for entry in load_journal(path):
+            key = (entry["m"], entry["u"], entry["b"])
+            self.responses.setdefault(key, deque()).append(entry)
+
+    def respond(
+        self, method: str, url: str, headers: dict[str, str] | None = None, data: Any = None
+    ) -> RecordedResponse:
+        key = request_key(method, url, headers, data)
+        with self.lock:
+            queue = self.responses.get(key)
+            if queue:
+                entry = queue.popleft()
+                self.last[key] = entry
+            elif key in self.last:
+                entry = self.last[key]
+            else:
+                self.misses += 1
+                raise JournalMiss(f"No recorded response for {key[0]} {key[1]} {key[2]}")
+            self.served += 1
+            self.recorded_ms += float(entry.get("ms", 0))
+        return RecordedResponse(int(entry["s"]), str(entry["r"]), entry.get("h"))
+
+    def stats(self) -> dict[str, Any]:
+        with self.lock:
+            return {
+                "served": self.served,
+                "misses": self.misses,
+                "unused": sum(len(queue) for queue in self.responses.values()),
+                "recorded_ms": round(self.recorded_ms, 1),
+            }
@@ -0,0 +1,159 @@
+"""
+Decoding of exchange responses, with msgspec or orjson when they are installed
+"""
+
+import importlib
+import importlib.util
+import json
+from typing import Any, TypedDict
+
+
+MSGSPEC_LOADED = importlib.util.find_spec("msgspec") is not None
+ORJSON_LOADED = importlib.util.find_spec("orjson") is not None
+
+AUTO = "auto"
+MSGSPEC = "msgspec"
+ORJSON = "orjson"
+STDLIB = "json"
+DECODER_NAMES = (AUTO, MSGSPEC, ORJSON, STDLIB)
+
+
+# Bitfinex v1 payloads the bot reads every cycle. Numbers the converters compute with
+# are decoded as numbers; amounts that are passed on as Poloniex strings stay strings.
+
+
+class LendbookLevel(TypedDict):
+    rate: float
+    amount: float
+    period: int
+
+
+class Lendbook(TypedDict):
+    asks: list[LendbookLevel]
+    bids: list[LendbookLevel]
+
+
+class Offer(TypedDict):
+    id: int
+    currency: str
+    rate: float
+    period: int
+    direction: str
+    timestamp: float
+    remaining_amount: str
+
+
+class Credit(TypedDict):
+    id: int
+    currency: str
+    rate: float
+    period: int
+    amount: str
+    timestamp: float
+
+
+class Balance(TypedDict):
+    type: str
+    currency: str
+    amount: str
+    available: str
+
+
+LENDBOOK = "lendbook"
+OFFERS = "offers"
+CREDITS = "credits"
+BALANCES = "balances"
+PAYLOAD_TYPES: dict[str, Any] = {
+    LENDBOOK: Lendbook,
+    OFFERS: list[Offer],
+    CREDITS: list[Credit],
+    BALANCES: list[Balance],
+}
+
+
+class JsonDecoder:
+    """
+    Decodes response bodies with the standard library. Subclasses use a faster
+    library. Every decoder raises ValueError for a body that is not valid JSON.
+    """
+
+    name = STDLIB
+
+    def loads(self, content: bytes | str) -> Any:
+        return json.loads(content)
+
+    def decode(self, content: bytes | str, payload_type: str | None = None) -> Any:  # noqa: ARG002
+        """
+        Decodes the body. `payload_type` names one of PAYLOAD_TYPES the body is
+        expected to be; a decoder that supports typed decoding converts its fields
+        while parsing, and any other body is decoded as plain JSON.
+        """
+        return self.loads(content)
+
+    def decode_response(self, response: Any, payload_type: str | None = None) -> Any:
+        content = getattr(response, "content", None)
+        if not isinstance(content, bytes | str):
+            # Responses that only offer json(), like test doubles
+            return response.json()
+        return self.decode(content, payload_type)
+
+
+class OrjsonDecoder(JsonDecoder):
+    name = ORJSON
+
+    def __init__(self) -> None:
+        self.orjson = importlib.import_module("orjson")
+
+    def loads(self, content: bytes | str) -> Any:
+        # orjson.JSONDecodeError is a ValueError
+        return self.orjson.loads(content)
+
+
+class MsgspecDecoder(JsonDecoder):
+    name = MSGSPEC
+
+    def __init__(self) -> None:
+        self.msgspec = importlib.import_module("msgspec")
+        self.decoder = self.msgspec.json.Decoder()
+        # strict=False lets the typed decoders turn the exchange's numeric strings
+        # into numbers
+        self.typed = {
+            name: self.msgspec.json.Decoder(payload, strict=False)
+            for name, payload in PAYLOAD_TYPES.items()
+        }
+
+    def loads(self, content: bytes | str) -> Any:
+        try:
+            return self.decoder.decode(content)
+        except self.msgspec.DecodeError as ex:
+            raise ValueError(str(ex)) from ex
+
+    def decode(self, content: bytes | str, payload_type: str | None = None) -> Any:
+        typed = self.typed.get(payload_type) if payload_type else None
+        if typed is not None:
+            try:
+                return typed.decode(content)
+            except self.msgspec.DecodeError:
+                # An error message or a changed schema, keep every field
+                pass
+        return self.loads(content)
+
+
+def create_decoder(name: str = AUTO) -> JsonDecoder:
+    """
+    The decoder `name`, or with "auto" the fastest one installed. Raises ValueError
+    if the requested library is not installed.
+    """
+    if name == AUTO:
+        name = MSGSPEC if MSGSPEC_LOADED else ORJSON if ORJSON_LOADED else STDLIB
+    if name == MSGSPEC:
+        if not MSGSPEC_LOADED:
+            raise ValueError("json_decoder is msgspec, but msgspec is not installed")
+        return MsgspecDecoder()
+    if name == ORJSON:
+        if not ORJSON_LOADED:
+            raise ValueError("json_decoder is orjson, but orjson is not installed")
+        return OrjsonDecoder()
+    if name == STDLIB:
+        return JsonDecoder()
+    raise ValueError(f"Unknown json_decoder {name}, expected one of {DECODER_NAMES}")
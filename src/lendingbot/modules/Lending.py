@@ -1,17 +1,31 @@
+import asyncio
+import dataclasses
 import sched
 import threading
 import time
+from collections.abc import Callable, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import AbstractContextManager, nullcontext
 from dataclasses import dataclass
 from decimal import Decimal
 from typing import Any
 
-from . import Configuration
+from . import Configuration, Reconciliation
+from .AsyncExchangeApi import AsyncExchangeApi
+from .BookDepth import BookDepth, BookExhausted
+from .CycleSnapshot import OPEN_LOAN_OFFERS, TICKER, CycleSnapshot
 from .ExchangeApi import ExchangeApi
+from .FixedPoint import amount_decimal, amount_units, rate_decimal, rate_units, split_units
 from .Logger import Logger
+from .OrderBook import BookSide, OrderBook
+from .Reconciliation import LendOffer
 from .Utils import format_amount_currency, format_rate_pct
+from .XDayCurve import XDayCurve
 
 
 SATOSHI = Decimal(10) ** -8
+# The FRR delta range is stepped through in this many steps, hard coded for now
+FRR_DELTA_STEPS = 5
 
 
 @dataclass
@@ -55,7 +69,9 @@ class LendingEngine:
         self.gap_bottom_default: Decimal = Decimal(0)
         self.gap_top_default: Decimal = Decimal(0)
         self.gap_mode_default: Configuration.GapMode | bool | str = ""
-        self.xday_threshold: str = ""
+        # Lending periods by rate, compiled from the xday thresholds of every coin
+        self.default_xday_curve: XDayCurve = XDayCurve([], [])
+        self.xday_curves: dict[str, XDayCurve] = {}
         self.min_loan_size: Decimal = Decimal(0)
         self.min_loan_sizes: dict[str, Decimal] = {}
 
@@ -70,19 +86,36 @@ class LendingEngine:
         self.loans_provided: list[dict[str, Any]] = []
 
         self.frrdelta_cur_step: int = 0
+        # The FRR delta step of each currency of the current lending cycle
+        self.frrdelta_steps: dict[str, int] = {}
         self.frrdelta_min: Decimal = Decimal(0)
         self.frrdelta_max: Decimal = Decimal(0)
         self.debug_on: bool = False
         self.lending_paused: bool = False
         self.last_lending_status: bool | None = None
 
-        self.loan_orders_request_limit: dict[str, int] = {}
-        self.default_loan_orders_request_limit: int = 5
+        # Order book levels to request per currency, grown and shrunk to the gaps
+        self.book_depth = BookDepth()
+        self.loan_orders_request_limit: dict[str, int] = self.book_depth.limits
         self.compete_rate: float = 0.00064
         self.analysis_method: str = "percentile"
 
+        # Fetched ahead of lending by lend_all_async. Order books are stored with the
+        # request limit they were fetched with.
+        self.prefetched_loan_orders: dict[str, tuple[int, OrderBook]] = {}
+        self.prefetched_frr: dict[str, float] = {}
+        # Open offers of the currencies being reconciled, taken off their order books
+        self.own_offers: dict[str, list[dict[str, Any]]] = {}
+
+        # Diff open offers against the desired ones instead of canceling them all
+        self.reconcile_offers: bool = False
+        self.reconcile_stats: dict[str, int] = self._new_reconcile_stats()
+
         self.scheduler: sched.scheduler | None = None
 
+        # Guards the state that currencies lent on several threads share
+        self.state_lock = threading.Lock()
+
     def initialize(self, dry_run: bool = False) -> None:
         """
         Initialize the LendingEngine state from the injected configuration.
@@ -103,12 +136,7 @@ class LendingEngine:
             else self.default_coin_cfg.gap_bottom
         )
 
-        # xday string reconstruction
-        xdays = self.default_coin_cfg.xday_thresholds
-        if xdays:
-            self.xday_threshold = ",".join([f"{x.rate}:{x.days}" for x in xdays])
-        else:
-            self.xday_threshold = ""
+        self.default_xday_curve = XDayCurve.from_thresholds(self.default_coin_cfg.xday_thresholds)
 
         self.min_loan_size = self.default_coin_cfg.min_loan_size
 
@@ -116,12 +144,16 @@ class LendingEngine:
         # Iterate over ALL active currencies, not just those with specific overrides
         self.coin_cfg = {}
         self.min_loan_sizes = {}
+        self.xday_curves = {}
         for symbol in self.config.api.all_currencies:
             cc = self.config.get_coin_config(symbol)
             self.coin_cfg[symbol] = cc
             self.min_loan_sizes[symbol] = cc.min_loan_size
+            self.xday_curves[symbol] = XDayCurve.from_thresholds(cc.xday_thresholds)
 
         self.transferable_currencies = list(self.config.bot.transferable_currencies)
+        # A dry run never places offers, so there is nothing to reconcile
+        self.reconcile_offers = self.config.bot.reconcile.enabled and not dry_run
 
         self.frrdelta_min = self.default_coin_cfg.frr_delta_min
         self.frrdelta_max = self.default_coin_cfg.frr_delta_max
@@ -159,6 +191,14 @@ class LendingEngine:
             return Decimal(self.min_loan_sizes[currency])
         return self.min_loan_size
 
+    def get_xday_curve(self, currency: str | None) -> XDayCurve:
+        """
+        Gets the xday curve of a specific currency, or the default one.
+        """
+        if currency is not None and currency in self.xday_curves:
+            return self.xday_curves[currency]
+        return self.default_xday_curve
+
     @staticmethod
     def parse_xday_threshold(xday_threshold_str: str) -> tuple[list[float], list[str]]:
         """
@@ -184,33 +224,29 @@ class LendingEngine:
             return rate - 0.000001
         return rate
 
-    def _calculate_duration(self, rate: float, requested_days: str) -> str:
+    def _calculate_duration(
+        self, rate: float, requested_days: str, currency: str | None = None
+    ) -> str:
         """
         Calculates the duration (days) based on rate thresholds and end_date.
         """
-        days = requested_days
-        rates, xdays = self.parse_xday_threshold(self.xday_threshold)
+        return self._calculate_durations([rate], [requested_days], currency)[0]
 
-        if days == "2" and len(rates) > 0:
+    def _calculate_durations(
+        self, rates: Sequence[float], requested_days: Sequence[str], currency: str | None = None
+    ) -> list[str]:
+        """
+        Calculates the durations (days) of several offers of a currency at once, based on
+        its rate thresholds and end_date.
+        """
+        days = list(requested_days)
+        curve = self.get_xday_curve(currency)
+        mapped = [i for i, d in enumerate(days) if d == "2"]
+        if len(curve) > 0 and mapped:
             # map rate to xdays, use interpolation if rate is not in the list
-            if rate < rates[0]:
-                days = xdays[0]
-            else:
-                for i in range(len(rates)):
-                    if rate <= rates[i]:
-                        # linear interpolation
-                        days = str(
-                            int(xdays[i - 1])
-                            + int(
-                                (int(xdays[i]) - int(xdays[i - 1]))
-                                * (rate - rates[i - 1])
-                                / (rates[i] - rates[i - 1])
-                            )
-                        )
-                        break
-                else:
-                    # If rate is greater than the last rate, use the last xdays
-                    days = xdays[-1]
+            curve_days = curve.days_for_rates([rates[i] for i in mapped]).tolist()
+            for i, d in zip(mapped, curve_days, strict=True):
+                days[i] = str(d)
 
         if self.config.bot.end_date:
             days_remaining = int(self.data.get_max_duration(self.config.bot.end_date, "order"))
@@ -223,42 +259,86 @@ class LendingEngine:
                     self.log.log(self.data.stringify_total_lent(self.data.get_total_lent()))
                     self.log.persistStatus()
                 exit(0)
-            if int(days) > days_remaining:
-                days = str(days_remaining)
+            days = [str(days_remaining) if int(d) > days_remaining else d for d in days]
 
         return days
 
-    def create_lend_offer(
+    def _build_lend_offer(
         self, currency: str, amt: str | Decimal, rate: str | float | Decimal, days: str = "2"
-    ) -> None:
+    ) -> LendOffer:
         """
-        Creates a new lending offer on the exchange.
+        Applies the competition adjustment and the duration rules to an order.
         """
-        original_rate = float(rate)
-        rate_f = self._adjust_rate_for_competition(original_rate)
-        amt_s = f"{Decimal(amt):.8f}"
+        return self._build_lend_offers(currency, [(amt, rate, days)])[0]
 
-        days = self._calculate_duration(rate_f, days)
+    def _build_lend_offers(
+        self, currency: str, planned: Sequence[tuple[str | Decimal, str | float | Decimal, str]]
+    ) -> list[LendOffer]:
+        """
+        Applies the competition adjustment and the duration rules to the orders of a
+        currency, working out all their durations in one go.
+        """
+        if not planned:
+            return []
+        original_rates = [float(rate) for _, rate, _ in planned]
+        rates = [self._adjust_rate_for_competition(rate) for rate in original_rates]
+        durations = self._calculate_durations(rates, [days for _, _, days in planned], currency)
+        return [
+            LendOffer(currency, Decimal(f"{Decimal(amt):.8f}"), rate_f, int(days), original_rate)
+            for (amt, _, _), rate_f, days, original_rate in zip(
+                planned, rates, durations, original_rates, strict=True
+            )
+        ]
 
-        print(
-            f"Lending {format_amount_currency(amt_s, currency)} by rate {format_rate_pct(rate_f)} for {days} days"
-        )
+    def _submit_lend_offers(self, offers: list[LendOffer]) -> list[Exception]:
+        """
+        Places the offers with one batch call. Returns the errors of the offers the
+        exchange refused.
+        """
+        for offer in offers:
+            print(
+                f"Lending {format_amount_currency(f'{offer.amount:.8f}', offer.currency)} by rate {format_rate_pct(offer.rate)} for {offer.days} days"
+            )
+        if self.dry_run or not offers:
+            return []
 
-        if not self.dry_run:
-            msg = self.api.create_loan_offer(currency, float(amt_s), int(days), 0, float(rate_f))
-            # Get thresholds again for notification check (logic from original)
-            _, xdays_list = self.parse_xday_threshold(self.xday_threshold)
+        errors: list[Exception] = []
+        for offer, msg in zip(offers, self.api.create_loan_offers(offers), strict=True):
+            if isinstance(msg, Exception):
+                errors.append(msg)
+                continue
+            amt_s = f"{offer.amount:.8f}"
+            days = str(offer.days)
             if (
-                len(xdays_list) > 0
-                and int(days) == int(xdays_list[-1])
-                and self.config.notifications.notify_xday_threshold
+                self.config.notifications.notify_xday_threshold
+                and offer.days == self.get_xday_curve(offer.currency).max_days
             ):
-                text = f"{format_amount_currency(amt_s, currency)} loan placed for {days} days at a rate of {format_rate_pct(rate_f)}"
+                text = f"{format_amount_currency(amt_s, offer.currency)} loan placed for {days} days at a rate of {format_rate_pct(offer.rate)}"
                 if self.log:
                     self.log.notify(text, self.config.notifications.model_dump())
             if self.log:
                 # Pass original_rate to show compete adjustment info
-                self.log.offer(amt_s, currency, float(rate_f), days, msg, original_rate)
+                self.log.offer(amt_s, offer.currency, offer.rate, days, msg, offer.original_rate)
+        return errors
+
+    def create_lend_offer(
+        self, currency: str, amt: str | Decimal, rate: str | float | Decimal, days: str = "2"
+    ) -> None:
+        """
+        Creates a new lending offer on the exchange.
+        """
+        errors = self._submit_lend_offers([self._build_lend_offer(currency, amt, rate, days)])
+        if errors:
+            raise errors[0]
+
+    def _next_frrdelta_step(self) -> int:
+        """Takes the next of the FRR delta steps, which are used in turn"""
+        with self.state_lock:
+            if self.frrdelta_cur_step > FRR_DELTA_STEPS:
+                self.frrdelta_cur_step = 0
+            cur_step = self.frrdelta_cur_step
+            self.frrdelta_cur_step += 1
+        return cur_step
 
     def get_frr_or_min_daily_rate(self, cur: str) -> RateCalcInfo:
         """
@@ -280,20 +360,21 @@ class LendingEngine:
         if frr_d_min > frr_d_max:
             frr_d_min, frr_d_max = frr_d_max, frr_d_min
 
-        # Let's use hard coded steps for now
-        frr_delta_steps = 5
-        frr_delta_step = (frr_d_max - frr_d_min) / frr_delta_steps
+        frr_delta_step = (frr_d_max - frr_d_min) / FRR_DELTA_STEPS
 
-        if self.frrdelta_cur_step > frr_delta_steps:
-            self.frrdelta_cur_step = 0
-        frr_delta_pct = frr_d_min + (frr_delta_step * self.frrdelta_cur_step)
-        current_step = self.frrdelta_cur_step + 1  # 1-indexed for display
-        self.frrdelta_cur_step += 1
+        cur_step = self.frrdelta_steps.get(cur)
+        if cur_step is None:
+            cur_step = self._next_frrdelta_step()
+        frr_delta_pct = frr_d_min + (frr_delta_step * cur_step)
+        current_step = cur_step + 1  # 1-indexed for display
 
         exchange_name = str(self.config.api.exchange.value).upper()
 
         if exchange_name == "BITFINEX" and frr_as_min:
-            frr_base = Decimal(self.api.get_frr(cur))
+            prefetched_frr = self.prefetched_frr.get(cur)
+            frr_base = Decimal(
+                prefetched_frr if prefetched_frr is not None else self.api.get_frr(cur)
+            )
             # Apply relative percentage: rate = FRR * (1 + pct/100)
             frr_rate = frr_base * (1 + frr_delta_pct / 100)
             if frr_rate > min_rate:
@@ -386,84 +467,93 @@ class LendingEngine:
             # Non-FRR mode
             self.log.log(f"[{cur}] Rate: min_rate {format_rate_pct(info.min_rate)}")
 
-    def construct_order_books(self, active_cur: str) -> tuple[dict[str, Any], dict[str, Any]]:
+    def construct_order_books(self, active_cur: str) -> tuple[BookSide, BookSide]:
         """
-        Fetches the loan order book from the exchange and structures it.
-        Returns (demand_book, offer_book).
+        Fetches the loan order book from the exchange.
+        Returns (demand_book, offer_book). The offers leave out the currency's own
+        open offers while it is reconciled.
         """
-        # make sure we have a request limit for this currency
-        if active_cur not in self.loan_orders_request_limit:
-            self.loan_orders_request_limit[active_cur] = self.default_loan_orders_request_limit
-
-        loans = self.api.return_loan_orders(active_cur, self.loan_orders_request_limit[active_cur])
-        empty_book: dict[str, list[Any]] = {"rates": [], "volumes": [], "rangeMax": []}
-        if not loans:
-            return empty_book, empty_book
-
-        resps = []
-        for load_type in ("demands", "offers"):
-            rate_book = []
-            volume_book = []
-            range_max_book = []
-            for load in loans.get(load_type, []):
-                rate_book.append(load["rate"])
-                volume_book.append(load["amount"])
-                range_max_book.append(load["rangeMax"])
-            resp = {"rates": rate_book, "volumes": volume_book, "rangeMax": range_max_book}
-            resps.append(resp)
-
-        return resps[0], resps[1]
+        limit = self.book_depth.limit(active_cur)
+        prefetched = self.prefetched_loan_orders.get(active_cur)
+        if prefetched is not None and prefetched[0] == limit:
+            book = prefetched[1]
+        else:
+            book = self.api.return_loan_book(active_cur, limit)
+        own = self.own_offers.get(active_cur)
+        if own:
+            offers = book.offers.without((float(o["rate"]), float(o["amount"])) for o in own)
+            return book.demands, offers
+        return book.demands, book.offers
 
     def get_gap_rate(
         self,
         active_cur: str,
         gap: Decimal,
-        order_book: dict[str, Any],
+        order_book: BookSide,
         cur_total_balance: Decimal,
         raw: bool = False,
     ) -> Decimal:
         """
         Calculates the lending rate at a specific depth (gap) in the order book.
         """
-        if active_cur not in self.loan_orders_request_limit:
-            self.loan_orders_request_limit[active_cur] = self.default_loan_orders_request_limit
+        return self.get_gap_rates(active_cur, [gap], order_book, cur_total_balance, raw)[0]
 
-        gap_expected = gap if raw else gap * cur_total_balance / Decimal("100.0")
-        gap_sum = Decimal(0)
+    def get_gap_rates(
+        self,
+        active_cur: str,
+        gaps: Sequence[Decimal],
+        order_book: BookSide,
+        cur_total_balance: Decimal,
+        raw: bool = False,
+    ) -> list[Decimal]:
+        """
+        Calculates the lending rates at several depths (gaps) in the order book, each
+        one as get_gap_rate does, with one pass over the book. Raises BookExhausted if
+        a gap lies beyond a book that may go deeper than the levels requested.
+        """
+        return self._gap_rates(active_cur, gaps, order_book, cur_total_balance, raw)[0]
 
+    def _gap_rates(
+        self,
+        active_cur: str,
+        gaps: Sequence[Decimal],
+        order_book: BookSide,
+        cur_total_balance: Decimal,
+        raw: bool,
+    ) -> tuple[list[Decimal], int]:
+        """
+        get_gap_rates, and the number of levels the rates were taken from
+        """
         # If order book is empty, return max rate
-        if not order_book["volumes"]:
-            return self.max_daily_rate
-
-        # If gap is 0 or less, return the first available rate (most aggressive)
-        if gap_expected <= 0:
-            return Decimal(str(order_book["rates"][0]))
-
-        for i, volume in enumerate(order_book["volumes"]):
-            gap_sum += Decimal(str(volume))
-            if gap_sum >= gap_expected:
-                # Original logic returned rates[i+1] if gap was filled at index i
-                if i + 1 < len(order_book["rates"]):
-                    return Decimal(str(order_book["rates"][i + 1]))
-                return self.max_daily_rate
-
-            # Check if we hit the request limit and don't have enough volume
-            if i == len(order_book["volumes"]) - 1 and len(
-                order_book["volumes"]
-            ) == self.loan_orders_request_limit.get(
-                active_cur, self.default_loan_orders_request_limit
+        if len(order_book) == 0:
+            return [self.max_daily_rate] * len(gaps), 0
+
+        expected = [gap if raw else gap * cur_total_balance / Decimal("100.0") for gap in gaps]
+        filled_at = order_book.fill_indices(expected)
+        rates = []
+        levels_used = 1
+        for gap_expected, i in zip(expected, filled_at, strict=True):
+            # If gap is 0 or less, return the first available rate (most aggressive)
+            if gap_expected <= 0:
+                rates.append(order_book.rate_at(0))
+            # Original logic returned rates[i+1] if gap was filled at index i
+            elif i + 1 < len(order_book):
+                rates.append(order_book.rate_at(i + 1))
+                levels_used = max(levels_used, i + 2)
+            elif (
+                i < len(order_book)
+                or len(order_book) != self.book_depth.limit(active_cur)
+                or self.book_depth.at_maximum(active_cur)
             ):
-                if self.log:
-                    self.log.log(
-                        f"{active_cur}: Not enough offers in response, adjusting request limit to {self.loan_orders_request_limit.get(active_cur, self.default_loan_orders_request_limit)}"
-                    )
-                raise StopIteration
-
-        # If we reached the end of the book without filling the gap, return max rate
-        return self.max_daily_rate
-
-        # If we reached the end of the book without filling the gap, return max rate
-        return self.max_daily_rate
+                # Filled at the last level, or the whole book is shorter than requested
+                rates.append(self.max_daily_rate)
+                levels_used = len(order_book)
+            else:
+                # Not enough volume and the book was cut off at the request limit
+                raise BookExhausted(
+                    active_cur, float(gap_expected), float(order_book.amounts.sum())
+                )
+        return rates, levels_used
 
     def get_cur_spread(self, spread: int, cur_active_bal: Decimal, active_cur: str) -> int:
         """
@@ -540,36 +630,25 @@ class LendingEngine:
         else:
             cur_spread = self.get_cur_spread(self.spread_lend, cur_active_bal, cur)
 
+        # Rates in units of 1e-10 and amounts in satoshis, see FixedPoint
         if cur_spread == 1:
-            rate_step = Decimal(0)
-            bottom_rate = Decimal(0)
+            order_rates = [0]
         else:
             top_rate, bottom_rate = self.get_gap_mode_rates(
                 cur, cur_active_bal, cur_total_balance, ticker
             )
-            gap_diff = top_rate - bottom_rate
-            rate_step = gap_diff / (cur_spread - 1)
-
-        order_rates = []
-        for i in range(cur_spread):
-            new_rate = bottom_rate + (rate_step * i)
-            order_rates.append(new_rate)
+            bottom = rate_units(bottom_rate)
+            gap_diff = rate_units(top_rate) - bottom
+            order_rates = [bottom + gap_diff * i // (cur_spread - 1) for i in range(cur_spread)]
 
         # Condensing and logic'ing time
-        for i, rate in enumerate(order_rates):
-            if rate > self.max_daily_rate:
-                order_rates[i] = self.max_daily_rate
-
-        new_order_rates = sorted(set(order_rates))
-        new_order_amounts = []
-        for _ in range(len(new_order_rates)):
-            new_amount = self.data.truncate(cur_active_bal / len(new_order_rates), 8)
-            new_order_amounts.append(Decimal(str(new_amount)))
-
-        remainder = cur_active_bal - sum(new_order_amounts)
-        if remainder > 0:  # If truncating causes remainder, add that to first order.
-            new_order_amounts[0] += remainder
+        max_rate = rate_units(self.max_daily_rate)
+        rate_list = sorted({min(rate, max_rate) for rate in order_rates})
+        # Truncating to satoshis leaves a remainder, which is added to the first order
+        amounts = split_units(amount_units(cur_active_bal), len(rate_list))
 
+        new_order_amounts = [amount_decimal(amount) for amount in amounts]
+        new_order_rates = [rate_decimal(rate) for rate in rate_list]
         resp = {"amounts": new_order_amounts, "rates": new_order_rates}
         return resp
 
@@ -591,24 +670,49 @@ class LendingEngine:
             mode, bottom, top = self._get_effective_gap_config(cur)
 
         _, offer_book = self.construct_order_books(cur)
-        if not offer_book or not offer_book["rates"]:
+        if len(offer_book) == 0:
             return [self.max_daily_rate, self.max_daily_rate]
 
         bottom_depth, top_depth, is_raw = self._calculate_gap_depths(
             mode, bottom, top, cur, cur_total_balance, ticker
         )
 
-        bottom_rate = self.get_gap_rate(cur, bottom_depth, offer_book, cur_total_balance, is_raw)
-        top_rate = self.get_gap_rate(cur, top_depth, offer_book, cur_total_balance, is_raw)
+        while True:
+            try:
+                (bottom_rate, top_rate), levels_used = self._gap_rates(
+                    cur, [bottom_depth, top_depth], offer_book, cur_total_balance, is_raw
+                )
+                break
+            except BookExhausted as ex:
+                # Fetch a deeper book of this currency only
+                limit = self.book_depth.grow(cur, ex.target, ex.volume)
+                if self.log:
+                    self.log.log(
+                        f"{cur}: Not enough offers in response, adjusting request limit to {limit}"
+                    )
+                _, offer_book = self.construct_order_books(cur)
+        self.book_depth.record(cur, levels_used)
 
         return [Decimal(str(top_rate)), Decimal(str(bottom_rate))]
 
-    def cancel_all(self) -> None:
+    def cancel_all(self, snapshot: CycleSnapshot | None = None) -> int:
         """
         Cancels all open lending offers for active currencies.
+        Reads the open offers and lending balances from the snapshot when given.
+        Returns the number of canceled offers. Does nothing when offers are
+        reconciled, which cancels only the offers that changed while lending.
         """
-        loan_offers = self.api.return_open_loan_offers()
-        available_balances = self.api.return_available_account_balances("lending")
+        if self.reconcile_offers:
+            return 0
+        if snapshot is not None:
+            loan_offers = snapshot.open_loan_offers
+            lending_balances = snapshot.lending_balances
+        else:
+            loan_offers = self.api.return_open_loan_offers()
+            lending_balances = self.api.return_available_account_balances("lending").get(
+                "lending", {}
+            )
+        canceled = 0
         for cur in loan_offers:
             if cur not in self.config.api.all_currencies:
                 continue
@@ -616,9 +720,8 @@ class LendingEngine:
                 # don't cancel disabled coin
                 continue
             if self.config.bot.keep_stuck_orders:
-                lending_balances = available_balances["lending"]
                 if isinstance(lending_balances, dict) and cur in lending_balances:
-                    cur_sum = float(available_balances["lending"][cur])
+                    cur_sum = float(lending_balances[cur])
                 else:
                     cur_sum = 0.0
                 for offer in loan_offers[cur]:
@@ -626,23 +729,36 @@ class LendingEngine:
             else:
                 cur_sum = float(self.get_min_loan_size(cur)) + 1.0
             if cur_sum >= float(self.get_min_loan_size(cur)):
-                for offer in loan_offers[cur]:
-                    if not self.dry_run:
-                        try:
-                            msg = self.api.cancel_loan_offer(cur, offer["id"])
-                            if self.log:
-                                self.log.cancelOrder(cur, msg)
-                        except Exception as ex:
-                            if self.log:
-                                self.log.log(f"Error canceling loan offer: {ex}")
+                if not self.dry_run and loan_offers[cur]:
+                    canceled += len(self._cancel_lend_offers(cur, loan_offers[cur], all_open=True))
             else:
                 print(f"Not enough {cur} to lend if bot canceled open orders. Not cancelling.")
+        return canceled
 
-    def lend_cur(
+    def _cancel_lend_offers(
+        self, cur: str, offers: list[dict[str, Any]], all_open: bool = False
+    ) -> list[dict[str, Any]]:
+        """
+        Cancels the offers with one batch call. Returns the offers that were canceled.
+        """
+        canceled = []
+        results = self.api.cancel_loan_offers(cur, [o["id"] for o in offers], all_open=all_open)
+        for offer, msg in zip(offers, results, strict=True):
+            if isinstance(msg, Exception):
+                if self.log:
+                    self.log.log(f"Error canceling loan offer: {msg}")
+                continue
+            canceled.append(offer)
+            if self.log:
+                self.log.cancelOrder(cur, msg)
+        return canceled
+
+    def plan_lend_offers(
         self, active_cur: str, total_lent_info: Any, lending_balances: dict[str, str], ticker: Any
-    ) -> int:
+    ) -> tuple[int, list[tuple[Decimal, Any, str]]]:
         """
-        Analyzes the market and places lend orders for a specific currency.
+        Analyzes the market and works out the lend orders for a specific currency.
+        Returns whether the currency is usable and the (amount, rate, days) orders.
         """
         active_cur_total_balance = Decimal(str(lending_balances[active_cur]))
         total_lent = total_lent_info.total_lent
@@ -655,81 +771,244 @@ class LendingEngine:
             self.log.updateStatusValue(active_cur, "totalCoins", active_cur_total_balance)
 
         demand_book, order_book = self.construct_order_books(active_cur)
-        if not order_book or not order_book["rates"] or not cur_min_daily_rate:
-            return 0
+        if len(order_book) == 0 or not cur_min_daily_rate:
+            return 0, []
 
         from . import MaxToLend
 
         # Pass the total_lent for this currency to enable max_active_amount limit
         cur_total_lent = total_lent.get(active_cur, Decimal(0))
-        active_bal = MaxToLend.amount_to_lend(
-            active_cur_total_balance,
+        active_bal = MaxToLend.amount_to_lend_units(
+            amount_units(active_cur_total_balance),
             active_cur,
-            Decimal(str(lending_balances[active_cur])),
-            Decimal(str(order_book["rates"][0])),
-            total_lent=cur_total_lent,
+            amount_units(lending_balances[active_cur]),
+            rate_units(order_book.rate_at(0)),
+            total_lent=amount_units(cur_total_lent),
         )
 
-        if float(active_bal) >= float(self.get_min_loan_size(active_cur)):
-            currency_usable = 1
-        else:
-            return 0
+        if active_bal < amount_units(self.get_min_loan_size(active_cur)):
+            return 0, []
 
-        orders = self.construct_orders(active_cur, active_bal, active_cur_total_balance, ticker)
+        planned: list[tuple[Decimal, Any, str]] = []
+        orders = self.construct_orders(
+            active_cur, amount_decimal(active_bal), active_cur_total_balance, ticker
+        )
+        min_rate = rate_units(cur_min_daily_rate)
         for i in range(len(orders["amounts"])):
-            below_min = Decimal(str(orders["rates"][i])) < Decimal(str(cur_min_daily_rate))
+            below_min = rate_units(orders["rates"][i]) < min_rate
 
             if self.config.bot.hide_coins and below_min:
                 if self.log:
                     self.log.log(
                         f"Not lending {active_cur} due to rate below {format_rate_pct(cur_min_daily_rate)} (actual: {format_rate_pct(orders['rates'][i])})"
                     )
-                return 0
+                return 0, []
             elif below_min:
-                rate = str(cur_min_daily_rate)
+                rate: str | Decimal = str(cur_min_daily_rate)
             else:
                 rate = orders["rates"][i]
 
             days = "2"
-            if demand_book and float(demand_book["rates"][0]) > self.compete_rate:
-                rate = demand_book["rates"][0]
-                days = str(demand_book["rangeMax"][0])
+            if len(demand_book) > 0 and float(demand_book.rate_at(0)) > self.compete_rate:
+                rate = demand_book.rate_at(0)
+                days = str(demand_book.periods[0])
                 if self.log:
                     self.log.log(
                         f"Competing offer found for {active_cur} at {format_rate_pct(rate)} for {days} days."
                     )
+            planned.append((orders["amounts"][i], rate, days))
 
-            try:
-                self.create_lend_offer(active_cur, orders["amounts"][i], rate, days)
-            except Exception as msg:
-                if "Amount must be at least " in str(msg):
-                    import re
-
-                    results = re.findall(r"[-+]?([0-9]*\.[0-9]+|[0-9]+)", str(msg))
-                    for result in results:
-                        if result:
-                            self.min_loan_sizes[active_cur] = Decimal(result)
-                            if self.log:
-                                self.log.log(
-                                    f"{active_cur}'s min_loan_size has been increased to the detected min: {result}"
-                                )
-                    return self.lend_cur(active_cur, total_lent_info, lending_balances, ticker)
-                else:
-                    raise msg
+        return 1, planned
+
+    def _learn_min_loan_size(self, active_cur: str, msg: Exception) -> bool:
+        """
+        Picks up the exchange's minimum offer size from an "Amount must be at least"
+        error. Returns False if the error is something else.
+        """
+        if "Amount must be at least " not in str(msg):
+            return False
+        import re
+
+        results = re.findall(r"[-+]?([0-9]*\.[0-9]+|[0-9]+)", str(msg))
+        for result in results:
+            if result:
+                self.min_loan_sizes[active_cur] = Decimal(result)
+                if self.log:
+                    self.log.log(
+                        f"{active_cur}'s min_loan_size has been increased to the detected min: {result}"
+                    )
+        return True
+
+    def lend_cur(
+        self, active_cur: str, total_lent_info: Any, lending_balances: dict[str, str], ticker: Any
+    ) -> int:
+        """
+        Analyzes the market and places lend orders for a specific currency.
+        """
+        currency_usable, planned = self.plan_lend_offers(
+            active_cur, total_lent_info, lending_balances, ticker
+        )
+        offers = self._build_lend_offers(active_cur, planned)
+        errors = self._submit_lend_offers(offers)
+        for msg in errors:
+            if not self._learn_min_loan_size(active_cur, msg):
+                raise msg
+        if errors and len(errors) == len(offers):
+            # Nothing was placed, so split the balance again with the learned minimum
+            return self.lend_cur(active_cur, total_lent_info, lending_balances, ticker)
 
         return currency_usable
 
-    def lend_all(self) -> None:
+    @staticmethod
+    def _new_reconcile_stats() -> dict[str, int]:
+        return dict.fromkeys(("kept", "canceled", "placed", "calls_saved"), 0)
+
+    def reconcile_cur(
+        self,
+        active_cur: str,
+        total_lent_info: Any,
+        lending_balances: dict[str, str],
+        open_offers: dict[str, list[dict[str, Any]]],
+        ticker: Any,
+    ) -> int:
         """
-        Main loop to attempt lending for all currencies with available balance.
+        Like lend_cur, but leaves the currency's open offers in place: works out the
+        orders lend_cur would place if every open offer were canceled, then cancels
+        and places only the offers that differ by more than the configured tolerances.
         """
-        total_lent_info = self.data.get_total_lent()
-        total_lent = total_lent_info.total_lent
-        lending_balances_data = self.api.return_available_account_balances("lending")
-        lending_balances = lending_balances_data.get("lending", {})
+        offers = open_offers.get(active_cur, [])
+        free = Decimal(str(lending_balances.get(active_cur, 0)))
+        available = free + sum((Decimal(str(o["amount"])) for o in offers), Decimal(0))
+        min_loan_size = self.get_min_loan_size(active_cur)
+        if self.config.bot.keep_stuck_orders and available < min_loan_size:
+            if offers:
+                print(
+                    f"Not enough {active_cur} to lend if bot canceled open orders. Not cancelling."
+                )
+            return 0
 
+        balances = {**lending_balances, active_cur: str(available)}
+        # Plan against the book as it would be with every open offer canceled
+        self.own_offers[active_cur] = offers
+        try:
+            currency_usable, planned = self.plan_lend_offers(
+                active_cur, total_lent_info, balances, ticker
+            )
+        finally:
+            del self.own_offers[active_cur]
+        desired = self._build_lend_offers(active_cur, planned)
+        reconcile_cfg = self.config.bot.reconcile
+        diff = Reconciliation.diff_offers(
+            desired, offers, reconcile_cfg.rate_tolerance, reconcile_cfg.amount_tolerance
+        )
+
+        canceled: list[dict[str, Any]] = []
+        if diff.cancel:
+            canceled = self._cancel_lend_offers(
+                active_cur, diff.cancel, all_open=len(diff.cancel) == len(offers)
+            )
+            free += sum((Decimal(str(o["amount"])) for o in canceled), Decimal(0))
+
+        batch = []
+        for offer in diff.place:
+            # Kept offers may hold slightly more than planned, within the tolerance
+            amount = min(offer.amount, free)
+            if amount < min_loan_size:
+                continue
+            batch.append(dataclasses.replace(offer, amount=amount))
+            free -= amount
+        refused = self._submit_lend_offers(batch)
+        for msg in refused:
+            if not self._learn_min_loan_size(active_cur, msg):
+                raise msg
+
+        # The calls canceling every open offer and placing the kept and new offers
+        # again would make, less the cancel and create calls made here
+        relist_calls = len(offers) + len(diff.keep) + len(batch)
+        calls_saved = relist_calls - len(diff.cancel) - len(batch)
+        with self.state_lock:
+            self.reconcile_stats["kept"] += len(diff.keep)
+            self.reconcile_stats["canceled"] += len(canceled)
+            self.reconcile_stats["placed"] += len(batch) - len(refused)
+            self.reconcile_stats["calls_saved"] += calls_saved
+        return currency_usable
+
+    def _uses_frr(self, cur: str) -> bool:
+        """
+        Whether the lending rate of cur is derived from the flash return rate.
+        """
+        if str(self.config.api.exchange.value).upper() != "BITFINEX":
+            return False
+        cfg = self.coin_cfg.get(cur, self.default_coin_cfg)
+        return cfg.strategy == Configuration.LendingStrategy.FRR
+
+    def needs_ticker(self) -> bool:
+        """
+        Whether lending needs the ticker (a currency uses the RawBTC gap mode).
+        """
+        if self.gap_mode_default == "rawbtc":
+            return True
+        return any(self.coin_cfg[cur_name].gap_mode == "rawbtc" for cur_name in self.coin_cfg)
+
+    def _get_lending_balances(self, snapshot: CycleSnapshot | None = None) -> Any:
         if self.dry_run:
-            lending_balances = self.data.get_on_order_balances()
+            return self.data.get_on_order_balances(snapshot)
+
+        if snapshot is not None:
+            return snapshot.lending_balances
+        lending_balances_data = self.api.return_available_account_balances("lending")
+        return lending_balances_data.get("lending", {})
+
+    def lend_all(self, snapshot: CycleSnapshot | None = None) -> None:
+        """
+        Main loop to attempt lending for all currencies with available balance.
+        Reads the active loans, balances and ticker from the snapshot when given.
+        """
+        self.prefetched_loan_orders = {}
+        self.prefetched_frr = {}
+        total_lent_info = self.data.get_total_lent(snapshot)
+        lending_balances = self._get_lending_balances(snapshot)
+        self._lend_currencies(total_lent_info, lending_balances, snapshot)
+
+    async def lend_all_async(self, snapshot: CycleSnapshot | None = None) -> None:
+        """
+        Same as lend_all, but fetches the lending state, then the order books of all
+        currencies and the FRRs of FRR-strategy currencies concurrently before lending.
+        A currency whose prefetch failed is fetched again while lending it.
+        """
+        api = AsyncExchangeApi(self.api)
+        total_lent_info, lending_balances = await asyncio.gather(
+            asyncio.to_thread(self.data.get_total_lent, snapshot),
+            asyncio.to_thread(self._get_lending_balances, snapshot),
+        )
+        currencies = [
+            cur for cur in lending_balances or {} if cur in self.config.api.all_currencies
+        ]
+        limits = {cur: self.book_depth.limit(cur) for cur in currencies}
+        books, frrs = await asyncio.gather(
+            api.fetch_loan_books(limits),
+            api.fetch_frrs(cur for cur in currencies if self._uses_frr(cur)),
+        )
+        self.prefetched_loan_orders = {
+            cur: (limits[cur], book)
+            for cur, book in books.items()
+            if not isinstance(book, BaseException)
+        }
+        self.prefetched_frr = {
+            cur: frr for cur, frr in frrs.items() if not isinstance(frr, BaseException)
+        }
+        try:
+            await asyncio.to_thread(
+                self._lend_currencies, total_lent_info, lending_balances, snapshot
+            )
+        finally:
+            self.prefetched_loan_orders = {}
+            self.prefetched_frr = {}
+
+    def _lend_currencies(
+        self, total_lent_info: Any, lending_balances: Any, snapshot: CycleSnapshot | None = None
+    ) -> None:
+        total_lent = total_lent_info.total_lent
 
         from . import MaxToLend
 
@@ -741,27 +1020,68 @@ class LendingEngine:
 
         usable_currencies = 0
         ticker: dict[str, dict[str, str]] | None = None
-        if self.gap_mode_default == "rawbtc":
-            ticker = self.api.return_ticker()
-        else:
-            for cur_name in self.coin_cfg:
-                if self.coin_cfg[cur_name].gap_mode == "rawbtc":
-                    ticker = self.api.return_ticker()
-                    break
+        if self.needs_ticker():
+            if snapshot is not None and snapshot.has(TICKER):
+                ticker = snapshot.ticker
+            else:
+                ticker = self.api.return_ticker()
 
         if self.log:
             self.log.log(f"Lending balances: {lending_balances}")
 
+        open_offers: dict[str, list[dict[str, Any]]] = {}
+        if self.reconcile_offers:
+            if snapshot is not None and snapshot.has(OPEN_LOAN_OFFERS):
+                open_offers = snapshot.open_loan_offers
+            else:
+                open_offers = self.api.return_open_loan_offers()
+            # Currencies whose whole balance sits in open offers need reconciling too
+            lending_balances = {**dict.fromkeys(open_offers, "0"), **(lending_balances or {})}
+        self.reconcile_stats = self._new_reconcile_stats()
+
+        currencies = []
+        for cur in lending_balances or {}:
+            if cur not in self.config.api.all_currencies:
+                continue
+            if (
+                self.reconcile_offers
+                and (cfg := self.coin_cfg.get(cur))
+                and cfg.max_active_amount == 0
+            ):
+                # don't touch disabled coin
+                continue
+            currencies.append(cur)
+
+        def lend(cur: str) -> int:
+            if self.reconcile_offers:
+                return self.reconcile_cur(
+                    cur, total_lent_info, lending_balances, open_offers, ticker
+                )
+            return self.lend_cur(cur, total_lent_info, lending_balances, ticker)
+
+        # The FRR delta steps go to the currencies in order, however they are lent
+        self.frrdelta_steps = {cur: self._next_frrdelta_step() for cur in currencies}
         try:
-            if lending_balances:
-                for cur in lending_balances:
-                    if cur in self.config.api.all_currencies:
-                        usable_currencies += self.lend_cur(
-                            cur, total_lent_info, lending_balances, ticker
-                        )
-        except StopIteration:
-            self.lend_all()
-            return
+            if self.config.bot.lend_workers > 1 and len(currencies) > 1:
+                outcomes = self._lend_in_parallel(currencies, lend)
+            else:
+                outcomes = [self._lend_or_error(cur, lend) for cur in currencies]
+        finally:
+            self.frrdelta_steps = {}
+
+        errors: list[tuple[str, Exception]] = []
+        for cur, outcome in zip(currencies, outcomes, strict=True):
+            if isinstance(outcome, Exception):
+                errors.append((cur, outcome))
+            else:
+                usable_currencies += outcome
+
+        if self.reconcile_offers and self.log:
+            stats = self.reconcile_stats
+            self.log.log(
+                f"Offers reconciled: kept {stats['kept']}, canceled {stats['canceled']}, "
+                f"placed {stats['placed']}, saved {stats['calls_saved']} API calls"
+            )
 
         self.sleep_time = (
             self.config.bot.period_inactive
@@ -769,6 +1089,55 @@ class LendingEngine:
             else self.config.bot.period_active
         )
 
+        if errors:
+            # The first error is handled as if the currencies had been lent in turn
+            for cur, error in errors[1:]:
+                if self.log:
+                    self.log.log_error(f"lending {cur}: {error}")
+            raise errors[0][1]
+
+    @staticmethod
+    def _lend_or_error(cur: str, lend: Callable[[str], int]) -> int | Exception:
+        """Whether cur was usable, or the error lending it"""
+        try:
+            return lend(cur)
+        except Exception as ex:
+            return ex
+
+    def _lend_in_parallel(
+        self, currencies: list[str], lend: Callable[[str], int]
+    ) -> list[int | Exception]:
+        """
+        Lends the currencies on up to lend_workers threads. The output of each currency
+        is held back until it is done, then written in the order of the currencies.
+        A currency that fails does not stop the others; its error is returned in place
+        of whether it was usable.
+        """
+
+        def run(cur: str) -> tuple[int | Exception, list[Callable[[], Any]]]:
+            hold: AbstractContextManager[list[Callable[[], Any]]] = (
+                self.log.hold_output() if self.log else nullcontext([])
+            )
+            with hold as held:
+                outcome = self._lend_or_error(cur, lend)
+            return outcome, held
+
+        outcomes: list[int | Exception] = []
+        workers = min(self.config.bot.lend_workers, len(currencies))
+        capture: AbstractContextManager[None] = (
+            self.log.capture_stdout() if self.log else nullcontext()
+        )
+        with (
+            capture,
+            ThreadPoolExecutor(max_workers=workers, thread_name_prefix="lend") as pool,
+        ):
+            for future in [pool.submit(run, cur) for cur in currencies]:
+                outcome, held = future.result()
+                if self.log:
+                    self.log.release(held)
+                outcomes.append(outcome)
+        return outcomes
+
     def transfer_balances(self) -> None:
         """
         Transfers all balances on the included list to Lending.
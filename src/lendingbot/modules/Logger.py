@@ -1,11 +1,15 @@
 import atexit
 import datetime
+import functools
 import json
 import shutil
 import sys
+import threading
 import time
 from collections import deque
-from typing import Any
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from typing import Any, TextIO
 
 from .Notify import send_notification
 from .Utils import format_amount_currency, format_rate_pct
@@ -90,6 +94,28 @@ class JsonOutput:
         self.jsonOutputCurrency[key] = str(value)
 
 
+class HeldStdout:
+    """
+    Stands in for sys.stdout while threads hold back their output: what a thread
+    holding its output prints is kept with the rest of its output, everything else is
+    written straight away.
+    """
+
+    def __init__(self, logger: "Logger", stream: TextIO) -> None:
+        self.logger = logger
+        self.stream = stream
+
+    def write(self, text: str) -> int:
+        self.logger._write(self.stream.write, text)
+        return len(text)
+
+    def flush(self) -> None:
+        self.stream.flush()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.stream, name)
+
+
 class Logger:
     def __init__(
         self,
@@ -100,6 +126,8 @@ class Logger:
     ) -> None:
         self._lent: str = ""
         self._daysRemaining: str = ""
+        # Output held back by the current thread, see hold_output
+        self._held = threading.local()
         self.output: JsonOutput | ConsoleOutput
         if json_file != "" and json_log_size != -1:
             self.output = JsonOutput(json_file, json_log_size, exchange, label)
@@ -107,6 +135,43 @@ class Logger:
             self.output = ConsoleOutput()
         self.refreshStatus()
 
+    def _write(self, method: Callable[..., Any], *args: Any) -> None:
+        """Writes output now, or keeps it if the current thread holds its output back"""
+        held: list[Callable[[], Any]] | None = getattr(self._held, "writes", None)
+        if held is None:
+            method(*args)
+        else:
+            held.append(functools.partial(method, *args))
+
+    @contextmanager
+    def hold_output(self) -> Iterator[list[Callable[[], Any]]]:
+        """
+        Holds back the output of the current thread, including what it prints while
+        capture_stdout is active. Yields the held writes, for release().
+        """
+        writes: list[Callable[[], Any]] = []
+        self._held.writes = writes
+        try:
+            yield writes
+        finally:
+            self._held.writes = None
+
+    @staticmethod
+    def release(writes: list[Callable[[], Any]]) -> None:
+        """Writes output held back by hold_output, in the order it was made"""
+        for write in writes:
+            write()
+
+    @contextmanager
+    def capture_stdout(self) -> Iterator[None]:
+        """Lets threads that hold back their output hold back their prints as well"""
+        stdout = sys.stdout
+        sys.stdout = HeldStdout(self, stdout)
+        try:
+            yield
+        finally:
+            sys.stdout = stdout
+
     @staticmethod
     def timestamp() -> str:
         ts = time.time()
@@ -114,14 +179,14 @@ class Logger:
 
     def log(self, msg: str) -> None:
         log_message = f"{self.timestamp()} {msg}"
-        self.output.printline(log_message)
+        self._write(self.output.printline, log_message)
         self.refreshStatus()
 
     def log_error(self, msg: str) -> None:
         log_message = f"{self.timestamp()} Error {msg}"
-        self.output.printline(log_message)
+        self._write(self.output.printline, log_message)
         if isinstance(self.output, JsonOutput):
-            print(log_message)
+            self._write(print, log_message)
         self.refreshStatus()
 
     def offer(
@@ -143,12 +208,12 @@ class Logger:
         status = "✓" if result == "Loan order placed." else result
 
         line = f"{self.timestamp()} [{cur}] Loan: {format_amount_currency(amt, cur)} @ {rate_info} for {days} days {status}"
-        self.output.printline(line)
+        self._write(self.output.printline, line)
         self.refreshStatus()
 
     def cancelOrder(self, cur: str, msg: Any) -> None:
         line = f"{self.timestamp()} Canceling {cur} order... {self.digestApiMsg(msg)}"
-        self.output.printline(line)
+        self._write(self.output.printline, line)
         self.refreshStatus()
 
     def refreshStatus(self, lent: str = "", days_remaining: str = "") -> None:
@@ -156,19 +221,19 @@ class Logger:
             self._lent = lent
         if days_remaining != "":
             self._daysRemaining = days_remaining
-        self.output.status(self._lent, self.timestamp(), self._daysRemaining)
+        self._write(self.output.status, self._lent, self.timestamp(), self._daysRemaining)
 
     def addSectionLog(self, section: str, key: str, value: Any) -> None:
         if hasattr(self.output, "addSectionLog"):
-            self.output.addSectionLog(section, key, value)
+            self._write(self.output.addSectionLog, section, key, value)
 
     def updateStatusValue(self, coin: str, key: str, value: Any) -> None:
         if hasattr(self.output, "statusValue"):
-            self.output.statusValue(coin, key, value)
+            self._write(self.output.statusValue, coin, key, value)
 
     def updateOutputCurrency(self, key: str, value: Any) -> None:
         if hasattr(self.output, "outputCurrency"):
-            self.output.outputCurrency(key, value)
+            self._write(self.output.outputCurrency, key, value)
 
     def persistStatus(self) -> None:
         if hasattr(self.output, "writeJsonFile"):
@@ -12,6 +12,9 @@ import pandas as pd
 
 from . import Configuration, Data
 from .ExchangeApi import ApiError
+from .OrderBook import format_amount
+from .RateLimiter import PUBLIC
+from .RequestScheduler import ANALYSIS, request_class
 
 
 class MarketDataException(Exception):
@@ -59,7 +62,7 @@ class MarketAnalysis:
         if len(self.currencies_to_analyse) != 0:
             for currency in self.currencies_to_analyse:
                 try:
-                    self.api.return_loan_orders(currency, 5)
+                    self.api.return_loan_book(currency, 5)
                 except Exception as cur_ex:
                     raise Exception(
                         f"ERROR: You entered an incorrect currency: '{currency}' to analyse the market of, please "
@@ -152,13 +155,15 @@ class MarketAnalysis:
         Perform a single market data update for a currency.
         """
         try:
-            raw_data = self.api.return_loan_orders(cur, levels)["offers"]
+            # Polling yields the request budget to the lending loop
+            with request_class(ANALYSIS):
+                offers = self.api.return_loan_book(cur, levels).offers
         except ApiError as ex:
             if "429" in str(ex):
                 if self.ma_debug_log:
                     print(
                         "Caught ERR_RATE_LIMIT, sleeping capture and increasing request delay. "
-                        f"Current {self.api.req_period}ms"
+                        f"Current {self.api.rate_limiter.bucket(PUBLIC).period}ms"
                     )
                 time.sleep(130)
             return
@@ -171,11 +176,13 @@ class MarketAnalysis:
             return
 
         market_data = []
+        rates = offers.rates.tolist()
+        amounts = offers.amounts.tolist()
         for i in range(levels):
-            try:
-                market_data.append(str(raw_data[i]["rate"]))
-                market_data.append(str(raw_data[i]["amount"]))
-            except IndexError:
+            if i < len(rates):
+                market_data.append(f"{rates[i]:.8f}")
+                market_data.append(format_amount(amounts[i]))
+            else:
                 market_data.append("5")
                 market_data.append("0.1")
         market_data.append("0")  # Percentile field not being filled yet.
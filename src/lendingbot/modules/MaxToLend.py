@@ -1,6 +1,7 @@
 from decimal import Decimal
 
 from . import Configuration
+from .FixedPoint import amount_decimal, amount_units, rate_decimal, rate_units
 from .Logger import Logger
 from .Utils import format_amount_currency, format_rate_pct
 
@@ -59,8 +60,35 @@ def amount_to_lend(
     if log is None:
         return lending_balance
 
+    return amount_decimal(
+        amount_to_lend_units(
+            amount_units(active_cur_test_balance),
+            active_cur,
+            amount_units(lending_balance),
+            rate_units(low_rate),
+            amount_units(total_lent),
+        )
+    )
+
+
+def amount_to_lend_units(
+    active_cur_test_balance: int,
+    active_cur: str,
+    lending_balance: int,
+    low_rate: int,
+    total_lent: int = 0,
+) -> int:
+    """
+    amount_to_lend with the amounts in satoshis and the rate in FixedPoint rate units.
+
+    Returns:
+        int: The amount in satoshis calculated to be offered for lending.
+    """
+    if log is None:
+        return lending_balance
+
     restrict_lend = False
-    active_bal = Decimal(0)
+    active_bal = 0
     log_data = ""
     cur_max_to_lend_rate = max_to_lend_rate
     cur_max_to_lend = max_to_lend
@@ -79,62 +107,61 @@ def amount_to_lend(
         # Calculate how much more we can lend without exceeding max_active_amount
         # total_lent = currently lent out (active loans)
         # lending_balance = available to lend (not yet offered)
-        available_capacity = cur_max_active_amount - total_lent
+        max_active_amount = amount_units(cur_max_active_amount)
+        available_capacity = max_active_amount - total_lent
         if available_capacity <= 0:
             log.log(
                 f"[{active_cur}] max_active_amount limit reached: "
-                f"currently lent {format_amount_currency(total_lent, active_cur)} "
+                f"currently lent {format_amount_currency(amount_decimal(total_lent), active_cur)} "
                 f">= limit {format_amount_currency(cur_max_active_amount, active_cur)}, skipping"
             )
-            return Decimal(0)
+            return 0
         if lending_balance > available_capacity:
             log.log(
                 f"[{active_cur}] max_active_amount limit: "
-                f"reducing lending from {format_amount_currency(lending_balance, active_cur)} "
-                f"to {format_amount_currency(available_capacity, active_cur)} "
-                f"(currently lent: {format_amount_currency(total_lent, active_cur)}, "
+                f"reducing lending from {format_amount_currency(amount_decimal(lending_balance), active_cur)} "
+                f"to {format_amount_currency(amount_decimal(available_capacity), active_cur)} "
+                f"(currently lent: {format_amount_currency(amount_decimal(total_lent), active_cur)}, "
                 f"limit: {format_amount_currency(cur_max_active_amount, active_cur)})"
             )
             lending_balance = available_capacity
 
-    if (cur_max_to_lend_rate == 0 and low_rate > 0) or cur_max_to_lend_rate >= low_rate > 0:
+    max_rate = rate_units(cur_max_to_lend_rate)
+    if (max_rate == 0 and low_rate > 0) or max_rate >= low_rate > 0:
         log_data = (
-            f"The Lower Rate found on {active_cur} is {format_rate_pct(low_rate)} "
+            f"The Lower Rate found on {active_cur} is {format_rate_pct(rate_decimal(low_rate))} "
             f"vs conditional rate {format_rate_pct(cur_max_to_lend_rate)}. "
         )
         restrict_lend = True
 
     if cur_max_to_lend != 0 and restrict_lend:
         log.updateStatusValue(active_cur, "maxToLend", cur_max_to_lend)
-        if lending_balance > (active_cur_test_balance - cur_max_to_lend):
-            active_bal = lending_balance - (active_cur_test_balance - cur_max_to_lend)
+        kept = active_cur_test_balance - amount_units(cur_max_to_lend)
+        if lending_balance > kept:
+            active_bal = lending_balance - kept
 
     if cur_max_to_lend == 0 and cur_max_percent_to_lend != 0 and restrict_lend:
-        log.updateStatusValue(
-            active_cur, "maxToLend", (cur_max_percent_to_lend * active_cur_test_balance)
-        )
-        if lending_balance > (
-            active_cur_test_balance - (cur_max_percent_to_lend * active_cur_test_balance)
-        ):
-            active_bal = lending_balance - (
-                active_cur_test_balance - (cur_max_percent_to_lend * active_cur_test_balance)
-            )
+        max_percent = int(cur_max_percent_to_lend * active_cur_test_balance)
+        log.updateStatusValue(active_cur, "maxToLend", amount_decimal(max_percent))
+        kept = active_cur_test_balance - max_percent
+        if lending_balance > kept:
+            active_bal = lending_balance - kept
 
     if cur_max_to_lend == 0 and cur_max_percent_to_lend == 0:
-        log.updateStatusValue(active_cur, "maxToLend", active_cur_test_balance)
+        log.updateStatusValue(active_cur, "maxToLend", amount_decimal(active_cur_test_balance))
         active_bal = lending_balance
 
     if not restrict_lend:
-        log.updateStatusValue(active_cur, "maxToLend", active_cur_test_balance)
+        log.updateStatusValue(active_cur, "maxToLend", amount_decimal(active_cur_test_balance))
         active_bal = lending_balance
 
-    if (lending_balance - active_bal) < min_loan_size:
+    if (lending_balance - active_bal) < amount_units(min_loan_size):
         active_bal = lending_balance
 
     if active_bal < lending_balance:
         log.log(
-            f"{log_data} Lending {format_amount_currency(active_bal, active_cur)} "
-            f"of {format_amount_currency(lending_balance, active_cur)} Available"
+            f"{log_data} Lending {format_amount_currency(amount_decimal(active_bal), active_cur)} "
+            f"of {format_amount_currency(amount_decimal(lending_balance), active_cur)} Available"
         )
 
     return active_bal
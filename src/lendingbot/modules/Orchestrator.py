@@ -1,3 +1,4 @@
+import asyncio
 import http.client
 import os
 import socket
@@ -10,6 +11,7 @@ from typing import Any, NoReturn
 
 from lendingbot.modules import (
     Configuration,
+    CycleSnapshot,
     Data,
     Lending,
     MarketAnalysis,
@@ -139,7 +141,18 @@ class BotOrchestrator:
         assert self.plugins_manager is not None
 
         self.dns_cache.clear()  # Flush DNS Cache
-        Data.update_conversion_rates(self.config.bot.output_currency, self.config.bot.web.enabled)
+
+        # Every resource is fetched once into the cycle snapshot and read from there
+        resources = [CycleSnapshot.ACTIVE_LOANS]
+        if self.config.bot.web.enabled or (
+            not self.engine.lending_paused and self.engine.needs_ticker()
+        ):
+            resources.append(CycleSnapshot.TICKER)
+        snapshot = CycleSnapshot.CycleSnapshot.fetch(self.api, *resources)
+
+        Data.update_conversion_rates(
+            self.config.bot.output_currency, self.config.bot.web.enabled, snapshot
+        )
 
         if self.engine.lending_paused != self.engine.last_lending_status:
             if not self.engine.lending_paused:
@@ -149,18 +162,34 @@ class BotOrchestrator:
             self.engine.last_lending_status = self.engine.lending_paused
 
         if not self.engine.lending_paused:
-            self.plugins_manager.before_lending()
+            self.plugins_manager.before_lending(snapshot)
             self.engine.transfer_balances()
-            self.engine.cancel_all()
-            self.engine.lend_all()
-            self.plugins_manager.after_lending()
+            # Fetched after the transfer, which changes the lending balances
+            snapshot = snapshot.refreshed(
+                self.api, CycleSnapshot.OPEN_LOAN_OFFERS, CycleSnapshot.LENDING_BALANCES
+            )
+            if self.engine.cancel_all(snapshot):
+                # Canceled offers return their amount to the lending balance
+                snapshot = snapshot.refreshed(
+                    self.api, CycleSnapshot.OPEN_LOAN_OFFERS, CycleSnapshot.LENDING_BALANCES
+                )
+            if self.config.bot.concurrent_fetch:
+                asyncio.run(self.engine.lend_all_async(snapshot))
+            else:
+                self.engine.lend_all(snapshot)
+            self.plugins_manager.after_lending(snapshot)
+
+        if self.config.bot.api_debug_log:
+            self.log.log(f"Cycle snapshot fetch times: {snapshot.describe_fetch_times()}")
 
-        lent_status_str = Data.stringify_total_lent(Data.get_total_lent())
+        lent_status_str = Data.stringify_total_lent(Data.get_total_lent(snapshot))
         if time.time() - self.last_summary_time >= self.config.bot.period_inactive:
             self.log.log(lent_status_str)
             self.last_summary_time = time.time()
 
         self.log.persistStatus()
+        if self.api is not None:
+            self.api.save_rate_state()
         sys.stdout.flush()
 
     def run(self) -> NoReturn:
@@ -215,7 +244,8 @@ class BotOrchestrator:
         elif "Nonce must be greater" in msg:
             print("!!! Troubleshooting !!!")
             print(
-                "Are you reusing the API key in multiple applications? Use a unique key for every application."
+                "Are you reusing the API key in multiple applications? Use a unique key for every application,"
+                " or point api.coordinator.state_file of every bot sharing the key to the same file."
             )
             sys.exit(1)
         elif "Permission denied" in msg:
@@ -246,6 +276,9 @@ class BotOrchestrator:
             self.web_server.stop()
         if self.plugins_manager:
             self.plugins_manager.on_bot_stop()
+        if self.api:
+            self.api.save_rate_state()
+            self.api.close()
         if self.log:
             self.log.log("bye")
         print("bye")
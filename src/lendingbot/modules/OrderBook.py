@@ -0,0 +1,191 @@
+"""
+Loan order books kept in NumPy arrays
+"""
+
+from bisect import bisect_left
+from collections.abc import Iterable, Sequence
+from decimal import Decimal
+from itertools import accumulate
+from typing import Any
+
+import numpy as np
+
+from .FixedPoint import AMOUNT_SCALE, ceil_amount_units
+
+
+# Bitfinex quotes funding rates per year in percent
+BITFINEX_RATE_DIVISOR = 36500
+
+# Amounts with at most 8 decimals are summed exactly as integer satoshis. Below this
+# bound two neighbouring floats are less than a satoshi apart, so the satoshi count of
+# a float is the one of its shortest decimal representation.
+MAX_EXACT_AMOUNT = 2.0**25
+
+
+def format_amount(value: float) -> str:
+    """The amount with at most 8 decimals and no trailing zeros"""
+    text = f"{value:.8f}".rstrip("0")
+    return text.rstrip(".") or "0"
+
+
+class BookSide:
+    """
+    The levels of one side of a loan order book, best rate first, as three arrays of
+    the same length: the daily rate, the amount and the maximum period in days.
+    """
+
+    __slots__ = ("_cumulative", "amounts", "periods", "rates")
+
+    def __init__(self, rates: Any, amounts: Any, periods: Any) -> None:
+        self.rates: np.ndarray = np.asarray(rates, dtype=np.float64)
+        self.amounts: np.ndarray = np.asarray(amounts, dtype=np.float64)
+        self.periods: np.ndarray = np.asarray(periods, dtype=np.int64)
+        # Running total of the amounts, built by the first fill_indices call
+        self._cumulative: np.ndarray | list[Decimal] | None = None
+
+    @classmethod
+    def empty(cls) -> "BookSide":
+        return cls([], [], [])
+
+    @classmethod
+    def from_levels(cls, levels: Sequence[tuple[float, int, float]]) -> "BookSide":
+        """From (rate, period, amount) tuples. Negative amounts are taken as positive"""
+        if not levels:
+            return cls.empty()
+        rates, periods, amounts = zip(*levels, strict=True)
+        return cls(rates, np.abs(np.asarray(amounts, dtype=np.float64)), periods)
+
+    @classmethod
+    def from_poloniex(cls, levels: Iterable[dict[str, Any]]) -> "BookSide":
+        """From the level dicts of ExchangeApi.return_loan_orders"""
+        levels = list(levels)
+        return cls(
+            [float(level["rate"]) for level in levels],
+            [float(level["amount"]) for level in levels],
+            [int(level.get("rangeMax", 2)) for level in levels],
+        )
+
+    def __len__(self) -> int:
+        return len(self.rates)
+
+    def __repr__(self) -> str:
+        return f"BookSide(rates={self.rates!r}, amounts={self.amounts!r}, periods={self.periods!r})"
+
+    def rate_at(self, i: int) -> Decimal:
+        """The daily rate of level i, rounded to 8 decimals as the exchanges quote it"""
+        return Decimal(f"{self.rates[i]:.8f}")
+
+    def _cumulative_amounts(self) -> np.ndarray | list[Decimal]:
+        """
+        The running total of the amounts, equal to summing Decimal(str(amount)) level by
+        level: integer satoshis when every amount has at most 8 decimals, else Decimals
+        """
+        if self._cumulative is None:
+            amounts = self.amounts
+            satoshis = np.rint(amounts * AMOUNT_SCALE)
+            exact = len(amounts) == 0 or (
+                amounts.min() >= 0
+                and amounts.max() < MAX_EXACT_AMOUNT
+                and np.array_equal(satoshis / AMOUNT_SCALE, amounts)
+            )
+            if exact:
+                self._cumulative = np.cumsum(satoshis.astype(np.int64))
+            else:
+                self._cumulative = list(accumulate(Decimal(str(a)) for a in amounts.tolist()))
+        return self._cumulative
+
+    def fill_indices(self, depths: Sequence[Decimal]) -> list[int]:
+        """
+        For every depth, the index of the first level at which the running total of
+        the amounts reaches it, or len(self) if the whole side does not. The running
+        total is built once per side and every depth is one binary search.
+        """
+        cumulative = self._cumulative_amounts()
+        if isinstance(cumulative, list):
+            return [bisect_left(cumulative, depth) for depth in depths]
+        # total >= depth  <=>  total in satoshis >= ceil(depth in satoshis)
+        limit = np.iinfo(np.int64).max
+        thresholds = np.array(
+            [min(ceil_amount_units(depth), limit) for depth in depths], dtype=np.int64
+        )
+        indices: list[int] = np.searchsorted(cumulative, thresholds, side="left").tolist()
+        return indices
+
+    def without(self, offers: Iterable[tuple[float, float]]) -> "BookSide":
+        """
+        The side without the (rate, amount) offers, such as the bot's own open ones.
+        Each offer is taken off the level quoted at its rate, at most the level's
+        amount, and levels left empty are dropped. Offers at no level's rate are ignored.
+        """
+        amounts = self.amounts.copy()
+        for rate, amount in offers:
+            matches = np.flatnonzero(np.isclose(self.rates, rate, rtol=1e-9, atol=0))
+            if len(matches) == 0:
+                continue
+            # Several levels at one rate are separate offers, prefer the one of this amount
+            same = matches[np.isclose(amounts[matches], amount, rtol=1e-9, atol=1e-9)]
+            i = same[0] if len(same) else matches[0]
+            amounts[i] = max(0.0, amounts[i] - amount)
+        keep = amounts > 1e-9
+        return BookSide(self.rates[keep], amounts[keep], self.periods[keep])
+
+    def to_poloniex(self) -> list[dict[str, Any]]:
+        """The levels in the format of ExchangeApi.return_loan_orders"""
+        return [
+            {
+                "rate": f"{rate:0.8f}",
+                "amount": format_amount(amount),
+                "rangeMin": "2",
+                "rangeMax": period,
+            }
+            for rate, amount, period in zip(
+                self.rates.tolist(), self.amounts.tolist(), self.periods.tolist(), strict=True
+            )
+        ]
+
+
+class OrderBook:
+    """
+    The loan offers (asks, lowest rate first) and demands (bids, highest rate first)
+    of one currency. Built once per response and read by the lending engine and the
+    market analysis directly, without per-level dicts or strings.
+    """
+
+    __slots__ = ("demands", "offers")
+
+    def __init__(self, offers: BookSide, demands: BookSide) -> None:
+        self.offers = offers
+        self.demands = demands
+
+    def __repr__(self) -> str:
+        return f"OrderBook(offers={self.offers!r}, demands={self.demands!r})"
+
+    @classmethod
+    def empty(cls) -> "OrderBook":
+        return cls(BookSide.empty(), BookSide.empty())
+
+    @classmethod
+    def from_bitfinex(cls, lendbook: dict[str, list[dict[str, Any]]]) -> "OrderBook":
+        """From a Bitfinex v1 'lendbook' response"""
+
+        def side(levels: list[dict[str, Any]]) -> BookSide:
+            rates = np.fromiter((float(level["rate"]) for level in levels), np.float64, len(levels))
+            amounts = np.fromiter(
+                (float(level["amount"]) for level in levels), np.float64, len(levels)
+            )
+            periods = np.fromiter((int(level["period"]) for level in levels), np.int64, len(levels))
+            return BookSide(rates / BITFINEX_RATE_DIVISOR, amounts, periods)
+
+        return cls(side(lendbook.get("asks", [])), side(lendbook.get("bids", [])))
+
+    @classmethod
+    def from_poloniex(cls, loan_orders: dict[str, list[dict[str, Any]]]) -> "OrderBook":
+        """From the format of ExchangeApi.return_loan_orders"""
+        return cls(
+            BookSide.from_poloniex(loan_orders.get("offers", [])),
+            BookSide.from_poloniex(loan_orders.get("demands", [])),
+        )
+
+    def to_poloniex(self) -> dict[str, list[dict[str, Any]]]:
+        """The book in the format of ExchangeApi.return_loan_orders"""
+        return {"offers": self.offers.to_poloniex(), "demands": self.demands.to_poloniex()}
@@ -2,6 +2,7 @@ from typing import Any
 
 from .. import plugins
 from . import Configuration
+from .CycleSnapshot import CycleSnapshot
 from .Logger import Logger
 
 
@@ -33,19 +34,19 @@ class PluginsManager:
             except Exception as ex:
                 self.log.log_error(f"Error initializing plugin {name}: {ex}")
 
-    def before_lending(self) -> None:
+    def before_lending(self, snapshot: CycleSnapshot | None = None) -> None:
         for plugin in self.active_plugins:
             try:
-                plugin.before_lending()
+                plugin.before_lending(snapshot)
             except Exception as ex:
                 self.log.log_error(
                     f"Error in before_lending for plugin {plugin.__class__.__name__}: {ex}"
                 )
 
-    def after_lending(self) -> None:
+    def after_lending(self, snapshot: CycleSnapshot | None = None) -> None:
         for plugin in self.active_plugins:
             try:
-                plugin.after_lending()
+                plugin.after_lending(snapshot)
             except Exception as ex:
                 self.log.log_error(
                     f"Error in after_lending for plugin {plugin.__class__.__name__}: {ex}"
@@ -70,14 +71,14 @@ def init(cfg: Configuration.RootConfig, api: Any, log: Logger, notify_conf: dict
     _manager = PluginsManager(cfg, api, log)
 
 
-def before_lending() -> None:
+def before_lending(snapshot: CycleSnapshot | None = None) -> None:
     if _manager:
-        _manager.before_lending()
+        _manager.before_lending(snapshot)
 
 
-def after_lending() -> None:
+def after_lending(snapshot: CycleSnapshot | None = None) -> None:
     if _manager:
-        _manager.after_lending()
+        _manager.after_lending(snapshot)
 
 
 def on_bot_stop() -> None:
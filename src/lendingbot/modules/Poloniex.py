@@ -1,16 +1,63 @@
 import hashlib
 import hmac
 import socket
-import threading
 import time
 import urllib.parse
-from collections import deque
 from typing import Any, cast
 
+import numpy as np
 import requests
 
 from . import Configuration
 from .ExchangeApi import ApiError, ExchangeApi
+from .HttpClient import HttpClient
+from .RateLimiter import AUTH_READ, AUTH_WRITE, PUBLIC, BucketLimit, parse_retry_after
+
+
+# Poloniex allows 6 calls per second on the public API and another 6 on the trading
+# API, where reads and writes count against the same limit.
+DEFAULT_RATE_LIMITS = {
+    PUBLIC: BucketLimit(requests=6, period_ms=1000),
+    AUTH_READ: BucketLimit(requests=6, period_ms=1000),
+    AUTH_WRITE: BucketLimit(requests=6, period_ms=1000, shared_with=AUTH_READ),
+}
+PUBLIC_COMMANDS = frozenset(
+    {
+        "returnTicker",
+        "return24hVolume",
+        "returnOrderBook",
+        "returnMarketTradeHistory",
+        "returnLoanOrders",
+    }
+)
+WRITE_COMMANDS = frozenset(
+    {
+        "buy",
+        "sell",
+        "cancelOrder",
+        "withdraw",
+        "transferBalance",
+        "createLoanOffer",
+        "cancelLoanOffer",
+        "toggleAutoRenew",
+    }
+)
+DEFAULT_URL = "https://poloniex.com"
+
+
+def parse_datetimes(datetimes: list[str]) -> list[float | None]:
+    """
+    Unix timestamps of UTC datetime strings like "2025-12-30 21:43:00", parsed all at
+    once. None for a string that is not a datetime.
+    """
+    try:
+        parsed = np.asarray(datetimes, dtype="datetime64[s]")
+    except ValueError:
+        if len(datetimes) == 1:
+            return [None]
+        return [parse_datetimes([dt])[0] for dt in datetimes]
+    seconds = parsed.astype(np.int64).astype(np.float64).tolist()
+    return [None if nat else t for t, nat in zip(seconds, np.isnat(parsed).tolist(), strict=True)]
 
 
 def post_process(json_ret: Any) -> Any:
@@ -19,15 +66,14 @@ def post_process(json_ret: Any) -> Any:
             raise ApiError(json_ret["error"])
         # Handle 'return' key if present (e.g. lending history)
         if "return" in json_ret and isinstance(json_ret["return"], list):
-            for item in json_ret["return"]:
-                if isinstance(item, dict) and "datetime" in item:
-                    try:
-                        # Parse datetime string to timestamp
-                        # Assuming format like "2025-12-30 21:43:00" (UTC)
-                        dt = time.strptime(item["datetime"], "%Y-%m-%d %H:%M:%S")
-                        item["timestamp"] = float(time.mktime(dt))
-                    except ValueError:
-                        pass
+            items = [
+                item for item in json_ret["return"] if isinstance(item, dict) and "datetime" in item
+            ]
+            for item, timestamp in zip(
+                items, parse_datetimes([item["datetime"] for item in items]), strict=True
+            ):
+                if timestamp is not None:
+                    item["timestamp"] = timestamp
     return json_ret
 
 
@@ -39,102 +85,106 @@ class Poloniex(ExchangeApi):
         # Handle SecretStr: get_secret_value() if they are not None
         self.APIKey = self.cfg.api.apikey.get_secret_value() if self.cfg.api.apikey else ""
         self.Secret = self.cfg.api.secret.get_secret_value() if self.cfg.api.secret else ""
-        self.req_per_period = 6
-        self.default_req_period = 1000  # milliseconds
-        self.req_period = float(self.default_req_period)
-        self.req_time_log: deque[float] = deque(maxlen=self.req_per_period)
-        self.lock = threading.RLock()
+        self.init_rate_limiter(cfg, DEFAULT_RATE_LIMITS)
+        self.url = (self.cfg.api.base_url or DEFAULT_URL).rstrip("/")
+        self.http = HttpClient(cfg)
 
         socket.setdefaulttimeout(self.cfg.bot.request_timeout)
         self.api_debug_log = self.cfg.bot.api_debug_log
 
-    def limit_request_rate(self) -> None:
-        super().limit_request_rate()
+    def close(self) -> None:
+        self.http.close()
+        super().close()
+
+    @staticmethod
+    def _bucket_for(command: str) -> str:
+        if command in PUBLIC_COMMANDS:
+            return PUBLIC
+        return AUTH_WRITE if command in WRITE_COMMANDS else AUTH_READ
+
+    def limit_request_rate(self, bucket: str = PUBLIC) -> float:
+        waited = super().limit_request_rate(bucket)
+        if waited > 0 and self.api_debug_log:
+            self.log.log(f"Waited {waited:.3f}s for {bucket} rate limit")
+        return waited
+
+    def increase_request_timer(
+        self, bucket: str = PUBLIC, retry_after: float | None = None
+    ) -> None:
+        super().increase_request_timer(bucket, retry_after)
+
+    def decrease_request_timer(self, bucket: str = PUBLIC, latency: float | None = None) -> None:
+        super().decrease_request_timer(bucket, latency)
+
+    def reset_request_timer(self, bucket: str = PUBLIC) -> None:
+        super().reset_request_timer(bucket)
+
+    def _public_url(self, command: str, req: dict[str, Any]) -> str:
+        if command == "returnOrderBook":
+            return f"{self.url}/public?command={command}&currencyPair={req['currencyPair']}"
+        if command == "returnMarketTradeHistory":
+            return (
+                f"{self.url}/public?command=returnTradeHistory&currencyPair={req['currencyPair']}"
+            )
+        if command == "returnLoanOrders":
+            url = f"{self.url}/public?command=returnLoanOrders&currency={req['currency']}"
+            if req.get("limit", 0) > 0:
+                url += f"&limit={req['limit']}"
+            return url
+        return f"{self.url}/public?command={command}"
 
-    def increase_request_timer(self) -> None:
-        super().increase_request_timer()
-
-    def decrease_request_timer(self) -> None:
-        super().decrease_request_timer()
-
-    def reset_request_timer(self) -> None:
-        super().reset_request_timer()
-
-    @ExchangeApi.synchronized
     def api_query(self, command: str, req: dict[str, Any] | None = None) -> Any:
-        # keep the 6 request per sec limit
-        self.limit_request_rate()
-
         if req is None:
             req = {}
+        bucket = self._bucket_for(command)
+        if bucket == PUBLIC:
+            url = self._public_url(command, req)
+            return self.public_requests.do(url, lambda: self._send_query(command, req, bucket))
+        return self._send_query(command, req, bucket)
+
+    def _send_query(self, command: str, req: dict[str, Any], bucket: str) -> Any:
+        # keep the 6 request per sec limit
+        self.limit_request_rate(bucket)
+        start = time.monotonic()
 
         def _handle_response(r: requests.Response) -> Any:
+            if r.status_code == 429:
+                self.increase_request_timer(bucket, parse_retry_after(r.headers.get("Retry-After")))
+                raise ApiError("Rate limit exceeded (429)")
             try:
-                resp_data = r.json()
+                resp_data = self.json_decoder.decode_response(r)
             except ValueError:
+                if r.status_code == 502 or r.status_code in range(520, 527):
+                    raise ApiError(
+                        f"API Error {r.status_code}: The web server reported a bad gateway or gateway timeout error."
+                    ) from None
                 raise ApiError(f"Failed to decode JSON response: {r.text}") from None
 
             if isinstance(resp_data, dict) and "error" in resp_data:
                 raise ApiError(resp_data["error"])
+            self.decrease_request_timer(bucket, time.monotonic() - start)
             return resp_data
 
         try:
-            headers = {"Connection": "close"}
-            timeout = int(self.cfg.bot.request_timeout)
-
-            if command in ("returnTicker", "return24hVolume"):
-                url = f"https://poloniex.com/public?command={command}"
-                r = requests.get(url, headers=headers, timeout=timeout)
+            if bucket == PUBLIC:
+                with self.public_slots:
+                    r = self.http.get(self._public_url(command, req), headers={})
                 return _handle_response(r)
-            elif command == "returnOrderBook":
-                url = f"https://poloniex.com/public?command={command}&currencyPair={req['currencyPair']}"
-                r = requests.get(url, headers=headers, timeout=timeout)
-                return _handle_response(r)
-            elif command == "returnMarketTradeHistory":
-                url = f"https://poloniex.com/public?command=returnTradeHistory&currencyPair={req['currencyPair']}"
-                r = requests.get(url, headers=headers, timeout=timeout)
-                return _handle_response(r)
-            elif command == "returnLoanOrders":
-                url = f"https://poloniex.com/public?command=returnLoanOrders&currency={req['currency']}"
-                if req.get("limit", 0) > 0:
-                    url += f"&limit={req['limit']}"
-                r = requests.get(url, headers=headers, timeout=timeout)
-                return _handle_response(r)
-            else:
+
+            # The nonce must reach the exchange in order, hold the lock until it is sent
+            with self.nonce_lock, self.signing():
                 req["command"] = command
-                req["nonce"] = int(time.time() * 1000)
+                req["nonce"] = self.next_nonce(int(time.time() * 1000))
                 post_data_str = urllib.parse.urlencode(req)
                 sign = hmac.new(
                     self.Secret.encode("utf-8"), post_data_str.encode("utf-8"), hashlib.sha512
                 ).hexdigest()
 
-                headers.update({"Sign": sign, "Key": self.APIKey})
-                r = requests.post(
-                    "https://poloniex.com/tradingApi", data=req, headers=headers, timeout=timeout
-                )
-                json_ret = _handle_response(r)
-                return post_process(json_ret)
+                headers = {"Sign": sign, "Key": self.APIKey}
+                r = self.http.post(f"{self.url}/tradingApi", headers=headers, data=req)
+            json_ret = _handle_response(r)
+            return post_process(json_ret)
 
-            # Check in case something has gone wrong and the timer is too big
-            self.reset_request_timer()
-
-        except requests.HTTPError as ex:
-            raw_polo_response = ex.response.text
-            try:
-                data = ex.response.json()
-                polo_error_msg = data["error"]
-            except Exception:
-                code = ex.response.status_code
-                if code == 502 or code in range(520, 527):
-                    polo_error_msg = f"API Error {code}: The web server reported a bad gateway or gateway timeout error."
-                elif code == 429:
-                    self.increase_request_timer()
-                    polo_error_msg = "Rate limit exceeded (429)"
-                else:
-                    polo_error_msg = raw_polo_response
-
-            ex_msg = f"{ex} Requesting {command}. Poloniex reports: '{polo_error_msg}'"
-            raise ApiError(ex_msg) from ex
         except Exception as ex:
             ex_msg = f"{ex} Requesting {command}"
             raise ApiError(ex_msg) from ex
@@ -0,0 +1,305 @@
+"""
+Per-endpoint request rate limiting for the exchange API clients
+"""
+
+import email.utils
+import heapq
+import itertools
+import json
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+
+PUBLIC = "public"
+AUTH_READ = "auth_read"
+AUTH_WRITE = "auth_write"
+BUCKET_NAMES = (PUBLIC, AUTH_READ, AUTH_WRITE)
+
+
+@dataclass(frozen=True)
+class BucketLimit:
+    """
+    A budget of `requests` calls per `period_ms` milliseconds. `shared_with` names
+    another bucket whose budget this endpoint group counts against.
+    """
+
+    requests: int
+    period_ms: float
+    shared_with: str | None = None
+
+
+@dataclass(frozen=True)
+class AdaptiveRate:
+    """
+    How a bucket adapts its request rate to the exchange's feedback. After a rate
+    limit error the rate is multiplied by `backoff_factor`; every successful request
+    then adds `probe_step` times the configured rate, probing up to the configured
+    rate times `max_speedup`. The rate never drops below the configured rate /
+    `max_backoff`.
+    A successful request that took longer than `slow_response` seconds does not
+    probe upwards (0 = ignore the response time).
+    """
+
+    backoff_factor: float = 0.5
+    probe_step: float = 0.05
+    max_backoff: float = 10.0
+    max_speedup: float = 1.0
+    slow_response: float = 0.0
+
+
+def parse_retry_after(value: Any) -> float | None:
+    """
+    Seconds to wait from a Retry-After header, given as seconds or as an HTTP date.
+    Returns None if the header is missing or malformed.
+    """
+    if not isinstance(value, str) or not value.strip():
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, date.timestamp() - time.time())
+
+
+class TokenBucket:
+    """
+    Holds `capacity` tokens. Every request spends one token and the token is returned
+    `period` milliseconds after the moment the request was allowed to run, so no more
+    than `capacity` requests ever go out within any window of `period` milliseconds.
+
+    A token is handed out only at the moment it becomes available, to the waiting
+    request with the highest priority, so urgent requests overtake queued ones.
+
+    `period` adapts to the exchange's feedback as described by AdaptiveRate: it grows
+    multiplicatively on rate limit errors (`slow_down`) and shrinks additively in rate
+    (`speed_up`), past the configured `default_period` down to `min_period`.
+    """
+
+    def __init__(
+        self, name: str, capacity: int, period_ms: float, adaptive: AdaptiveRate | None = None
+    ) -> None:
+        self.name = name
+        self.capacity = capacity
+        self.default_period = float(period_ms)
+        self.period = float(period_ms)
+        self.adaptive = adaptive or AdaptiveRate()
+        self.lock = threading.Lock()
+        # Signaled whenever the front of the waiting line changes
+        self.ready = threading.Condition(self.lock)
+        self.waiting: list[tuple[int, int]] = []  # heap of (priority, arrival)
+        self.arrivals = itertools.count()
+        self.spent: deque[float] = deque(maxlen=capacity)
+        self.requests = 0
+        self.total_wait = 0.0
+        self.last_wait = 0.0
+        self.paused_until = 0.0  # ms timestamp before which no request may go out
+        self.last_backoff = 0.0  # ms timestamp of the last slow_down
+        self.backoffs = 0
+        self.probes = 0
+
+    @property
+    def max_period(self) -> float:
+        return self.default_period * self.adaptive.max_backoff
+
+    @property
+    def min_period(self) -> float:
+        return self.default_period / self.adaptive.max_speedup
+
+    @property
+    def rate(self) -> float:
+        """Current requests per second"""
+        return self.capacity / self.period * 1000
+
+    def _next_free(self, now: float) -> float:
+        """The ms timestamp at which the next token becomes available"""
+        slot = max(now, self.paused_until)
+        # Start throttling only when every token is spent
+        if len(self.spent) == self.capacity:
+            slot = max(slot, self.spent[0] + self.period)
+        return slot
+
+    def wait_time(self) -> float:
+        """Seconds until a token is available, ignoring requests already waiting"""
+        with self.lock:
+            now = time.time() * 1000
+            return (self._next_free(now) - now) / 1000
+
+    def acquire(self, priority: int = 0) -> float:
+        """
+        Blocks until a token is available. Returns the seconds spent waiting.
+
+        Waiting requests are served lowest `priority` first and in arrival order within
+        a priority, so a request of a lower priority only gets a token when no request of
+        a higher one is waiting.
+        """
+        start = time.time()
+        with self.ready:
+            entry = (priority, next(self.arrivals))
+            heapq.heappush(self.waiting, entry)
+            try:
+                while True:
+                    if self.waiting[0] == entry:
+                        now = time.time() * 1000
+                        slot = self._next_free(now)
+                        if slot <= now:
+                            break
+                        self.ready.wait((slot - now) / 1000)
+                    else:
+                        self.ready.wait()
+            finally:
+                self.waiting.remove(entry)
+                heapq.heapify(self.waiting)
+                # The next waiter in line checks for its token
+                self.ready.notify_all()
+            self.spent.append(now)
+            wait = time.time() - start
+            self.requests += 1
+            self.total_wait += wait
+            self.last_wait = wait
+            return wait
+
+    def slow_down(self, retry_after: float | None = None) -> None:
+        """
+        Backs off after a rate limit error. `retry_after` (seconds) also holds every
+        request until then.
+        """
+        with self.lock:
+            now = time.time() * 1000
+            if retry_after is not None:
+                self.paused_until = max(self.paused_until, now + retry_after * 1000)
+            # Requests already in flight report the same limit, back off once per window
+            if now - self.last_backoff < self.period or self.period >= self.max_period:
+                return
+            self.last_backoff = now
+            self.period = min(self.period / self.adaptive.backoff_factor, self.max_period)
+            self.backoffs += 1
+
+    def speed_up(self, latency: float | None = None) -> None:
+        """Probes a slightly higher rate after a successful request that took `latency` s"""
+        with self.lock:
+            if self.period <= self.min_period:
+                return
+            slow = self.adaptive.slow_response
+            if latency is not None and slow > 0 and latency > slow:
+                return
+            rate = self.capacity / self.period
+            rate += self.adaptive.probe_step * self.capacity / self.default_period
+            self.period = max(self.min_period, self.capacity / rate)
+            self.probes += 1
+
+    def reset(self) -> None:
+        with self.lock:
+            self.period = self.default_period
+            self.paused_until = 0.0
+            self.ready.notify_all()
+
+    def restore(self, period_ms: float) -> None:
+        """Resumes from a previously learned period, clamped to the allowed range"""
+        with self.lock:
+            self.period = min(max(float(period_ms), self.min_period), self.max_period)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "capacity": self.capacity,
+            "period_ms": round(self.period, 1),
+            "default_period_ms": self.default_period,
+            "min_period_ms": round(self.min_period, 1),
+            "rate_per_s": round(self.rate, 4),
+            "paused_for": round(max(0.0, self.paused_until - time.time() * 1000) / 1000, 3),
+            "backoffs": self.backoffs,
+            "probes": self.probes,
+            "requests": self.requests,
+            "total_wait": round(self.total_wait, 3),
+            "last_wait": round(self.last_wait, 3),
+        }
+
+
+class RateLimiter:
+    """
+    A set of named token buckets. Several names may share one bucket when the
+    exchange counts those endpoints against a common limit.
+    """
+
+    def __init__(self) -> None:
+        self.buckets: dict[str, TokenBucket] = {}
+
+    @classmethod
+    def from_config(
+        cls, defaults: dict[str, BucketLimit], overrides: Any, adaptive: AdaptiveRate | None = None
+    ) -> "RateLimiter":
+        """
+        Builds the buckets from the exchange defaults, replacing any of them that is
+        configured in [api.rate_limits]. A bucket overridden in the config always gets
+        its own budget.
+        """
+        limiter = cls()
+        configured = {name: overrides[name] for name in overrides} if overrides else {}
+        for name in BUCKET_NAMES:
+            if name in configured:
+                limit = configured[name]
+                limiter.buckets[name] = TokenBucket(name, limit.requests, limit.period_ms, adaptive)
+                continue
+            default = defaults[name]
+            if default.shared_with is not None and default.shared_with in limiter.buckets:
+                limiter.buckets[name] = limiter.buckets[default.shared_with]
+            else:
+                limiter.buckets[name] = TokenBucket(
+                    name, default.requests, default.period_ms, adaptive
+                )
+        return limiter
+
+    def bucket(self, name: str) -> TokenBucket:
+        return self.buckets[name]
+
+    def acquire(self, name: str) -> float:
+        return self.buckets[name].acquire()
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        return {name: bucket.stats() for name, bucket in self.buckets.items()}
+
+    def state(self) -> dict[str, dict[str, float]]:
+        """The learned period of every bucket, as written by save_state"""
+        return {
+            name: {"period_ms": bucket.period, "default_period_ms": bucket.default_period}
+            for name, bucket in self.buckets.items()
+        }
+
+    def load_state(self, path: Path, key: str) -> None:
+        """
+        Restores the periods saved under `key` (the exchange name). A bucket whose
+        configured period changed since the save starts from its new configuration.
+        """
+        try:
+            with path.open("r", encoding="utf-8") as f:
+                saved = json.load(f).get(key, {})
+        except (OSError, ValueError, AttributeError):
+            return
+        for name, bucket in self.buckets.items():
+            entry = saved.get(name)
+            if not isinstance(entry, dict):
+                continue
+            if entry.get("default_period_ms") == bucket.default_period:
+                bucket.restore(entry.get("period_ms", bucket.default_period))
+
+    def save_state(self, path: Path, key: str) -> None:
+        """Stores the learned periods under `key`, keeping other exchanges' entries"""
+        saved: dict[str, Any] = {}
+        try:
+            with path.open("r", encoding="utf-8") as f:
+                loaded = json.load(f)
+            if isinstance(loaded, dict):
+                saved = loaded
+        except (OSError, ValueError):
+            pass
+        saved[key] = self.state()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("w", encoding="utf-8") as f:
+            json.dump(saved, f, indent=2, sort_keys=True)
@@ -0,0 +1,76 @@
+"""
+Diffing of desired lend offers against the offers already open on the exchange
+"""
+
+from collections.abc import Sequence
+from dataclasses import dataclass, field
+from decimal import Decimal
+from typing import Any
+
+
+@dataclass(frozen=True)
+class LendOffer:
+    """A lend offer as it would be sent to ExchangeApi.create_loan_offer"""
+
+    currency: str
+    amount: Decimal
+    rate: float
+    days: int
+    # Rate before the competition adjustment, for logging
+    original_rate: float = 0.0
+
+
+@dataclass
+class OfferDiff:
+    """The open offers to keep and cancel and the desired offers still to place"""
+
+    keep: list[dict[str, Any]] = field(default_factory=list)
+    cancel: list[dict[str, Any]] = field(default_factory=list)
+    place: list[LendOffer] = field(default_factory=list)
+
+    @property
+    def calls_saved(self) -> int:
+        """Every kept offer saves one cancel and one create call"""
+        return 2 * len(self.keep)
+
+
+def offer_matches(
+    desired: LendOffer, open_offer: dict[str, Any], rate_tolerance: float, amount_tolerance: float
+) -> bool:
+    """
+    Whether an open offer (as returned by return_open_loan_offers) is close enough to
+    the desired offer to be kept. Tolerances are in percent of the desired value.
+    """
+    if int(open_offer["duration"]) != desired.days:
+        return False
+    rate_diff = abs(float(open_offer["rate"]) - desired.rate)
+    if rate_diff > desired.rate * rate_tolerance / 100:
+        return False
+    amount_diff = abs(Decimal(str(open_offer["amount"])) - desired.amount)
+    return amount_diff <= desired.amount * Decimal(str(amount_tolerance)) / 100
+
+
+def diff_offers(
+    desired: Sequence[LendOffer],
+    open_offers: Sequence[dict[str, Any]],
+    rate_tolerance: float,
+    amount_tolerance: float,
+) -> OfferDiff:
+    """
+    Pairs every desired offer with at most one matching open offer. Open offers left
+    unpaired are canceled, desired offers left unpaired are placed.
+    """
+    diff = OfferDiff()
+    unmatched = list(open_offers)
+    for offer in desired:
+        match = next(
+            (o for o in unmatched if offer_matches(offer, o, rate_tolerance, amount_tolerance)),
+            None,
+        )
+        if match is None:
+            diff.place.append(offer)
+        else:
+            unmatched.remove(match)
+            diff.keep.append(match)
+    diff.cancel = unmatched
+    return diff
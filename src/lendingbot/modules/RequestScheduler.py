@@ -0,0 +1,118 @@
+"""
+Priority classes of exchange requests
+"""
+
+import threading
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any
+
+from .RateLimiter import AUTH_READ, AUTH_WRITE, PUBLIC, RateLimiter
+
+
+# Highest priority first
+TRADE = "trade"  # placing and canceling offers, transfers
+ACCOUNT = "account"  # balances, open offers, active loans
+MARKET_DATA = "market_data"  # order books, tickers and FRRs the lending loop needs
+ANALYSIS = "analysis"  # market analysis polling
+BACKFILL = "backfill"  # lending history download
+PRIORITY_CLASSES = (TRADE, ACCOUNT, MARKET_DATA, ANALYSIS, BACKFILL)
+
+# The class of a request made outside of a `request_class` block
+BUCKET_CLASSES = {AUTH_WRITE: TRADE, AUTH_READ: ACCOUNT, PUBLIC: MARKET_DATA}
+
+_current_class: ContextVar[str | None] = ContextVar("request_class", default=None)
+
+
+@contextmanager
+def request_class(name: str) -> Iterator[None]:
+    """
+    Makes every request of the current thread (or task) inside the block queue as
+    `name` instead of the default class of its rate limit bucket
+    """
+    if name not in PRIORITY_CLASSES:
+        raise ValueError(f"Unknown request class {name}, expected {PRIORITY_CLASSES}")
+    token = _current_class.set(name)
+    try:
+        yield
+    finally:
+        _current_class.reset(token)
+
+
+def current_class(bucket: str) -> str:
+    """The class a request to `bucket` is queued as"""
+    return _current_class.get() or BUCKET_CLASSES.get(bucket, MARKET_DATA)
+
+
+def priority_of(name: str) -> int:
+    """0 is the highest priority"""
+    return PRIORITY_CLASSES.index(name)
+
+
+class ClassMetrics:
+    """Queue depth and rate limit wait times of one request class"""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.lock = threading.Lock()
+        self.queued = 0
+        self.max_queued = 0
+        self.requests = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.last_wait = 0.0
+
+    def enter(self) -> None:
+        with self.lock:
+            self.queued += 1
+            self.max_queued = max(self.max_queued, self.queued)
+
+    def leave(self, wait: float | None) -> None:
+        """`wait` is None if the request gave up waiting"""
+        with self.lock:
+            self.queued -= 1
+            if wait is None:
+                return
+            self.requests += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            self.last_wait = wait
+
+    def stats(self) -> dict[str, Any]:
+        with self.lock:
+            return {
+                "queued": self.queued,
+                "max_queued": self.max_queued,
+                "requests": self.requests,
+                "avg_wait": round(self.total_wait / self.requests, 3) if self.requests else 0.0,
+                "max_wait": round(self.max_wait, 3),
+                "last_wait": round(self.last_wait, 3),
+            }
+
+
+class RequestScheduler:
+    """
+    Queues every request for its rate limit bucket by the priority of its class, so
+    offer placement and cancels go out before account reads, and market analysis
+    polling only gets the budget the lending loop leaves over. Keeps the queue depth
+    and wait time of each class.
+    """
+
+    def __init__(self) -> None:
+        self.metrics = {name: ClassMetrics(name) for name in PRIORITY_CLASSES}
+
+    def acquire(self, limiter: RateLimiter, bucket: str) -> float:
+        """Blocks until `bucket` grants the request a token. Returns the seconds waited"""
+        name = current_class(bucket)
+        metrics = self.metrics[name]
+        metrics.enter()
+        wait = None
+        try:
+            wait = limiter.bucket(bucket).acquire(priority_of(name))
+        finally:
+            metrics.leave(wait)
+        return wait
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        return {name: metrics.stats() for name, metrics in self.metrics.items()}
@@ -0,0 +1,113 @@
+"""
+Nonces and request budgets shared by bot processes that use the same API key
+"""
+
+import json
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+
+if TYPE_CHECKING:
+    from .RateLimiter import TokenBucket
+
+
+try:
+    import fcntl
+
+    FCNTL_LOADED = True
+except ImportError:
+    FCNTL_LOADED = False
+
+
+class SigningCoordinator:
+    """
+    Coordinates every process that signs requests with one API key, through a state
+    file they all share and its lock file `<state file>.lock`.
+
+    A process holds the lock file from taking a nonce until its signed request is
+    sent, so nonces reach the exchange in increasing order across processes. The
+    nonce counter in the state file only moves forward: every nonce is above the last
+    one handed out to any process and at least the caller's time based value.
+
+    The state file also keeps the send times of the latest requests of every rate
+    limit bucket, so all processes together stay within a single bucket's budget.
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        if not FCNTL_LOADED:
+            raise ValueError("api.coordinator needs file locks (fcntl), not available here")
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.lock_path = self.path.with_name(self.path.name + ".lock")
+        self.lock_file = self.lock_path.open("a")
+        # Signed methods may call each other, the file lock is only taken once
+        self.thread_lock = threading.RLock()
+        self.depth = 0
+
+    def close(self) -> None:
+        self.lock_file.close()
+
+    @contextmanager
+    def signing(self) -> Iterator[None]:
+        """Holds the signing lock of every process sharing the key"""
+        with self.thread_lock:
+            if self.depth == 0:
+                fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+            self.depth += 1
+            try:
+                yield
+            finally:
+                self.depth -= 1
+                if self.depth == 0:
+                    fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+
+    @contextmanager
+    def _state(self) -> Iterator[dict[str, Any]]:
+        """The shared state, locked for this caller and written back when it is done"""
+        with self.path.open("a+", encoding="utf-8") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(0)
+            try:
+                state = json.loads(f.read() or "{}")
+            except ValueError:
+                state = {}
+            if not isinstance(state, dict):
+                state = {}
+            yield state
+            f.seek(0)
+            f.truncate()
+            json.dump(state, f)
+            f.flush()
+
+    def next_nonce(self, floor: int) -> int:
+        """
+        A nonce greater than every nonce handed out before and at least `floor`.
+        Must be called within signing() and the nonce sent before leaving it.
+        """
+        with self._state() as state:
+            nonce = max(int(state.get("nonce", 0)) + 1, int(floor))
+            state["nonce"] = nonce
+        return nonce
+
+    def acquire(self, bucket: "TokenBucket") -> float:
+        """
+        Blocks until the budget of `bucket`, shared by every process, allows another
+        request. Returns the seconds spent waiting.
+        """
+        start = time.time()
+        while True:
+            with self._state() as state:
+                spent: list[float] = state.setdefault("spent", {}).setdefault(bucket.name, [])
+                now = time.time() * 1000
+                slot = now
+                if len(spent) >= bucket.capacity:
+                    slot = spent[-bucket.capacity] + bucket.period
+                if slot <= now:
+                    spent.append(now)
+                    del spent[: -bucket.capacity]
+                    return time.time() - start
+            time.sleep((slot - now) / 1000)
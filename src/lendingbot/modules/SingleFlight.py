@@ -0,0 +1,96 @@
+"""
+Coalescing of identical public requests
+"""
+
+import threading
+import time
+from collections.abc import Callable
+from typing import Any
+
+
+class _Call:
+    """One request in flight and the threads waiting for it"""
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException | None = None
+
+
+class SingleFlight:
+    """
+    Merges identical requests that are in flight at the same time into one call.
+
+    The first thread to ask for a key runs `fetch`; threads asking for the same key
+    before it returns wait for that call and receive the same result, or the same
+    exception. With a `ttl` above 0 a successful result is also reused for `ttl`
+    seconds after it arrived. Results are shared between callers, so they must be
+    treated as read-only.
+    """
+
+    def __init__(self, ttl: float = 0.0) -> None:
+        self.ttl = float(ttl)
+        self.lock = threading.Lock()
+        self.in_flight: dict[str, _Call] = {}
+        self.results: dict[str, tuple[float, Any]] = {}  # key -> (time.monotonic(), result)
+        self.hits = 0  # served from a result younger than ttl
+        self.coalesced = 0  # joined an identical call already in flight
+        self.misses = 0  # ran the call
+
+    def _prune(self, now: float) -> None:
+        expired = [key for key, (stored, _) in self.results.items() if now - stored >= self.ttl]
+        for key in expired:
+            del self.results[key]
+
+    def do(self, key: str, fetch: Callable[[], Any]) -> Any:
+        """Returns the result of `fetch`, sharing it with identical concurrent calls"""
+        with self.lock:
+            cached = self.results.get(key)
+            if cached is not None and time.monotonic() - cached[0] < self.ttl:
+                self.hits += 1
+                return cached[1]
+            call = self.in_flight.get(key)
+            leader = call is None
+            if call is None:
+                call = _Call()
+                self.in_flight[key] = call
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fetch()
+        except BaseException as ex:
+            call.error = ex
+            raise
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+                if call.error is None and self.ttl > 0:
+                    now = time.monotonic()
+                    self._prune(now)
+                    self.results[key] = (now, call.result)
+            call.done.set()
+        return call.result
+
+    def clear(self) -> None:
+        """Forgets every stored result. Calls in flight are not affected"""
+        with self.lock:
+            self.results.clear()
+
+    def snapshot(self) -> dict[str, Any]:
+        """The counters and the number of stored results"""
+        with self.lock:
+            return {
+                "ttl": self.ttl,
+                "in_flight": len(self.in_flight),
+                "cached": len(self.results),
+                "hits": self.hits,
+                "coalesced": self.coalesced,
+                "misses": self.misses,
+            }
@@ -111,6 +111,35 @@ class WebServer:
                             "lending_strategies": strategies,
                         }
                         self.wfile.write(json.dumps(status_data).encode("utf-8"))
+                    elif self.path == "/get_frr":
+                        self.send_response(200)
+                        self.send_header("Content-Type", "application/json")
+                        self.end_headers()
+
+                        frr_cache = web_instance.lending_engine.api.frr_cache
+                        frr_data = frr_cache.snapshot() if frr_cache is not None else {}
+                        self.wfile.write(json.dumps(frr_data).encode("utf-8"))
+                    elif self.path == "/get_public_requests":
+                        self.send_response(200)
+                        self.send_header("Content-Type", "application/json")
+                        self.end_headers()
+
+                        public_requests = web_instance.lending_engine.api.public_requests
+                        self.wfile.write(json.dumps(public_requests.snapshot()).encode("utf-8"))
+                    elif self.path == "/get_rate_limits":
+                        self.send_response(200)
+                        self.send_header("Content-Type", "application/json")
+                        self.end_headers()
+
+                        rate_limiter = web_instance.lending_engine.api.rate_limiter
+                        self.wfile.write(json.dumps(rate_limiter.stats()).encode("utf-8"))
+                    elif self.path == "/get_request_queues":
+                        self.send_response(200)
+                        self.send_header("Content-Type", "application/json")
+                        self.end_headers()
+
+                        scheduler = web_instance.lending_engine.api.scheduler
+                        self.wfile.write(json.dumps(scheduler.stats()).encode("utf-8"))
                     elif self.path == "/get_settings":
                         self.send_response(200)
                         self.send_header("Content-Type", "application/json")
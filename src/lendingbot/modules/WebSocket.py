@@ -0,0 +1,180 @@
+"""
+Minimal blocking WebSocket client (RFC 6455) on top of the standard library
+"""
+
+import base64
+import contextlib
+import hashlib
+import os
+import socket
+import ssl
+import struct
+import urllib.parse
+
+
+GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+OP_CONTINUATION = 0x0
+OP_TEXT = 0x1
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+
+class WebSocketError(Exception):
+    pass
+
+
+class ConnectionClosed(WebSocketError):
+    pass
+
+
+def accept_key(key: str) -> str:
+    """The Sec-WebSocket-Accept value a server answers to Sec-WebSocket-Key `key`"""
+    digest = hashlib.sha1((key + GUID).encode("ascii")).digest()
+    return base64.b64encode(digest).decode("ascii")
+
+
+def encode_frame(opcode: int, payload: bytes, mask: bool) -> bytes:
+    """A single final frame. Clients must mask their frames, servers must not."""
+    header = bytearray([0x80 | opcode])
+    mask_bit = 0x80 if mask else 0
+    length = len(payload)
+    if length < 126:
+        header.append(mask_bit | length)
+    elif length < 1 << 16:
+        header.append(mask_bit | 126)
+        header += struct.pack("!H", length)
+    else:
+        header.append(mask_bit | 127)
+        header += struct.pack("!Q", length)
+    if not mask:
+        return bytes(header) + payload
+    key = os.urandom(4)
+    masked = bytes(b ^ key[i % 4] for i, b in enumerate(payload))
+    return bytes(header) + key + masked
+
+
+def _recv_exact(sock: socket.socket, count: int) -> bytes:
+    data = bytearray()
+    while len(data) < count:
+        chunk = sock.recv(count - len(data))
+        if not chunk:
+            raise ConnectionClosed("Connection closed by peer")
+        data += chunk
+    return bytes(data)
+
+
+def read_frame(sock: socket.socket) -> tuple[bool, int, bytes]:
+    """Reads one frame. Returns (final, opcode, unmasked payload)"""
+    first, second = _recv_exact(sock, 2)
+    length = second & 0x7F
+    if length == 126:
+        (length,) = struct.unpack("!H", _recv_exact(sock, 2))
+    elif length == 127:
+        (length,) = struct.unpack("!Q", _recv_exact(sock, 8))
+    key = _recv_exact(sock, 4) if second & 0x80 else b""
+    payload = _recv_exact(sock, length)
+    if key:
+        payload = bytes(b ^ key[i % 4] for i, b in enumerate(payload))
+    return bool(first & 0x80), first & 0x0F, payload
+
+
+class WebSocketConnection:
+    """
+    A client connection to a ws:// or wss:// URL. Only what a market data feed needs:
+    text messages, fragmentation, ping/pong and closing. Not thread-safe; one thread
+    reads and writes.
+    """
+
+    def __init__(self, sock: socket.socket) -> None:
+        self.sock = sock
+        self.closed = False
+
+    @classmethod
+    def connect(cls, url: str, timeout: float) -> "WebSocketConnection":
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme not in ("ws", "wss") or not parts.hostname:
+            raise WebSocketError(f"Not a WebSocket URL: {url}")
+        secure = parts.scheme == "wss"
+        port = parts.port or (443 if secure else 80)
+        sock = socket.create_connection((parts.hostname, port), timeout=timeout)
+        try:
+            if secure:
+                sock = ssl.create_default_context().wrap_socket(
+                    sock, server_hostname=parts.hostname
+                )
+            key = base64.b64encode(os.urandom(16)).decode("ascii")
+            path = parts.path or "/"
+            if parts.query:
+                path += "?" + parts.query
+            request = (
+                f"GET {path} HTTP/1.1\r\n"
+                f"Host: {parts.netloc}\r\n"
+                "Upgrade: websocket\r\n"
+                "Connection: Upgrade\r\n"
+                f"Sec-WebSocket-Key: {key}\r\n"
+                "Sec-WebSocket-Version: 13\r\n\r\n"
+            )
+            sock.sendall(request.encode("ascii"))
+            cls._check_handshake(sock, key)
+        except BaseException:
+            sock.close()
+            raise
+        return cls(sock)
+
+    @staticmethod
+    def _check_handshake(sock: socket.socket, key: str) -> None:
+        response = bytearray()
+        while b"\r\n\r\n" not in response:
+            # Byte by byte so no frame data sent right after the headers is consumed
+            response += _recv_exact(sock, 1)
+            if len(response) > 16384:
+                raise WebSocketError("Handshake response too long")
+        lines = response.decode("latin-1").split("\r\n")
+        if len(lines[0].split()) < 2 or lines[0].split()[1] != "101":
+            raise WebSocketError(f"Handshake failed: {lines[0]}")
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if headers.get("sec-websocket-accept") != accept_key(key):
+            raise WebSocketError("Handshake failed: bad Sec-WebSocket-Accept")
+
+    def settimeout(self, timeout: float | None) -> None:
+        self.sock.settimeout(timeout)
+
+    def send(self, text: str) -> None:
+        self.sock.sendall(encode_frame(OP_TEXT, text.encode("utf-8"), mask=True))
+
+    def recv(self) -> str:
+        """
+        Returns the next text message, answering pings on the way. Raises
+        ConnectionClosed when the server closes the connection.
+        """
+        message = bytearray()
+        while True:
+            final, opcode, payload = read_frame(self.sock)
+            if opcode == OP_PING:
+                self.sock.sendall(encode_frame(OP_PONG, payload, mask=True))
+                continue
+            if opcode == OP_PONG:
+                continue
+            if opcode == OP_CLOSE:
+                self.close()
+                raise ConnectionClosed("Connection closed by server")
+            message += payload
+            if final:
+                return message.decode("utf-8")
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        with contextlib.suppress(OSError):
+            self.sock.sendall(encode_frame(OP_CLOSE, b"", mask=True))
+        # Shutting down also wakes a thread blocked in recv
+        with contextlib.suppress(OSError):
+            self.sock.shutdown(socket.SHUT_RDWR)
+        self.sock.close()
@@ -0,0 +1,73 @@
+"""
+Lending periods by rate, compiled from the xday_thresholds of a coin
+"""
+
+from bisect import bisect_left
+from collections.abc import Sequence
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+
+if TYPE_CHECKING:
+    from .Configuration import XDayThreshold
+
+
+class XDayCurve:
+    """
+    The xday thresholds of a coin, sorted by rate. A rate up to the lowest threshold
+    gets that threshold's days, a rate above the highest one the highest one's days,
+    and a rate in between the days interpolated linearly between its two neighbours,
+    rounded towards zero.
+    """
+
+    __slots__ = ("_days", "_rates", "days", "rates")
+
+    def __init__(self, rates: Sequence[float], days: Sequence[int | str]) -> None:
+        # Sorting is stable, so of two thresholds at one rate the first listed wins
+        order = sorted(range(len(rates)), key=lambda i: rates[i])
+        self.rates = [float(rates[i]) for i in order]
+        self.days = [int(days[i]) for i in order]
+        self._rates = np.array(self.rates, dtype=np.float64)
+        self._days = np.array(self.days, dtype=np.float64)
+
+    @classmethod
+    def from_thresholds(cls, thresholds: Sequence["XDayThreshold"]) -> "XDayCurve":
+        """The curve of configured thresholds, whose rates are in percent"""
+        return cls([float(t.rate) / 100 for t in thresholds], [t.days for t in thresholds])
+
+    def __len__(self) -> int:
+        return len(self.rates)
+
+    @property
+    def max_days(self) -> int | None:
+        """The days of the highest rate threshold"""
+        return self.days[-1] if self.days else None
+
+    def days_for(self, rate: float) -> int:
+        """The lending period for `rate`. The curve must not be empty."""
+        i = bisect_left(self.rates, rate)
+        if i == 0:
+            return self.days[0]
+        if i == len(self.rates):
+            return self.days[-1]
+        r0, r1 = self.rates[i - 1], self.rates[i]
+        d0, d1 = self.days[i - 1], self.days[i]
+        return d0 + int((d1 - d0) * (rate - r0) / (r1 - r0))
+
+    def days_for_rates(self, rates: Sequence[float] | np.ndarray) -> np.ndarray:
+        """days_for of every rate, in one pass. The curve must not be empty."""
+        values = np.asarray(rates, dtype=np.float64)
+        count = len(self.rates)
+        if count == 1:
+            return np.full(values.shape, self.days[0], dtype=np.int64)
+        found = np.searchsorted(self._rates, values, side="left")
+        upper = np.clip(found, 1, count - 1)
+        r0, r1 = self._rates[upper - 1], self._rates[upper]
+        d0, d1 = self._days[upper - 1], self._days[upper]
+        # Rates outside the thresholds may divide by zero, their days are replaced below
+        with np.errstate(divide="ignore", invalid="ignore"):
+            interpolated = d0 + np.trunc((d1 - d0) * (values - r0) / (r1 - r0))
+        days = np.where(found == 0, self._days[0], interpolated)
+        days = np.where(found == count, self._days[-1], days)
+        return days.astype(np.int64)
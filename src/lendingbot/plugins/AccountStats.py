@@ -3,6 +3,8 @@ import sqlite3
 import time
 from typing import Any
 
+from ..modules.CycleSnapshot import CycleSnapshot
+from ..modules.HistorySync import HistorySync
 from ..modules.Utils import format_amount_currency
 from .Plugin import Plugin
 
@@ -45,19 +47,32 @@ class AccountStats(Plugin):
         self.earnings: dict[str, dict[str, float]] = {}
         self.report_interval: int = 86400
         self.db: sqlite3.Connection | None = None
+        self.history_sync: HistorySync | None = None
+        # Longest window of history requested at once, windows downloaded at the same
+        # time, the most entries one request returns and the most requests and windows
+        # one cycle spends on older history
+        self.history_window: int = 90 * 86400
+        self.history_concurrency: int = 4
+        self.history_page_limit: int = 1000
+        self.history_windows_per_cycle: int = 8
 
     def on_bot_init(self) -> None:
         super().on_bot_init()
         self.init_db()
         self.check_upgrade()
-        self.report_interval = int(self.config.plugins.account_stats.get("ReportInterval", 86400))
-
-    def before_lending(self) -> None:
+        stats_cfg = self.config.plugins.account_stats
+        self.report_interval = int(stats_cfg.get("ReportInterval", 86400))
+        self.history_window = int(float(stats_cfg.get("HistoryWindowDays", 90)) * 86400)
+        self.history_concurrency = int(stats_cfg.get("HistoryConcurrency", 4))
+        self.history_page_limit = int(stats_cfg.get("HistoryPageLimit", 1000))
+        self.history_windows_per_cycle = int(stats_cfg.get("HistoryWindowsPerCycle", 8))
+
+    def before_lending(self, snapshot: CycleSnapshot | None = None) -> None:  # noqa: ARG002
         for coin in self.earnings:
             for key in self.earnings[coin]:
                 self.log.updateStatusValue(coin, key, self.earnings[coin][key])
 
-    def after_lending(self) -> None:
+    def after_lending(self, snapshot: CycleSnapshot | None = None) -> None:  # noqa: ARG002
         if (
             self.get_db_version() > 0
             and self.last_notification != 0
@@ -85,31 +100,31 @@ class AccountStats(Plugin):
     def update_history(self) -> None:
         if not self.db:
             return
-        # timestamps are in UTC
-        last_time_stamp = self.get_last_timestamp()
+        if self.history_sync is None:
+            self.history_sync = HistorySync(
+                self.api,
+                self.db,
+                self.log,
+                self.store_loans,
+                window=self.history_window,
+                concurrency=self.history_concurrency,
+                page_limit=self.history_page_limit,
+                windows_per_sync=self.history_windows_per_cycle,
+            )
 
-        if last_time_stamp is None:
-            # no entries means db is empty and needs initialization
-            last_time_stamp = BITCOIN_GENESIS_BLOCK_DATE
-            self.db.execute("PRAGMA user_version = 0")
+        # timestamps are in UTC
+        start = BITCOIN_GENESIS_BLOCK_DATE
+        if self.get_db_version() == DB_VERSION and self.get_last_timestamp() is not None:
+            # a complete history from before the sync kept cursors only needs the new loans
+            start = self.get_last_timestamp()
 
-        self.fetch_history(self.api.create_time_stamp(last_time_stamp), time.time())
+        count, complete = self.history_sync.sync(self.api.create_time_stamp(start))
+        self.log.log(f"Downloaded {count} loans history")
 
-        # Fetch history in batches, loop to make sure we got everything
-        if (self.get_db_version() == 0) and (self.get_first_timestamp() is not None):
-            last_time_stamp = BITCOIN_GENESIS_BLOCK_DATE
-            loop = True
-            while loop:
-                time.sleep(10)  # delay a bit, try not to annoy exchange
-                first_time_stamp = self.get_first_timestamp()
-                count = self.fetch_history(
-                    self.api.create_time_stamp(last_time_stamp),
-                    self.api.create_time_stamp(first_time_stamp),
-                )
-                loop = count != 0
-
-            # if we reached here without errors means we managed to fetch all the history, db is ready.
+        if complete:
+            # every stream is downloaded up to now, db is ready.
             self.set_db_version(DB_VERSION)
+            self.db.commit()
 
     def set_db_version(self, version: int) -> None:
         if self.db:
@@ -127,25 +142,9 @@ class AccountStats(Plugin):
         history = self.api.return_lending_history(
             int(first_time_stamp), int(last_time_stamp - 1), 5000
         )
-        loans = []
-        for loan in history:
-            loans.append(
-                [
-                    loan["id"],
-                    loan["open"],
-                    loan["close"],
-                    loan["duration"],
-                    loan["interest"],
-                    loan["rate"],
-                    loan["currency"],
-                    loan["amount"],
-                    loan["earned"],
-                    loan["fee"],
-                ]
-            )
-        self.db.executemany(DB_INSERT, loans)
+        self.store_loans(history)
         self.db.commit()
-        count = len(loans)
+        count = len(history)
 
         start_dt = datetime.datetime.fromtimestamp(first_time_stamp, datetime.UTC).strftime(
             "%Y-%m-%d %H:%M:%S"
@@ -159,6 +158,27 @@ class AccountStats(Plugin):
             self.log.log(f"Last: {history[0]['close']} First:{history[count - 1]['close']}")
         return count
 
+    def store_loans(self, history: list[dict[str, Any]]) -> None:
+        """Writes history rows to the db without committing"""
+        if not self.db:
+            return
+        loans = [
+            [
+                loan["id"],
+                loan["open"],
+                loan["close"],
+                loan["duration"],
+                loan["interest"],
+                loan["rate"],
+                loan["currency"],
+                loan["amount"],
+                loan["earned"],
+                loan["fee"],
+            ]
+            for loan in history
+        ]
+        self.db.executemany(DB_INSERT, loans)
+
     def get_last_timestamp(self) -> Any:
         if not self.db:
             return None
@@ -4,6 +4,7 @@ import time
 from pathlib import Path
 from typing import Any
 
+from ..modules.CycleSnapshot import CycleSnapshot
 from .Plugin import Plugin
 
 
@@ -35,10 +36,10 @@ class Charts(Plugin):
         # Note: history_file is hardcoded because frontend expects it at logs/history.json
         self.activeCurrencies = self.config.api.all_currencies
 
-    def before_lending(self) -> None:
+    def before_lending(self, snapshot: CycleSnapshot | None = None) -> None:  # noqa: ARG002
         return
 
-    def after_lending(self) -> None:
+    def after_lending(self, snapshot: CycleSnapshot | None = None) -> None:  # noqa: ARG002
         if self.get_db_version() > 0 and self.last_dump + self.dump_interval < time.time():
             self.log.log("Dumping Charts Data")
             self.dump_history()
@@ -1,5 +1,7 @@
 from typing import Any
 
+from ..modules.CycleSnapshot import CycleSnapshot
+
 
 class Plugin:
     def __init__(self, cfg1: Any, api1: Any, log1: Any, notify_config1: Any) -> None:
@@ -13,11 +15,12 @@ class Plugin:
         self.log.log(f"{self.__class__.__name__} plugin initializing...")
 
     # override this to run plugin loop code before lending
-    def before_lending(self) -> None:
+    # snapshot holds the exchange state of the current cycle, read it instead of the api
+    def before_lending(self, snapshot: CycleSnapshot | None = None) -> None:
         pass
 
     # override this to run plugin loop code after lending
-    def after_lending(self) -> None:
+    def after_lending(self, snapshot: CycleSnapshot | None = None) -> None:
         pass
 
     # override this to run plugin stop code
@@ -4,6 +4,7 @@ Global pytest configuration and fixtures for LendingBot tests.
 This conftest.py provides:
 - Custom pytest markers for test categorization
 - Automatic integration test skipping (unless --run-integration is passed)
+- Automatic benchmark skipping (unless --run-benchmarks is passed)
 - Test collection modifications
 """
 
@@ -18,6 +19,7 @@ def pytest_addoption(parser):
 
     Options:
     --run-integration: Enable integration tests (disabled by default)
+    --run-benchmarks: Enable benchmarks (disabled by default)
     """
     parser.addoption(
         "--run-integration",
@@ -25,6 +27,12 @@ def pytest_addoption(parser):
         default=False,
         help="Run integration tests (disabled by default)",
     )
+    parser.addoption(
+        "--run-benchmarks",
+        action="store_true",
+        default=False,
+        help="Run benchmarks (disabled by default)",
+    )
 
 
 def pytest_configure(config):
@@ -37,6 +45,7 @@ def pytest_configure(config):
     - unit: Fast, isolated tests with no external dependencies
     - integration: Slow tests that make real API calls
     - slow: Tests that take more than 1 second to run
+    - benchmark: Timings of a fast path against its reference, recorded as properties
     """
     config.addinivalue_line(
         "markers", "unit: Unit tests (fast, isolated, no external dependencies)"
@@ -45,6 +54,9 @@ def pytest_configure(config):
         "markers", "integration: Integration tests (slow, real API calls, require API keys)"
     )
     config.addinivalue_line("markers", "slow: Slow-running tests (take > 1 second)")
+    config.addinivalue_line(
+        "markers", "benchmark: Benchmarks (slow, timings only, need --run-benchmarks)"
+    )
 
 
 def pytest_collection_modifyitems(config, items):
@@ -53,6 +65,7 @@ def pytest_collection_modifyitems(config, items):
     This function:
     1. Automatically marks tests in tests/integration/ as 'integration' and 'slow'
     2. Skips integration tests unless --run-integration option is passed
+    3. Skips benchmarks unless --run-benchmarks option is passed
 
     Args:
         config: Pytest config object
@@ -60,6 +73,7 @@ def pytest_collection_modifyitems(config, items):
     """
     # Check if integration tests should run via command-line option
     run_integration = config.getoption("--run-integration")
+    run_benchmarks = config.getoption("--run-benchmarks")
 
     for item in items:
         # Automatically mark integration tests based on directory location
@@ -76,6 +90,12 @@ def pytest_collection_modifyitems(config, items):
                 )
             )
 
+        # Skip benchmarks by default (unless --run-benchmarks is passed)
+        if item.get_closest_marker("benchmark") and not run_benchmarks:
+            item.add_marker(
+                pytest.mark.skip(reason="Benchmarks skipped. Use --run-benchmarks to run.")
+            )
+
 
 # Add src to Python path for imports
 src_path = Path(__file__).parent.parent / "src"
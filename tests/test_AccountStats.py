@@ -7,6 +7,7 @@ from unittest.mock import MagicMock, Mock, patch
 
 import pytest
 
+from lendingbot.modules.HistorySync import ALL_CURRENCIES, HistoryPage
 from lendingbot.plugins.AccountStats import AccountStats
 
 
@@ -20,7 +21,7 @@ class TestAccountStats:
         mock_log = MagicMock()
 
         # Create a real in-memory database for testing
-        db = sqlite3.connect(":memory:")
+        db = sqlite3.connect(":memory:", check_same_thread=False)
 
         with (
             patch("sqlite3.connect", return_value=db),
@@ -85,6 +86,41 @@ class TestAccountStats:
 
     def test_update_history_empty(self, account_stats):
         # Test update_history when DB is empty
-        with patch.object(account_stats, "fetch_history", return_value=0) as mock_fetch:
-            account_stats.update_history()
-            mock_fetch.assert_called()
+        account_stats.api.history_streams.return_value = [ALL_CURRENCIES]
+        account_stats.api.return_lending_history_page.return_value = HistoryPage()
+        account_stats.update_history()
+        account_stats.api.return_lending_history_page.assert_called()
+        # Every window was downloaded, so the DB is ready
+        assert account_stats.get_db_version() == 2
+
+    def test_update_history_streams_rows(self, account_stats):
+        row = {
+            "id": 1,
+            "open": "2025-12-30 00:00:00",
+            "close": "2025-12-30 01:00:00",
+            "duration": 0.04,
+            "interest": "0.0001",
+            "rate": "0.01",
+            "currency": "BTC",
+            "amount": "1.0",
+            "earned": "0.000085",
+            "fee": "0.000015",
+        }
+        account_stats.api.history_streams.return_value = ["BTC"]
+        account_stats.api.return_lending_history_page.return_value = HistoryPage(
+            rows=[row], oldest=1767056400, complete=True
+        )
+        account_stats.update_history()
+
+        res = account_stats.db.execute("SELECT count(*) FROM history").fetchone()
+        assert res[0] == 1
+        # A history that fits one page takes one request, however far back it starts
+        account_stats.api.return_lending_history_page.assert_called_once()
+        assert account_stats.get_db_version() == 2
+
+    def test_update_history_failure_keeps_db_not_ready(self, account_stats):
+        account_stats.api.history_streams.return_value = ["BTC"]
+        account_stats.api.return_lending_history_page.side_effect = Exception("boom")
+        account_stats.update_history()
+        assert account_stats.get_db_version() == 0
+        account_stats.log.log_error.assert_called()
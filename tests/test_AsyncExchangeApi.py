@@ -0,0 +1,55 @@
+"""
+Tests for the asyncio front-end of the exchange API clients.
+"""
+
+import asyncio
+import threading
+import time
+from unittest.mock import MagicMock
+
+from lendingbot.modules.AsyncExchangeApi import AsyncExchangeApi
+
+
+def test_calls_are_forwarded():
+    api = MagicMock()
+    api.return_loan_orders.return_value = {"offers": [], "demands": []}
+    async_api = AsyncExchangeApi(api)
+
+    result = asyncio.run(async_api.return_loan_orders("BTC", 50))
+
+    assert result == {"offers": [], "demands": []}
+    api.return_loan_orders.assert_called_once_with("BTC", 50)
+
+
+def test_fetch_loan_orders_runs_concurrently():
+    api = MagicMock()
+    barrier = threading.Barrier(3, timeout=5)
+
+    def return_loan_orders(currency, limit):
+        # Fails with BrokenBarrierError unless all three fetches are in flight together
+        barrier.wait()
+        return {"currency": currency, "limit": limit}
+
+    api.return_loan_orders.side_effect = return_loan_orders
+    limits = {"BTC": 5, "ETH": 10, "USD": 20}
+
+    results = asyncio.run(AsyncExchangeApi(api).fetch_loan_orders(limits))
+
+    assert results == {cur: {"currency": cur, "limit": limit} for cur, limit in limits.items()}
+
+
+def test_fetch_isolates_failures():
+    api = MagicMock()
+
+    def get_frr(currency):
+        if currency == "ETH":
+            raise ValueError("bad symbol")
+        time.sleep(0.01)
+        return 0.0001
+
+    api.get_frr.side_effect = get_frr
+
+    results = asyncio.run(AsyncExchangeApi(api).fetch_frrs(["USD", "ETH"]))
+
+    assert results["USD"] == 0.0001
+    assert isinstance(results["ETH"], ValueError)
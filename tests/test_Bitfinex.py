@@ -1,4 +1,6 @@
 import base64
+import hashlib
+import hmac
 import json
 import re
 import threading
@@ -10,6 +12,7 @@ import pytest
 from lendingbot.modules.Bitfinex import Bitfinex
 from lendingbot.modules.Configuration import ApiConfig, BotConfig, RootConfig
 from lendingbot.modules.ExchangeApi import ApiError
+from lendingbot.modules.OrderBook import OrderBook
 
 
 @pytest.fixture
@@ -52,7 +55,7 @@ def test_sign_payload(bitfinex_api):
     assert decoded_payload == payload
 
 
-@patch("requests.get")
+@patch("requests.Session.get")
 def test_request_get_success(mock_get, bitfinex_api):
     mock_response = MagicMock()
     mock_response.status_code = 200
@@ -63,7 +66,7 @@ def test_request_get_success(mock_get, bitfinex_api):
     assert result == {"key": "value"}
 
 
-@patch("requests.post")
+@patch("requests.Session.post")
 def test_request_post_success(mock_post, bitfinex_api):
     mock_response = MagicMock()
     mock_response.status_code = 200
@@ -74,7 +77,7 @@ def test_request_post_success(mock_post, bitfinex_api):
     assert result == {"key": "value"}
 
 
-@patch("requests.get")
+@patch("requests.Session.get")
 def test_request_error_429(mock_get, bitfinex_api):
     mock_response = MagicMock()
     mock_response.status_code = 429
@@ -86,7 +89,7 @@ def test_request_error_429(mock_get, bitfinex_api):
         mock_increase.assert_called_once()
 
 
-@patch("requests.get")
+@patch("requests.Session.get")
 def test_request_error_502(mock_get, bitfinex_api):
     mock_response = MagicMock()
     mock_response.status_code = 502
@@ -96,7 +99,7 @@ def test_request_error_502(mock_get, bitfinex_api):
         bitfinex_api._request("get", "/v1/test")
 
 
-@patch("requests.get")
+@patch("requests.Session.get")
 def test_get_symbols(mock_get, bitfinex_api):
     mock_response = MagicMock()
     mock_response.status_code = 200
@@ -110,42 +113,122 @@ def test_get_symbols(mock_get, bitfinex_api):
     assert "ltcusd" not in symbols
 
 
-@patch("requests.get")
+@patch("requests.Session.get")
 def test_return_loan_orders(mock_get, bitfinex_api):
     mock_response = MagicMock()
     mock_response.status_code = 200
-    mock_response.json.return_value = {"asks": [], "bids": []}
+    mock_response.json.return_value = {
+        "asks": [{"rate": "7.3", "amount": "150.5", "period": 2, "frr": "No"}],
+        "bids": [{"rate": "3.65", "amount": "20", "period": 30, "frr": "No"}],
+    }
     mock_response.text = "{}"
     mock_get.return_value = mock_response
-    with patch(
-        "lendingbot.modules.Bitfinex2Poloniex.Bitfinex2Poloniex.convertLoanOrders"
-    ) as mock_conv:
-        mock_conv.return_value = {"asks": "converted"}
-        res = bitfinex_api.return_loan_orders("BTC", limit=5)
-        assert res == {"asks": "converted"}
+    res = bitfinex_api.return_loan_orders("BTC", limit=5)
+    assert res == {
+        "offers": [{"rate": "0.00020000", "amount": "150.5", "rangeMin": "2", "rangeMax": 2}],
+        "demands": [{"rate": "0.00010000", "amount": "20", "rangeMin": "2", "rangeMax": 30}],
+    }
+
+
+@patch("requests.Session.get")
+def test_return_loan_book(mock_get, bitfinex_api):
+    mock_response = MagicMock(status_code=200)
+    mock_response.json.return_value = {
+        "asks": [
+            {"rate": "7.3", "amount": "150.5", "period": 2},
+            {"rate": "10.95", "amount": "10", "period": 7},
+        ],
+        "bids": [],
+    }
+    mock_get.return_value = mock_response
+    book = bitfinex_api.return_loan_book("BTC", 5)
+    assert book.offers.rates.tolist() == pytest.approx([0.0002, 0.0003])
+    assert book.offers.amounts.tolist() == [150.5, 10.0]
+    assert book.offers.periods.tolist() == [2, 7]
+    assert len(book.demands) == 0
+
+
+def test_return_loan_orders_from_websocket_feed(bitfinex_api):
+    book = OrderBook.empty()
+    bitfinex_api.ws_feed = MagicMock()
+    bitfinex_api.ws_feed.order_book.return_value = book
+    bitfinex_api.ws_feed.frr.return_value = 0.0003
+    with patch.object(bitfinex_api, "_get") as mock_get:
+        assert bitfinex_api.return_loan_book("USD", 25) is book
+        assert bitfinex_api.return_loan_orders("USD", 25) == {"offers": [], "demands": []}
+        assert bitfinex_api.get_frr("USD") == 0.0003
+    mock_get.assert_not_called()
+
+
+@patch("requests.Session.get")
+def test_return_loan_orders_falls_back_to_rest(mock_get, bitfinex_api):
+    bitfinex_api.ws_feed = MagicMock()
+    bitfinex_api.ws_feed.order_book.return_value = None
+    mock_response = MagicMock(status_code=200)
+    mock_response.json.return_value = {"bids": [], "asks": []}
+    mock_get.return_value = mock_response
+    assert bitfinex_api.return_loan_orders("USD", 25) == {"offers": [], "demands": []}
+    mock_get.assert_called_once()
 
 
-@patch("requests.get")
+@patch("requests.Session.get")
 def test_return_ticker(mock_get, bitfinex_api):
+    bitfinex_api.symbols = ["btcusd", "ethusd", "ethbtc"]
+    bitfinex_api.usedCurrencies = ["BTC", "ETH"]
+    mock_response = MagicMock()
+    mock_response.status_code = 200
+    mock_response.json.return_value = [
+        ["tBTCUSD", 49999.0, 1, 50001.0, 1, 100, 0.002, 50000.0, 100.0, 51000, 49000],
+        ["tETHUSD", 2999.0, 1, 3001.0, 1, 10, -0.01, 3000.0, 50.0, 3100, 2900],
+        ["tETHBTC", 0.0599, 1, 0.0601, 1, 0, 0, 0.06, 20.0, 0.061, 0.059],
+        ["fUSD", 0.0002, 0.00019, 30, 1000, 0.00021, 2, 500, 0, 0, 0.0002, 1e6, 0, 0],
+    ]
+    mock_get.return_value = mock_response
+
+    ticker = bitfinex_api.return_ticker()
+
+    # Every pair and funding symbol comes from a single request
+    assert mock_get.call_count == 1
+    url = mock_get.call_args[0][0]
+    assert url.startswith("https://api.bitfinex.com/v2/tickers?symbols=")
+    assert url.endswith("tBTCUSD,tETHUSD,tETHBTC,fBTC,fETH,fUSD")
+    assert ticker["USD_BTC"]["last"] == "50000.0"
+    assert ticker["USD_BTC"]["lowestAsk"] == "50001.0"
+    assert ticker["USD_BTC"]["highestBid"] == "49999.0"
+    assert float(ticker["USD_BTC"]["baseVolume"]) == pytest.approx(100.0 * 50000.0)
+    assert float(ticker["BTC_USD"]["last"]) == pytest.approx(1 / 50000.0)
+    assert ticker["BTC_ETH"]["last"] == "0.06"
+    assert bitfinex_api.funding_ticker["USD"]["frr"] == "0.0002"
+    # The FRR cache is filled from the same request
+    assert bitfinex_api.get_frr("USD") == 0.0002
+    assert bitfinex_api.tickerTime > 0
+
+    # Cached for 60 seconds
+    bitfinex_api.return_ticker()
+    assert mock_get.call_count == 1
+
+
+@patch("requests.Session.get")
+def test_return_ticker_missing_symbol(mock_get, bitfinex_api):
     bitfinex_api.symbols = ["btcusd", "ethusd"]
     bitfinex_api.usedCurrencies = ["BTC", "ETH"]
     mock_response = MagicMock()
     mock_response.status_code = 200
-    mock_response.json.return_value = {
-        "last_price": "50000.0",
-        "ask": "50001.0",
-        "bid": "49999.0",
-        "volume": "100.0",
-        "mid": "50000.0",
-    }
+    mock_response.json.return_value = [
+        ["tBTCUSD", 49999.0, 1, 50001.0, 1, 100, 0.002, 50000.0, 100.0, 51000, 49000],
+    ]
     mock_get.return_value = mock_response
+
     ticker = bitfinex_api.return_ticker()
+
     assert "USD_BTC" in ticker
-    assert "BTC_USD" in ticker
-    assert bitfinex_api.tickerTime > 0
+    assert "USD_ETH" not in ticker
+    bitfinex_api.log.log_error.assert_called_once()
+    # An incomplete ticker is fetched again on the next call
+    assert bitfinex_api.tickerTime == 0
 
 
-@patch("requests.post")
+@patch("requests.Session.post")
 def test_cancel_loan_offer_success(mock_post, bitfinex_api):
     mock_response = MagicMock()
     mock_response.status_code = 200
@@ -160,7 +243,50 @@ def test_cancel_loan_offer_success(mock_post, bitfinex_api):
     assert res["success"] == 1
 
 
-@patch("requests.post")
+@patch("requests.Session.post")
+def test_cancel_loan_offers_all_open(mock_post, bitfinex_api):
+    mock_response = MagicMock()
+    mock_response.status_code = 200
+    mock_response.json.return_value = [1, "foc-req", None, None, [], None, "SUCCESS", "ok"]
+    mock_post.return_value = mock_response
+
+    results = bitfinex_api.cancel_loan_offers("USD", [1, 2, 3], all_open=True)
+
+    assert [r["success"] for r in results] == [1, 1, 1]
+    mock_post.assert_called_once()
+    url = mock_post.call_args[0][0]
+    assert url == "https://api.bitfinex.com/v2/auth/w/funding/offer/cancel/all"
+    headers = mock_post.call_args[1]["headers"]
+    body = mock_post.call_args[1]["data"]
+    assert json.loads(body) == {"currency": "USD"}
+    message = f"/api/v2/auth/w/funding/offer/cancel/all{headers['bfx-nonce']}{body}"
+    expected = hmac.new(b"test_secret", message.encode(), hashlib.sha384).hexdigest()
+    assert headers["bfx-signature"] == expected
+    assert headers["bfx-apikey"] == "test_key"
+
+
+def test_cancel_loan_offers_falls_back_to_loop(bitfinex_api):
+    with (
+        patch.object(bitfinex_api, "_post_v2", side_effect=ApiError("API Error 500")),
+        patch.object(bitfinex_api, "cancel_loan_offer", return_value={"success": 1}) as cancel,
+    ):
+        results = bitfinex_api.cancel_loan_offers("USD", [1, 2], all_open=True)
+    assert results == [{"success": 1}, {"success": 1}]
+    assert cancel.call_count == 2
+    bitfinex_api.log.log_error.assert_called_once()
+
+
+def test_cancel_loan_offers_subset_uses_loop(bitfinex_api):
+    with (
+        patch.object(bitfinex_api, "_post_v2") as post_v2,
+        patch.object(bitfinex_api, "cancel_loan_offer", return_value={"success": 1}) as cancel,
+    ):
+        bitfinex_api.cancel_loan_offers("USD", [1, 2])
+    post_v2.assert_not_called()
+    assert cancel.call_count == 2
+
+
+@patch("requests.Session.post")
 def test_cancel_loan_offer_exception(mock_post, bitfinex_api):
     mock_response = MagicMock()
     mock_response.status_code = 200
@@ -171,7 +297,7 @@ def test_cancel_loan_offer_exception(mock_post, bitfinex_api):
     assert "Error canceling offer" in res["message"]
 
 
-@patch("requests.post")
+@patch("requests.Session.post")
 def test_create_loan_offer_success(mock_post, bitfinex_api):
     mock_response = MagicMock()
     mock_response.status_code = 200
@@ -182,7 +308,7 @@ def test_create_loan_offer_success(mock_post, bitfinex_api):
     assert res["orderId"] == 67890
 
 
-@patch("requests.post")
+@patch("requests.Session.post")
 def test_create_loan_offer_min_amount_error(mock_post, bitfinex_api):
     with patch.object(
         bitfinex_api,
@@ -195,7 +321,7 @@ def test_create_loan_offer_min_amount_error(mock_post, bitfinex_api):
             bitfinex_api.create_loan_offer("BTC", 0.0001, 2, 0, 0.01)
 
 
-@patch("requests.post")
+@patch("requests.Session.post")
 def test_transfer_balance(mock_post, bitfinex_api):
     mock_response = MagicMock()
     mock_response.status_code = 200
@@ -205,7 +331,7 @@ def test_transfer_balance(mock_post, bitfinex_api):
     assert res["status"] == 1
 
 
-@patch("requests.post")
+@patch("requests.Session.post")
 def test_return_lending_history(mock_post, bitfinex_api):
     mock_response = MagicMock()
     mock_response.status_code = 200
@@ -218,6 +344,23 @@ def test_return_lending_history(mock_post, bitfinex_api):
     assert len(history) == 3
 
 
+@patch("requests.Session.post")
+def test_return_lending_history_page(mock_post, bitfinex_api):
+    mock_response = MagicMock()
+    mock_response.status_code = 200
+    mock_response.json.return_value = [
+        {"description": "Margin Funding Payment", "amount": "0.85", "timestamp": "1600000200.0"},
+        {"description": "Deposit", "amount": "5.0", "timestamp": "1600000100.0"},
+    ]
+    mock_post.return_value = mock_response
+    page = bitfinex_api.return_lending_history_page("BTC", 1600000000, 1600000300, 2)
+    assert [row["close"] for row in page.rows] == ["2020-09-13 12:30:00"]
+    # The entry that is not a payment still counts for paging
+    assert page.oldest == 1600000100
+    assert not page.complete
+    assert bitfinex_api.history_streams() == ["BTC", "ETH", "USD"]
+
+
 # --- Concurrency Tests (from test_BitfinexAPI.py) ---
 
 
@@ -238,10 +381,86 @@ def test_multiple_calls(bitfinex_api):
         t.join()
 
 
+def _track_concurrency(delay: float):
+    """Returns a fake request function and a dict recording the peak concurrency."""
+    state = {"active": 0, "peak": 0}
+    lock = threading.Lock()
+
+    def fake_request(*_args, **_kwargs):
+        with lock:
+            state["active"] += 1
+            state["peak"] = max(state["peak"], state["active"])
+        time.sleep(delay)
+        with lock:
+            state["active"] -= 1
+        return {}
+
+    return fake_request, state
+
+
+def _run_threads(target, count):
+    threads = [threading.Thread(target=target) for _ in range(count)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+
+def test_public_calls_run_concurrently(bitfinex_api):
+    fake_request, state = _track_concurrency(0.05)
+    with (
+        patch.object(bitfinex_api, "limit_request_rate"),
+        patch.object(bitfinex_api, "_request", side_effect=fake_request),
+    ):
+        paths = iter(f"lendbook/C{i}" for i in range(8))
+        _run_threads(lambda: bitfinex_api._get(next(paths)), 8)
+    assert 1 < state["peak"] <= bitfinex_api.cfg.api.http.public_concurrency
+
+
+def test_identical_public_calls_share_one_request(bitfinex_api):
+    fake_request, _state = _track_concurrency(0.2)
+    with (
+        patch.object(bitfinex_api, "limit_request_rate") as limit,
+        patch.object(bitfinex_api, "_request", side_effect=fake_request) as request,
+    ):
+        _run_threads(lambda: bitfinex_api._get("lendbook/USD"), 5)
+    assert request.call_count == 1
+    assert limit.call_count == 1
+    stats = bitfinex_api.public_requests.snapshot()
+    assert stats["misses"] == 1
+    assert stats["coalesced"] == 4
+
+
+def test_signed_calls_are_serialized(bitfinex_api):
+    fake_request, state = _track_concurrency(0.01)
+    with (
+        patch.object(bitfinex_api, "limit_request_rate"),
+        patch.object(bitfinex_api, "_request", side_effect=fake_request),
+    ):
+        _run_threads(lambda: bitfinex_api._post("offers"), 5)
+    assert state["peak"] == 1
+
+
+def test_public_calls_do_not_wait_for_signed_calls(bitfinex_api):
+    fake_request, _state = _track_concurrency(0.0)
+    with (
+        patch.object(bitfinex_api, "limit_request_rate"),
+        patch.object(bitfinex_api, "_request", side_effect=fake_request),
+    ):
+        bitfinex_api.nonce_lock.acquire()
+        try:
+            worker = threading.Thread(target=lambda: bitfinex_api._get("lendbook/USD"))
+            worker.start()
+            worker.join(timeout=2)
+            assert not worker.is_alive()
+        finally:
+            bitfinex_api.nonce_lock.release()
+
+
 # --- More edge cases ---
 
 
-@patch("requests.post")
+@patch("requests.Session.post")
 def test_return_balances(mock_post, bitfinex_api):
     mock_response = MagicMock()
     mock_response.status_code = 200
@@ -253,7 +472,7 @@ def test_return_balances(mock_post, bitfinex_api):
     assert balances["BTC"] == "1.0"
 
 
-@patch("requests.get")
+@patch("requests.Session.get")
 def test_return_ticker_error_message(mock_get, bitfinex_api):
     bitfinex_api.symbols = ["btcusd"]
     mock_response = MagicMock()
@@ -271,10 +490,29 @@ def test_debug_log(bitfinex_api):
     bitfinex_api.log.log.assert_called_with("test")
 
 
-@patch("requests.get")
+@patch("requests.Session.get")
 def test_get_frr(mock_get, bitfinex_api):
     mock_response = MagicMock()
     mock_response.status_code = 200
     mock_response.json.return_value = [["fUSD", 0.0002]]
     mock_get.return_value = mock_response
     assert bitfinex_api.get_frr("USD") == 0.0002
+
+
+@patch("requests.Session.get")
+def test_get_frr_fetches_all_currencies_once(mock_get, bitfinex_api):
+    mock_response = MagicMock()
+    mock_response.status_code = 200
+    mock_response.json.return_value = [
+        ["fBTC", 0.0001],
+        ["fETH", 0.00015],
+        ["fUSD", 0.0002],
+    ]
+    mock_get.return_value = mock_response
+
+    assert bitfinex_api.get_frr("USD") == 0.0002
+    assert bitfinex_api.get_frr("BTC") == 0.0001
+    assert bitfinex_api.get_frr("ETH") == 0.00015
+
+    mock_get.assert_called_once()
+    assert mock_get.call_args[0][0].endswith("/v2/tickers?symbols=fBTC,fETH,fUSD")
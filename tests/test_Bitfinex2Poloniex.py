@@ -1,3 +1,6 @@
+import random
+import time
+
 import pytest
 
 from lendingbot.modules.Bitfinex2Poloniex import Bitfinex2Poloniex
@@ -9,6 +12,17 @@ def test_convert_timestamp():
     assert Bitfinex2Poloniex.convertTimestamp("1514764800") == "2018-01-01 00:00:00"
 
 
+def test_bulk_conversions_match_scalar_conversions():
+    timestamps = ["1514764800", 1514764800.999, "1700000000.25", 86399]
+    assert Bitfinex2Poloniex.convertTimestamps(timestamps) == [
+        Bitfinex2Poloniex.convertTimestamp(t) for t in timestamps
+    ]
+    assert Bitfinex2Poloniex.convertTimestamps([]) == []
+
+    rates = ["7.3", "18.25", 0.01, "0"]
+    assert Bitfinex2Poloniex.convertRates(rates) == [str(float(r) / 36500) for r in rates]
+
+
 def test_convert_open_loan_offers():
     bfx_offers = [
         {
@@ -109,13 +123,13 @@ def test_convert_loan_orders():
 
     demand = plx_orders["demands"][0]
     assert demand["rate"] == "0.00020000"
-    assert demand["amount"] == "10.0"
+    assert float(demand["amount"]) == 10.0
     assert demand["rangeMin"] == "2"
     assert int(demand["rangeMax"]) == 30
 
     offer = plx_orders["offers"][0]
     assert offer["rate"] == "0.00040000"
-    assert offer["amount"] == "20.0"
+    assert float(offer["amount"]) == 20.0
     assert offer["rangeMin"] == "2"
     assert int(offer["rangeMax"]) == 2
 
@@ -157,3 +171,50 @@ def test_convert_account_balances():
     assert "margin" in balances_margin
     assert "lending" not in balances_margin
     assert balances_margin["margin"]["ETH"] == "1.5"
+
+
+def make_credits(n):
+    rng = random.Random(0)
+    return [
+        {
+            "id": i,
+            "currency": "BTC",
+            "rate": f"{rng.uniform(1, 40):.4f}",
+            "period": rng.randint(2, 120),
+            "amount": f"{rng.uniform(0.01, 5):.8f}",
+            "timestamp": f"{1_500_000_000 + rng.uniform(0, 2e8):.1f}",
+        }
+        for i in range(n)
+    ]
+
+
+def convert_credits_per_row(credits):
+    """The rate and date of every credit, converted one row at a time"""
+    return [
+        {
+            "rate": str(float(c["rate"]) / 36500),
+            "date": Bitfinex2Poloniex.convertTimestamp(c["timestamp"]),
+        }
+        for c in credits
+    ]
+
+
+def test_bulk_conversion_matches_per_row_conversion():
+    credits = make_credits(2_000)
+    bulk = Bitfinex2Poloniex.convertActiveLoans(credits)["provided"]
+    assert [{"rate": loan["rate"], "date": loan["date"]} for loan in bulk] == (
+        convert_credits_per_row(credits)
+    )
+
+
+@pytest.mark.benchmark
+def test_benchmark_bulk_conversion_of_100k_credits(record_property):
+    credits = make_credits(100_000)
+
+    start = time.perf_counter()
+    convert_credits_per_row(credits)
+    record_property("per_row_seconds", time.perf_counter() - start)
+
+    start = time.perf_counter()
+    Bitfinex2Poloniex.convertActiveLoans(credits)
+    record_property("bulk_seconds", time.perf_counter() - start)
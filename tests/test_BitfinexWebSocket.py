@@ -0,0 +1,345 @@
+"""
+Tests for the Bitfinex WebSocket funding feed, against a local fake WebSocket server.
+"""
+
+import json
+import socket
+import threading
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+from lendingbot.modules.BitfinexWebSocket import (
+    BitfinexWebSocketFeed,
+    FundingBook,
+    ResyncNeeded,
+    _js_number,
+)
+from lendingbot.modules.Configuration import WebSocketConfig
+from lendingbot.modules.WebSocket import (
+    OP_CLOSE,
+    OP_PING,
+    OP_PONG,
+    OP_TEXT,
+    ConnectionClosed,
+    accept_key,
+    encode_frame,
+    read_frame,
+)
+
+
+SNAPSHOT = [[0.0002, 2, 3, 100.0], [0.00025, 30, 1, 50.0], [0.00015, 2, 2, -80.0]]
+BOOK_CHAN = 10
+TICKER_CHAN = 11
+
+
+class FakeConnection:
+    """Server side of one WebSocket connection"""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.seq = 0
+
+    def send_json(self, msg):
+        self.sock.sendall(encode_frame(OP_TEXT, json.dumps(msg).encode("utf-8"), mask=False))
+
+    def send_channel(self, *items, seq=None):
+        """Sends a channel message with the next (or the given) sequence number"""
+        self.seq = self.seq + 1 if seq is None else seq
+        self.send_json([*items, self.seq])
+
+    def recv_json(self):
+        while True:
+            _final, opcode, payload = read_frame(self.sock)
+            if opcode == OP_TEXT:
+                return json.loads(payload)
+            if opcode == OP_CLOSE:
+                raise ConnectionClosed("client closed")
+
+    def subscribe_all(self):
+        """Answers the conf and subscribe requests of a feed for USD"""
+        requests = [self.recv_json() for _ in range(3)]
+        assert requests[0]["event"] == "conf"
+        for request in requests[1:]:
+            chan_id = BOOK_CHAN if request["channel"] == "book" else TICKER_CHAN
+            self.send_json({**request, "event": "subscribed", "chanId": chan_id})
+        return requests
+
+    def send_snapshot(self, levels):
+        book = FundingBook("USD")
+        book.apply_snapshot(levels)
+        self.send_channel(BOOK_CHAN, levels)
+        self.send_channel(BOOK_CHAN, "cs", book.checksum())
+        return book
+
+    def wait_closed(self):
+        try:
+            while True:
+                self.recv_json()
+        except (ConnectionClosed, OSError):
+            pass
+
+
+class FakeBitfinexWs:
+    """Accepts WebSocket connections and runs `script(index, connection)` for each"""
+
+    def __init__(self, script):
+        self.script = script
+        self.listener = socket.create_server(("127.0.0.1", 0))
+        self.port = self.listener.getsockname()[1]
+        self.connections = 0
+        self.socks = []
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    @property
+    def url(self):
+        return f"ws://127.0.0.1:{self.port}"
+
+    def _accept(self):
+        while True:
+            try:
+                sock, _ = self.listener.accept()
+            except OSError:
+                return
+            self.socks.append(sock)
+            index = self.connections
+            self.connections += 1
+            threading.Thread(target=self._serve, args=(index, sock), daemon=True).start()
+
+    def _serve(self, index, sock):
+        request = b""
+        while b"\r\n\r\n" not in request:
+            request += sock.recv(1024)
+        headers = dict(
+            line.split(": ", 1) for line in request.decode("latin-1").split("\r\n")[1:] if line
+        )
+        sock.sendall(
+            (
+                "HTTP/1.1 101 Switching Protocols\r\n"
+                "Upgrade: websocket\r\nConnection: Upgrade\r\n"
+                f"Sec-WebSocket-Accept: {accept_key(headers['Sec-WebSocket-Key'])}\r\n\r\n"
+            ).encode("ascii")
+        )
+        try:
+            self.script(index, FakeConnection(sock))
+        except (ConnectionClosed, OSError):
+            pass
+        finally:
+            sock.close()
+
+    def close(self):
+        self.listener.close()
+        for sock in self.socks:
+            sock.close()
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+@pytest.fixture
+def run_feed():
+    created = []
+
+    def start(script, **cfg):
+        server = FakeBitfinexWs(script)
+        config = WebSocketConfig(
+            enabled=True,
+            url=server.url,
+            stale_after=5,
+            reconnect_delay=0.05,
+            max_reconnect_delay=0.2,
+            **cfg,
+        )
+        feed = BitfinexWebSocketFeed(config, ["USD"], MagicMock())
+        feed.start()
+        created.append((server, feed))
+        return server, feed
+
+    yield start
+    for server, feed in created:
+        feed.stop()
+        server.close()
+
+
+# --- WebSocket protocol ---
+
+
+def test_accept_key_rfc_example():
+    assert accept_key("dGhlIHNhbXBsZSBub25jZQ==") == "s3pPLMBiTxaQ9kYGzzhZRbK+xOo="
+
+
+@pytest.mark.parametrize("size", [5, 300, 70000])
+def test_frame_round_trip(size):
+    payload = bytes(i % 251 for i in range(size))
+    left, right = socket.socketpair()
+    with left, right:
+        sender = threading.Thread(
+            target=lambda: left.sendall(encode_frame(OP_TEXT, payload, mask=True))
+        )
+        sender.start()
+        final, opcode, received = read_frame(right)
+        sender.join()
+    assert final
+    assert opcode == OP_TEXT
+    assert received == payload
+
+
+# --- Funding book ---
+
+
+def test_funding_book_sides_and_order():
+    book = FundingBook("USD")
+    book.apply_snapshot(SNAPSHOT)
+    assert book.sorted_asks() == [(0.0002, 2, 100.0), (0.00025, 30, 50.0)]
+    assert book.sorted_bids() == [(0.00015, 2, -80.0)]
+
+    book.apply_update([0.0002, 2, 0, 1])
+    book.apply_update([0.00018, 7, 1, 10.0])
+    assert book.sorted_asks() == [(0.00018, 7, 10.0), (0.00025, 30, 50.0)]
+
+
+def test_funding_book_as_loan_orders():
+    book = FundingBook("USD")
+    book.apply_snapshot(SNAPSHOT)
+    orders = book.to_loan_orders(1)
+    assert orders == {
+        "offers": [{"rate": "0.00020000", "amount": "100", "rangeMin": "2", "rangeMax": 2}],
+        "demands": [{"rate": "0.00015000", "amount": "80", "rangeMin": "2", "rangeMax": 2}],
+    }
+
+
+def test_funding_book_checksum_tracks_top_levels():
+    book = FundingBook("USD")
+    book.apply_snapshot(SNAPSHOT)
+    before = book.checksum()
+    assert -(1 << 31) <= before < 1 << 31
+    book.apply_update([0.0002, 2, 3, 101.0])
+    assert book.checksum() != before
+
+
+@pytest.mark.parametrize(
+    ("value", "text"), [(100.0, "100"), (0.0002, "0.0002"), (0.00001, "0.00001"), (-1.5, "-1.5")]
+)
+def test_js_number(value, text):
+    assert _js_number(value) == text
+
+
+def test_sequence_gap_raises():
+    feed = BitfinexWebSocketFeed(WebSocketConfig(), ["USD"], MagicMock())
+    feed.handle_message({"event": "subscribed", "channel": "book", "chanId": 1, "symbol": "fUSD"})
+    feed.handle_message([1, SNAPSHOT, 1])
+    with pytest.raises(ResyncNeeded, match="Sequence gap"):
+        feed.handle_message([1, "hb", 3])
+
+
+# --- Feed against the fake server ---
+
+
+def test_feed_serves_book_and_frr(run_feed):
+    def script(_index, conn):
+        conn.subscribe_all()
+        conn.send_channel(TICKER_CHAN, [0.0003, 0.00015, 2, 80, 0.0002, 2, 100])
+        book = conn.send_snapshot(SNAPSHOT)
+        update = [0.00021, 5, 1, 20.0]
+        book.apply_update(update)
+        conn.send_channel(BOOK_CHAN, update)
+        conn.send_channel(BOOK_CHAN, "cs", book.checksum())
+        conn.wait_closed()
+
+    server, feed = run_feed(script)
+    assert wait_for(lambda: len((feed.loan_orders("USD", 25) or {"offers": []})["offers"]) == 3)
+    offers = feed.loan_orders("USD", 25)["offers"]
+    assert [o["rate"] for o in offers] == ["0.00020000", "0.00021000", "0.00025000"]
+    assert feed.frr("USD") == 0.0003
+    assert feed.loan_orders("USD", 100) is None  # more than the subscribed length
+    assert feed.loan_orders("BTC", 25) is None
+    assert feed.stats()["resyncs"] == 0
+    assert server.connections == 1
+
+
+def test_feed_resyncs_after_sequence_gap(run_feed):
+    def script(index, conn):
+        conn.subscribe_all()
+        if index == 0:
+            conn.send_snapshot(SNAPSHOT)
+            conn.send_channel(BOOK_CHAN, [0.0003, 2, 1, 5.0], seq=conn.seq + 2)
+        else:
+            conn.send_snapshot([[0.0004, 2, 1, 7.0]])
+        conn.wait_closed()
+
+    server, feed = run_feed(script)
+    assert wait_for(lambda: server.connections == 2 and feed.loan_orders("USD", 25) is not None)
+    assert feed.loan_orders("USD", 25)["offers"][0]["rate"] == "0.00040000"
+    assert feed.resyncs == 1
+    feed.log.log_error.assert_called()
+
+
+def test_feed_resyncs_after_checksum_mismatch(run_feed):
+    def script(index, conn):
+        conn.subscribe_all()
+        book = conn.send_snapshot(SNAPSHOT)
+        if index == 0:
+            conn.send_channel(BOOK_CHAN, [0.0002, 2, 3, 90.0])
+            conn.send_channel(BOOK_CHAN, "cs", book.checksum())  # stale checksum
+        conn.wait_closed()
+
+    server, feed = run_feed(script)
+    assert wait_for(lambda: server.connections == 2 and feed.loan_orders("USD", 25) is not None)
+    assert feed.loan_orders("USD", 25)["offers"][0]["amount"] == "100"
+    assert feed.resyncs == 1
+
+
+def test_feed_reconnects_after_disconnect(run_feed):
+    def script(index, conn):
+        conn.subscribe_all()
+        conn.send_snapshot(SNAPSHOT if index == 0 else [[0.0005, 2, 1, 1.0]])
+        if index == 0:
+            return  # drops the connection
+        conn.wait_closed()
+
+    server, feed = run_feed(script)
+    assert wait_for(
+        lambda: (
+            (feed.loan_orders("USD", 25) or {"offers": [{}]})["offers"][0].get("rate")
+            == "0.00050000"
+        )
+    )
+    assert server.connections == 2
+    assert feed.connects == 2
+
+
+def test_feed_answers_pings(run_feed):
+    pongs = []
+
+    def script(_index, conn):
+        conn.subscribe_all()
+        conn.sock.sendall(encode_frame(OP_PING, b"hi", mask=False))
+        _final, opcode, payload = read_frame(conn.sock)
+        pongs.append((opcode, payload))
+        conn.send_snapshot(SNAPSHOT)
+        conn.wait_closed()
+
+    _server, feed = run_feed(script)
+    assert wait_for(lambda: feed.loan_orders("USD", 25) is not None)
+    assert pongs == [(OP_PONG, b"hi")]
+
+
+def test_feed_data_goes_stale(run_feed):
+    def script(_index, conn):
+        conn.subscribe_all()
+        conn.send_channel(TICKER_CHAN, [0.0003, 0, 0, 0, 0, 0, 0])
+        conn.send_snapshot(SNAPSHOT)
+        conn.wait_closed()
+
+    _server, feed = run_feed(script)
+    assert wait_for(lambda: feed.loan_orders("USD", 25) is not None)
+    feed.updated["USD"] -= 10
+    assert feed.loan_orders("USD", 25) is None
+    assert feed.frr("USD") is None
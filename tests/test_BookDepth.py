@@ -0,0 +1,40 @@
+"""
+Tests for the per-currency order book depth
+"""
+
+from lendingbot.modules.BookDepth import BookDepth
+
+
+def test_limit_starts_at_the_default():
+    depth = BookDepth(default=5, maximum=100)
+    assert depth.limit("BTC") == 5
+    assert depth.limits == {"BTC": 5}
+    assert not depth.at_maximum("BTC")
+
+
+def test_grow_to_the_expected_levels():
+    depth = BookDepth(default=5, maximum=100)
+    # 50 offered on 5 levels, 400 needed: 40 levels, with headroom 60
+    assert depth.grow("BTC", target=400, volume=50) == 60
+    # A small shortfall still at least doubles the depth
+    assert depth.grow("ETH", target=55, volume=50) == 10
+    assert depth.grow("USD", target=10, volume=0) == 10
+
+
+def test_grow_stops_at_the_maximum():
+    depth = BookDepth(default=5, maximum=20)
+    assert depth.grow("BTC", target=1000, volume=1) == 20
+    assert depth.at_maximum("BTC")
+    assert depth.grow("BTC", target=1000, volume=1) is None
+
+
+def test_record_shrinks_half_the_way_and_grows_at_once():
+    depth = BookDepth(default=5, maximum=100)
+    depth.limits["BTC"] = 85
+    # Gaps filled within 2 levels want the default depth back
+    assert depth.record("BTC", 2) == 45
+    assert depth.record("BTC", 2) == 25
+    assert depth.record("BTC", 2) == 15
+    # Gaps close to the edge of the book get headroom right away
+    assert depth.record("BTC", 14) == 21
+    assert depth.record("BTC", 200) == 100
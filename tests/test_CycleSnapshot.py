@@ -0,0 +1,84 @@
+"""
+Tests for the per-cycle exchange snapshot
+"""
+
+from dataclasses import FrozenInstanceError
+from decimal import Decimal
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from lendingbot.modules import Data
+from lendingbot.modules.CycleSnapshot import (
+    ACTIVE_LOANS,
+    LENDING_BALANCES,
+    OPEN_LOAN_OFFERS,
+    TICKER,
+    CycleSnapshot,
+)
+
+
+@pytest.fixture
+def api():
+    api = MagicMock()
+    api.return_active_loans.return_value = {
+        "provided": [{"currency": "BTC", "amount": "1.5", "rate": "0.001"}]
+    }
+    api.return_open_loan_offers.return_value = {"BTC": [{"id": 1, "amount": "0.5"}]}
+    api.return_available_account_balances.return_value = {"lending": {"BTC": "2.0"}}
+    api.return_ticker.return_value = {"BTC_ETH": {"highestBid": "0.05"}}
+    return api
+
+
+class TestCycleSnapshot:
+    def test_fetch_calls_each_resource_once(self, api):
+        snapshot = CycleSnapshot.fetch(api, ACTIVE_LOANS, OPEN_LOAN_OFFERS, LENDING_BALANCES)
+
+        assert snapshot.lending_balances == {"BTC": "2.0"}
+        assert snapshot.open_loan_offers == {"BTC": [{"id": 1, "amount": "0.5"}]}
+        assert snapshot.active_loans["provided"][0]["amount"] == "1.5"
+        api.return_active_loans.assert_called_once()
+        api.return_open_loan_offers.assert_called_once()
+        api.return_available_account_balances.assert_called_once_with("lending")
+        api.return_ticker.assert_not_called()
+        assert set(snapshot.fetch_times) == {ACTIVE_LOANS, OPEN_LOAN_OFFERS, LENDING_BALANCES}
+
+    def test_missing_resource(self, api):
+        snapshot = CycleSnapshot.fetch(api, ACTIVE_LOANS)
+        assert not snapshot.has(TICKER)
+        with pytest.raises(KeyError, match="ticker was not fetched"):
+            _ = snapshot.ticker
+
+    def test_immutable(self, api):
+        snapshot = CycleSnapshot.fetch(api, ACTIVE_LOANS)
+        with pytest.raises(FrozenInstanceError):
+            snapshot.created = 0  # type: ignore[misc]
+        with pytest.raises(TypeError):
+            snapshot.resources[TICKER] = {}  # type: ignore[index]
+
+    def test_refreshed_returns_copy(self, api):
+        snapshot = CycleSnapshot.fetch(api, ACTIVE_LOANS, LENDING_BALANCES)
+        api.return_available_account_balances.return_value = {"lending": {"BTC": "3.0"}}
+
+        refreshed = snapshot.refreshed(api, LENDING_BALANCES)
+
+        assert snapshot.lending_balances == {"BTC": "2.0"}
+        assert refreshed.lending_balances == {"BTC": "3.0"}
+        assert refreshed.active_loans is snapshot.active_loans
+        api.return_active_loans.assert_called_once()
+
+    def test_unknown_resource(self, api):
+        with pytest.raises(ValueError, match="Unknown snapshot resource"):
+            CycleSnapshot.fetch(api, "balances")
+
+
+class TestDataWithSnapshot:
+    def test_reads_from_snapshot(self, api):
+        snapshot = CycleSnapshot.fetch(api, ACTIVE_LOANS, OPEN_LOAN_OFFERS)
+        with patch.object(Data, "api", MagicMock()) as data_api:
+            lent = Data.get_total_lent(snapshot)
+            on_order = Data.get_on_order_balances(snapshot)
+        data_api.return_active_loans.assert_not_called()
+        data_api.return_open_loan_offers.assert_not_called()
+        assert lent.total_lent == {"BTC": Decimal("1.5")}
+        assert on_order == {"BTC": Decimal("0.5")}
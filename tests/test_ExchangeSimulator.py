@@ -0,0 +1,333 @@
+"""
+Tests for the exchange simulator, and the exchange clients run end to end against it
+"""
+
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import pytest
+
+from lendingbot.modules.Bitfinex import Bitfinex
+from lendingbot.modules.Configuration import (
+    AdaptiveRateConfig,
+    ApiConfig,
+    BotConfig,
+    Exchange,
+    RateLimitConfig,
+    RootConfig,
+)
+from lendingbot.modules.ExchangeApi import ApiError
+from lendingbot.modules.ExchangeSimulator import (
+    DAY,
+    CurrencySettings,
+    DemandEvent,
+    ExchangeSimulator,
+    SimulatedExchange,
+    SimulatorError,
+    SimulatorSettings,
+    load_demand,
+)
+from lendingbot.modules.Orchestrator import BotOrchestrator
+from lendingbot.modules.Poloniex import Poloniex
+
+
+KEY = "sim-key"
+SECRET = "sim-secret"
+CURRENCIES = {
+    "USD": CurrencySettings(rate=0.0002, depth=100000.0, price_usd=1.0, balance=1000.0),
+    "BTC": CurrencySettings(rate=0.00005, depth=10.0, price_usd=50000.0, balance=0.1),
+}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_exchange(clock=None, demand=None, **settings):
+    settings.setdefault("demand_interval", 0)
+    return SimulatedExchange(
+        CURRENCIES, SimulatorSettings(**settings), demand=demand, clock=clock or FakeClock()
+    )
+
+
+@pytest.fixture
+def simulator():
+    created = []
+
+    def start(**settings):
+        settings = {"api_key": KEY, "api_secret": SECRET, "demand_interval": 0, **settings}
+        sim = ExchangeSimulator(SimulatedExchange(CURRENCIES, SimulatorSettings(**settings)))
+        sim.start()
+        created.append(sim)
+        return sim
+
+    yield start
+    for sim in created:
+        sim.stop()
+
+
+def client_cfg(url, exchange=Exchange.BITFINEX, secret=SECRET):
+    fast = RateLimitConfig(requests=100, period_ms=100)
+    return RootConfig(
+        api=ApiConfig(
+            exchange=exchange,
+            apikey=KEY,
+            secret=secret,
+            base_url=url,
+            all_currencies=["USD", "BTC"],
+            rate_limits={"public": fast, "auth_read": fast, "auth_write": fast},
+            adaptive_rate=AdaptiveRateConfig(state_file=""),
+        ),
+        bot=BotConfig(request_timeout=5),
+    )
+
+
+# --- Matching engine ---
+
+
+def test_offer_below_the_market_is_filled_first():
+    clock = FakeClock()
+    ex = make_exchange(clock)
+    cheap = ex.place_offer("USD", 200, 0.00015, 2)
+    dear = ex.place_offer("USD", 300, 0.0005, 30)
+
+    filled = ex.fill("USD", 500, 0.00021, clock.now)
+
+    assert filled == 200
+    assert [o.id for o in ex.open_offers()] == [dear.id]
+    credits = ex.active_credits()
+    assert [(c.currency, c.amount, c.rate) for c in credits] == [("USD", 200, cheap.rate)]
+    # Loans and open offers are not available to lend again
+    assert ex.available("deposit", "USD") == pytest.approx(500)
+
+
+def test_other_lenders_at_the_same_rate_fill_first():
+    clock = FakeClock()
+    ex = make_exchange(clock)
+    ex.place_offer("USD", 100, 0.0002, 2)  # the rate of the best synthetic level
+    level = CURRENCIES["USD"].depth / 20
+
+    assert ex.fill("USD", level, 0.0002, clock.now) == 0
+    assert ex.fill("USD", level + 40, 0.0002, clock.now) == pytest.approx(40)
+    assert ex.open_offers()[0].remaining == pytest.approx(60)
+
+
+def test_expired_loan_pays_interest():
+    clock = FakeClock()
+    ex = make_exchange(clock)
+    ex.place_offer("USD", 1000, 0.0001, 2)
+    ex.fill("USD", 1000, 0.0002, clock.now)
+
+    clock.now += 2 * DAY
+    assert ex.active_credits() == []
+    earned = 1000 * 0.0001 * 2 * 0.85
+    assert ex.available("deposit", "USD") == pytest.approx(1000 + earned)
+    [entry] = ex.history("USD", 0, clock.now, 10)
+    assert entry["amount"] == pytest.approx(earned)
+    assert "Margin Funding Payment" in entry["description"]
+
+
+def test_synthetic_demand_is_deterministic_and_scaled():
+    def run():
+        clock = FakeClock()
+        ex = make_exchange(clock, seed=7, demand_interval=10, time_scale=10)
+        ex.place_offer("USD", 1000, 0.0001, 2)
+        clock.now += 5  # 50 simulated seconds, 5 demands
+        ex.advance()
+        return ex.stats()["USD"]
+
+    first = run()
+    assert first == run()
+    assert first["volume"] > 0
+    assert first["filled"] > 0
+
+
+def test_replayed_demand(tmp_path):
+    path = tmp_path / "demand.csv"
+    path.write_text("at,currency,amount,rate\n20,usd,50,0.0002\n5,USD,100,0.0001\n")
+    events = load_demand(path)
+    assert events == [DemandEvent(5, "USD", 100, 0.0001), DemandEvent(20, "USD", 50, 0.0002)]
+
+    clock = FakeClock()
+    ex = make_exchange(clock, demand=events)
+    ex.place_offer("USD", 500, 0.0001, 2)
+    clock.now += 10
+    ex.advance()
+    assert ex.stats()["USD"]["filled"] == 100
+    clock.now += 10
+    ex.advance()
+    assert ex.stats()["USD"]["filled"] == 150
+
+
+@pytest.mark.parametrize(
+    ("currency", "amount", "rate", "period", "message"),
+    [
+        ("USD", 10, 0.0002, 2, "minimum is 50"),
+        ("USD", 5000, 0.0002, 2, "not enough balance"),
+        ("USD", 100, 0.0002, 1, "period"),
+        ("XYZ", 100, 0.0002, 2, "Unknown currency"),
+    ],
+)
+def test_invalid_offers(currency, amount, rate, period, message):
+    with pytest.raises(SimulatorError, match=message):
+        make_exchange().place_offer(currency, amount, rate, period)
+
+
+def test_nonce_must_increase():
+    ex = make_exchange()
+    ex.check_nonce("key", 5)
+    with pytest.raises(SimulatorError, match="Nonce must be greater than 5"):
+        ex.check_nonce("key", 5)
+
+
+# --- Bitfinex client against the simulator ---
+
+
+def test_bitfinex_client_round_trip(simulator):
+    sim = simulator()
+    api = Bitfinex(client_cfg(sim.url), MagicMock())
+
+    assert api.return_available_account_balances("lending") == {
+        "lending": {"BTC": "0.10000000", "USD": "1000.00000000"}
+    }
+    placed = api.create_loan_offer("USD", 200, 2, 0, 0.00015)
+    assert placed["success"] == 1
+
+    book = api.return_loan_orders("USD", 3)
+    assert [o["rate"] for o in book["offers"]] == ["0.00015000", "0.00020000", "0.00020400"]
+    open_offers = api.return_open_loan_offers()["USD"]
+    assert [(o["id"], o["amount"], o["duration"]) for o in open_offers] == [
+        (placed["orderId"], "200.00000000", 2)
+    ]
+
+    sim.exchange.fill("USD", 50, 0.0002, sim.exchange.now())
+    [loan] = api.return_active_loans()["provided"]
+    assert (loan["currency"], float(loan["amount"])) == ("USD", 50)
+
+    assert api.cancel_loan_offer("USD", placed["orderId"])["success"] == 1
+    assert api.return_open_loan_offers() == {}
+    assert api.get_frr("USD") == 0.0002
+    ticker = api.return_ticker()
+    assert float(ticker["USD_BTC"]["last"]) == 50000
+
+
+def test_bitfinex_cancel_all_uses_v2(simulator):
+    sim = simulator()
+    api = Bitfinex(client_cfg(sim.url), MagicMock())
+    ids = [api.create_loan_offer("USD", 100, 2, 0, 0.0003)["orderId"] for _ in range(3)]
+
+    results = api.cancel_loan_offers("USD", ids, all_open=True)
+
+    assert [r["success"] for r in results] == [1, 1, 1]
+    assert sim.exchange.open_offers() == []
+    assert sim.stats()["requests"] == 5  # balances, 3 offers, 1 cancel
+
+
+def test_bitfinex_minimum_offer_error(simulator):
+    sim = simulator()
+    api = Bitfinex(client_cfg(sim.url), MagicMock())
+    with pytest.raises(ApiError, match="Amount must be at least 50"):
+        api.create_loan_offer("USD", 10, 2, 0, 0.0003)
+
+
+def test_bitfinex_bad_signature_rejected(simulator):
+    sim = simulator()
+    with pytest.raises(ApiError, match="Invalid X-BFX-SIGNATURE"):
+        Bitfinex(client_cfg(sim.url, secret="wrong"), MagicMock())
+
+
+# --- Poloniex client against the simulator ---
+
+
+def test_poloniex_client_round_trip(simulator):
+    sim = simulator()
+    api = Poloniex(client_cfg(sim.url, Exchange.POLONIEX), MagicMock())
+
+    assert api.return_available_account_balances("lending") == {
+        "lending": {"BTC": "0.10000000", "USD": "1000.00000000"}
+    }
+    placed = api.create_loan_offer("BTC", 0.05, 2, 0, 0.00004)
+    assert placed["success"] == 1
+    book = api.return_loan_orders("BTC", 2)
+    assert [o["rate"] for o in book["offers"]] == ["0.00004000", "0.00005000"]
+    [offer] = api.return_open_loan_offers()["BTC"]
+    assert offer["id"] == placed["orderID"]
+    assert api.cancel_loan_offer("BTC", offer["id"])["success"] == 1
+    assert api.return_open_loan_offers() == {}
+    assert "BTC_USD" in api.return_ticker()
+    with pytest.raises(ApiError, match="not enough balance"):
+        api.create_loan_offer("BTC", 1, 2, 0, 0.00004)
+
+
+# --- Fault injection ---
+
+
+def test_injected_rate_limit_slows_the_client(simulator):
+    sim = simulator(rate_limit_rate=1.0, retry_after=0.5, seed=1)
+    api = Poloniex(client_cfg(sim.url, Exchange.POLONIEX), MagicMock())
+    with pytest.raises(ApiError, match="429"):
+        api.return_ticker()
+    bucket = api.rate_limiter.stats()["public"]
+    assert bucket["backoffs"] == 1
+    assert bucket["paused_for"] > 0
+    assert sim.stats()["rate_limited"] == 1
+
+
+def test_injected_errors_and_latency(simulator):
+    sim = simulator(error_rate=1.0, latency=0.05, seed=1)
+    cfg = client_cfg(sim.url, Exchange.POLONIEX)
+    api = Poloniex(cfg, MagicMock())
+    with pytest.raises(ApiError, match="Simulated server error"):
+        api.return_loan_orders("USD", 5)
+    assert sim.stats()["errors"] == 1
+
+
+# --- Bot end to end ---
+
+
+def test_orchestrator_cycle_against_simulator(simulator, tmp_path):
+    sim = simulator()
+    config = tmp_path / "config.toml"
+    config.write_text(
+        f"""
+[api]
+exchange = "Bitfinex"
+apikey = "{KEY}"
+secret = "{SECRET}"
+all_currencies = ["USD", "BTC"]
+base_url = "{sim.url}"
+[api.adaptive_rate]
+state_file = ""
+[api.rate_limits.public]
+requests = 100
+period_ms = 100
+[api.rate_limits.auth_read]
+requests = 100
+period_ms = 100
+[api.rate_limits.auth_write]
+requests = 100
+period_ms = 100
+[bot]
+json_file = "{Path(tmp_path, "botlog.json").as_posix()}"
+plugins = []
+[bot.web]
+enabled = false
+[coin.default]
+min_daily_rate = 0.003
+"""
+    )
+    bot = BotOrchestrator(config_path=config)
+    bot.initialize()
+    bot.step()
+
+    offers = sim.exchange.open_offers()
+    assert {o.currency for o in offers} == {"USD", "BTC"}
+    assert sum(o.amount for o in offers if o.currency == "USD") == pytest.approx(1000)
+
+    # The next cycle cancels the open offers and places them again
+    bot.step()
+    assert {o.currency for o in sim.exchange.open_offers()} == {"USD", "BTC"}
@@ -0,0 +1,96 @@
+"""
+Tests for the integer fixed-point amounts and rates
+"""
+
+import time
+from decimal import Decimal
+
+import pytest
+
+from lendingbot.modules import Data
+from lendingbot.modules.FixedPoint import (
+    amount_decimal,
+    amount_units,
+    ceil_amount_units,
+    rate_decimal,
+    rate_units,
+    split_units,
+)
+
+
+def test_amount_units_truncate_below_a_satoshi():
+    assert amount_units("1.5") == 150000000
+    assert amount_units("0.123456789") == 12345678
+    assert amount_units(Decimal("0.123456789")) == 12345678
+    assert amount_units(0.1) == 10000000
+    assert amount_units(2) == 200000000
+    assert amount_units("1e-8") == 1
+    assert amount_units("12.") == 1200000000
+    assert ceil_amount_units(Decimal("0.000000001")) == 1
+
+
+def test_rate_units_round_half_even():
+    assert rate_units("0.0002") == 2000000
+    assert rate_units("0.00000000005") == 0
+    assert rate_units("0.00000000015") == 2
+    assert rate_units(Decimal("0.000249315068493")) == 2493151
+    assert rate_units(0.01) == 100000000
+
+
+def test_round_trips():
+    assert amount_decimal(amount_units("1.00000001")) == Decimal("1.00000001")
+    assert rate_decimal(rate_units("0.0001234567")) == Decimal("0.0001234567")
+    assert str(amount_decimal(150000000)) == "1.50000000"
+
+
+def test_split_units_gives_the_remainder_to_the_first_share():
+    assert split_units(100000001, 3) == [33333335, 33333333, 33333333]
+    assert split_units(5, 1) == [5]
+    assert sum(split_units(123456789, 7)) == 123456789
+
+
+BOTTOM, TOP, SPREAD = Decimal("0.00012"), Decimal("0.00049"), 5
+
+
+def make_balances(n):
+    return [Decimal(f"{i}.{i * 7919 % 10**8:08d}") for i in range(1, n + 1)]
+
+
+def split_with_decimals(balance):
+    """The amount and rate arithmetic of construct_orders before fixed-point"""
+    step = (TOP - BOTTOM) / (SPREAD - 1)
+    rates = sorted({BOTTOM + step * i for i in range(SPREAD)})
+    amounts = [Decimal(str(Data.truncate(balance / len(rates), 8))) for _ in range(len(rates))]
+    amounts[0] += balance - sum(amounts)
+    return amounts, rates
+
+
+def split_with_units(balance):
+    """The amount and rate arithmetic of construct_orders in fixed-point"""
+    low = rate_units(BOTTOM)
+    diff = rate_units(TOP) - low
+    rates = sorted({low + diff * i // (SPREAD - 1) for i in range(SPREAD)})
+    return split_units(amount_units(balance), len(rates)), rates
+
+
+def test_order_split_in_units_matches_decimals():
+    for balance in make_balances(2000):
+        amounts, rates = split_with_units(balance)
+        expected_amounts, expected_rates = split_with_decimals(balance)
+        assert [amount_decimal(a) for a in amounts] == expected_amounts
+        assert [rate_decimal(r) for r in rates] == expected_rates
+
+
+@pytest.mark.benchmark
+def test_benchmark_order_split(record_property):
+    balances = make_balances(20000)
+
+    start = time.perf_counter()
+    for balance in balances:
+        split_with_decimals(balance)
+    record_property("decimal_seconds", time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for balance in balances:
+        split_with_units(balance)
+    record_property("units_seconds", time.perf_counter() - start)
@@ -0,0 +1,76 @@
+"""
+Tests for the shared flash return rate cache.
+"""
+
+import threading
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from lendingbot.modules.FrrCache import FrrCache
+
+
+def test_one_fetch_serves_all_currencies():
+    fetch = MagicMock(return_value={"USD": 0.0002, "BTC": 0.0001})
+    cache = FrrCache(fetch, ttl=60, currencies=["USD", "BTC"])
+
+    assert cache.get("USD") == 0.0002
+    assert cache.get("BTC") == 0.0001
+
+    fetch.assert_called_once_with(["USD", "BTC"])
+    assert (cache.hits, cache.misses, cache.fetches) == (1, 1, 1)
+
+
+def test_expired_rates_are_refetched():
+    fetch = MagicMock(side_effect=[{"USD": 0.0002}, {"USD": 0.0003}])
+    cache = FrrCache(fetch, ttl=60)
+
+    with patch("lendingbot.modules.FrrCache.time.time", return_value=1000):
+        assert cache.get("USD") == 0.0002
+    with patch("lendingbot.modules.FrrCache.time.time", return_value=1059):
+        assert cache.get("USD") == 0.0002
+    with patch("lendingbot.modules.FrrCache.time.time", return_value=1060):
+        assert cache.get("USD") == 0.0003
+    assert fetch.call_count == 2
+
+
+def test_zero_ttl_disables_caching():
+    fetch = MagicMock(return_value={"USD": 0.0002})
+    cache = FrrCache(fetch, ttl=0)
+    cache.get("USD")
+    cache.get("USD")
+    assert fetch.call_count == 2
+
+
+def test_update_seeds_cache():
+    fetch = MagicMock()
+    cache = FrrCache(fetch, ttl=60)
+    cache.update({"USD": 0.0002})
+    assert cache.get("USD") == 0.0002
+    fetch.assert_not_called()
+
+
+def test_missing_currency_raises():
+    cache = FrrCache(MagicMock(return_value={}), ttl=60)
+    with pytest.raises(KeyError, match="XYZ"):
+        cache.get("XYZ")
+
+
+def test_concurrent_lookups_share_one_fetch():
+    fetch = MagicMock(return_value={"USD": 0.0002, "BTC": 0.0001})
+    cache = FrrCache(fetch, ttl=60, currencies=["USD", "BTC"])
+    threads = [threading.Thread(target=cache.get, args=(cur,)) for cur in ["USD", "BTC"] * 4]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    fetch.assert_called_once()
+
+
+def test_snapshot():
+    cache = FrrCache(MagicMock(), ttl=30)
+    cache.update({"USD": 0.0002})
+    snapshot = cache.snapshot()
+    assert snapshot["ttl"] == 30
+    assert snapshot["rates"]["USD"]["frr"] == 0.0002
+    assert snapshot["rates"]["USD"]["age"] >= 0
@@ -0,0 +1,167 @@
+"""
+Tests for the windowed, resumable lending history download
+"""
+
+import sqlite3
+import threading
+from unittest.mock import MagicMock
+
+import pytest
+
+from lendingbot.modules.HistorySync import ALL_CURRENCIES, HistoryPage, HistorySync
+from lendingbot.modules.RateLimiter import AUTH_READ
+from lendingbot.modules.RequestScheduler import BACKFILL, current_class
+
+
+class FakeApi:
+    """Serves a ledger of (timestamp, currency) entries newest first, like Bitfinex"""
+
+    def __init__(self, entries, streams=("BTC", "USD"), fail=None):
+        self.entries = entries
+        self.streams = list(streams)
+        self.fail = fail or set()
+        self.lock = threading.Lock()
+        self.calls = []
+        self.classes = set()
+
+    def history_streams(self):
+        return self.streams
+
+    def return_lending_history_page(self, stream, start, stop, limit):
+        with self.lock:
+            self.calls.append((stream, start, stop, limit))
+            self.classes.add(current_class(AUTH_READ))
+        if (stream, start) in self.fail:
+            raise RuntimeError("exchange down")
+        found = sorted(
+            (e for e in self.entries if e[1] == stream and start <= e[0] <= stop), reverse=True
+        )[:limit]
+        return HistoryPage(
+            rows=[{"id": ts, "currency": cur} for ts, cur in found],
+            oldest=found[-1][0] if found else None,
+            complete=len(found) < limit,
+        )
+
+
+@pytest.fixture
+def db():
+    conn = sqlite3.connect(":memory:", check_same_thread=False)
+    conn.execute("CREATE TABLE history(id INTEGER, currency TEXT, UNIQUE(id, currency))")
+    yield conn
+    conn.close()
+
+
+def make_sync(api, db, **kwargs):
+    def store(rows):
+        db.executemany(
+            "INSERT OR REPLACE INTO history VALUES (?, ?)",
+            [(r["id"], r["currency"]) for r in rows],
+        )
+
+    return HistorySync(api, db, MagicMock(), store, **kwargs)
+
+
+def stored(db):
+    return db.execute("SELECT count(*) FROM history").fetchone()[0]
+
+
+def test_short_history_takes_one_request_per_stream(db):
+    entries = [(t, cur) for t in range(0, 1000, 7) for cur in ("BTC", "USD")]
+    api = FakeApi(entries)
+    sync = make_sync(api, db, window=100, concurrency=3, page_limit=500)
+
+    count, complete = sync.sync(0, 1000)
+
+    assert complete
+    assert count == len(entries)
+    assert stored(db) == len(entries)
+    # Paged backwards from now, never split into windows
+    assert sorted(api.calls) == [("BTC", 0, 999, 500), ("USD", 0, 999, 500)]
+    assert sync.load_cursor("BTC") == sync.load_cursor("USD") == (None, 1000)
+    assert api.classes == {BACKFILL}
+
+
+def test_splits_into_windows_below_a_full_page(db):
+    entries = [(t, "BTC") for t in range(500, 1000)]
+    api = FakeApi(entries, streams=["BTC"])
+    sync = make_sync(api, db, window=1000, concurrency=3, page_limit=100, windows_per_sync=100)
+
+    _, complete = sync.sync(0, 1000)
+
+    assert complete
+    assert stored(db) == 500
+    # The newest page spans 100 seconds, the windows below it as much
+    assert api.calls[0] == ("BTC", 0, 999, 100)
+    assert ("BTC", 801, 900, 100) in api.calls
+    # Besides the newest pages of what is left, which start at 0
+    assert all(stop - start < 100 for _, start, stop, _ in api.calls if start > 0)
+
+
+def test_pages_backwards_through_a_dense_window(db):
+    entries = [(t, "BTC") for t in range(100)]
+    api = FakeApi(entries, streams=["BTC"])
+    sync = make_sync(api, db, window=10, page_limit=30, windows_per_sync=100)
+
+    count, complete = sync.sync(0, 100)
+
+    assert complete
+    assert stored(db) == 100
+    # Pages overlap on their oldest second, so some rows are stored twice
+    assert count >= 100
+    assert api.calls[0][2] == 99
+
+
+def test_windows_per_sync_spreads_a_long_history_over_syncs(db):
+    entries = [(t, "BTC") for t in range(1000)]
+    api = FakeApi(entries, streams=["BTC"])
+    sync = make_sync(api, db, window=1000, concurrency=2, page_limit=100, windows_per_sync=3)
+
+    _, complete = sync.sync(0, 1000)
+
+    assert not complete
+    assert len(api.calls) == 3
+    synced_from, synced_until = sync.load_cursor("BTC")
+    assert synced_until == 1000
+    assert stored(db) == 1000 - synced_from
+
+    syncs = 1
+    while not complete:
+        _, complete = sync.sync(0, 1000)
+        syncs += 1
+    assert stored(db) == 1000
+    assert syncs == 4
+
+
+def test_failed_window_keeps_cursor_and_resumes(db):
+    entries = [(t, "BTC") for t in range(0, 300)]
+    api = FakeApi(entries, streams=["BTC"], fail={("BTC", 101)})
+    sync = make_sync(api, db, window=1000, concurrency=2, page_limit=100, windows_per_sync=10)
+
+    _, complete = sync.sync(0, 300)
+
+    assert not complete
+    # The newest page reached 200, the window below it failed
+    assert sync.load_cursor("BTC") == (201, 300)
+    sync.log.log_error.assert_called_once()
+
+    api.fail.clear()
+    api.calls.clear()
+    _, complete = sync.sync(0, 300)
+
+    assert complete
+    assert stored(db) == 300
+    assert sync.load_cursor("BTC") == (None, 300)
+    assert all(stop < 201 for _, _, stop, _ in api.calls)
+
+
+def test_resumes_from_cursor_up_to_now(db):
+    api = FakeApi([], streams=[ALL_CURRENCIES])
+    sync = make_sync(api, db, window=50)
+    sync.sync(0, 100)
+    api.calls.clear()
+
+    _, complete = sync.sync(0, 160)
+
+    assert complete
+    assert [(c[1], c[2]) for c in api.calls] == [(100, 159)]
+    assert sync.cursor(ALL_CURRENCIES) == 160
@@ -0,0 +1,60 @@
+"""
+Tests for the pooled HTTP transport.
+"""
+
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from lendingbot.modules.Configuration import ApiConfig, BotConfig, HttpConfig, RootConfig
+from lendingbot.modules.HttpClient import HttpClient
+
+
+@pytest.fixture
+def http_client():
+    cfg = RootConfig(
+        api=ApiConfig(http=HttpConfig(pool_size=4, connect_timeout=2.5, idle_timeout=30)),
+        bot=BotConfig(request_timeout=20),
+    )
+    return HttpClient(cfg)
+
+
+class TestHttpClient:
+    def test_pool_size_applied_to_adapters(self, http_client):
+        adapter = http_client.session.get_adapter("https://api.bitfinex.com")
+        assert adapter._pool_connections == 4
+        assert adapter._pool_maxsize == 4
+        assert adapter._pool_block is True
+
+    def test_split_timeouts(self, http_client):
+        assert http_client.timeout == (2.5, 20.0)
+
+    def test_get_keeps_connection_alive(self, http_client):
+        with patch("requests.Session.get") as mock_get:
+            mock_get.return_value = MagicMock(status_code=200)
+            http_client.get("https://example.com/a")
+            _args, kwargs = mock_get.call_args
+            assert kwargs["timeout"] == (2.5, 20.0)
+            assert "Connection" not in (kwargs["headers"] or {})
+
+    def test_post_forwards_payload(self, http_client):
+        with patch("requests.Session.post") as mock_post:
+            http_client.post("https://example.com/b", headers={"Key": "k"}, data={"a": 1})
+            _args, kwargs = mock_post.call_args
+            assert kwargs["headers"] == {"Key": "k"}
+            assert kwargs["data"] == {"a": 1}
+            assert kwargs["verify"] is True
+
+    def test_reap_idle_recreates_session(self, http_client):
+        old_session = http_client.session
+        assert http_client.reap_idle() is False
+        assert http_client.session is old_session
+
+        http_client.last_used -= 31
+        assert http_client.reap_idle() is True
+        assert http_client.session is not old_session
+
+    def test_reap_disabled(self, http_client):
+        http_client.idle_timeout = 0
+        http_client.last_used -= 10_000
+        assert http_client.reap_idle() is False
@@ -0,0 +1,173 @@
+"""
+Tests for recording exchange API traffic to a journal and replaying it
+"""
+
+import base64
+import json
+import time
+from unittest.mock import MagicMock
+
+import pytest
+from pydantic import ValidationError
+
+from lendingbot.modules.Bitfinex import Bitfinex
+from lendingbot.modules.Configuration import (
+    AdaptiveRateConfig,
+    ApiConfig,
+    BotConfig,
+    JournalConfig,
+    RateLimitConfig,
+    RootConfig,
+)
+from lendingbot.modules.ExchangeApi import ApiError
+from lendingbot.modules.ExchangeSimulator import (
+    CurrencySettings,
+    ExchangeSimulator,
+    SimulatedExchange,
+    SimulatorSettings,
+)
+from lendingbot.modules.Journal import (
+    JournalMiss,
+    JournalRecorder,
+    JournalReplayer,
+    RecordedResponse,
+    load_journal,
+    request_key,
+)
+
+
+KEY = "journal-key"
+SECRET = "journal-secret"
+
+
+def make_cfg(url="http://127.0.0.1:1", **journal):
+    slow = RateLimitConfig(requests=1, period_ms=60000)
+    return RootConfig(
+        api=ApiConfig(
+            apikey=KEY,
+            secret=SECRET,
+            base_url=url,
+            all_currencies=["USD", "BTC"],
+            rate_limits={"public": slow, "auth_read": slow, "auth_write": slow},
+            adaptive_rate=AdaptiveRateConfig(state_file=""),
+            journal=JournalConfig(**journal),
+        ),
+        bot=BotConfig(request_timeout=5),
+    )
+
+
+@pytest.fixture
+def simulator():
+    currencies = {
+        "USD": CurrencySettings(rate=0.0002, depth=100000.0, price_usd=1.0, balance=1000.0),
+        "BTC": CurrencySettings(rate=0.00005, depth=10.0, price_usd=50000.0, balance=0.1),
+    }
+    sim = ExchangeSimulator(
+        SimulatedExchange(currencies, SimulatorSettings(api_key=KEY, demand_interval=0))
+    )
+    sim.start()
+    yield sim
+    sim.stop()
+
+
+def test_request_key_ignores_host_signature_and_nonce():
+    payload = base64.b64encode(json.dumps({"request": "/v1/offers", "nonce": "1"}).encode())
+    other = base64.b64encode(json.dumps({"request": "/v1/offers", "nonce": "2"}).encode())
+    first = request_key(
+        "post", "https://api.bitfinex.com/v1/offers", {"X-BFX-PAYLOAD": payload.decode()}
+    )
+    second = request_key(
+        "POST", "http://127.0.0.1:8765/v1/offers", {"X-BFX-PAYLOAD": other.decode()}
+    )
+    assert first == second == ("POST", "/v1/offers", '{"request":"/v1/offers"}')
+
+    form = request_key("POST", "https://poloniex.com/tradingApi", data={"nonce": 5, "command": "x"})
+    assert form == ("POST", "/tradingApi", '{"command":"x"}')
+    assert request_key("GET", "https://x/v2/tickers?symbols=fUSD") == (
+        "GET",
+        "/v2/tickers?symbols=fUSD",
+        "",
+    )
+    assert request_key("POST", "https://x/v2/w", data='{"currency":"USD"}')[2] == (
+        '{"currency":"USD"}'
+    )
+
+
+def test_recorder_writes_compact_redacted_lines(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    recorder = JournalRecorder(path, [KEY, SECRET])
+    response = RecordedResponse(429, f'{{"echo":"{KEY}"}}', {"Retry-After": "2"})
+    recorder.record(
+        "POST", "https://x/tradingApi", {"Key": KEY, "Sign": "abc"}, {"nonce": 1}, response, 0.25
+    )
+    recorder.close()
+
+    text = path.read_text()
+    assert text.count("\n") == 1
+    assert KEY not in text
+    assert SECRET not in text
+    assert "abc" not in text
+    [entry] = load_journal(path)
+    assert entry["ms"] == 250.0
+    assert entry["s"] == 429
+    assert entry["h"] == {"Retry-After": "2"}
+    assert json.loads(entry["r"]) == {"echo": "***"}
+
+
+def test_replayer_serves_in_order_then_repeats_last(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    recorder = JournalRecorder(path)
+    for text in ("[1]", "[2]"):
+        recorder.record("GET", "https://x/v1/symbols", None, None, RecordedResponse(200, text), 0.1)
+    recorder.close()
+    # A line cut short by a crash is skipped
+    with path.open("a") as f:
+        f.write('{"t":1,"m":"GET"')
+
+    replayer = JournalReplayer(path)
+    answers = [replayer.respond("GET", "http://other/v1/symbols").json() for _ in range(3)]
+    assert answers == [[1], [2], [2]]
+    with pytest.raises(JournalMiss):
+        replayer.respond("GET", "http://other/v1/offers")
+    assert replayer.stats() == {"served": 3, "misses": 1, "unused": 0, "recorded_ms": 300.0}
+
+
+def test_record_and_replay_a_bitfinex_session(simulator, tmp_path):
+    path = tmp_path / "journal.jsonl"
+    fast = RateLimitConfig(requests=100, period_ms=100)
+    cfg = make_cfg(simulator.url, record=str(path))
+    cfg.api.rate_limits = {"public": fast, "auth_read": fast, "auth_write": fast}
+
+    live = Bitfinex(cfg, MagicMock())
+    placed = live.create_loan_offer("USD", 200, 2, 0, 0.0003)
+    recorded = {
+        "offers": live.return_open_loan_offers(),
+        "book": live.return_loan_orders("USD", 5),
+        "frr": live.get_frr("USD"),
+    }
+    live.cancel_loan_offer("USD", placed["orderId"])
+    after_cancel = live.return_open_loan_offers()
+    live.http.close()
+    simulator.stop()
+    assert SECRET not in path.read_text()
+
+    # Replayed without the exchange and despite a budget of 1 request a minute
+    replay = Bitfinex(make_cfg(replay=str(path)), MagicMock())
+    start = time.monotonic()
+    assert replay.create_loan_offer("USD", 200, 2, 0, 0.0003) == placed
+    assert replay.return_open_loan_offers() == recorded["offers"]
+    assert replay.return_loan_orders("USD", 5) == recorded["book"]
+    assert replay.get_frr("USD") == recorded["frr"]
+    assert replay.cancel_loan_offer("USD", placed["orderId"])["success"] == 1
+    assert replay.return_open_loan_offers() == after_cancel
+    assert time.monotonic() - start < 5
+    assert replay.http.replayer is not None
+    assert replay.http.replayer.stats()["unused"] == 0
+
+    with pytest.raises(ApiError, match="No recorded response"):
+        replay.return_loan_orders("BTC", 5)
+
+
+def test_journal_modes_are_exclusive():
+    with pytest.raises(ValidationError, match="cannot be used together"):
+        JournalConfig(record="a.jsonl", replay="b.jsonl")
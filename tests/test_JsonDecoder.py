@@ -0,0 +1,98 @@
+"""
+Tests for the response decoders
+"""
+
+from unittest.mock import MagicMock
+
+import pytest
+
+from lendingbot.modules import JsonDecoder as jd
+from lendingbot.modules.Bitfinex2Poloniex import Bitfinex2Poloniex
+from lendingbot.modules.Journal import RecordedResponse
+from lendingbot.modules.OrderBook import OrderBook
+
+
+LENDBOOK = (
+    b'{"asks":[{"rate":"9.1","amount":"1.5","period":30,"timestamp":"1.0","frr":"No"}],'
+    b'"bids":[{"rate":"8.0","amount":"2","period":2,"timestamp":"1.0","frr":"No"}]}'
+)
+CREDITS = (
+    b'[{"id":7,"currency":"BTC","rate":"18.25","period":30,"amount":"0.50000000",'
+    b'"timestamp":"1700000000.0","status":"ACTIVE"}]'
+)
+
+
+def decoders():
+    params = [pytest.param(jd.STDLIB)]
+    for name, loaded in ((jd.ORJSON, jd.ORJSON_LOADED), (jd.MSGSPEC, jd.MSGSPEC_LOADED)):
+        params.append(
+            pytest.param(
+                name, marks=pytest.mark.skipif(not loaded, reason=f"{name} is not installed")
+            )
+        )
+    return params
+
+
+@pytest.mark.parametrize("name", decoders())
+def test_decoders_agree_after_conversion(name):
+    decoder = jd.create_decoder(name)
+    assert decoder.name == name
+
+    book = OrderBook.from_bitfinex(decoder.decode(LENDBOOK, jd.LENDBOOK))
+    assert book.offers.rates.tolist() == [9.1 / 36500]
+    assert book.demands.amounts.tolist() == [2.0]
+
+    loans = Bitfinex2Poloniex.convertActiveLoans(decoder.decode(CREDITS, jd.CREDITS))
+    assert loans["provided"][0]["amount"] == "0.50000000"
+    assert loans["provided"][0]["rate"] == "0.0005"
+    assert loans["provided"][0]["duration"] == 30
+
+
+@pytest.mark.parametrize("name", decoders())
+def test_invalid_json_raises_value_error(name):
+    with pytest.raises(ValueError):
+        jd.create_decoder(name).decode(b"<html>bad gateway</html>")
+
+
+def test_msgspec_decodes_typed_fields():
+    pytest.importorskip("msgspec")
+    decoder = jd.create_decoder(jd.MSGSPEC)
+
+    book = decoder.decode(LENDBOOK, jd.LENDBOOK)
+    assert book["asks"] == [{"rate": 9.1, "amount": 1.5, "period": 30}]
+
+    credit = decoder.decode(CREDITS, jd.CREDITS)[0]
+    assert credit["rate"] == 18.25
+    assert credit["timestamp"] == 1700000000.0
+    assert "status" not in credit
+
+
+def test_msgspec_keeps_unexpected_payloads():
+    pytest.importorskip("msgspec")
+    decoder = jd.create_decoder(jd.MSGSPEC)
+
+    assert decoder.decode(b'{"message":"Nonce is too small."}', jd.CREDITS) == {
+        "message": "Nonce is too small."
+    }
+    assert decoder.decode(b'{"message":"Unknown currency"}', jd.LENDBOOK) == {
+        "message": "Unknown currency"
+    }
+
+
+def test_decode_response_uses_content_or_json():
+    decoder = jd.create_decoder(jd.STDLIB)
+    assert decoder.decode_response(RecordedResponse(200, '{"a": 1}')) == {"a": 1}
+
+    response = MagicMock()
+    response.json.return_value = {"b": 2}
+    assert decoder.decode_response(response) == {"b": 2}
+
+
+def test_create_decoder(monkeypatch):
+    monkeypatch.setattr(jd, "MSGSPEC_LOADED", False)
+    monkeypatch.setattr(jd, "ORJSON_LOADED", False)
+    assert jd.create_decoder().name == jd.STDLIB
+    with pytest.raises(ValueError, match="not installed"):
+        jd.create_decoder(jd.ORJSON)
+    with pytest.raises(ValueError, match="Unknown"):
+        jd.create_decoder("simdjson")
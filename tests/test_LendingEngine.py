@@ -1,16 +1,54 @@
+import asyncio
+import functools
+import threading
+import time
 from decimal import Decimal
 from unittest.mock import MagicMock, patch
 
 import pytest
+from hypothesis import HealthCheck, given, settings
+from hypothesis import strategies as st
 
+from lendingbot.modules.BookDepth import BookExhausted
 from lendingbot.modules.Configuration import (
     CoinConfig,
     Exchange,
     GapMode,
     LendingStrategy,
     RootConfig,
+    XDayThreshold,
 )
+from lendingbot.modules.CycleSnapshot import LENDING_BALANCES, OPEN_LOAN_OFFERS, CycleSnapshot
+from lendingbot.modules.ExchangeApi import ExchangeApi
 from lendingbot.modules.Lending import LendingEngine
+from lendingbot.modules.Logger import Logger
+from lendingbot.modules.OrderBook import BookSide, OrderBook
+from lendingbot.modules.XDayCurve import XDayCurve
+
+
+def scalar_gap_rate(engine, cur, gap, order_book, total, raw=False):
+    """get_gap_rate as it walked the book level by level, the reference for the gap engine"""
+    gap_expected = gap if raw else gap * total / Decimal("100.0")
+    gap_sum = Decimal(0)
+    if len(order_book) == 0:
+        return engine.max_daily_rate
+    if gap_expected <= 0:
+        return order_book.rate_at(0)
+    volumes = order_book.amounts.tolist()
+    for i, volume in enumerate(volumes):
+        gap_sum += Decimal(str(volume))
+        if gap_sum >= gap_expected:
+            if i + 1 < len(order_book):
+                return order_book.rate_at(i + 1)
+            return engine.max_daily_rate
+        if i == len(volumes) - 1 and len(volumes) == engine.loan_orders_request_limit[cur]:
+            raise StopIteration
+    return engine.max_daily_rate
+
+
+def side(rates, volumes):
+    """An order book side whose levels all have a 2 day period"""
+    return BookSide(rates, volumes, [2] * len(rates))
 
 
 @pytest.fixture
@@ -55,6 +93,9 @@ def mock_config():
 def mock_api():
     api = MagicMock()
     api.return_ticker.return_value = {"BTC_ETH": {"last": "0.05"}}
+    # Bulk calls go through the one-by-one defaults, so tests can check single calls
+    api.cancel_loan_offers.side_effect = functools.partial(ExchangeApi.cancel_loan_offers, api)
+    api.create_loan_offers.side_effect = functools.partial(ExchangeApi.create_loan_offers, api)
     return api
 
 
@@ -122,7 +163,7 @@ class TestLendingEngineLogic:
         engine.loan_orders_request_limit["BTC"] = 5
         engine.max_daily_rate = Decimal("0.1")
 
-        order_book = {"rates": [0.01, 0.02, 0.03, 0.04, 0.05], "volumes": [10, 10, 10, 10, 10]}
+        order_book = side([0.01, 0.02, 0.03, 0.04, 0.05], [10, 10, 10, 10, 10])
 
         # 1. Exact match at first element
         # gap_expected = 10 * 100 / 100 = 10
@@ -140,8 +181,8 @@ class TestLendingEngineLogic:
         )
 
         # 3. No match (beyond book total volume 50)
-        # Hits request limit (5) and volume 50 < 60. Raises StopIteration
-        with pytest.raises(StopIteration):
+        # Hits request limit (5) and volume 50 < 60, the book may go deeper
+        with pytest.raises(BookExhausted):
             engine.get_gap_rate("BTC", Decimal("60"), order_book, Decimal("100"))
 
         # 4. Match at last element
@@ -150,11 +191,53 @@ class TestLendingEngineLogic:
             "0.1"
         )
 
+    @settings(
+        max_examples=300, deadline=None, suppress_health_check=[HealthCheck.function_scoped_fixture]
+    )
+    @given(
+        amounts=st.lists(
+            st.one_of(
+                st.integers(0, 10**12).map(lambda sat: sat / 10**8),
+                st.floats(0, 1e9, allow_nan=False),
+            ),
+            max_size=30,
+        ),
+        gaps=st.lists(
+            st.one_of(
+                st.decimals(-1, 10**6, places=8),
+                st.decimals(0, 10**4, allow_nan=False, allow_infinity=False),
+            ),
+            min_size=1,
+            max_size=6,
+        ),
+        total=st.decimals(0, 10**6, places=4),
+        raw=st.booleans(),
+        at_limit=st.booleans(),
+    )
+    def test_gap_rates_match_walking_the_book(self, engine, amounts, gaps, total, raw, at_limit):
+        rates = [0.0001 * (i + 1) for i in range(len(amounts))]
+        order_book = side(rates, amounts)
+        engine.max_daily_rate = Decimal("0.05")
+        engine.loan_orders_request_limit["BTC"] = len(amounts) if at_limit else len(amounts) + 1
+
+        expected = []
+        for gap in gaps:
+            try:
+                expected.append(scalar_gap_rate(engine, "BTC", gap, order_book, total, raw))
+            except StopIteration:
+                with pytest.raises(BookExhausted):
+                    engine.get_gap_rates("BTC", gaps, order_book, total, raw)
+                return
+        assert engine.get_gap_rates("BTC", gaps, order_book, total, raw) == expected
+        assert [engine.get_gap_rate("BTC", gap, order_book, total, raw) for gap in gaps] == expected
+
     def test_get_gap_mode_rates_relative(self, engine):
         engine.initialize()
         # Mock construct_order_books
-        order_book = {"rates": [0.01, 0.02, 0.03], "volumes": [10, 10, 10]}
-        with patch.object(engine, "construct_order_books", return_value=({}, order_book)):
+        order_book = side([0.01, 0.02, 0.03], [10, 10, 10])
+        with patch.object(
+            engine, "construct_order_books", return_value=(BookSide.empty(), order_book)
+        ):
             # Set explicit gap values on the engine directly
             engine.gap_mode_default = "relative"
             engine.gap_bottom_default = Decimal("10")
@@ -173,14 +256,56 @@ class TestLendingEngineLogic:
             # depth 100 -> top_rate = rates[0] = max_daily_rate = 5.0 -> 0.05
             assert rates[0] == Decimal("0.05")
 
+    def test_get_gap_mode_rates_fetches_a_deeper_book(self, engine, mock_api):
+        engine.initialize()
+        engine.gap_mode_default = "raw"
+        engine.gap_bottom_default = Decimal("15")
+        engine.gap_top_default = Decimal("60")
+        engine.coin_cfg["BTC"].gap_bottom = Decimal("0")
+        shallow = OrderBook(side([0.01 * (i + 1) for i in range(5)], [10] * 5), BookSide.empty())
+        deep = OrderBook(side([0.01 * (i + 1) for i in range(12)], [10] * 12), BookSide.empty())
+        mock_api.return_loan_book.side_effect = lambda _cur, limit: shallow if limit == 5 else deep
+
+        rates = engine.get_gap_mode_rates("BTC", Decimal("100"), Decimal("100"), {})
+
+        # 50 offered on 5 levels, 60 needed: the depth grows to 10 levels
+        assert [c.args for c in mock_api.return_loan_book.call_args_list] == [
+            ("BTC", 5),
+            ("BTC", 10),
+        ]
+        assert rates == [Decimal("0.07"), Decimal("0.03")]
+        engine.log.log.assert_any_call(
+            "BTC: Not enough offers in response, adjusting request limit to 10"
+        )
+        # The gaps took 7 levels, so the next cycle requests 11
+        assert engine.loan_orders_request_limit["BTC"] == 11
+
+    def test_gap_beyond_the_deepest_book_gets_max_rate(self, engine, mock_api):
+        engine.initialize()
+        engine.book_depth.maximum = 10
+        engine.gap_mode_default = "raw"
+        engine.gap_bottom_default = Decimal("10")
+        engine.gap_top_default = Decimal("1000")
+        engine.coin_cfg["BTC"].gap_bottom = Decimal("0")
+        mock_api.return_loan_book.side_effect = lambda _cur, limit: OrderBook(
+            side([0.01 * (i + 1) for i in range(limit)], [10] * limit), BookSide.empty()
+        )
+
+        rates = engine.get_gap_mode_rates("BTC", Decimal("100"), Decimal("100"), {})
+
+        assert rates == [engine.max_daily_rate, Decimal("0.02")]
+        assert mock_api.return_loan_book.call_count == 2
+
     def test_get_gap_mode_rates_rawbtc(self, engine):
         engine.initialize()
         # ETH ticker: 0.05 BTC/ETH
         ticker = {"BTC_ETH": {"last": "0.05"}}
         # depth in ETH: bottom = 0.5 / 0.05 = 10 ETH, top = 1.0 / 0.05 = 20 ETH
 
-        order_book = {"rates": [0.01, 0.02, 0.03, 0.04], "volumes": [15, 10, 10, 10]}
-        with patch.object(engine, "construct_order_books", return_value=({}, order_book)):
+        order_book = side([0.01, 0.02, 0.03, 0.04], [15, 10, 10, 10])
+        with patch.object(
+            engine, "construct_order_books", return_value=(BookSide.empty(), order_book)
+        ):
             # Force defaults for this test
             engine.gap_mode_default = "rawbtc"
             engine.gap_bottom_default = Decimal("0.5")  # 0.5 BTC
@@ -203,6 +328,24 @@ class TestLendingEngineLogic:
         # Bal 1.0, want 10. Possible.
         assert engine.get_cur_spread(10, Decimal("1.0"), "BTC") == 10
 
+    def test_construct_orders_splits_in_satoshis(self, engine):
+        engine.initialize()
+        engine.spread_lend = 3
+        engine.max_daily_rate = Decimal("0.0004")
+        with patch.object(
+            engine, "get_gap_mode_rates", return_value=[Decimal("0.0005"), Decimal("0.0001")]
+        ):
+            orders = engine.construct_orders("BTC", Decimal("1.00000001"), Decimal("2"), {})
+
+        # Steps of 0.0002, the top one capped at the max daily rate
+        assert orders["rates"] == [Decimal("0.0001"), Decimal("0.0003"), Decimal("0.0004")]
+        assert orders["amounts"] == [
+            Decimal("0.33333335"),
+            Decimal("0.33333333"),
+            Decimal("0.33333333"),
+        ]
+        assert sum(orders["amounts"]) == Decimal("1.00000001")
+
     def test_get_frr_or_min_daily_rate_non_frr(self, engine):
         engine.initialize()
         # BTC is SPREAD
@@ -240,7 +383,7 @@ class TestLendingEngineLogic:
         assert engine._adjust_rate_for_competition(0.0001) == 0.0001
 
     def test_calculate_duration_no_thresholds(self, engine):
-        engine.xday_threshold = ""
+        engine.default_xday_curve = XDayCurve([], [])
         # Default behavior when no thresholds defined
         assert engine._calculate_duration(0.01, "2") == "2"
         assert engine._calculate_duration(0.01, "5") == "5"
@@ -248,7 +391,7 @@ class TestLendingEngineLogic:
     def test_calculate_duration_with_thresholds(self, engine):
         # 0.05% -> 25 days, 0.1% -> 60 days
         # Internal representation is percentage / 100
-        engine.xday_threshold = "0.05:25,0.1:60"
+        engine.default_xday_curve = XDayCurve([0.0005, 0.001], [25, 60])
 
         # Rate below first threshold -> use first threshold days
         assert engine._calculate_duration(0.0004, "2") == "25"
@@ -276,6 +419,45 @@ class TestLendingEngineLogic:
         assert engine._calculate_duration(0.001, "5") == "3"
         assert engine._calculate_duration(0.001, "2") == "2"  # default 2 is less than 3
 
+    def test_calculate_duration_uses_coin_thresholds(self, engine, mock_config):
+        mock_config.coin["default"].xday_thresholds = [
+            XDayThreshold(rate=Decimal("0.1"), days=60),
+            XDayThreshold(rate=Decimal("0.05"), days=20),
+        ]
+        mock_config.coin["BTC"] = CoinConfig(
+            min_daily_rate=Decimal("1.0"),
+            xday_thresholds=[XDayThreshold(rate=Decimal("0.05"), days=30)],
+        )
+        engine.initialize()
+
+        # Listed out of order, sorted when compiled
+        assert engine._calculate_duration(0.00075, "2", "USD") == "40"
+        assert engine._calculate_duration(0.00075, "2") == "40"
+        assert engine._calculate_duration(0.00075, "2", "BTC") == "30"
+        assert engine._calculate_duration(0.0001, "2", "BTC") == "30"
+
+    def test_build_lend_offers_in_one_batch(self, engine, mock_config):
+        mock_config.coin["default"].xday_thresholds = [
+            XDayThreshold(rate=Decimal("0.05"), days=20),
+            XDayThreshold(rate=Decimal("0.1"), days=60),
+        ]
+        engine.initialize()
+
+        offers = engine._build_lend_offers(
+            "USD",
+            [
+                (Decimal("1"), Decimal("0.0004"), "2"),
+                (Decimal("2"), "0.00075", "2"),
+                (Decimal("3"), 0.002, "7"),
+            ],
+        )
+
+        assert [o.days for o in offers] == [20, 39, 7]
+        assert [o.amount for o in offers] == [Decimal("1"), Decimal("2"), Decimal("3")]
+        assert offers[1].original_rate == 0.00075
+        assert offers[1].rate == pytest.approx(0.000749)
+        assert engine._build_lend_offers("USD", []) == []
+
 
 class TestLendingEngineFlow:
     """Tests for high-level flow (from comprehensive)."""
@@ -287,8 +469,8 @@ class TestLendingEngineFlow:
         mock_data.get_on_order_balances.return_value = {"BTC": "1.0"}
 
         # Mock order books
-        order_book = {"rates": [0.02], "volumes": [10]}
-        demand_book = {"rates": [0.015], "volumes": [5], "rangeMax": [2]}
+        order_book = side([0.02], [10])
+        demand_book = BookSide([0.015], [5], [2])
 
         with patch.object(engine, "construct_order_books", return_value=[demand_book, order_book]):
             engine.lend_all()
@@ -296,6 +478,352 @@ class TestLendingEngineFlow:
         # Should NOT call API create_loan_offer because dry_run=True
         mock_api.create_loan_offer.assert_not_called()
 
+    def test_lend_all_async_prefetches_books_and_frr(self, engine, mock_data, mock_api):
+        engine.initialize()
+        mock_data.get_total_lent.return_value.total_lent = {}
+        mock_api.return_available_account_balances.return_value = {
+            "lending": {"BTC": "1.0", "ETH": "2.0", "XRP": "3.0"}
+        }
+        book = OrderBook(side([0.01], [1]), BookSide.empty())
+        mock_api.return_loan_book.return_value = book
+        mock_api.get_frr.return_value = 0.0002
+        seen = {}
+
+        def lend_cur(cur, *_args):
+            seen[cur] = (engine.prefetched_loan_orders.get(cur), engine.prefetched_frr.get(cur))
+            return 1
+
+        with patch.object(engine, "lend_cur", side_effect=lend_cur):
+            asyncio.run(engine.lend_all_async())
+
+        # XRP is not in all_currencies, only ETH uses the FRR strategy
+        assert sorted(c.args[0] for c in mock_api.return_loan_book.call_args_list) == [
+            "BTC",
+            "ETH",
+        ]
+        mock_api.get_frr.assert_called_once_with("ETH")
+        assert seen == {"BTC": ((5, book), None), "ETH": ((5, book), 0.0002)}
+        assert engine.prefetched_loan_orders == {}
+        assert engine.sleep_time == engine.config.bot.period_active
+
+    def test_prefetched_book_ignored_after_limit_change(self, engine, mock_api):
+        engine.initialize()
+        engine.loan_orders_request_limit["BTC"] = 10
+        engine.prefetched_loan_orders["BTC"] = (5, OrderBook.empty())
+        mock_api.return_loan_book.return_value = OrderBook.empty()
+
+        engine.construct_order_books("BTC")
+
+        mock_api.return_loan_book.assert_called_once_with("BTC", 10)
+
+    def test_lend_all_async_falls_back_on_failed_prefetch(self, engine, mock_data, mock_api):
+        engine.initialize()
+        mock_data.get_total_lent.return_value.total_lent = {}
+        mock_api.return_available_account_balances.return_value = {"lending": {"BTC": "1.0"}}
+        mock_api.return_loan_book.side_effect = Exception("timeout")
+
+        with patch.object(engine, "lend_cur", return_value=0) as mock_lend_cur:
+            asyncio.run(engine.lend_all_async())
+
+        mock_lend_cur.assert_called_once()
+        assert engine.sleep_time == engine.config.bot.period_inactive
+
+    def test_cancel_all_uses_snapshot(self, engine, mock_api):
+        engine.initialize()
+        snapshot = CycleSnapshot(
+            resources={
+                OPEN_LOAN_OFFERS: {"BTC": [{"id": 1, "amount": "1.0"}, {"id": 2, "amount": "1.0"}]},
+                LENDING_BALANCES: {"BTC": "0.0"},
+            }
+        )
+
+        assert engine.cancel_all(snapshot) == 2
+
+        mock_api.return_open_loan_offers.assert_not_called()
+        mock_api.return_available_account_balances.assert_not_called()
+        assert mock_api.cancel_loan_offer.call_count == 2
+
+    def test_lend_all_uses_snapshot(self, engine, mock_data, mock_api):
+        engine.initialize()
+        mock_data.get_total_lent.return_value.total_lent = {}
+        snapshot = CycleSnapshot(resources={LENDING_BALANCES: {"BTC": "1.0"}})
+
+        with patch.object(engine, "lend_cur", return_value=1) as mock_lend_cur:
+            engine.lend_all(snapshot)
+
+        mock_data.get_total_lent.assert_called_once_with(snapshot)
+        mock_api.return_available_account_balances.assert_not_called()
+        assert mock_lend_cur.call_args[0][2] == {"BTC": "1.0"}
+
+    def test_lend_all_lends_currencies_in_parallel(self, engine, mock_data, mock_api, tmp_path):
+        engine.config.bot.lend_workers = 3
+        engine.log = Logger(str(tmp_path / "botlog.json"), 50)
+        engine.initialize()
+        mock_data.get_total_lent.return_value.total_lent = {}
+        mock_api.return_available_account_balances.return_value = {
+            "lending": {"BTC": "1.0", "ETH": "2.0", "USD": "3.0"}
+        }
+        all_started = threading.Barrier(3, timeout=5)
+
+        def lend_cur(cur, *_args):
+            # Every currency waits for the others, so they must run at the same time
+            all_started.wait()
+            engine.log.log(f"{cur} one")
+            time.sleep({"BTC": 0.05, "ETH": 0, "USD": 0.02}[cur])
+            engine.log.log(f"{cur} two")
+            return 0 if cur == "ETH" else 1
+
+        with patch.object(engine, "lend_cur", side_effect=lend_cur):
+            engine.lend_all()
+
+        lines = [line[20:] for line in engine.log.output.jsonOutputLog]
+        assert lines[-6:] == ["BTC one", "BTC two", "ETH one", "ETH two", "USD one", "USD two"]
+        assert engine.sleep_time == engine.config.bot.period_active
+
+    @pytest.mark.parametrize("workers", [1, 2])
+    def test_lending_isolates_failures(self, engine, mock_data, mock_api, workers):
+        engine.config.bot.lend_workers = workers
+        engine.initialize()
+        mock_data.get_total_lent.return_value.total_lent = {}
+        mock_api.return_available_account_balances.return_value = {
+            "lending": {"BTC": "1.0", "ETH": "2.0", "USD": "3.0"}
+        }
+        lent = []
+
+        def lend_cur(cur, *_args):
+            if cur != "ETH":
+                raise ValueError(f"{cur} failed")
+            lent.append(cur)
+            return 0
+
+        with (
+            patch.object(engine, "lend_cur", side_effect=lend_cur),
+            pytest.raises(ValueError, match="BTC failed"),
+        ):
+            engine.lend_all()
+
+        assert lent == ["ETH"]
+        engine.log.log_error.assert_called_once_with("lending USD: USD failed")
+        # Failed currencies are not usable, the rest decides the sleep time
+        assert engine.sleep_time == engine.config.bot.period_inactive
+
+    def test_frr_delta_steps_follow_currency_order(self, engine, mock_data, mock_api):
+        engine.config.bot.lend_workers = 3
+        engine.initialize()
+        mock_data.get_total_lent.return_value.total_lent = {}
+        mock_api.return_available_account_balances.return_value = {
+            "lending": {"BTC": "1.0", "ETH": "2.0", "USD": "3.0"}
+        }
+        for cur in ("BTC", "USD"):
+            engine.coin_cfg[cur].strategy = LendingStrategy.FRR
+        mock_api.get_frr.return_value = 0.002
+        steps = {}
+
+        def lend_cur(cur, *_args):
+            # The last currency asks for its rate first
+            time.sleep({"BTC": 0.1, "ETH": 0.05, "USD": 0}[cur])
+            steps[cur] = engine.get_frr_or_min_daily_rate(cur).frr_delta_step
+            return 1
+
+        with patch.object(engine, "lend_cur", side_effect=lend_cur):
+            engine.lend_all()
+            engine.lend_all()
+
+        # The second cycle continues with the steps after the first one's
+        assert steps == {"BTC": 4, "ETH": 5, "USD": 6}
+        assert engine.frrdelta_steps == {}
+
+    def test_deep_gap_does_not_restart_lend_all(self, engine, mock_data, mock_api):
+        engine.initialize(dry_run=True)
+        engine.gap_mode_default = "raw"
+        engine.gap_bottom_default = Decimal("15")
+        engine.gap_top_default = Decimal("60")
+        engine.coin_cfg["BTC"].gap_bottom = Decimal("0")
+        mock_data.get_total_lent.return_value.total_lent = {}
+        mock_data.get_on_order_balances.return_value = {"BTC": "1.0", "USD": "1.0"}
+        mock_api.return_loan_book.side_effect = lambda _cur, limit: OrderBook(
+            side([0.001 * (i + 1) for i in range(limit)], [10] * limit), BookSide.empty()
+        )
+
+        engine.lend_all()
+
+        # Only BTC's book is fetched again, deeper, and the balances only once
+        assert [c.args for c in mock_api.return_loan_book.call_args_list] == [
+            ("BTC", 5),
+            ("BTC", 5),
+            ("BTC", 10),
+            ("USD", 5),
+            ("USD", 5),
+        ]
+        mock_data.get_on_order_balances.assert_called_once()
+
+    @pytest.fixture
+    def reconcile_engine(self, engine, mock_api):
+        engine.config.bot.reconcile.enabled = True
+        engine.initialize()
+        mock_api.cancel_loan_offer.return_value = {"success": 1}
+        return engine
+
+    def reconcile(self, engine, orders, open_offers, free="0"):
+        total_lent_info = MagicMock()
+        total_lent_info.total_lent = {}
+        with patch.object(engine, "plan_lend_offers", return_value=(1, orders)):
+            return engine.reconcile_cur(
+                "BTC", total_lent_info, {"BTC": free}, {"BTC": open_offers}, {}
+            )
+
+    def test_reconcile_keeps_matching_offers(self, reconcile_engine, mock_api):
+        rate = reconcile_engine._adjust_rate_for_competition(0.02)
+        offers = [{"id": 1, "rate": str(rate), "amount": "1.0", "duration": 2}]
+
+        assert self.reconcile(reconcile_engine, [(Decimal("1.0"), "0.02", "2")], offers) == 1
+
+        mock_api.cancel_loan_offer.assert_not_called()
+        mock_api.create_loan_offer.assert_not_called()
+        assert reconcile_engine.reconcile_stats["calls_saved"] == 2
+
+    def test_reconcile_replaces_changed_offers(self, reconcile_engine, mock_api):
+        offers = [{"id": 1, "rate": "0.01", "amount": "1.0", "duration": 2}]
+
+        self.reconcile(reconcile_engine, [(Decimal("1.0"), "0.02", "2")], offers)
+
+        mock_api.cancel_loan_offer.assert_called_once_with("BTC", 1)
+        mock_api.create_loan_offer.assert_called_once()
+        assert mock_api.create_loan_offer.call_args[0][1] == 1.0
+        assert reconcile_engine.reconcile_stats == {
+            "kept": 0,
+            "canceled": 1,
+            "placed": 1,
+            "calls_saved": 0,
+        }
+
+    def test_reconcile_places_only_available_funds(self, reconcile_engine, mock_api):
+        rate = reconcile_engine._adjust_rate_for_competition(0.02)
+        # Kept offer holds 1.005 instead of the planned 1.0
+        offers = [{"id": 1, "rate": str(rate), "amount": "1.005", "duration": 2}]
+        orders = [(Decimal("1.0"), "0.02", "2"), (Decimal("1.0"), "0.03", "2")]
+
+        self.reconcile(reconcile_engine, orders, offers, free="0.995")
+
+        mock_api.cancel_loan_offer.assert_not_called()
+        assert mock_api.create_loan_offer.call_args[0][1] == 0.995
+
+    def test_reconcile_stats_count_what_happened(self, reconcile_engine, mock_api):
+        rate = reconcile_engine._adjust_rate_for_competition(0.02)
+        offers = [
+            {"id": 1, "rate": str(rate), "amount": "1.0", "duration": 2},
+            {"id": 2, "rate": "0.01", "amount": "0.5", "duration": 2},
+            {"id": 3, "rate": "0.01", "amount": "0.5", "duration": 2},
+        ]
+        orders = [
+            (Decimal("1.0"), "0.02", "2"),
+            (Decimal("0.5"), "0.03", "2"),
+            (Decimal("0.5"), "0.04", "2"),
+        ]
+        # Offer 3 cannot be canceled, so only one of the new offers has funds
+        mock_api.cancel_loan_offer.side_effect = [{"success": 1}, Exception("not found")]
+
+        self.reconcile(reconcile_engine, orders, offers)
+
+        assert mock_api.create_loan_offer.call_count == 1
+        assert reconcile_engine.reconcile_stats == {
+            "kept": 1,
+            "canceled": 1,
+            "placed": 1,
+            "calls_saved": 2,
+        }
+
+    def test_reconcile_plans_without_own_offers_in_the_book(self, reconcile_engine, mock_api):
+        own = {"id": 1, "rate": "0.0011", "amount": "10", "duration": 2}
+        mock_api.return_loan_book.return_value = OrderBook(
+            side([0.001, 0.0011, 0.002, 0.003], [10, 10, 10, 10]), BookSide.empty()
+        )
+        gap_rates = []
+
+        def plan(cur, *_args):
+            # The own offer lies within a raw gap of 15, it must not count towards it
+            _, offer_book = reconcile_engine.construct_order_books(cur)
+            rate = reconcile_engine.get_gap_rate(cur, Decimal(15), offer_book, Decimal(0), True)
+            gap_rates.append(rate)
+            return 1, [(Decimal("10"), rate, "2")]
+
+        total_lent_info = MagicMock()
+        total_lent_info.total_lent = {}
+        with patch.object(reconcile_engine, "plan_lend_offers", side_effect=plan):
+            reconcile_engine.reconcile_cur("BTC", total_lent_info, {"BTC": "0"}, {"BTC": [own]}, {})
+
+        # The rate the cancel-all path gets once the own offer left the book
+        assert gap_rates == [Decimal("0.003")]
+        mock_api.cancel_loan_offer.assert_called_once_with("BTC", 1)
+        assert reconcile_engine.own_offers == {}
+        assert len(reconcile_engine.construct_order_books("BTC")[1]) == 4
+
+    def test_cancel_all_skipped_when_reconciling(self, reconcile_engine, mock_api):
+        assert reconcile_engine.cancel_all() == 0
+        mock_api.return_open_loan_offers.assert_not_called()
+
+    def test_lend_cur_places_offers_in_one_batch(self, engine, mock_api):
+        engine.initialize()
+        order_book = side([0.01, 0.02], [10, 10])
+        mock_api.create_loan_offers.side_effect = lambda offers: [{"success": 1}] * len(offers)
+        total_lent_info = MagicMock()
+        total_lent_info.total_lent = {}
+        with (
+            patch.object(
+                engine, "construct_order_books", return_value=(BookSide.empty(), order_book)
+            ),
+            patch.object(
+                engine,
+                "construct_orders",
+                return_value={
+                    "amounts": [Decimal("0.5"), Decimal("0.5")],
+                    "rates": [Decimal("0.02"), Decimal("0.03")],
+                },
+            ),
+        ):
+            assert engine.lend_cur("BTC", total_lent_info, {"BTC": "1.0"}, {}) == 1
+
+        mock_api.create_loan_offers.assert_called_once()
+        (offers,) = mock_api.create_loan_offers.call_args[0]
+        assert [o.amount for o in offers] == [Decimal("0.5"), Decimal("0.5")]
+        mock_api.create_loan_offer.assert_not_called()
+
+    def test_lend_cur_learns_min_loan_size(self, engine, mock_api):
+        engine.initialize()
+        order_book = side([0.02], [10])
+        mock_api.create_loan_offer.side_effect = [
+            Exception("Amount must be at least 0.5"),
+            {"success": 1},
+        ]
+        total_lent_info = MagicMock()
+        total_lent_info.total_lent = {}
+        orders = {"amounts": [Decimal("1.0")], "rates": [Decimal("0.02")]}
+        with (
+            patch.object(
+                engine, "construct_order_books", return_value=(BookSide.empty(), order_book)
+            ),
+            patch.object(engine, "construct_orders", return_value=orders),
+        ):
+            engine.lend_cur("BTC", total_lent_info, {"BTC": "1.0"}, {})
+
+        assert engine.min_loan_sizes["BTC"] == Decimal("0.5")
+        assert mock_api.create_loan_offer.call_count == 2
+
+    def test_cancel_all_uses_bulk_cancel(self, engine, mock_api):
+        engine.initialize()
+        mock_api.cancel_loan_offers.side_effect = lambda _cur, ids, **_kwargs: [{}] * len(ids)
+        snapshot = CycleSnapshot(
+            resources={
+                OPEN_LOAN_OFFERS: {"BTC": [{"id": 1, "amount": "1.0"}, {"id": 2, "amount": "1.0"}]},
+                LENDING_BALANCES: {},
+            }
+        )
+
+        assert engine.cancel_all(snapshot) == 2
+
+        mock_api.cancel_loan_offers.assert_called_once_with("BTC", [1, 2], all_open=True)
+        mock_api.cancel_loan_offer.assert_not_called()
+
     def test_cancel_all_api_error(self, engine, mock_api):
         engine.initialize()
         mock_api.return_open_loan_offers.return_value = {"BTC": [{"id": 123, "amount": "1.0"}]}
@@ -312,7 +840,9 @@ class TestLendingEngineFlow:
     def test_lend_cur_empty_books(self, engine, mock_api):  # noqa: ARG002
         engine.initialize()
         # Mock construct_order_books to return empty books
-        with patch.object(engine, "construct_order_books", return_value=({}, {})):
+        with patch.object(
+            engine, "construct_order_books", return_value=(BookSide.empty(), BookSide.empty())
+        ):
             total_lent_info = MagicMock()
             total_lent_info.total_lent = {"BTC": Decimal("0")}
             lending_balances = {"BTC": "1.0"}
@@ -321,13 +851,13 @@ class TestLendingEngineFlow:
             result = engine.lend_cur("BTC", total_lent_info, lending_balances, {})
             assert result == 0
 
-    def test_lend_cur_api_exception(self, engine, mock_api):  # noqa: ARG002
+    def test_lend_cur_api_exception(self, engine, mock_api):
         engine.initialize()
-        # Mock construct_order_books to return valid books but create_lend_offer raises non-amount error
-        order_book = {"rates": [0.01], "volumes": [10]}
-        with (
-            patch.object(engine, "construct_order_books", return_value=({}, order_book)),
-            patch.object(engine, "create_lend_offer", side_effect=RuntimeError("Serious Error")),
+        # Mock construct_order_books to return valid books but the exchange raises non-amount error
+        order_book = side([0.01], [10])
+        mock_api.create_loan_offer.side_effect = RuntimeError("Serious Error")
+        with patch.object(
+            engine, "construct_order_books", return_value=(BookSide.empty(), order_book)
         ):
             total_lent_info = MagicMock()
             total_lent_info.total_lent = {"BTC": Decimal("0")}
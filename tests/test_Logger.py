@@ -4,6 +4,7 @@ Tests for Logger module.
 
 import json
 import os
+import threading
 from unittest.mock import patch
 
 from lendingbot.modules.Logger import ConsoleOutput, JsonOutput, Logger
@@ -70,3 +71,33 @@ class TestLogger:
             Logger.notify("Msg", conf)
             # Should not call if disabled
             assert mock_send.call_count == 1
+
+    def test_held_output_is_written_on_release(self, tmp_path, capsys):
+        logger = Logger(str(tmp_path / "botlog.json"), 10)
+        logger.log("before")
+        with logger.capture_stdout(), logger.hold_output() as held:
+            logger.log("held line")
+            logger.updateStatusValue("BTC", "maxToLend", "1.0")
+            print("held print")
+        assert [line[20:] for line in logger.output.jsonOutputLog] == ["before"]
+        assert logger.output.jsonOutputCoins == {}
+        assert capsys.readouterr().out == ""
+
+        logger.log("after")
+        logger.release(held)
+
+        assert [line[20:] for line in logger.output.jsonOutputLog] == [
+            "before",
+            "after",
+            "held line",
+        ]
+        assert logger.output.jsonOutputCoins == {"BTC": {"maxToLend": "1.0"}}
+        assert capsys.readouterr().out == "held print\n"
+
+    def test_output_is_only_held_on_its_thread(self, tmp_path):
+        logger = Logger(str(tmp_path / "botlog.json"), 10)
+        with logger.hold_output():
+            thread = threading.Thread(target=logger.log, args=("other thread",))
+            thread.start()
+            thread.join()
+        assert [line[20:] for line in logger.output.jsonOutputLog] == ["other thread"]
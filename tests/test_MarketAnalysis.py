@@ -16,6 +16,9 @@ from lendingbot.modules.Configuration import (
     RootConfig,
 )
 from lendingbot.modules.MarketAnalysis import MarketAnalysis, MarketDataException
+from lendingbot.modules.OrderBook import BookSide, OrderBook
+from lendingbot.modules.RateLimiter import PUBLIC
+from lendingbot.modules.RequestScheduler import ANALYSIS, MARKET_DATA, current_class
 
 
 @pytest.fixture
@@ -39,7 +42,7 @@ def ma_module(tmp_path):
     )
 
     mock_api = Mock()
-    mock_api.return_loan_orders.return_value = {"offers": []}
+    mock_api.return_loan_book.return_value = OrderBook.empty()
 
     return MarketAnalysis(mock_config, mock_api, db_dir=tmp_path)
 
@@ -135,7 +138,9 @@ class TestMarketAnalysis:
         db_con = ma_module.create_connection("BTC")
         ma_module.create_rate_table(db_con, 1)
 
-        ma_module.api.return_loan_orders.return_value = {"offers": [{"rate": 0.01, "amount": 1.0}]}
+        ma_module.api.return_loan_book.return_value = OrderBook(
+            BookSide([0.01], [1.0], [2]), BookSide.empty()
+        )
 
         ma_module.update_market_once("BTC", 1, db_con)
 
@@ -143,6 +148,22 @@ class TestMarketAnalysis:
         assert float(res[0]) == 0.01
         db_con.close()
 
+    def test_update_market_once_polls_at_analysis_priority(self, ma_module):
+        db_con = ma_module.create_connection("BTC")
+        ma_module.create_rate_table(db_con, 1)
+        classes = []
+
+        def return_loan_book(*_args):
+            classes.append(current_class(PUBLIC))
+            return OrderBook(BookSide([0.01], [1.0], [2]), BookSide.empty())
+
+        ma_module.api.return_loan_book.side_effect = return_loan_book
+        ma_module.update_market_once("BTC", 1, db_con)
+        db_con.close()
+
+        assert classes == [ANALYSIS]
+        assert current_class(PUBLIC) == MARKET_DATA
+
     def test_get_rate_suggestion_error_handling(self, ma_module):
         df = pd.DataFrame({"rate0": [0.01, 0.02], "time": pd.to_datetime([1, 2], unit="s")})
         # Test MarketDataException fallback
@@ -1,4 +1,4 @@
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 
 from lendingbot.modules.Orchestrator import BotOrchestrator
 
@@ -56,9 +56,12 @@ class TestOrchestrator:
         orchestrator.config.bot.output_currency = "BTC"
         orchestrator.config.bot.web.enabled = False
         orchestrator.config.bot.period_inactive = 60
+        orchestrator.config.bot.concurrent_fetch = False
 
         orchestrator.log = MagicMock()
+        orchestrator.api = MagicMock()
         orchestrator.engine = MagicMock()
+        orchestrator.engine.cancel_all.return_value = 0
         orchestrator.plugins_manager = MagicMock()
 
         # Setup initial state
@@ -71,7 +74,8 @@ class TestOrchestrator:
         orchestrator.step()
 
         # Verify interactions
-        mock_data.update_conversion_rates.assert_called_with("BTC", False)
+        args, _ = mock_data.update_conversion_rates.call_args
+        assert args[:2] == ("BTC", False)
 
         # Verify lending cycle
         orchestrator.plugins_manager.before_lending.assert_called_once()
@@ -80,8 +84,70 @@ class TestOrchestrator:
         orchestrator.engine.lend_all.assert_called_once()
         orchestrator.plugins_manager.after_lending.assert_called_once()
 
+        # Every resource is fetched once per step and shared through the snapshot
+        orchestrator.api.return_active_loans.assert_called_once()
+        orchestrator.api.return_open_loan_offers.assert_called_once()
+        orchestrator.api.return_available_account_balances.assert_called_once()
+        snapshot = orchestrator.engine.lend_all.call_args[0][0]
+        assert snapshot.active_loans is orchestrator.api.return_active_loans.return_value
+        orchestrator.plugins_manager.after_lending.assert_called_once_with(snapshot)
+        mock_data.get_total_lent.assert_called_with(snapshot)
+
         # Verify logging
         orchestrator.log.persistStatus.assert_called_once()
+        orchestrator.api.save_rate_state.assert_called_once()
+
+    @patch("lendingbot.modules.Orchestrator.Data")
+    @patch("lendingbot.modules.Orchestrator.sys.stdout")
+    @patch("lendingbot.modules.Orchestrator.time.time", return_value=1000)
+    def test_orchestrator_step_concurrent_fetch(self, _mock_time, _mock_stdout, _mock_data):
+        """With bot.concurrent_fetch the step runs the asyncio lending cycle."""
+        orchestrator = BotOrchestrator(config_path="config.toml", dry_run=True)
+        orchestrator.config = MagicMock()
+        orchestrator.config.bot.web.enabled = False
+        orchestrator.config.bot.concurrent_fetch = True
+        orchestrator.config.bot.period_inactive = 60
+        orchestrator.log = MagicMock()
+        orchestrator.api = MagicMock()
+        orchestrator.engine = MagicMock()
+        orchestrator.engine.lending_paused = False
+        orchestrator.engine.lend_all_async = AsyncMock()
+        orchestrator.plugins_manager = MagicMock()
+        orchestrator.last_summary_time = 0
+
+        orchestrator.step()
+
+        orchestrator.engine.lend_all_async.assert_awaited_once()
+        orchestrator.engine.lend_all.assert_not_called()
+
+    @patch("lendingbot.modules.Orchestrator.Data")
+    @patch("lendingbot.modules.Orchestrator.sys.stdout")
+    @patch("lendingbot.modules.Orchestrator.time.time", return_value=1000)
+    def test_orchestrator_step_refreshes_after_cancel(self, _mock_time, _mock_stdout, _mock_data):
+        """Canceled offers change the lending balances, so they are fetched again."""
+        orchestrator = BotOrchestrator(config_path="config.toml", dry_run=True)
+        orchestrator.config = MagicMock()
+        orchestrator.config.bot.web.enabled = False
+        orchestrator.config.bot.concurrent_fetch = False
+        orchestrator.config.bot.period_inactive = 60
+        orchestrator.log = MagicMock()
+        orchestrator.api = MagicMock()
+        orchestrator.api.return_available_account_balances.side_effect = [
+            {"lending": {"BTC": "0"}},
+            {"lending": {"BTC": "1.0"}},
+        ]
+        orchestrator.engine = MagicMock()
+        orchestrator.engine.lending_paused = False
+        orchestrator.engine.cancel_all.return_value = 2
+        orchestrator.plugins_manager = MagicMock()
+        orchestrator.last_summary_time = 0
+
+        orchestrator.step()
+
+        assert orchestrator.api.return_available_account_balances.call_count == 2
+        snapshot = orchestrator.engine.lend_all.call_args[0][0]
+        assert snapshot.lending_balances == {"BTC": "1.0"}
+        orchestrator.api.return_active_loans.assert_called_once()
 
     @patch("lendingbot.modules.Orchestrator.os._exit")
     def test_orchestrator_stop(self, mock_exit):
@@ -90,11 +156,14 @@ class TestOrchestrator:
         orchestrator.web_server = MagicMock()
         orchestrator.plugins_manager = MagicMock()
         orchestrator.log = MagicMock()
+        orchestrator.api = MagicMock()
 
         orchestrator.stop()
 
         orchestrator.web_server.stop.assert_called_once()
         orchestrator.plugins_manager.on_bot_stop.assert_called_once()
+        orchestrator.api.save_rate_state.assert_called_once()
+        orchestrator.api.close.assert_called_once()
         orchestrator.log.log.assert_called_with("bye")
         mock_exit.assert_called_with(0)
 
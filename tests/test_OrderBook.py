@@ -0,0 +1,83 @@
+"""
+Tests for the array-backed loan order book
+"""
+
+from decimal import Decimal
+
+import pytest
+
+from lendingbot.modules.OrderBook import BookSide, OrderBook, format_amount
+
+
+LENDBOOK = {
+    "asks": [
+        {"rate": "7.3", "amount": "150.5", "period": 2, "frr": "No"},
+        {"rate": "9.125", "amount": "1000", "period": 30, "frr": "No"},
+    ],
+    "bids": [{"rate": "3.65", "amount": "0.12345678", "period": 7, "frr": "No"}],
+}
+
+
+def test_from_bitfinex_builds_daily_rate_arrays():
+    book = OrderBook.from_bitfinex(LENDBOOK)
+    assert book.offers.rates.tolist() == pytest.approx([0.0002, 0.00025])
+    assert book.offers.amounts.tolist() == [150.5, 1000.0]
+    assert book.offers.periods.tolist() == [2, 30]
+    assert len(book.demands) == 1
+    assert book.demands.rate_at(0) == Decimal("0.0001")
+
+
+def test_poloniex_view_round_trips():
+    view = OrderBook.from_bitfinex(LENDBOOK).to_poloniex()
+    assert view["offers"][1] == {
+        "rate": "0.00025000",
+        "amount": "1000",
+        "rangeMin": "2",
+        "rangeMax": 30,
+    }
+    assert view["demands"][0]["amount"] == "0.12345678"
+    assert OrderBook.from_poloniex(view).to_poloniex() == view
+
+
+def test_from_levels_takes_bid_amounts_as_positive():
+    side = BookSide.from_levels([(0.0002, 2, -80.0), (0.00015, 5, -1.5)])
+    assert side.amounts.tolist() == [80.0, 1.5]
+    assert side.periods.tolist() == [2, 5]
+    assert len(BookSide.from_levels([])) == 0
+
+
+def test_rate_at_rounds_to_quoted_precision():
+    side = BookSide([7.3 / 36500 + 1e-12], [1.0], [2])
+    assert side.rate_at(0) == Decimal("0.00020000")
+
+
+def test_format_amount():
+    assert format_amount(100.0) == "100"
+    assert format_amount(0.5) == "0.5"
+    assert format_amount(0.0) == "0"
+
+
+def test_fill_indices():
+    side = BookSide([0.01, 0.02, 0.03], [0.1, 0.2, 0.3], [2, 2, 2])
+    depths = [Decimal("0"), Decimal("0.1"), Decimal("0.3"), Decimal("0.30000001"), Decimal("0.6")]
+    assert side.fill_indices(depths) == [0, 0, 1, 2, 2]
+    assert side.fill_indices([Decimal("0.60000001"), Decimal("1e30")]) == [3, 3]
+    assert BookSide.empty().fill_indices([Decimal("1")]) == [0]
+
+
+def test_fill_indices_sums_finer_amounts_as_decimals():
+    side = BookSide([0.01, 0.02], [0.1 + 0.2, 1e-9], [2, 2])
+    # str(0.1 + 0.2) is 0.30000000000000004, which is above 0.3
+    assert side.fill_indices([Decimal("0.3"), Decimal("0.30000000000000004")]) == [0, 0]
+    assert side.fill_indices([Decimal("0.300000000000000041")]) == [1]
+
+
+def test_without_takes_offers_off_their_levels():
+    side = BookSide([0.01, 0.02, 0.02, 0.03], [1.0, 0.5, 2.0, 3.0], [2, 2, 30, 2])
+    rest = side.without([(0.02, 2.0), (0.03, 1.0), (0.05, 1.0)])
+    assert rest.rates.tolist() == [0.01, 0.02, 0.03]
+    assert rest.amounts.tolist() == [1.0, 0.5, 2.0]
+    assert rest.periods.tolist() == [2, 2, 2]
+    # Offers larger than their level empty it
+    assert len(side.without([(0.01, 5.0)])) == 3
+    assert len(side.without([])) == 4
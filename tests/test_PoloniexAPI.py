@@ -10,6 +10,10 @@ def test_rate_limiter() -> None:
     mock_config = MagicMock()
     mock_config.get.return_value = "30"
     mock_config.getboolean.return_value = False
+    mock_config.api.journal.record = ""
+    mock_config.api.journal.replay = ""
+    mock_config.api.http.json_decoder = "auto"
+    mock_config.api.coordinator.state_file = ""
 
     mock_log = MagicMock()
 
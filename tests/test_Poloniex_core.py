@@ -2,13 +2,17 @@
 Tests for Poloniex module core logic.
 """
 
+import calendar
+import time
+from decimal import Decimal
 from unittest.mock import MagicMock, patch
 
 import pytest
-import requests
 
 from lendingbot.modules.Configuration import ApiConfig, BotConfig, RootConfig
 from lendingbot.modules.Poloniex import ApiError, Poloniex
+from lendingbot.modules.RateLimiter import PUBLIC
+from lendingbot.modules.Reconciliation import LendOffer
 
 
 @pytest.fixture
@@ -22,7 +26,7 @@ def poloniex_api():
 
 class TestPoloniexCore:
     def test_api_query_public(self, poloniex_api):
-        with patch("requests.get") as mock_get:
+        with patch("requests.Session.get") as mock_get:
             mock_resp = MagicMock()
             mock_resp.json.return_value = {"BTC_ETH": {"last": "0.05"}}
             mock_get.return_value = mock_resp
@@ -32,7 +36,7 @@ class TestPoloniexCore:
             mock_get.assert_called()
 
     def test_api_query_private(self, poloniex_api):
-        with patch("requests.post") as mock_post:
+        with patch("requests.Session.post") as mock_post:
             mock_resp = MagicMock()
             mock_resp.json.return_value = {"result": "success"}
             mock_post.return_value = mock_resp
@@ -48,7 +52,7 @@ class TestPoloniexCore:
             assert "Sign" in headers
 
     def test_api_error_handling(self, poloniex_api):
-        with patch("requests.get") as mock_get:
+        with patch("requests.Session.get") as mock_get:
             mock_resp = MagicMock()
             mock_resp.json.return_value = {"error": "Invalid API Key"}
             mock_get.return_value = mock_resp
@@ -56,20 +60,40 @@ class TestPoloniexCore:
             with pytest.raises(ApiError, match="Invalid API Key"):
                 poloniex_api.return_ticker()
 
-    def test_http_error_handling(self, poloniex_api):
-        with patch("requests.get") as mock_get:
-            # Construct a response with 429 error
+    def test_rate_limited_response_slows_down(self, poloniex_api):
+        bucket = poloniex_api.rate_limiter.bucket(PUBLIC)
+        with patch("requests.Session.get") as mock_get:
             mock_resp = MagicMock()
             mock_resp.status_code = 429
-            mock_resp.text = '{"error": "Rate limit exceeded"}'
-            mock_resp.json.return_value = {"error": "Rate limit exceeded"}
-
-            # Construct HTTPError that points to this response
-            mock_error = requests.HTTPError(response=mock_resp)
-            mock_get.side_effect = mock_error
+            mock_resp.headers = {"Retry-After": "3"}
+            mock_get.return_value = mock_resp
 
             with pytest.raises(ApiError, match="Rate limit exceeded"):
                 poloniex_api.return_ticker()
+            assert bucket.stats()["paused_for"] > 2
+
+    def test_bad_gateway_error_handling(self, poloniex_api):
+        with patch("requests.Session.get") as mock_get:
+            mock_resp = MagicMock()
+            mock_resp.status_code = 502
+            mock_resp.json.side_effect = ValueError("not json")
+            mock_get.return_value = mock_resp
+
+            with pytest.raises(ApiError, match="bad gateway"):
+                poloniex_api.return_ticker()
+
+    def test_public_response_reused_within_ttl(self, poloniex_api):
+        poloniex_api.public_requests.ttl = 60
+        with patch("requests.Session.get") as mock_get:
+            mock_resp = MagicMock()
+            mock_resp.json.return_value = {"offers": [], "demands": []}
+            mock_get.return_value = mock_resp
+
+            poloniex_api.return_loan_orders("BTC", 5)
+            poloniex_api.return_loan_orders("BTC", 5)
+            poloniex_api.return_loan_orders("BTC", 10)
+            assert mock_get.call_count == 2
+            assert poloniex_api.public_requests.hits == 1
 
     def test_post_process(self):
         from lendingbot.modules.Poloniex import post_process
@@ -78,3 +102,69 @@ class TestPoloniexCore:
         res = post_process(data)
         assert "timestamp" in res["return"][0]
         assert isinstance(res["return"][0]["timestamp"], float)
+
+    def test_post_process_parses_utc_and_skips_bad_datetimes(self):
+        from lendingbot.modules.Poloniex import post_process
+
+        data = {
+            "return": [
+                {"datetime": "2018-01-01 00:00:00"},
+                {"datetime": "yesterday"},
+                {"amount": "1"},
+                {"datetime": "2025-12-30 21:43:05"},
+            ]
+        }
+        res = post_process(data)["return"]
+        assert res[0]["timestamp"] == 1514764800.0
+        assert "timestamp" not in res[1]
+        assert "timestamp" not in res[2]
+        assert res[3]["timestamp"] == 1767130985.0
+
+    @staticmethod
+    def history_datetimes(n):
+        return [
+            time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(1_500_000_000 + i * 997))
+            for i in range(n)
+        ]
+
+    @staticmethod
+    def parse_per_row(datetimes):
+        """The timestamps of the history rows, parsed one row at a time"""
+        return [float(calendar.timegm(time.strptime(dt, "%Y-%m-%d %H:%M:%S"))) for dt in datetimes]
+
+    def test_post_process_matches_parsing_per_row(self):
+        from lendingbot.modules.Poloniex import post_process
+
+        datetimes = self.history_datetimes(2_000)
+        res = post_process({"return": [{"datetime": dt} for dt in datetimes]})
+        assert [item["timestamp"] for item in res["return"]] == self.parse_per_row(datetimes)
+
+    @pytest.mark.benchmark
+    def test_benchmark_post_process_100k_history_rows(self, record_property):
+        from lendingbot.modules.Poloniex import post_process
+
+        datetimes = self.history_datetimes(100_000)
+
+        start = time.perf_counter()
+        self.parse_per_row(datetimes)
+        record_property("per_row_seconds", time.perf_counter() - start)
+
+        data = {"return": [{"datetime": dt} for dt in datetimes]}
+        start = time.perf_counter()
+        post_process(data)
+        record_property("bulk_seconds", time.perf_counter() - start)
+
+    def test_bulk_calls_fall_back_to_loops(self, poloniex_api):
+        offers = [LendOffer("BTC", Decimal("1"), 0.01, 2), LendOffer("BTC", Decimal("2"), 0.02, 2)]
+        with (
+            patch.object(poloniex_api, "create_loan_offer", return_value={"success": 1}) as create,
+            patch.object(
+                poloniex_api, "cancel_loan_offer", side_effect=[{"success": 1}, ApiError("gone")]
+            ) as cancel,
+        ):
+            assert poloniex_api.create_loan_offers(offers) == [{"success": 1}, {"success": 1}]
+            results = poloniex_api.cancel_loan_offers("BTC", [1, 2], all_open=True)
+        create.assert_any_call("BTC", 2.0, 2, 0, 0.02)
+        assert cancel.call_count == 2
+        assert results[0] == {"success": 1}
+        assert isinstance(results[1], ApiError)
@@ -0,0 +1,273 @@
+"""
+Tests for the per-endpoint rate limiter.
+"""
+
+import json
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+from pydantic import ValidationError
+
+from lendingbot.modules.Bitfinex import Bitfinex
+from lendingbot.modules.Configuration import ApiConfig, RateLimitConfig, RootConfig
+from lendingbot.modules.ExchangeApi import ApiError
+from lendingbot.modules.RateLimiter import (
+    AUTH_READ,
+    AUTH_WRITE,
+    PUBLIC,
+    AdaptiveRate,
+    BucketLimit,
+    RateLimiter,
+    TokenBucket,
+    parse_retry_after,
+)
+
+
+DEFAULTS = {
+    PUBLIC: BucketLimit(2, 1000),
+    AUTH_READ: BucketLimit(1, 1000),
+    AUTH_WRITE: BucketLimit(1, 1000, shared_with=AUTH_READ),
+}
+
+
+class TestTokenBucket:
+    def test_burst_then_wait(self):
+        bucket = TokenBucket("test", 2, 200)
+        assert bucket.acquire() < 0.01
+        assert bucket.acquire() < 0.01
+        wait = bucket.acquire()
+        assert 0.15 < wait < 0.3
+        assert bucket.requests == 3
+        assert bucket.last_wait == wait
+        assert bucket.total_wait == pytest.approx(wait, abs=0.02)
+
+    def test_queued_requests_are_spaced(self):
+        bucket = TokenBucket("test", 1, 100)
+        bucket.acquire()
+        start = time.time()
+        bucket.acquire()
+        bucket.acquire()
+        assert 0.18 < time.time() - start < 0.35
+
+    def test_higher_priority_overtakes_waiting_requests(self):
+        bucket = TokenBucket("test", 1, 200)
+        bucket.acquire()
+        order = []
+
+        def request(priority, name):
+            bucket.acquire(priority)
+            order.append(name)
+
+        low = [threading.Thread(target=request, args=(3, f"low{i}")) for i in range(2)]
+        for t in low:
+            t.start()
+        while len(bucket.waiting) < 2:
+            time.sleep(0.001)
+        high = threading.Thread(target=request, args=(0, "high"))
+        high.start()
+        for t in [*low, high]:
+            t.join()
+        assert order[0] == "high"
+        assert sorted(order[1:]) == ["low0", "low1"]
+        assert bucket.waiting == []
+
+    def test_timer_adjustments(self):
+        bucket = TokenBucket("test", 1, 1000)
+        bucket.slow_down()
+        assert bucket.period == 2000
+        bucket.speed_up()
+        # 0.5 req/s + 5% of the configured 1 req/s
+        assert bucket.period == pytest.approx(1000 / 0.55)
+        bucket.reset()
+        assert bucket.period == 1000
+
+    def test_backoff_is_multiplicative_and_capped(self):
+        bucket = TokenBucket("test", 1, 1000, AdaptiveRate(backoff_factor=0.5, max_backoff=4))
+        for step in range(4):
+            with patch("lendingbot.modules.RateLimiter.time.time", return_value=100.0 * (step + 1)):
+                bucket.slow_down()
+        assert bucket.period == 4000
+        assert bucket.backoffs == 2
+
+    def test_backoff_once_per_window(self):
+        bucket = TokenBucket("test", 1, 1000)
+        with patch("lendingbot.modules.RateLimiter.time.time", return_value=100.0):
+            bucket.slow_down()
+            bucket.slow_down()
+        assert bucket.period == 2000
+        assert bucket.backoffs == 1
+
+    def test_probe_is_additive_up_to_configured_rate(self):
+        bucket = TokenBucket("test", 2, 1000, AdaptiveRate(probe_step=0.25, max_speedup=1))
+        bucket.slow_down()
+        assert bucket.rate == pytest.approx(1.0)
+        bucket.speed_up()
+        assert bucket.rate == pytest.approx(1.5)
+        bucket.speed_up()
+        assert bucket.period == 1000
+        bucket.speed_up()
+        assert bucket.probes == 2
+
+    def test_probe_goes_above_configured_rate_until_rate_limited(self):
+        bucket = TokenBucket("test", 2, 1000, AdaptiveRate(probe_step=0.25, max_speedup=1.5))
+        bucket.speed_up()
+        assert bucket.rate == pytest.approx(2.5)
+        bucket.speed_up()
+        bucket.speed_up()
+        # Capped at 1.5 times the configured 2 req/s
+        assert bucket.rate == pytest.approx(3.0)
+        assert bucket.probes == 2
+        bucket.slow_down()
+        assert bucket.rate == pytest.approx(1.5)
+
+    def test_slow_responses_do_not_probe(self):
+        bucket = TokenBucket("test", 1, 1000, AdaptiveRate(slow_response=2.0))
+        bucket.slow_down()
+        bucket.speed_up(latency=3.0)
+        assert bucket.period == 2000
+        bucket.speed_up(latency=0.5)
+        assert bucket.period < 2000
+
+    def test_retry_after_holds_requests(self):
+        bucket = TokenBucket("test", 5, 1000)
+        bucket.slow_down(retry_after=3)
+        assert 2.9 < bucket.wait_time() <= 3.0
+        assert bucket.stats()["paused_for"] > 0
+        bucket.reset()
+        assert bucket.wait_time() <= 0
+
+    def test_restore_is_clamped(self):
+        bucket = TokenBucket("test", 1, 1000, AdaptiveRate(max_backoff=3, max_speedup=1.25))
+        bucket.restore(500)
+        assert bucket.period == 800
+        bucket.restore(99999)
+        assert bucket.period == 3000
+        bucket.restore(1500)
+        assert bucket.period == 1500
+
+
+class TestParseRetryAfter:
+    def test_seconds(self):
+        assert parse_retry_after("12") == 12.0
+
+    def test_http_date(self):
+        with patch("lendingbot.modules.RateLimiter.time.time", return_value=782724567.0):
+            assert parse_retry_after("Wed, 21 Oct 1994 07:29:57 GMT") == pytest.approx(30.0)
+
+    @pytest.mark.parametrize("value", [None, "", "soon"])
+    def test_missing_or_malformed(self, value):
+        assert parse_retry_after(value) is None
+
+
+class TestRateLimiter:
+    def test_buckets_are_independent(self):
+        limiter = RateLimiter.from_config(DEFAULTS, {})
+        limiter.acquire(AUTH_READ)
+        # Auth bucket is exhausted but public requests still go through immediately
+        assert limiter.bucket(PUBLIC).wait_time() <= 0
+        assert limiter.bucket(AUTH_READ).wait_time() > 0
+
+    def test_shared_bucket(self):
+        limiter = RateLimiter.from_config(DEFAULTS, {})
+        assert limiter.bucket(AUTH_WRITE) is limiter.bucket(AUTH_READ)
+
+    def test_config_override(self):
+        overrides = {AUTH_WRITE: RateLimitConfig(requests=3, period_ms=500)}
+        limiter = RateLimiter.from_config(DEFAULTS, overrides)
+        assert limiter.bucket(AUTH_WRITE) is not limiter.bucket(AUTH_READ)
+        assert limiter.bucket(AUTH_WRITE).capacity == 3
+        assert limiter.bucket(AUTH_WRITE).period == 500
+
+    def test_acquire_waits_and_reports_wait(self):
+        limits = {**DEFAULTS, AUTH_READ: BucketLimit(1, 100)}
+        limiter = RateLimiter.from_config(limits, {})
+        limiter.acquire(AUTH_READ)
+        waited = limiter.acquire(AUTH_READ)
+        assert 0.05 < waited < 0.2
+        assert limiter.stats()[AUTH_READ]["requests"] == 2
+
+    def test_state_survives_restart(self, tmp_path):
+        path = tmp_path / "rate_limits.json"
+        limiter = RateLimiter.from_config(DEFAULTS, {})
+        limiter.bucket(PUBLIC).slow_down()
+        limiter.save_state(path, "BITFINEX")
+
+        restarted = RateLimiter.from_config(DEFAULTS, {})
+        restarted.load_state(path, "BITFINEX")
+        assert restarted.bucket(PUBLIC).period == 2000
+        assert restarted.bucket(AUTH_READ).period == 1000
+        other = RateLimiter.from_config(DEFAULTS, {})
+        other.load_state(path, "POLONIEX")
+        assert other.bucket(PUBLIC).period == 1000
+
+    def test_state_ignored_when_configured_period_changed(self, tmp_path):
+        path = tmp_path / "rate_limits.json"
+        limiter = RateLimiter.from_config(DEFAULTS, {})
+        limiter.bucket(PUBLIC).slow_down()
+        limiter.save_state(path, "BITFINEX")
+
+        overrides = {PUBLIC: RateLimitConfig(requests=2, period_ms=3000)}
+        restarted = RateLimiter.from_config(DEFAULTS, overrides)
+        restarted.load_state(path, "BITFINEX")
+        assert restarted.bucket(PUBLIC).period == 3000
+
+    def test_missing_or_corrupt_state_is_ignored(self, tmp_path):
+        path = tmp_path / "rate_limits.json"
+        limiter = RateLimiter.from_config(DEFAULTS, {})
+        limiter.load_state(path, "BITFINEX")
+        path.write_text("not json")
+        limiter.load_state(path, "BITFINEX")
+        assert limiter.bucket(PUBLIC).period == 1000
+
+    def test_unknown_bucket_rejected(self):
+        with pytest.raises(ValidationError, match="Unknown rate limit bucket"):
+            ApiConfig(rate_limits={"private": {"requests": 1, "period_ms": 1000}})
+
+
+class TestBitfinexBuckets:
+    @pytest.fixture
+    def bitfinex_api(self):
+        cfg = RootConfig(api=ApiConfig(apikey="key", secret="secret"))
+        with patch.object(Bitfinex, "return_available_account_balances", return_value={}):
+            return Bitfinex(cfg, MagicMock())
+
+    def test_post_uses_auth_buckets(self, bitfinex_api):
+        with (
+            patch.object(bitfinex_api, "limit_request_rate") as mock_limit,
+            patch.object(bitfinex_api, "_request"),
+        ):
+            bitfinex_api._post("offers")
+            mock_limit.assert_called_with(AUTH_READ)
+            bitfinex_api._post("offer/new", {})
+            mock_limit.assert_called_with(AUTH_WRITE)
+            bitfinex_api._get("lendbook/USD")
+            mock_limit.assert_called_with(PUBLIC)
+
+    def test_429_backs_off_with_retry_after(self, bitfinex_api):
+        response = MagicMock(status_code=429, text="ratelimit", headers={"Retry-After": "5"})
+        with (
+            patch.object(bitfinex_api.http, "get", return_value=response),
+            patch.object(bitfinex_api, "increase_request_timer") as mock_increase,
+            pytest.raises(ApiError),
+        ):
+            bitfinex_api._request("get", "/v1/lendbook/USD")
+        mock_increase.assert_called_once_with(PUBLIC, 5.0)
+
+    def test_success_probes_upwards(self, bitfinex_api):
+        response = MagicMock(status_code=200, text="{}")
+        response.json.return_value = {}
+        bitfinex_api.rate_limiter.bucket(PUBLIC).slow_down()
+        with patch.object(bitfinex_api.http, "get", return_value=response):
+            bitfinex_api._request("get", "/v1/lendbook/USD")
+        assert bitfinex_api.rate_limiter.bucket(PUBLIC).probes == 1
+
+    def test_save_rate_state_only_when_changed(self, bitfinex_api, tmp_path):
+        bitfinex_api.rate_state_file = tmp_path / "rate_limits.json"
+        assert not bitfinex_api.save_rate_state()
+        bitfinex_api.rate_limiter.bucket(AUTH_READ).slow_down()
+        assert bitfinex_api.save_rate_state()
+        assert not bitfinex_api.save_rate_state()
+        saved = json.loads(bitfinex_api.rate_state_file.read_text())
+        assert saved["BITFINEX"][AUTH_READ]["period_ms"] == 4000
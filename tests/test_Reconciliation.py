@@ -0,0 +1,65 @@
+"""
+Tests for diffing desired lend offers against open offers.
+"""
+
+from decimal import Decimal
+
+from lendingbot.modules.Reconciliation import LendOffer, diff_offers, offer_matches
+
+
+def open_offer(offer_id, rate, amount, duration=2):
+    return {"id": offer_id, "rate": str(rate), "amount": str(amount), "duration": duration}
+
+
+class TestOfferMatches:
+    def test_within_tolerance(self):
+        desired = LendOffer("USD", Decimal("100"), 0.001, 2)
+        assert offer_matches(desired, open_offer(1, 0.001004, "100.9"), 0.5, 1.0)
+
+    def test_rate_outside_tolerance(self):
+        desired = LendOffer("USD", Decimal("100"), 0.001, 2)
+        assert not offer_matches(desired, open_offer(1, 0.00101, "100"), 0.5, 1.0)
+
+    def test_amount_outside_tolerance(self):
+        desired = LendOffer("USD", Decimal("100"), 0.001, 2)
+        assert not offer_matches(desired, open_offer(1, 0.001, "98"), 0.5, 1.0)
+
+    def test_duration_must_be_equal(self):
+        desired = LendOffer("USD", Decimal("100"), 0.001, 30)
+        assert not offer_matches(desired, open_offer(1, 0.001, "100", duration=2), 0.5, 1.0)
+
+
+class TestDiffOffers:
+    def test_identical_offers_are_kept(self):
+        desired = [
+            LendOffer("USD", Decimal("50"), 0.001, 2),
+            LendOffer("USD", Decimal("50"), 0.002, 2),
+        ]
+        offers = [open_offer(1, 0.002, 50), open_offer(2, 0.001, 50)]
+
+        diff = diff_offers(desired, offers, 0.5, 1.0)
+
+        assert [o["id"] for o in diff.keep] == [2, 1]
+        assert diff.cancel == []
+        assert diff.place == []
+        assert diff.calls_saved == 4
+
+    def test_changed_offers_are_replaced(self):
+        desired = [
+            LendOffer("USD", Decimal("50"), 0.001, 2),
+            LendOffer("USD", Decimal("50"), 0.003, 2),
+        ]
+        offers = [open_offer(1, 0.001, 50), open_offer(2, 0.002, 50), open_offer(3, 0.001, 50)]
+
+        diff = diff_offers(desired, offers, 0.5, 1.0)
+
+        assert [o["id"] for o in diff.keep] == [1]
+        assert [o["id"] for o in diff.cancel] == [2, 3]
+        assert diff.place == [desired[1]]
+        assert diff.calls_saved == 2
+
+    def test_nothing_desired_cancels_everything(self):
+        offers = [open_offer(1, 0.001, 50)]
+        diff = diff_offers([], offers, 0.5, 1.0)
+        assert diff.cancel == offers
+        assert diff.calls_saved == 0
@@ -0,0 +1,121 @@
+"""
+Tests for the priority request scheduler.
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from lendingbot.modules.RateLimiter import (
+    AUTH_READ,
+    AUTH_WRITE,
+    PUBLIC,
+    BucketLimit,
+    RateLimiter,
+)
+from lendingbot.modules.RequestScheduler import (
+    ACCOUNT,
+    ANALYSIS,
+    MARKET_DATA,
+    TRADE,
+    RequestScheduler,
+    current_class,
+    priority_of,
+    request_class,
+)
+
+
+def _limiter(public=BucketLimit(1, 200)):
+    return RateLimiter.from_config(
+        {
+            PUBLIC: public,
+            AUTH_READ: BucketLimit(5, 1000),
+            AUTH_WRITE: BucketLimit(5, 1000),
+        },
+        {},
+    )
+
+
+class TestRequestClass:
+    def test_default_class_follows_bucket(self):
+        assert current_class(AUTH_WRITE) == TRADE
+        assert current_class(AUTH_READ) == ACCOUNT
+        assert current_class(PUBLIC) == MARKET_DATA
+
+    def test_block_overrides_and_restores(self):
+        with request_class(ANALYSIS):
+            assert current_class(PUBLIC) == ANALYSIS
+            with request_class(TRADE):
+                assert current_class(PUBLIC) == TRADE
+            assert current_class(PUBLIC) == ANALYSIS
+        assert current_class(PUBLIC) == MARKET_DATA
+
+    def test_class_is_per_thread(self):
+        seen = []
+        with request_class(ANALYSIS):
+            worker = threading.Thread(target=lambda: seen.append(current_class(PUBLIC)))
+            worker.start()
+            worker.join()
+        assert seen == [MARKET_DATA]
+
+    def test_class_follows_to_thread(self):
+        async def run():
+            with request_class(ANALYSIS):
+                return await asyncio.to_thread(current_class, PUBLIC)
+
+        assert asyncio.run(run()) == ANALYSIS
+
+    def test_unknown_class_rejected(self):
+        with pytest.raises(ValueError, match="Unknown request class"), request_class("urgent"):
+            pass
+
+    def test_priorities_are_ordered(self):
+        assert [priority_of(c) for c in (TRADE, ACCOUNT, MARKET_DATA, ANALYSIS)] == [0, 1, 2, 3]
+
+
+class TestRequestScheduler:
+    def test_metrics_per_class(self):
+        scheduler = RequestScheduler()
+        limiter = _limiter()
+        scheduler.acquire(limiter, AUTH_WRITE)
+        with request_class(ANALYSIS):
+            scheduler.acquire(limiter, PUBLIC)
+        stats = scheduler.stats()
+        assert stats[TRADE]["requests"] == 1
+        assert stats[ANALYSIS]["requests"] == 1
+        assert stats[ACCOUNT]["requests"] == 0
+        assert stats[ANALYSIS]["queued"] == 0
+        assert stats[ANALYSIS]["max_queued"] == 1
+
+    def test_lending_requests_preempt_analysis_polling(self):
+        scheduler = RequestScheduler()
+        limiter = _limiter()
+        scheduler.acquire(limiter, PUBLIC)
+        order = []
+
+        def poll(i):
+            with request_class(ANALYSIS):
+                scheduler.acquire(limiter, PUBLIC)
+            order.append(f"poll{i}")
+
+        def fetch_book():
+            scheduler.acquire(limiter, PUBLIC)
+            order.append("book")
+
+        polls = [threading.Thread(target=poll, args=(i,)) for i in range(3)]
+        for t in polls:
+            t.start()
+        while scheduler.metrics[ANALYSIS].queued < 3:
+            time.sleep(0.001)
+        assert scheduler.stats()[ANALYSIS]["queued"] == 3
+        book = threading.Thread(target=fetch_book)
+        book.start()
+        for t in [*polls, book]:
+            t.join()
+
+        assert order[0] == "book"
+        stats = scheduler.stats()
+        assert stats[ANALYSIS]["max_queued"] == 3
+        assert stats[ANALYSIS]["max_wait"] > stats[MARKET_DATA]["max_wait"]
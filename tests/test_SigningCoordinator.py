@@ -0,0 +1,111 @@
+"""
+Tests for the nonce and rate budget coordination between bot processes
+"""
+
+import multiprocessing
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from lendingbot.modules import SigningCoordinator as sc
+from lendingbot.modules.Bitfinex import Bitfinex
+from lendingbot.modules.Configuration import ApiConfig, BotConfig, CoordinatorConfig, RootConfig
+from lendingbot.modules.RateLimiter import TokenBucket
+
+
+pytestmark = pytest.mark.skipif(not sc.FCNTL_LOADED, reason="needs fcntl")
+
+
+def take_nonces(path, count, queue):
+    coordinator = sc.SigningCoordinator(path)
+    nonces = []
+    for _ in range(count):
+        with coordinator.signing():
+            nonces.append((coordinator.next_nonce(1000), time.monotonic()))
+    queue.put(nonces)
+
+
+def test_nonces_increase_across_processes(tmp_path):
+    path = tmp_path / "key.json"
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    workers = [ctx.Process(target=take_nonces, args=(path, 50, queue)) for _ in range(3)]
+    for worker in workers:
+        worker.start()
+    taken = [nonce for _ in workers for nonce in queue.get(timeout=60)]
+    for worker in workers:
+        worker.join(timeout=60)
+
+    nonces = [nonce for nonce, _ in sorted(taken, key=lambda t: t[1])]
+    assert len(set(nonces)) == 150
+    assert nonces == sorted(nonces)
+    assert min(nonces) == 1000
+
+
+def test_nonce_is_at_least_the_time_based_value(tmp_path):
+    coordinator = sc.SigningCoordinator(tmp_path / "key.json")
+    with coordinator.signing():
+        assert coordinator.next_nonce(5) == 5
+        assert coordinator.next_nonce(5) == 6
+        assert coordinator.next_nonce(100) == 100
+    assert sc.SigningCoordinator(tmp_path / "key.json").next_nonce(0) == 101
+
+
+def test_signing_is_exclusive_and_reentrant(tmp_path):
+    first = sc.SigningCoordinator(tmp_path / "key.json")
+    second = sc.SigningCoordinator(tmp_path / "key.json")
+    entered = threading.Event()
+
+    def sign():
+        with second.signing():
+            entered.set()
+
+    with first.signing():
+        with first.signing():
+            thread = threading.Thread(target=sign)
+            thread.start()
+            assert not entered.wait(0.2)
+        assert not entered.wait(0.1)
+    thread.join(timeout=5)
+    assert entered.is_set()
+
+
+def test_processes_share_the_request_budget(tmp_path):
+    bucket = TokenBucket("auth_read", capacity=2, period_ms=300)
+    coordinators = [sc.SigningCoordinator(tmp_path / "key.json") for _ in range(3)]
+
+    start = time.monotonic()
+    waits = [coordinator.acquire(bucket) for coordinator in coordinators]
+
+    assert waits[0] < 0.1
+    assert waits[1] < 0.1
+    assert waits[2] >= 0.25
+    assert time.monotonic() - start >= 0.25
+
+
+def test_bitfinex_instances_share_nonces(tmp_path):
+    cfg = RootConfig(
+        api=ApiConfig(
+            apikey="key",
+            secret="secret",
+            all_currencies=["BTC"],
+            coordinator=CoordinatorConfig(state_file=str(tmp_path / "key.json")),
+        ),
+        bot=BotConfig(),
+    )
+    with patch.object(Bitfinex, "return_available_account_balances"):
+        apis = [Bitfinex(cfg, None), Bitfinex(cfg, None)]
+
+    # The clock does not move, the counter still does
+    with patch("time.time", return_value=1700000000.0):
+        nonces = [int(api._nonce) for api in apis for _ in range(2)]
+    assert nonces == list(range(nonces[0], nonces[0] + 4))
+
+    feed = MagicMock()
+    apis[0].ws_feed = feed
+    apis[0].close()
+    feed.stop.assert_called_once()
+    assert apis[0].coordinator.lock_file.closed
+    assert not apis[1].coordinator.lock_file.closed
@@ -0,0 +1,127 @@
+"""
+Tests for SingleFlight module
+"""
+
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+from lendingbot.modules.SingleFlight import SingleFlight
+
+
+def _run_threads(target, count):
+    threads = [threading.Thread(target=target) for _ in range(count)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+
+def test_concurrent_identical_calls_share_one_fetch():
+    flight = SingleFlight()
+    calls = []
+    results = []
+
+    def fetch():
+        calls.append(1)
+        time.sleep(0.2)
+        return {"offers": []}
+
+    _run_threads(lambda: results.append(flight.do("lendbook/USD", fetch)), 6)
+
+    assert len(calls) == 1
+    assert len(results) == 6
+    assert all(r is results[0] for r in results)
+    assert flight.misses == 1
+    assert flight.coalesced == 5
+    assert flight.hits == 0
+
+
+def test_different_keys_are_not_shared():
+    flight = SingleFlight()
+    assert flight.do("a", lambda: 1) == 1
+    assert flight.do("b", lambda: 2) == 2
+    assert flight.misses == 2
+
+
+def test_no_reuse_without_ttl():
+    flight = SingleFlight()
+    flight.do("a", lambda: 1)
+    assert flight.do("a", lambda: 2) == 2
+    assert flight.hits == 0
+    assert flight.snapshot()["cached"] == 0
+
+
+def test_result_reused_within_ttl():
+    flight = SingleFlight(ttl=10)
+    with patch("lendingbot.modules.SingleFlight.time.monotonic", return_value=100.0):
+        flight.do("a", lambda: 1)
+        assert flight.do("a", lambda: 2) == 1
+    with patch("lendingbot.modules.SingleFlight.time.monotonic", return_value=110.0):
+        assert flight.do("a", lambda: 3) == 3
+    assert flight.hits == 1
+    assert flight.misses == 2
+
+
+def test_error_is_shared_and_not_cached():
+    flight = SingleFlight(ttl=10)
+    started = threading.Event()
+    release = threading.Event()
+    errors = []
+
+    def failing_fetch():
+        started.set()
+        release.wait()
+        raise ValueError("boom")
+
+    def call():
+        try:
+            flight.do("a", failing_fetch)
+        except ValueError as ex:
+            errors.append(ex)
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait()
+    follower = threading.Thread(target=call)
+    follower.start()
+    # Let the follower join the call in flight before it fails
+    while flight.coalesced == 0:
+        time.sleep(0.001)
+    release.set()
+    leader.join()
+    follower.join()
+
+    assert len(errors) == 2
+    assert flight.snapshot()["cached"] == 0
+    assert flight.snapshot()["in_flight"] == 0
+    assert flight.do("a", lambda: 1) == 1
+
+
+def test_leader_exception_propagates():
+    flight = SingleFlight()
+
+    def fetch():
+        raise KeyError("x")
+
+    with pytest.raises(KeyError):
+        flight.do("a", fetch)
+    assert flight.in_flight == {}
+
+
+def test_clear_drops_stored_results():
+    flight = SingleFlight(ttl=60)
+    flight.do("a", lambda: 1)
+    flight.clear()
+    assert flight.do("a", lambda: 2) == 2
+
+
+def test_expired_results_are_pruned():
+    flight = SingleFlight(ttl=5)
+    with patch("lendingbot.modules.SingleFlight.time.monotonic", return_value=100.0):
+        flight.do("a", lambda: 1)
+    with patch("lendingbot.modules.SingleFlight.time.monotonic", return_value=200.0):
+        flight.do("b", lambda: 2)
+    assert list(flight.results) == ["b"]
@@ -149,6 +149,34 @@ class TestWebServer:
                 response = json.loads(args[0].decode("utf-8"))
                 assert "lending_paused" in response
 
+                # === Test /get_frr ===
+                mock_lending_engine.api.frr_cache.snapshot.return_value = {"rates": {}}
+                handler.path = "/get_frr"
+                handler.do_GET()
+                args, _ = handler.wfile.write.call_args
+                assert json.loads(args[0].decode("utf-8")) == {"rates": {}}
+
+                # === Test /get_public_requests ===
+                mock_lending_engine.api.public_requests.snapshot.return_value = {"hits": 2}
+                handler.path = "/get_public_requests"
+                handler.do_GET()
+                args, _ = handler.wfile.write.call_args
+                assert json.loads(args[0].decode("utf-8")) == {"hits": 2}
+
+                # === Test /get_rate_limits ===
+                mock_lending_engine.api.rate_limiter.stats.return_value = {"public": {}}
+                handler.path = "/get_rate_limits"
+                handler.do_GET()
+                args, _ = handler.wfile.write.call_args
+                assert json.loads(args[0].decode("utf-8")) == {"public": {}}
+
+                # === Test /get_request_queues ===
+                mock_lending_engine.api.scheduler.stats.return_value = {"trade": {"queued": 0}}
+                handler.path = "/get_request_queues"
+                handler.do_GET()
+                args, _ = handler.wfile.write.call_args
+                assert json.loads(args[0].decode("utf-8")) == {"trade": {"queued": 0}}
+
                 # === Test /set_config (POST) ===
                 handler.path = "/set_config"
                 payload = json.dumps({"frrdelta_min": "0.0001", "frrdelta_max": "0.0005"}).encode(
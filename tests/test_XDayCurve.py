@@ -0,0 +1,121 @@
+"""
+Tests for the compiled xday threshold curves
+"""
+
+import time
+from decimal import Decimal
+
+import numpy as np
+import pytest
+from hypothesis import given
+from hypothesis import strategies as st
+
+from lendingbot.modules.Configuration import XDayThreshold
+from lendingbot.modules.Lending import LendingEngine
+from lendingbot.modules.XDayCurve import XDayCurve
+
+
+def scan_days(xday_threshold, rate):
+    """The duration as _calculate_duration scanned the parsed threshold string"""
+    rates, xdays = LendingEngine.parse_xday_threshold(xday_threshold)
+    if rate < rates[0]:
+        return int(xdays[0])
+    for i in range(len(rates)):
+        if rate <= rates[i]:
+            return int(xdays[i - 1]) + int(
+                (int(xdays[i]) - int(xdays[i - 1]))
+                * (rate - rates[i - 1])
+                / (rates[i] - rates[i - 1])
+            )
+    return int(xdays[-1])
+
+
+def test_days_for():
+    curve = XDayCurve([0.0005, 0.001], [25, 60])
+    assert len(curve) == 2
+    assert curve.max_days == 60
+    assert curve.days_for(0.0004) == 25
+    assert curve.days_for(0.0005) == 25
+    assert curve.days_for(0.00075) == 42
+    assert curve.days_for(0.001) == 60
+    assert curve.days_for(0.002) == 60
+    assert curve.days_for_rates([0.0004, 0.0005, 0.00075, 0.001, 0.002]).tolist() == [
+        25,
+        25,
+        42,
+        60,
+        60,
+    ]
+
+
+def test_single_threshold_and_empty_curve():
+    curve = XDayCurve([0.0005], [30])
+    assert curve.days_for(0.0005) == 30
+    assert curve.days_for(0.01) == 30
+    assert curve.days_for_rates(np.array([0.0001, 0.0005, 0.01])).tolist() == [30, 30, 30]
+
+    empty = XDayCurve([], [])
+    assert len(empty) == 0
+    assert empty.max_days is None
+
+
+def test_from_thresholds_sorts_by_rate():
+    curve = XDayCurve.from_thresholds(
+        [
+            XDayThreshold(rate=Decimal("0.070"), days=120),
+            XDayThreshold(rate=Decimal("0.050"), days=20),
+            XDayThreshold(rate=Decimal("0.060"), days=45),
+        ]
+    )
+    assert curve.rates == pytest.approx([0.0005, 0.0006, 0.0007])
+    assert curve.days == [20, 45, 120]
+    assert curve.max_days == 120
+
+
+thresholds = st.lists(
+    st.tuples(
+        st.decimals(min_value=Decimal("0.003"), max_value=5, places=3),
+        st.integers(min_value=2, max_value=120),
+    ),
+    min_size=2,
+    max_size=8,
+    unique_by=lambda t: t[0],
+).map(sorted)
+
+
+@given(thresholds, st.lists(st.floats(min_value=0, max_value=0.06), min_size=1, max_size=20))
+def test_curve_matches_scanning_the_thresholds(pairs, rates):
+    xday_threshold = ",".join(f"{rate}:{days}" for rate, days in pairs)
+    curve = XDayCurve.from_thresholds([XDayThreshold(rate=r, days=d) for r, d in pairs])
+
+    expected = [scan_days(xday_threshold, rate) for rate in rates]
+    assert [curve.days_for(rate) for rate in rates] == expected
+    assert curve.days_for_rates(rates).tolist() == expected
+
+
+BENCHMARK_PAIRS = [("0.028", 20), ("0.035", 30), ("0.040", 60), ("0.045", 90), ("0.050", 120)]
+
+
+def test_compiled_durations_match_scanning_a_batch():
+    xday_threshold = ",".join(f"{rate}:{days}" for rate, days in BENCHMARK_PAIRS)
+    rates = np.linspace(0.0001, 0.0006, 2000)
+    curve = XDayCurve.from_thresholds([XDayThreshold(rate=r, days=d) for r, d in BENCHMARK_PAIRS])
+    expected = [scan_days(xday_threshold, rate) for rate in rates.tolist()]
+    assert curve.days_for_rates(rates).tolist() == expected
+
+
+@pytest.mark.benchmark
+def test_benchmark_durations(record_property):
+    """Durations of a batch of offers, parsed and scanned per offer versus compiled"""
+    xday_threshold = ",".join(f"{rate}:{days}" for rate, days in BENCHMARK_PAIRS)
+    rates = np.linspace(0.0001, 0.0006, 200000)
+
+    start = time.perf_counter()
+    for rate in rates.tolist():
+        scan_days(xday_threshold, rate)
+    record_property("scanned_seconds", time.perf_counter() - start)
+
+    start = time.perf_counter()
+    curve = XDayCurve.from_thresholds([XDayThreshold(rate=r, days=d) for r, d in BENCHMARK_PAIRS])
+    curve.days_for_rates(rates)
+    record_property("compiled_seconds", time.perf_counter() - start)